@@ -0,0 +1,55 @@
+"""add_crawl_tasks_queue
+
+Revision ID: 4e7b1c9d2a10
+Revises: ca610d1ada57
+Create Date: 2026-10-19 10:12:41.503218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e7b1c9d2a10'
+down_revision: Union[str, None] = 'ca610d1ada57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Очередь задач обхода для нескольких реплик воркера парсинга
+    op.create_table('crawl_tasks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('source', sa.String(length=50), nullable=False),
+    sa.Column('city', sa.String(length=100), nullable=False),
+    sa.Column('max_pages', sa.Integer(), nullable=False),
+    sa.Column('incremental', sa.Boolean(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('available_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('lease_owner', sa.String(length=100), nullable=True),
+    sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('result_count', sa.Integer(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_crawl_task_claim', 'crawl_tasks', ['status', 'available_at'], unique=False)
+    op.create_index('idx_crawl_task_pair', 'crawl_tasks', ['source', 'city', 'status'], unique=False)
+    op.create_index(op.f('ix_crawl_tasks_id'), 'crawl_tasks', ['id'], unique=False)
+    op.create_index(op.f('ix_crawl_tasks_source'), 'crawl_tasks', ['source'], unique=False)
+    op.create_index(op.f('ix_crawl_tasks_status'), 'crawl_tasks', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_crawl_tasks_status'), table_name='crawl_tasks')
+    op.drop_index(op.f('ix_crawl_tasks_source'), table_name='crawl_tasks')
+    op.drop_index(op.f('ix_crawl_tasks_id'), table_name='crawl_tasks')
+    op.drop_index('idx_crawl_task_pair', table_name='crawl_tasks')
+    op.drop_index('idx_crawl_task_claim', table_name='crawl_tasks')
+    op.drop_table('crawl_tasks')
@@ -0,0 +1,29 @@
+"""add_listing_analyzer_version
+
+Revision ID: 7b3e5f1a9c42
+Revises: 4e7b1c9d2a10
+Create Date: 2026-10-19 14:05:12.318640
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b3e5f1a9c42'
+down_revision: Union[str, None] = '4e7b1c9d2a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Версия правил DescriptionAnalyzer, которой посчитаны поля фильтров объявления
+    op.add_column('listings', sa.Column('analyzer_version', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_listings_analyzer_version'), 'listings', ['analyzer_version'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_listings_analyzer_version'), table_name='listings')
+    op.drop_column('listings', 'analyzer_version')
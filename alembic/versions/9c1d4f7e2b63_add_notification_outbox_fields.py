@@ -0,0 +1,37 @@
+"""add_notification_outbox_fields
+
+Revision ID: 9c1d4f7e2b63
+Revises: 7b3e5f1a9c42
+Create Date: 2026-10-19 16:21:47.902315
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c1d4f7e2b63'
+down_revision: Union[str, None] = '7b3e5f1a9c42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Outbox уведомлений: канал, объявления сообщения, отложенный повтор и аренда воркера доставки
+    op.add_column('notifications', sa.Column('channel', sa.String(length=20), nullable=True))
+    op.add_column('notifications', sa.Column('listing_ids', sa.JSON(), nullable=True))
+    op.add_column('notifications', sa.Column('available_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('notifications', sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index(op.f('ix_notifications_channel'), 'notifications', ['channel'], unique=False)
+    op.create_index('idx_notification_outbox', 'notifications', ['status', 'available_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_notification_outbox', table_name='notifications')
+    op.drop_index(op.f('ix_notifications_channel'), table_name='notifications')
+    op.drop_column('notifications', 'lease_expires_at')
+    op.drop_column('notifications', 'available_at')
+    op.drop_column('notifications', 'listing_ids')
+    op.drop_column('notifications', 'channel')
@@ -0,0 +1,27 @@
+"""add_filter_listing_watermark
+
+Revision ID: b5e2a8c4d917
+Revises: 9c1d4f7e2b63
+Create Date: 2026-10-19 17:48:03.115472
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5e2a8c4d917'
+down_revision: Union[str, None] = '9c1d4f7e2b63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Последний обработанный фильтром id объявления: повторный проход берет только id выше него
+    op.add_column('filters', sa.Column('last_seen_listing_id', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('filters', 'last_seen_listing_id')
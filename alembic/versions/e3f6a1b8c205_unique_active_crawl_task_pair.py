@@ -0,0 +1,37 @@
+"""unique_active_crawl_task_pair
+
+Revision ID: e3f6a1b8c205
+Revises: b5e2a8c4d917
+Create Date: 2026-10-19 19:05:27.640318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3f6a1b8c205'
+down_revision: Union[str, None] = 'b5e2a8c4d917'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ACTIVE = sa.text("status IN ('pending', 'running')")
+
+
+def upgrade() -> None:
+    # Дубликаты, поставленные репликами одновременно до появления индекса: остается самая ранняя задача
+    op.execute(
+        "DELETE FROM crawl_tasks WHERE status IN ('pending', 'running') AND id NOT IN ("
+        "SELECT MIN(id) FROM crawl_tasks WHERE status IN ('pending', 'running') GROUP BY source, city)"
+    )
+    # Пара в очереди или в работе - не больше одной задачи
+    op.create_index(
+        'uq_crawl_task_active_pair', 'crawl_tasks', ['source', 'city'], unique=True,
+        postgresql_where=ACTIVE, sqlite_where=ACTIVE,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_crawl_task_active_pair', table_name='crawl_tasks')
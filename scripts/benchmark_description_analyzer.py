@@ -0,0 +1,115 @@
+"""
+Бенчмарк анализатора описаний
+
+Сравнивает поиск ключевых слов одним проходом (KeywordMatcher.match)
+с отдельной проверкой каждого списка (match_naive - как было раньше):
+описаний в секунду для поиска и для полного DescriptionAnalyzer.analyze,
+плюс проверка, что категории совпадают на всем корпусе.
+
+Запуск:
+    python scripts/benchmark_description_analyzer.py --synthetic-count 20000
+    python scripts/benchmark_description_analyzer.py --corpus descriptions.json
+
+Файл --corpus: JSON-массив строк или текст, одно описание на строку.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+# Добавляем корневую директорию в PYTHONPATH
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+from src.parsers.description_analyzer import DescriptionAnalyzer, KeywordMatcher
+
+FILLER = (
+    "Affittasi luminoso appartamento in zona servita, composto da ingresso, soggiorno con angolo cottura, "
+    "due camere da letto matrimoniali, bagno con finestra e ripostiglio. Riscaldamento autonomo, "
+    "aria condizionata, vicino alla metro e ai negozi. Contratto 4+4, cauzione tre mensilità. "
+    "Bright flat close to public transport, fully furnished, available from next month. "
+)
+
+
+def synthetic_corpus(count: int, seed: int = 42) -> List[str]:
+    """Описания объявлений с ключевыми словами в случайных местах"""
+    rng = random.Random(seed)
+    keywords = [word for words in DescriptionAnalyzer.KEYWORDS.categories.values() for word in words]
+    sentences = [sentence.strip() + '.' for sentence in FILLER.split('.') if sentence.strip()]
+    corpus = []
+    for _ in range(count):
+        parts = [rng.choice(sentences) for _ in range(rng.randint(2, 12))]
+        for _ in range(rng.randint(0, 4)):
+            parts.insert(rng.randint(0, len(parts)), rng.choice(keywords).capitalize())
+        if rng.random() < 0.3:
+            parts.append(f"Palazzo del {rng.randint(1850, 2020)}, piano {rng.randint(1, 6)} di {rng.randint(6, 9)}.")
+        corpus.append(' '.join(parts))
+    return corpus
+
+
+def load_corpus(path: str) -> List[str]:
+    text = Path(path).read_text(encoding='utf-8')
+    try:
+        data = json.loads(text)
+        return [str(item) for item in data if item]
+    except ValueError:
+        return [line for line in text.splitlines() if line.strip()]
+
+
+def measure(func: Callable[[str], object], corpus: List[str], repeat: int) -> float:
+    """Описаний в секунду"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for description in corpus:
+            func(description)
+    elapsed = time.perf_counter() - started
+    return len(corpus) * repeat / elapsed if elapsed else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк анализатора описаний')
+    parser.add_argument('--corpus', help='Файл с описаниями (JSON-массив или по одному на строку)')
+    parser.add_argument('--synthetic-count', type=int, default=10000, help='Синтетических описаний')
+    parser.add_argument('--repeat', type=int, default=3, help='Повторов')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.synthetic_count)
+    origin = args.corpus or "синтетика"
+    lowered = [description.lower() for description in corpus]
+    matcher = DescriptionAnalyzer.KEYWORDS
+
+    print("=" * 80)
+    print("⏱️  БЕНЧМАРК АНАЛИЗАТОРА ОПИСАНИЙ (один проход vs проверка каждого списка)")
+    print("=" * 80)
+    avg_len = sum(len(description) for description in corpus) / max(len(corpus), 1)
+    print(f"📄 Описаний: {len(corpus)} ({origin}), средняя длина {avg_len:.0f} символов")
+
+    mismatches = sum(1 for text in lowered if matcher.match(text) != matcher.match_naive(text))
+
+    fast = measure(matcher.match, lowered, args.repeat)
+    naive = measure(matcher.match_naive, lowered, args.repeat)
+    print(f"\n🔎 Ключевые слова ({sum(len(words) for words in matcher.categories.values())} слов, "
+          f"{len(matcher.categories)} категорий):")
+    print(f"   ⚡ Один проход:     {fast:10.0f} описаний/сек")
+    print(f"   🐢 Каждый список:   {naive:10.0f} описаний/сек")
+    print(f"   🚀 Ускорение: x{fast / naive:.1f}" if naive else "")
+
+    analyze_fast = measure(DescriptionAnalyzer.analyze, corpus, args.repeat)
+    original_match = KeywordMatcher.match
+    KeywordMatcher.match = KeywordMatcher.match_naive
+    try:
+        analyze_naive = measure(DescriptionAnalyzer.analyze, corpus, args.repeat)
+    finally:
+        KeywordMatcher.match = original_match
+    print(f"\n🧮 DescriptionAnalyzer.analyze целиком:")
+    print(f"   ⚡ Один проход:     {analyze_fast:10.0f} описаний/сек")
+    print(f"   🐢 Каждый список:   {analyze_naive:10.0f} описаний/сек")
+
+    print(f"\n{'✅ Категории совпадают' if mismatches == 0 else f'❌ Расхождений: {mismatches}'}")
+
+
+if __name__ == "__main__":
+    main()
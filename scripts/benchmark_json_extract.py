@@ -0,0 +1,131 @@
+"""
+Бенчмарк извлечения встроенного JSON со страниц Casa.it, Subito и Immobiliare
+
+Сравнивает быстрый путь src.parsers.json_extract (срез по сырому тексту)
+с полным разбором BeautifulSoup: страниц в секунду и пиковая память
+(tracemalloc), плюс проверка, что результаты совпадают.
+
+Запуск:
+    python scripts/benchmark_json_extract.py --pages-dir /path/to/pages
+    python scripts/benchmark_json_extract.py --synthetic-kb 2000
+
+Файлы в --pages-dir: сохраненные ответы ScraperAPI с именами
+casa*.html, subito*.html, immobiliare*.html. Без --pages-dir страницы
+генерируются синтетически.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+# Добавляем корневую директорию в PYTHONPATH
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+from src.parsers import json_extract
+
+SITES = {
+    'casa': ('initial_state', json_extract.extract_initial_state),
+    'subito': ('next_data', json_extract.extract_next_data),
+    'immobiliare': ('next_data', json_extract.extract_next_data),
+}
+
+
+def soup_extract(kind: str) -> Callable[[str], object]:
+    """Старый способ: полное дерево BeautifulSoup"""
+    if kind == 'initial_state':
+        def extract(html: str):
+            raw = json_extract._initial_state_soup(html)
+            return json_extract.decode_json_parse_string(raw) if raw else None
+    else:
+        def extract(html: str):
+            raw = json_extract._next_data_soup(html)
+            return json.loads(raw) if raw else None
+    return extract
+
+
+def synthetic_page(kind: str, size_kb: int) -> str:
+    """Страница с большим количеством разметки и одним скриптом с данными"""
+    items = [{'id': i, 'title': f'Bilocale {i}', 'price': 1000 + i, 'features': ['a', 'b']} for i in range(30)]
+    filler = '<div class="card"><span class="x">lorem ipsum</span><a href="/a">link</a></div>\n'
+    body = filler * max(1, size_kb * 1024 // len(filler))
+    if kind == 'initial_state':
+        payload = json.dumps({'search': {'list': items}}).replace('"', '\\"').replace('/', '\\/')
+        script = f'<script>window.__INITIAL_STATE__ = JSON.parse("{payload}");</script>'
+    else:
+        payload = json.dumps({'props': {'pageProps': {'items': items}}})
+        script = f'<script id="__NEXT_DATA__" type="application/json">{payload}</script>'
+    return f'<html><head><script src="/app.js"></script></head><body>{body}{script}</body></html>'
+
+
+def load_pages(pages_dir: str, site: str) -> List[str]:
+    pages = []
+    for path in sorted(glob.glob(os.path.join(pages_dir, f'{site}*.html'))):
+        with open(path, encoding='utf-8') as f:
+            pages.append(f.read())
+    return pages
+
+
+def measure(extract: Callable[[str], object], pages: List[str], repeat: int) -> Dict[str, float]:
+    # Скорость меряем без tracemalloc (он сильно замедляет), память - отдельным проходом
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            extract(html)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    for html in pages:
+        extract(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = len(pages) * repeat
+    return {'pages_per_sec': total / elapsed if elapsed else 0.0, 'peak_mb': peak / 1024 / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк извлечения встроенного JSON')
+    parser.add_argument('--pages-dir', help='Каталог с сохраненными страницами')
+    parser.add_argument('--synthetic-kb', type=int, default=1500, help='Размер синтетической страницы, КБ')
+    parser.add_argument('--synthetic-count', type=int, default=5, help='Синтетических страниц на сайт')
+    parser.add_argument('--repeat', type=int, default=3, help='Повторов')
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("⏱️  БЕНЧМАРК ИЗВЛЕЧЕНИЯ JSON (срез по тексту vs BeautifulSoup)")
+    print("=" * 80)
+
+    for site, (kind, fast) in SITES.items():
+        if args.pages_dir:
+            pages = load_pages(args.pages_dir, site)
+            origin = args.pages_dir
+        else:
+            pages = [synthetic_page(kind, args.synthetic_kb) for _ in range(args.synthetic_count)]
+            origin = f"синтетика {args.synthetic_kb} КБ"
+
+        if not pages:
+            print(f"\n⚠️ {site}: нет страниц в {origin}")
+            continue
+
+        slow = soup_extract(kind)
+        mismatches = sum(1 for html in pages if fast(html) != slow(html))
+
+        fast_stats = measure(fast, pages, args.repeat)
+        slow_stats = measure(slow, pages, args.repeat)
+        speedup = fast_stats['pages_per_sec'] / slow_stats['pages_per_sec'] if slow_stats['pages_per_sec'] else 0
+
+        print(f"\n📄 {site}: {len(pages)} страниц ({origin})")
+        print(f"   ⚡ Быстрый путь:   {fast_stats['pages_per_sec']:8.1f} стр/сек, пик памяти {fast_stats['peak_mb']:6.2f} МБ")
+        print(f"   🐢 BeautifulSoup:  {slow_stats['pages_per_sec']:8.1f} стр/сек, пик памяти {slow_stats['peak_mb']:6.2f} МБ")
+        print(f"   🚀 Ускорение: x{speedup:.1f}")
+        print(f"   {'✅ Результаты совпадают' if mismatches == 0 else f'❌ Расхождений: {mismatches}'}")
+
+
+if __name__ == "__main__":
+    main()
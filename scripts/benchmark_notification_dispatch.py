@@ -0,0 +1,195 @@
+"""
+Симуляция рассылки уведомлений на заглушках каналов
+
+Пользователи обрабатываются так же, как в NotificationService:
+run_bounded с NOTIFICATION_DISPATCH_CONCURRENCY и лимиты каналов
+NotificationRateLimits. Отправка - заглушка с задержкой ответа, которая
+запоминает время каждого сообщения. Время симуляции ускорено в --time-scale
+раз (лимиты умножаются, задержки делятся), отчет - в реальных секундах:
+длительность цикла, пиковый темп каждого канала и минимальный интервал
+сообщений одному получателю в сравнении с лимитами провайдеров.
+Для сравнения - оценка прежней последовательной рассылки с паузами
+(0.5 с между пользователями, 1 с между фильтрами, 2 с между сообщениями).
+
+Запуск:
+    python scripts/benchmark_notification_dispatch.py --users 1000
+    python scripts/benchmark_notification_dispatch.py --users 200 --concurrency 5 --time-scale 20
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# Добавляем корневую директорию в PYTHONPATH
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+from src.core.config import settings
+from src.services.notification_limits import NotificationRateLimits, run_bounded
+
+# Сообщений на фильтр в каждом канале (как в send_notification_for_filter)
+TELEGRAM_MESSAGES = 5
+WHATSAPP_MESSAGES = 3
+
+# Лимиты провайдеров: сообщений в секунду на канал и минимальный интервал одному получателю
+PROVIDER_LIMITS = {
+    'telegram': {'rate': 30, 'recipient_interval': 1.0},
+    'whatsapp': {'rate': 80, 'recipient_interval': None},
+    'email': {'rate': 2, 'recipient_interval': None},
+}
+
+
+class StubChannel:
+    """Заглушка канала: отвечает через latency секунд и запоминает время отправки"""
+
+    def __init__(self, name: str, latency: float):
+        self.name = name
+        self.latency = latency
+        self.sent: List[Tuple[float, str]] = []
+
+    async def send(self, recipient: str) -> bool:
+        self.sent.append((time.monotonic(), recipient))
+        await asyncio.sleep(self.latency)
+        return True
+
+
+def peak_rate(times: List[float]) -> int:
+    """Максимум сообщений в любом окне длиной 1 с"""
+    window: deque = deque()
+    peak = 0
+    for moment in sorted(times):
+        window.append(moment)
+        while moment - window[0] >= 1.0:
+            window.popleft()
+        peak = max(peak, len(window))
+    return peak
+
+
+def min_recipient_interval(sent: List[Tuple[float, str]]) -> float:
+    by_recipient: Dict[str, List[float]] = defaultdict(list)
+    for moment, recipient in sent:
+        by_recipient[recipient].append(moment)
+    gaps = [
+        later - earlier
+        for moments in by_recipient.values()
+        for earlier, later in zip(sorted(moments), sorted(moments)[1:])
+    ]
+    return min(gaps) if gaps else float('inf')
+
+
+def make_users(count: int, whatsapp_share: float, email_share: float, seed: int = 1) -> List[Dict[str, bool]]:
+    rng = random.Random(seed)
+    return [
+        {
+            'id': str(user_id),
+            'telegram': True,
+            'whatsapp': rng.random() < whatsapp_share,
+            'email': rng.random() < email_share,
+        }
+        for user_id in range(count)
+    ]
+
+
+def legacy_estimate(users: List[Dict[str, bool]], filters: int, latency: float) -> float:
+    """Длительность прежней последовательной рассылки (секунд)"""
+    total = 0.0
+    for user in users:
+        per_filter = TELEGRAM_MESSAGES * (latency + 2)
+        if user['email']:
+            per_filter += latency
+        if user['whatsapp']:
+            per_filter += WHATSAPP_MESSAGES * latency + (WHATSAPP_MESSAGES - 1) * 2
+        total += filters * (per_filter + 1) + 0.5
+    return total
+
+
+async def simulate(users, filters: int, latency: float, concurrency: int, scale: float):
+    limits = NotificationRateLimits(
+        telegram_rate=settings.NOTIFICATION_TELEGRAM_RATE * scale,
+        telegram_chat_rate=settings.NOTIFICATION_TELEGRAM_CHAT_RATE * scale,
+        whatsapp_rate=settings.NOTIFICATION_WHATSAPP_RATE * scale,
+        whatsapp_recipient_rate=settings.NOTIFICATION_WHATSAPP_RECIPIENT_RATE * scale,
+        whatsapp_recipient_burst=settings.NOTIFICATION_WHATSAPP_RECIPIENT_BURST,
+        email_rate=settings.NOTIFICATION_EMAIL_RATE * scale,
+    )
+    channels = {name: StubChannel(name, latency / scale) for name in PROVIDER_LIMITS}
+
+    async def process_user(user) -> None:
+        for _ in range(filters):
+            for _ in range(TELEGRAM_MESSAGES):
+                await limits.acquire('telegram', user['id'])
+                await channels['telegram'].send(user['id'])
+            if user['email']:
+                await limits.acquire('email')
+                await channels['email'].send(user['id'])
+            if user['whatsapp']:
+                for _ in range(WHATSAPP_MESSAGES):
+                    await limits.acquire('whatsapp', user['id'])
+                    await channels['whatsapp'].send(user['id'])
+
+    started = time.monotonic()
+    await run_bounded(users, process_user, concurrency)
+    elapsed = (time.monotonic() - started) * scale
+
+    report = {}
+    for name, channel in channels.items():
+        real_times = [(moment - started) * scale for moment, _ in channel.sent]
+        report[name] = {
+            'messages': len(channel.sent),
+            'peak_rate': peak_rate(real_times),
+            'min_interval': min_recipient_interval(
+                [((moment - started) * scale, recipient) for moment, recipient in channel.sent]
+            ),
+        }
+    return elapsed, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Симуляция рассылки уведомлений на заглушках каналов')
+    parser.add_argument('--users', type=int, default=1000, help='Пользователей')
+    parser.add_argument('--filters', type=int, default=1, help='Фильтров с новыми объявлениями на пользователя')
+    parser.add_argument('--latency-ms', type=float, default=150, help='Задержка ответа канала (мс)')
+    parser.add_argument('--concurrency', type=int, default=settings.NOTIFICATION_DISPATCH_CONCURRENCY,
+                        help='Пользователей одновременно')
+    parser.add_argument('--whatsapp-share', type=float, default=0.2, help='Доля пользователей с WhatsApp')
+    parser.add_argument('--email-share', type=float, default=0.3, help='Доля пользователей с email')
+    parser.add_argument('--time-scale', type=float, default=10, help='Ускорение времени симуляции')
+    args = parser.parse_args()
+
+    users = make_users(args.users, args.whatsapp_share, args.email_share)
+    latency = args.latency_ms / 1000
+
+    print("=" * 80)
+    print("📬 СИМУЛЯЦИЯ РАССЫЛКИ УВЕДОМЛЕНИЙ (заглушки каналов)")
+    print("=" * 80)
+    print(f"👥 Пользователей: {len(users)}, фильтров на пользователя: {args.filters}, "
+          f"параллельно: {args.concurrency}, ускорение x{args.time_scale:g}")
+
+    elapsed, report = asyncio.run(simulate(users, args.filters, latency, args.concurrency, args.time_scale))
+    legacy = legacy_estimate(users, args.filters, latency)
+
+    print(f"\n⏱️  Параллельная рассылка: {elapsed:8.0f} с")
+    print(f"🐢 Прежняя (оценка):       {legacy:8.0f} с  (x{legacy / elapsed:.1f})" if elapsed else "")
+
+    violations = 0
+    print(f"\n{'Канал':<10} {'Сообщений':>10} {'Пик/с':>7} {'Лимит/с':>8} {'Мин. интервал':>14}")
+    for name, channel_report in report.items():
+        limit = PROVIDER_LIMITS[name]
+        interval = channel_report['min_interval']
+        over_rate = channel_report['peak_rate'] > limit['rate']
+        # Допуск на неточность таймеров при ускорении
+        too_close = limit['recipient_interval'] is not None and interval < limit['recipient_interval'] * 0.9
+        violations += over_rate + too_close
+        interval_text = f"{interval:.2f} с" if interval != float('inf') else "-"
+        print(f"{name:<10} {channel_report['messages']:>10} {channel_report['peak_rate']:>7} "
+              f"{limit['rate']:>8} {interval_text:>14}{'  ❌' if over_rate or too_close else ''}")
+
+    print(f"\n{'✅ Лимиты провайдеров соблюдены' if not violations else f'❌ Нарушений лимитов: {violations}'}")
+
+
+if __name__ == "__main__":
+    main()
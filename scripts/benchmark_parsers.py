@@ -0,0 +1,176 @@
+"""
+Бенчмарк парсеров на записанных страницах (без сети)
+
+Меряет пропускную способность и выделение памяти для:
+- CasaScraper.parse_listing            (объявление из __INITIAL_STATE__)
+- IdealistaScraper.parse_detail_page   (детальная страница HTML)
+- SubitoScraper.parse_listing_data     (объявление из __NEXT_DATA__)
+- ImmobiliareScraper.parse_list_page   (страница списка целиком)
+
+Входные данные берутся из хранилища фикстур (src/parsers/replay.py),
+JSON извлекается заранее - меряется только сам парсер. Результаты можно
+сохранить (--save) и сравнить со следующим запуском (--baseline).
+
+Запуск:
+    python scripts/benchmark_parsers.py
+    python scripts/benchmark_parsers.py --fixtures-dir /path/to/recorded --repeat 20
+    python scripts/benchmark_parsers.py --save before.json
+    python scripts/benchmark_parsers.py --baseline before.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+# Добавляем корневую директорию в PYTHONPATH
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+from src.parsers import json_extract
+from src.parsers.replay import FixtureStore
+from src.parsers.casa_scraper import CasaScraper
+from src.parsers.idealista_scraper import IdealistaScraper
+from src.parsers.subito_scraper import SubitoScraper
+from src.parsers.immobiliare_scraper import ImmobiliareScraper
+
+DEFAULT_FIXTURES_DIR = root_dir / 'tests' / 'fixtures'
+
+# Имя бенчмарка -> (функция разбора одного входа, входы)
+Case = Tuple[Callable[[Any], Any], List[Any]]
+
+
+def build_cases(store: FixtureStore) -> Dict[str, Case]:
+    cases: Dict[str, Case] = {}
+
+    casa = CasaScraper()
+    casa_items = []
+    for page in store.pages('casa_it', 'list'):
+        state = json_extract.extract_initial_state(page['html']) or {}
+        casa_items.extend(state.get('search', {}).get('list', []))
+    cases['casa_it.parse_listing'] = (casa.parse_listing, casa_items)
+
+    idealista = IdealistaScraper()
+    idealista_pages = [(page['html'], page['url']) for page in store.pages('idealista', 'detail')]
+    cases['idealista.parse_detail_page'] = (lambda args: idealista.parse_detail_page(*args), idealista_pages)
+
+    subito = SubitoScraper()
+    subito_items = []
+    for page in store.pages('subito', 'list'):
+        data = json_extract.extract_next_data(page['html']) or {}
+        subito_items.extend(
+            data.get('props', {}).get('pageProps', {}).get('initialState', {}).get('items', {}).get('list', [])
+        )
+    cases['subito.parse_listing_data'] = (subito.parse_listing_data, subito_items)
+
+    immobiliare = ImmobiliareScraper()
+    immobiliare_pages = [page['html'] for page in store.pages('immobiliare', 'list')]
+    cases['immobiliare.parse_list_page'] = (immobiliare.parse_list_page, immobiliare_pages)
+
+    return cases
+
+
+def measure(parse: Callable[[Any], Any], inputs: List[Any], repeat: int) -> Dict[str, float]:
+    # Прогрев (ленивые импорты, кеши регулярок)
+    for item in inputs:
+        parse(item)
+
+    # Скорость меряем без tracemalloc (он сильно замедляет), память - отдельным проходом
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for item in inputs:
+            parse(item)
+    elapsed = time.perf_counter() - started
+
+    # Память: пик временных выделений на каждый вызов и то, что осталось после прохода
+    tracemalloc.start()
+    start_current, _ = tracemalloc.get_traced_memory()
+    peaks = []
+    for item in inputs:
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        parse(item)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - current)
+    end_current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    calls = len(inputs) * repeat
+    return {
+        'inputs': len(inputs),
+        'calls_per_sec': calls / elapsed if elapsed else 0.0,
+        'us_per_call': elapsed / calls * 1e6 if calls else 0.0,
+        'peak_kb_per_call': sum(peaks) / len(peaks) / 1024 if peaks else 0.0,
+        'max_peak_kb': max(peaks) / 1024 if peaks else 0.0,
+        'retained_kb_per_pass': max(0, end_current - start_current) / 1024,
+    }
+
+
+def delta(current: float, baseline: float) -> str:
+    if not baseline:
+        return ''
+    change = (current - baseline) / baseline * 100
+    return f" ({change:+.1f}%)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк парсеров на записанных страницах')
+    parser.add_argument('--fixtures-dir', default=str(DEFAULT_FIXTURES_DIR), help='Хранилище фикстур (index.json)')
+    parser.add_argument('--repeat', type=int, default=10, help='Повторов прохода по всем входам')
+    parser.add_argument('--only', help='Только бенчмарки, содержащие эту строку')
+    parser.add_argument('--save', help='Сохранить результаты в JSON')
+    parser.add_argument('--baseline', help='Сравнить с сохраненными результатами')
+    args = parser.parse_args()
+
+    store = FixtureStore(args.fixtures_dir)
+    if not store.index:
+        print(f"❌ Нет фикстур в {args.fixtures_dir}")
+        sys.exit(1)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f).get('results', {})
+
+    print("=" * 80)
+    print("⏱️  БЕНЧМАРК ПАРСЕРОВ (записанные страницы, без сети)")
+    print("=" * 80)
+    print(f"📼 Фикстуры: {args.fixtures_dir} ({len(store.index)} страниц)")
+
+    results = {}
+    for name, (parse, inputs) in build_cases(store).items():
+        if args.only and args.only not in name:
+            continue
+        if not inputs:
+            print(f"\n⚠️ {name}: нет входных данных")
+            continue
+
+        # Парсеры печатают ошибки - в замерах вывод не нужен
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = measure(parse, inputs, args.repeat)
+        results[name] = stats
+
+        base = baseline.get(name, {})
+        print(f"\n📄 {name}: {stats['inputs']} входов x {args.repeat}")
+        print(f"   ⚡ {stats['calls_per_sec']:10.1f} вызовов/сек  ({stats['us_per_call']:.1f} мкс/вызов)"
+              f"{delta(stats['calls_per_sec'], base.get('calls_per_sec'))}")
+        print(f"   🧠 {stats['peak_kb_per_call']:10.1f} КБ пик выделений на вызов (макс. {stats['max_peak_kb']:.1f})"
+              f"{delta(stats['peak_kb_per_call'], base.get('peak_kb_per_call'))}")
+        print(f"   📦 {stats['retained_kb_per_pass']:10.1f} КБ остается после прохода"
+              f"{delta(stats['retained_kb_per_pass'], base.get('retained_kb_per_pass'))}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(
+                {'fixtures_dir': args.fixtures_dir, 'repeat': args.repeat, 'python': sys.version.split()[0], 'results': results},
+                f, ensure_ascii=False, indent=2
+            )
+        print(f"\n💾 Результаты сохранены: {args.save}")
+
+
+if __name__ == "__main__":
+    main()
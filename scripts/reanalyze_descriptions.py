@@ -0,0 +1,55 @@
+"""
+Переанализ сохраненных описаний после изменения правил DescriptionAnalyzer
+
+По умолчанию обрабатываются только объявления, посчитанные старой версией
+правил (analyzer_version < DescriptionAnalyzer.RULES_VERSION или пусто).
+Прогресс сохраняется после каждой пачки: повторный запуск продолжает работу.
+
+Запуск:
+    python scripts/reanalyze_descriptions.py --dry-run --limit 2000
+    python scripts/reanalyze_descriptions.py --workers 4
+    python scripts/reanalyze_descriptions.py --force --restart
+"""
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию в PYTHONPATH
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+from src.core.config import settings
+from src.services.analysis_backfill import AnalysisBackfill
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Переанализ сохраненных описаний объявлений')
+    parser.add_argument('--chunk-size', type=int, default=settings.ANALYSIS_BACKFILL_CHUNK_SIZE, help='Объявлений в пачке')
+    parser.add_argument('--workers', type=int, default=None, help='Процессов для анализа')
+    parser.add_argument('--limit', type=int, default=None, help='Максимум объявлений за запуск')
+    parser.add_argument('--force', action='store_true', help='Проверить все объявления, а не только старой версии')
+    parser.add_argument('--restart', action='store_true', help='Начать с начала, игнорируя сохраненный прогресс')
+    parser.add_argument('--dry-run', action='store_true', help='Только посчитать изменения')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    backfill = AnalysisBackfill.from_settings(chunk_size=args.chunk_size, workers=args.workers)
+
+    print("=" * 80)
+    print(f"🔁 ПЕРЕАНАЛИЗ ОПИСАНИЙ (правила v{backfill.version}){' - DRY RUN' if args.dry_run else ''}")
+    print("=" * 80)
+
+    result = backfill.run(limit=args.limit, force=args.force, dry_run=args.dry_run, restart=args.restart)
+
+    print(f"\n📊 Обработано: {result['processed']} объявлений за {result['elapsed_seconds']}с "
+          f"({result['chunks']} пачек, последний id {result['last_id']})")
+    print(f"✏️  Изменилось: {result['changed']}")
+    for field, count in sorted(result['fields'].items(), key=lambda item: -item[1]):
+        print(f"   {field:<20} {count:>7}")
+    print(f"\n{'✅ Все объявления обработаны' if result['completed'] else '⏸️  Остановлено по лимиту - запустите снова для продолжения'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Запись страниц сайтов в хранилище фикстур
+
+Запускает скраперы через настоящий ScraperAPI, но с RecordingSession:
+каждый успешный ответ сохраняется в <fixtures-dir>/<source>/ и индекс.
+Записанные страницы потом используются в тестах (ReplaySession) и в
+scripts/benchmark_parsers.py без сети.
+
+Запуск:
+    python scripts/record_fixtures.py --sources casa_it subito --pages 1
+    python scripts/record_fixtures.py --fixtures-dir /tmp/recorded --pages 2
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию в PYTHONPATH
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+from src.core.config import settings
+from src.parsers.http_client import get_http_session, close_http_session, set_http_session_override
+from src.parsers.detail_cache import detail_cache
+from src.parsers.replay import FixtureStore, RecordingSession
+from src.parsers.casa_scraper import CasaScraper
+from src.parsers.idealista_scraper import IdealistaScraper
+from src.parsers.subito_scraper import SubitoScraper
+from src.parsers.immobiliare_scraper import ImmobiliareScraper
+
+SOURCES = ['casa_it', 'idealista', 'subito', 'immobiliare']
+
+
+async def record(sources, pages: int, details: int, fixtures_dir: str):
+    store = FixtureStore(fixtures_dir)
+    recording = RecordingSession(await get_http_session(), store)
+    set_http_session_override(recording)
+    # Детальные страницы из кеша не попадут в запись
+    detail_cache.enabled = False
+
+    try:
+        for source in sources:
+            print(f"\n📼 Запись {source}...")
+            if source == 'casa_it':
+                await CasaScraper(max_concurrent=2).scrape_parallel(num_pages=pages)
+            elif source == 'idealista':
+                await IdealistaScraper(max_concurrent=2).scrape_parallel(num_pages=pages)
+            elif source == 'subito':
+                await SubitoScraper().scrape_pages(num_pages=pages)
+            elif source == 'immobiliare':
+                await ImmobiliareScraper(max_concurrent=2).scrape_listings(num_pages=pages, max_details=details)
+    finally:
+        set_http_session_override(None)
+        await recording.close()
+        await close_http_session()
+
+    print(f"\n✅ Записано страниц: {recording.recorded}, всего в хранилище: {len(store.index)} ({fixtures_dir})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Запись страниц в хранилище фикстур')
+    parser.add_argument('--fixtures-dir', default=str(root_dir / 'tests' / 'fixtures'), help='Хранилище фикстур')
+    parser.add_argument('--sources', nargs='+', choices=SOURCES, default=SOURCES, help='Источники')
+    parser.add_argument('--pages', type=int, default=1, help='Страниц списков на источник')
+    parser.add_argument('--details', type=int, default=5, help='Детальных страниц Immobiliare')
+    args = parser.parse_args()
+
+    if not settings.SCRAPERAPI_KEY:
+        print("❌ SCRAPERAPI_KEY не задан")
+        sys.exit(1)
+
+    asyncio.run(record(args.sources, args.pages, args.details, args.fixtures_dir))
+
+
+if __name__ == "__main__":
+    main()
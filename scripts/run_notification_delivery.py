@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Runner for the notification outbox delivery worker."""
+
+import argparse
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+load_dotenv(ROOT_DIR / ".env")
+
+from src.core.config import settings  # noqa: E402
+from src.workers.notification_delivery_worker import NotificationDeliveryWorker  # noqa: E402
+
+
+def configure_logging(debug: bool) -> None:
+    level = logging.DEBUG if debug else logging.INFO
+    logging.basicConfig(
+        level=level,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        handlers=[logging.StreamHandler(sys.stdout)],
+    )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Launch delivery worker for the notification outbox"
+    )
+    parser.add_argument(
+        "--poll",
+        type=int,
+        help="Override pause between outbox polls in seconds",
+    )
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="Drain the outbox once and exit",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    configure_logging(settings.DEBUG_NOTIFICATIONS)
+
+    if not settings.DATABASE_URL:
+        logging.getLogger(__name__).error("❌ Отсутствуют обязательные переменные окружения: DATABASE_URL")
+        sys.exit(1)
+    if not settings.NOTIFICATION_OUTBOX_ENABLED:
+        logging.getLogger(__name__).warning(
+            "⚠️ NOTIFICATION_OUTBOX_ENABLED выключен: подбор отправляет уведомления сам, очередь будет пустой."
+        )
+
+    worker = NotificationDeliveryWorker(poll_seconds=args.poll, run_once=args.once)
+    try:
+        asyncio.run(worker.run())
+    except KeyboardInterrupt:
+        logging.getLogger(__name__).info("🛑 Delivery worker остановлен пользователем")
+    except Exception:  # noqa: BLE001
+        logging.getLogger(__name__).exception("❌ Критическая ошибка delivery worker")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,10 @@ from sqlalchemy import text
 from src.api.deps import get_current_user, get_db
 from src.db.models import User
 from src.services.scraping_service import ScrapingService
+from src.services.crawl_planner import crawl_planner
+from src.services.recrawl_scheduler import recrawl_scheduler
+from src.services.crawl_queue import crawl_queue
+from src.services.notification_outbox import notification_outbox
 
 logger = logging.getLogger(__name__)
 
@@ -281,6 +285,62 @@ async def get_scraping_status():
         ) 
 
 
+@router.get("/rate-limiter", response_model=Dict[str, Any])
+async def get_rate_limiter_stats():
+    """
+    Метрики общего лимитера ScraperAPI (лимит параллельности, 429/5xx, ожидание по источникам)
+    """
+    return scraping_service.get_rate_limiter_stats()
+
+
+@router.get("/fetch-strategy", response_model=Dict[str, Any])
+async def get_fetch_strategy_report():
+    """
+    Статистика уровней ScraperAPI по источникам (стартовый уровень, доля успеха, кредиты на объявление)
+    """
+    return scraping_service.get_fetch_strategy_report()
+
+
+@router.get("/crawl-plan", response_model=Dict[str, Any])
+async def get_crawl_plan(db: Session = Depends(get_db)):
+    """
+    План обхода на следующий цикл: города по спросу из активных фильтров и глубина пагинации
+    """
+    demand = crawl_planner.get_demand(db)
+    tasks = crawl_planner.plan(demand)
+    return {
+        "demand": demand,
+        "cities": crawl_planner.summary(tasks),
+        "estimated_credits": sum(task["estimated_credits"] for task in tasks),
+        "tasks": tasks,
+    }
+
+
+@router.get("/recrawl-schedule", response_model=Dict[str, Any])
+async def get_recrawl_schedule(db: Session = Depends(get_db)):
+    """
+    Расписание обхода: темп новых объявлений по парам источник/город, интервалы и время следующего обхода
+    """
+    tasks = crawl_planner.plan(crawl_planner.get_demand(db))
+    return recrawl_scheduler.schedule(db, tasks)
+
+
+@router.get("/crawl-queue", response_model=Dict[str, Any])
+async def get_crawl_queue(db: Session = Depends(get_db)):
+    """
+    Очередь задач обхода: задачи по статусам, ожидающие и выполняющиеся (с арендой реплик)
+    """
+    return crawl_queue.snapshot(db)
+
+
+@router.get("/notification-outbox", response_model=Dict[str, Any])
+async def get_notification_outbox(db: Session = Depends(get_db)):
+    """
+    Outbox уведомлений: сообщения по статусам и каналам, статистика доставки этого процесса
+    """
+    return notification_outbox.snapshot(db)
+
+
 @router.post("/run-public", response_model=ScrapingResponse)
 async def run_scraping_public(
     city: str = "Roma",
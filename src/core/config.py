@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 import os
 
 
@@ -77,10 +77,92 @@ class Settings(BaseSettings):
     SCRAPING_MAX_PAGES: int = 10
     SCRAPING_DELAY_SECONDS: int = 1
     SCRAPING_TIMEOUT_SECONDS: int = 30
-    
+
+    # HTTP клиент парсеров (один пул соединений на воркер)
+    SCRAPER_HTTP_POOL_LIMIT: int = 100  # Всего соединений в пуле
+    SCRAPER_HTTP_LIMIT_PER_HOST: int = 20  # Соединений на один хост (api.scraperapi.com)
+    SCRAPER_HTTP_DNS_TTL_SECONDS: int = 300
+    SCRAPER_HTTP_KEEPALIVE_SECONDS: int = 30
+    SCRAPER_HTTP_TIMEOUT_SECONDS: int = 90
+    SCRAPER_HTTP_CONNECT_TIMEOUT_SECONDS: int = 15
+    SCRAPER_REQUEST_RETRIES: int = 2  # Повторов запроса при 429/5xx/таймауте
+    SCRAPER_REQUEST_RETRY_BACKOFF_SECONDS: float = 2.0  # Пауза перед первым повтором, дальше удваивается (со случайным разбросом)
+    SCRAPER_REQUEST_RETRY_MAX_BACKOFF_SECONDS: float = 30.0
+    SCRAPER_CIRCUIT_FAILURE_THRESHOLD: int = 5  # Ошибок подряд до приостановки запросов к источнику
+    SCRAPER_CIRCUIT_RECOVERY_SECONDS: int = 120  # Через сколько пробовать источник снова
+
+    # Общий лимитер ScraperAPI (на весь процесс, для всех источников)
+    SCRAPERAPI_MAX_CONCURRENT: int = 10  # Потолок параллельности тарифа ScraperAPI
+    SCRAPERAPI_MIN_CONCURRENT: int = 1
+    SCRAPERAPI_INITIAL_CONCURRENT: int = 5
+    SCRAPERAPI_REQUESTS_PER_SECOND: float = 5.0
+    SCRAPERAPI_BURST: int = 10
+    SCRAPERAPI_BACKOFF_FACTOR: float = 0.5  # Множитель лимита при 429/5xx/таймаутах
+    SCRAPERAPI_SOURCE_WEIGHTS: Dict[str, float] = {
+        "subito": 2.0,  # Subito обновляется быстрее остальных
+        "casa_it": 1.0,
+        "idealista": 1.0,
+        "immobiliare": 1.0,
+    }
+
     # Воркер настройки
     SCRAPER_WORKER_INTERVAL_HOURS: int = 6
     SCRAPER_WORKER_MAX_PAGES: int = 10
+    SCRAPER_INCREMENTAL_ENABLED: bool = True  # Стоп пагинации, когда страницы не дают новых объявлений
+    SCRAPER_INCREMENTAL_STOP_AFTER_PAGES: int = 1  # Сколько страниц подряд без новых до остановки
+    SCRAPER_FULL_CRAWL_EVERY_CYCLES: int = 4  # Каждый N-й цикл - полный обход всех страниц (сверка)
+
+    # Детальные страницы: кеш на диске и пропуск неизменившихся объявлений
+    SCRAPER_DETAIL_CACHE_ENABLED: bool = True
+    SCRAPER_DETAIL_CACHE_DIR: str = ".cache/detail_pages"
+    SCRAPER_DETAIL_CACHE_TTL_HOURS: int = 24
+    SCRAPER_DETAIL_CACHE_MAX_MB: int = 500
+    SCRAPER_DETAIL_SKIP_UNCHANGED: bool = True  # Не грузить детали, если цена/заголовок в списке не изменились
+    SCRAPER_DETAIL_REFRESH_DAYS: int = 7  # Но обновлять детали не реже раза в N дней
+
+    # Координаты Subito с детальных страниц: кеш (источник, external_id) -> (lat, lon) и база
+    SCRAPER_SUBITO_FETCH_COORDS: bool = False  # Догружать координаты новых объявлений Subito
+    SCRAPER_SUBITO_MAX_COORDS_FETCH: int = 20  # Детальных страниц за обход (известные координаты не считаются)
+    SCRAPER_COORDS_CACHE_ENABLED: bool = True
+    SCRAPER_COORDS_CACHE_PATH: str = ".cache/coords.json"
+    SCRAPER_COORDS_CACHE_MAX_ENTRIES: int = 200000  # На источник
+
+    # Анализ описаний: кеш результатов и пул процессов для больших пачек
+    DESCRIPTION_ANALYSIS_CACHE_SIZE: int = 50000  # Записей LRU (0 - без кеша)
+    DESCRIPTION_ANALYSIS_WORKERS: int = 0  # Процессов для промахов кеша (0 - в текущем процессе)
+    DESCRIPTION_ANALYSIS_POOL_MIN_BATCH: int = 500  # Меньшие пачки пулу не отдаются
+    ANALYSIS_BACKFILL_CHUNK_SIZE: int = 500  # Объявлений за шаг переанализа сохраненных описаний
+    ANALYSIS_BACKFILL_CHECKPOINT_PATH: str = ".cache/analysis_backfill.json"
+
+    # Уровни запросов ScraperAPI (plain -> render -> premium -> ultra_premium)
+    SCRAPER_FETCH_STATS_PATH: str = ".cache/fetch_strategy.json"  # Статистика уровней между запусками
+    SCRAPER_FETCH_MIN_SUCCESS_RATE: float = 0.6  # Уровень с меньшей долей успеха пропускается
+    SCRAPER_FETCH_MIN_SAMPLES: int = 5
+    SCRAPER_FETCH_EXPLORE_EVERY: int = 50  # Каждый N-й запрос снова пробует самый дешевый уровень
+
+    # Планировщик обхода по спросу (города из активных фильтров)
+    SCRAPER_CRAWL_PLANNER_ENABLED: bool = False  # Включается явно: без него обход как раньше (SCRAPER_WORKER_MAX_PAGES)
+    SCRAPER_CRAWL_BUDGET_CREDITS: int = 0  # Кредитов ScraperAPI на цикл (0 - как у обхода одного города на SCRAPER_WORKER_MAX_PAGES)
+    SCRAPER_CRAWL_MIN_PAGES: int = 1  # Минимальная глубина для города в плане
+    SCRAPER_CRAWL_MAX_CITIES: int = 10
+
+    # Адаптивные интервалы обхода по темпу новых объявлений (источник × город)
+    SCRAPER_RECRAWL_ADAPTIVE: bool = False  # Включается явно: по умолчанию фиксированный SCRAPER_WORKER_INTERVAL_HOURS
+    SCRAPER_RECRAWL_TICK_MINUTES: int = 15  # Как часто воркер проверяет, каким парам пора обходиться
+    SCRAPER_FRESHNESS_TARGET: float = 0.9  # Доля новых объявлений, увиденных за окно свежести
+    SCRAPER_FRESHNESS_WINDOW_MINUTES: int = 60
+    SCRAPER_RECRAWL_MAX_INTERVAL_HOURS: int = 24  # Каждая пара обходится не реже
+    SCRAPER_RECRAWL_BUDGET_CREDITS_PER_HOUR: int = 0  # 0 - как при обходе плана раз в SCRAPER_WORKER_INTERVAL_HOURS
+    SCRAPER_RECRAWL_HISTORY_SESSIONS: int = 10  # Сколько последних обходов пары учитывать в оценке темпа
+
+    # Очередь задач обхода в БД (несколько реплик воркера парсинга)
+    SCRAPER_QUEUE_ENABLED: bool = False
+    SCRAPER_QUEUE_WORKER_ID: str = ""  # Имя реплики (по умолчанию хост и PID)
+    SCRAPER_QUEUE_LEASE_SECONDS: int = 600  # Задача упавшей реплики возвращается в очередь через это время
+    SCRAPER_QUEUE_HEARTBEAT_SECONDS: int = 60
+    SCRAPER_QUEUE_BATCH_SIZE: int = 8  # Задач за раз на реплику
+    SCRAPER_QUEUE_MAX_ATTEMPTS: int = 3
+    SCRAPER_QUEUE_RETRY_DELAY_SECONDS: int = 300  # Задержка первого повтора, дальше удваивается
     NOTIFICATION_WORKER_INTERVAL_SECONDS: int = 43200  # 12 часов по умолчанию
     NOTIFICATION_WORKER_DEBUG_INTERVAL_SECONDS: int = 15  # 15 секунд в отладке
     
@@ -90,6 +172,26 @@ class Settings(BaseSettings):
     # Email (Resend API)
     RESEND_API_TOKEN: str = ""
     
+    # Рассылка уведомлений: пользователи параллельно, темп - лимиты каналов
+    NOTIFICATION_DISPATCH_CONCURRENCY: int = 20  # Пользователей одновременно (у каждого своя сессия БД - не больше пула соединений)
+    NOTIFICATION_TELEGRAM_RATE: float = 25.0  # Сообщений/с на бота (лимит Telegram ~30/с)
+    NOTIFICATION_TELEGRAM_CHAT_RATE: float = 1.0  # Сообщений/с в один чат (лимит Telegram ~1/с)
+    NOTIFICATION_WHATSAPP_RATE: float = 20.0  # Сообщений/с с номера (лимит Cloud API 80/с)
+    NOTIFICATION_WHATSAPP_RECIPIENT_RATE: float = 0.17  # Одному получателю ~1 в 6 с (pair rate limit)
+    NOTIFICATION_WHATSAPP_RECIPIENT_BURST: int = 5  # Всплеск одному получателю (одна пачка объявлений)
+    NOTIFICATION_EMAIL_RATE: float = 2.0  # Запросов/с к Resend (лимит по умолчанию 2/с)
+    NOTIFICATION_SHARED_POOL_FACTOR: int = 4  # Запас общего поиска одинаковых фильтров (× лимит фильтра)
+    NOTIFICATION_WATERMARK_PAGE_SIZE: int = 500  # Страница выборки новых объявлений выше водяного знака фильтра
+    NOTIFICATION_MESSAGE_CACHE_SIZE: int = 20000  # Отрисованных тел сообщений на проход рассылки (0 - без кеша)
+    
+    # Outbox уведомлений: подбор ставит сообщения в очередь, доставляет отдельный воркер
+    NOTIFICATION_OUTBOX_ENABLED: bool = False
+    NOTIFICATION_OUTBOX_BATCH_SIZE: int = 50  # Сообщений за один захват
+    NOTIFICATION_OUTBOX_LEASE_SECONDS: int = 300  # Сообщение упавшего воркера возвращается в очередь
+    NOTIFICATION_OUTBOX_MAX_ATTEMPTS: int = 5
+    NOTIFICATION_OUTBOX_RETRY_DELAY_SECONDS: int = 60  # Задержка первого повтора, дальше удваивается
+    NOTIFICATION_OUTBOX_POLL_SECONDS: int = 5  # Пауза воркера доставки при пустой очереди
+    
     # CORS - обновленные домены Railway + Vercel
     BACKEND_CORS_ORIGINS: List[str] = [
         "http://localhost:3000",
@@ -0,0 +1,110 @@
+"""
+Примитивы ограничения частоты запросов
+"""
+import asyncio
+import time
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """
+    Token bucket: пополняется со скоростью rate токенов в секунду,
+    накапливает не больше capacity токенов (допустимый всплеск)
+
+    rate <= 0 означает отсутствие ограничения.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Забрать токены без ожидания. Возвращает False если их не хватает"""
+        if self.unlimited:
+            return True
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def time_until_available(self, tokens: float = 1.0) -> float:
+        """Сколько секунд ждать, пока накопится нужное количество токенов"""
+        if self.unlimited:
+            return 0.0
+        self._refill()
+        if self._tokens >= tokens:
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    async def wait(self, tokens: float = 1.0) -> float:
+        """Дождаться, пока накопятся токены, не забирая их"""
+        waited = 0.0
+        delay = self.time_until_available(tokens)
+        while delay > 0:
+            await asyncio.sleep(delay)
+            waited += delay
+            delay = self.time_until_available(tokens)
+        return waited
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Дождаться и забрать токены
+
+        Returns:
+            Сколько секунд пришлось ждать
+        """
+        waited = 0.0
+        while not self.try_acquire(tokens):
+            delay = self.time_until_available(tokens)
+            await asyncio.sleep(delay)
+            waited += delay
+        return waited
+
+
+class KeyedTokenBuckets:
+    """
+    Отдельный token bucket на каждый ключ (чат, получатель)
+
+    Полные (простаивающие) корзины вытесняются, когда ключей больше max_keys:
+    их состояние совпадает с новой корзиной.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, max_keys: int = 10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def get(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._evict_idle()
+            bucket = TokenBucket(self.rate, self.capacity)
+            self._buckets[key] = bucket
+        return bucket
+
+    def _evict_idle(self) -> None:
+        for key in list(self._buckets):
+            bucket = self._buckets[key]
+            bucket._refill()
+            if bucket._tokens >= bucket.capacity:
+                del self._buckets[key]
+
+    async def acquire(self, key: str, tokens: float = 1.0) -> float:
+        return await self.get(key).acquire(tokens)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
@@ -3,5 +3,9 @@
 from .crud_user import user
 from .crud_listing import listing
 from .crud_filter import filter
+from .crud_scraping_session import scraping_session
+from .crud_crawl_task import crawl_task
+from .crud_sent_notification import sent_notification
+from .crud_notification import notification
 
-__all__ = ["user", "listing", "filter"] 
\ No newline at end of file
+__all__ = ["user", "listing", "filter", "scraping_session", "crawl_task", "sent_notification", "notification"] 
\ No newline at end of file
@@ -0,0 +1,263 @@
+"""
+CRUD операции для очереди задач обхода
+
+Захват задачи: на PostgreSQL - SELECT ... FOR UPDATE SKIP LOCKED (реплики
+не ждут друг друга и не берут одну строку), на SQLite - UPDATE с проверкой
+прежнего состояния (compare-and-set по attempts, который растет при каждом
+захвате): строку получает только та реплика, чей UPDATE ее изменил.
+
+Постановка: частичный уникальный индекс (source, city) по задачам в очереди
+и в работе и INSERT ... ON CONFLICT DO NOTHING - реплики, ставящие план
+одновременно, не создают вторую задачу для пары.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from pydantic import BaseModel
+from sqlalchemy import and_, func, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from src.crud.base import CRUDBase
+from src.db.models import CrawlTask
+
+ACTIVE_STATUSES = ("pending", "running")
+
+# Диалекты с INSERT ... ON CONFLICT DO NOTHING
+UPSERT_DIALECTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class CRUDCrawlTask(CRUDBase[CrawlTask, BaseModel, BaseModel]):
+    """CRUD операции для задач обхода"""
+
+    def get_active_pairs(self, db: Session) -> Set[Tuple[str, str]]:
+        """Пары (источник, город), у которых уже есть задача в очереди или в работе"""
+        rows = db.query(CrawlTask.source, CrawlTask.city).filter(
+            CrawlTask.status.in_(ACTIVE_STATUSES)
+        ).distinct().all()
+        return {(source, city) for source, city in rows}
+
+    def get_recently_done_pairs(self, db: Session, *, since: datetime) -> Set[Tuple[str, str]]:
+        """Пары, обход которых завершился успешно не раньше since (любой репликой)"""
+        rows = db.query(CrawlTask.source, CrawlTask.city).filter(
+            CrawlTask.status == "done",
+            CrawlTask.completed_at >= since,
+        ).distinct().all()
+        return {(source, city) for source, city in rows}
+
+    def enqueue(
+        self,
+        db: Session,
+        *,
+        tasks: Iterable[Dict[str, Any]],
+        incremental: bool = False,
+        max_attempts: int = 3,
+        min_interval_seconds: Optional[int] = None,
+    ) -> List[CrawlTask]:
+        """
+        Поставить задачи плана в очередь
+
+        Пропускаются пары, которые уже ждут или выполняются (уникальный индекс),
+        и - если задан min_interval_seconds - пары, успешно обойденные за этот
+        интервал: реплики с разными таймерами не обходят пару повторно.
+        """
+        now = _utcnow()
+        skip = set()
+        if min_interval_seconds:
+            skip = self.get_recently_done_pairs(db, since=now - timedelta(seconds=min_interval_seconds))
+
+        rows = {}
+        for task in tasks:
+            pair = (task['source'], task['city'])
+            if pair in skip or pair in rows:
+                continue
+            rows[pair] = {
+                'source': task['source'],
+                'city': task['city'],
+                'max_pages': task['max_pages'],
+                'incremental': incremental,
+                'status': "pending",
+                'attempts': 0,
+                'max_attempts': max_attempts,
+                'available_at': now,
+                'created_at': now,
+            }
+        if not rows:
+            return []
+
+        insert = UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+        if insert is not None:
+            created_ids = db.execute(
+                insert(CrawlTask)
+                .values(list(rows.values()))
+                .on_conflict_do_nothing(
+                    index_elements=['source', 'city'],
+                    index_where=CrawlTask.status.in_(ACTIVE_STATUSES),
+                )
+                .returning(CrawlTask.id)
+            ).scalars().all()
+            db.commit()
+            if not created_ids:
+                return []
+            return db.query(CrawlTask).filter(CrawlTask.id.in_(created_ids)).order_by(CrawlTask.id).all()
+
+        # Прочие БД: проверка активных пар перед вставкой (уникальный индекс остается страховкой)
+        active = self.get_active_pairs(db)
+        created = [CrawlTask(**row) for pair, row in rows.items() if pair not in active]
+        db.add_all(created)
+        db.commit()
+        return created
+
+    def _claimable(self, now: datetime):
+        """Ожидающие задачи и задачи с истекшей арендой (реплика упала)"""
+        return and_(
+            CrawlTask.attempts < CrawlTask.max_attempts,
+            or_(
+                and_(CrawlTask.status == "pending", CrawlTask.available_at <= now),
+                and_(CrawlTask.status == "running", CrawlTask.lease_expires_at < now),
+            ),
+        )
+
+    def claim(
+        self,
+        db: Session,
+        *,
+        worker_id: str,
+        lease_seconds: int,
+        limit: int = 1,
+    ) -> List[CrawlTask]:
+        """Захватить до limit задач в аренду на lease_seconds"""
+        now = _utcnow()
+        lease = {
+            'status': "running",
+            'lease_owner': worker_id,
+            'lease_expires_at': now + timedelta(seconds=lease_seconds),
+            'heartbeat_at': now,
+        }
+        query = db.query(CrawlTask).filter(self._claimable(now)).order_by(CrawlTask.available_at, CrawlTask.id)
+
+        if db.get_bind().dialect.name == "postgresql":
+            tasks = query.limit(limit).with_for_update(skip_locked=True).all()
+            for task in tasks:
+                for key, value in lease.items():
+                    setattr(task, key, value)
+                task.attempts += 1
+            db.commit()
+            return tasks
+
+        # Без SKIP LOCKED: кандидатов с запасом, строку забирает тот, чей UPDATE сработал
+        claimed_ids = []
+        for candidate in query.limit(limit * 3).all():
+            updated = db.query(CrawlTask).filter(
+                CrawlTask.id == candidate.id,
+                CrawlTask.attempts == candidate.attempts,
+                self._claimable(now),
+            ).update({**lease, 'attempts': candidate.attempts + 1}, synchronize_session=False)
+            db.commit()
+            if updated:
+                claimed_ids.append(candidate.id)
+                if len(claimed_ids) >= limit:
+                    break
+        db.expire_all()
+        if not claimed_ids:
+            return []
+        return db.query(CrawlTask).filter(CrawlTask.id.in_(claimed_ids)).order_by(CrawlTask.id).all()
+
+    def _owned(self, db: Session, task_id: int, worker_id: str):
+        return db.query(CrawlTask).filter(
+            CrawlTask.id == task_id,
+            CrawlTask.lease_owner == worker_id,
+            CrawlTask.status == "running",
+        )
+
+    def heartbeat(self, db: Session, *, task_id: int, worker_id: str, lease_seconds: int) -> bool:
+        """Продлить аренду. False - аренда потеряна (задачу забрала другая реплика)"""
+        now = _utcnow()
+        updated = self._owned(db, task_id, worker_id).update(
+            {'heartbeat_at': now, 'lease_expires_at': now + timedelta(seconds=lease_seconds)},
+            synchronize_session=False,
+        )
+        db.commit()
+        return bool(updated)
+
+    def complete(self, db: Session, *, task_id: int, worker_id: str, result_count: int) -> bool:
+        """Отметить задачу выполненной"""
+        updated = self._owned(db, task_id, worker_id).update(
+            {
+                'status': "done",
+                'result_count': result_count,
+                'completed_at': _utcnow(),
+                'lease_expires_at': None,
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+        return bool(updated)
+
+    def fail(
+        self,
+        db: Session,
+        *,
+        task: CrawlTask,
+        worker_id: str,
+        error: str,
+        retry_delay_seconds: int,
+    ) -> bool:
+        """
+        Ошибка задачи: вернуть в очередь с экспоненциальной задержкой
+        или отметить failed, если попытки исчерпаны
+        """
+        exhausted = task.attempts >= task.max_attempts
+        values = {'last_error': error[:2000], 'lease_owner': None, 'lease_expires_at': None}
+        if exhausted:
+            values.update(status="failed", completed_at=_utcnow())
+        else:
+            delay = retry_delay_seconds * 2 ** max(task.attempts - 1, 0)
+            values.update(status="pending", available_at=_utcnow() + timedelta(seconds=delay))
+        updated = self._owned(db, task.id, worker_id).update(values, synchronize_session=False)
+        db.commit()
+        return bool(updated)
+
+    def fail_expired(self, db: Session) -> int:
+        """Задачи с истекшей арендой и исчерпанными попытками - в failed"""
+        now = _utcnow()
+        updated = db.query(CrawlTask).filter(
+            CrawlTask.status == "running",
+            CrawlTask.lease_expires_at < now,
+            CrawlTask.attempts >= CrawlTask.max_attempts,
+        ).update(
+            {'status': "failed", 'last_error': "lease expired", 'completed_at': now},
+            synchronize_session=False,
+        )
+        db.commit()
+        return updated
+
+    def purge_finished(self, db: Session, *, older_than: datetime) -> int:
+        """Удалить завершенные задачи старше указанного времени"""
+        deleted = db.query(CrawlTask).filter(
+            CrawlTask.status.in_(("done", "failed")),
+            CrawlTask.completed_at < older_than,
+        ).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+
+    def get_status_counts(self, db: Session) -> Dict[str, int]:
+        """Число задач по статусам"""
+        rows = db.query(CrawlTask.status, func.count(CrawlTask.id)).group_by(CrawlTask.status).all()
+        return {status: count for status, count in rows}
+
+    def get_active(self, db: Session, *, limit: int = 100) -> List[CrawlTask]:
+        """Задачи в очереди и в работе"""
+        return db.query(CrawlTask).filter(
+            CrawlTask.status.in_(ACTIVE_STATUSES)
+        ).order_by(CrawlTask.available_at, CrawlTask.id).limit(limit).all()
+
+
+crawl_task = CRUDCrawlTask(CrawlTask)
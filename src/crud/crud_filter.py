@@ -50,6 +50,10 @@ class CRUDFilter(CRUDBase[Filter, FilterCreate, FilterUpdate]):
         """Создать фильтр для пользователя (алиас для create_with_user)"""
         return self.create_with_user(db=db, obj_in=obj_in, user_id=user_id)
     
+    def get_all_active(self, db: Session) -> List[Filter]:
+        """Все активные фильтры (для индекса подбора новых объявлений)"""
+        return db.query(Filter).filter(Filter.is_active == True).all()
+    
     def get_filters_for_notification(self, db: Session) -> List[Filter]:
         """Получить фильтры, готовые для отправки уведомлений"""
         # Получаем фильтры, которые:
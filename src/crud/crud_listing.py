@@ -1,13 +1,13 @@
 """
 CRUD операции для объявлений
 """
-from typing import Optional, List, Dict, Any, Union
+from typing import Optional, List, Dict, Any, Set, Tuple, Union
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc, func, Index
+from sqlalchemy import and_, or_, desc, exists, func, Index
 from datetime import datetime, timedelta
 
 from src.crud.base import CRUDBase
-from src.db.models import Listing
+from src.db.models import Listing, SentNotification
 from src.schemas.listing import ListingCreate, ListingUpdate, ListingResponse
 
 
@@ -20,6 +20,12 @@ PROPERTY_TYPE_MAPPING = {
     "penthouse": ["penthouse", "attico-mansarda", "attico"],
 }
 
+# Поля объявления, которые заполняет DescriptionAnalyzer
+ANALYZED_FIELDS = [
+    "agency_commission", "pets_allowed", "children_friendly", "renovation_type", "building_type",
+    "year_built", "total_floors", "floor_number", "is_first_floor", "is_top_floor", "park_nearby",
+]
+
 
 def normalize_property_type(property_types: Union[str, List[str]]) -> List[str]:
     """
@@ -69,11 +75,112 @@ class CRUDListing(CRUDBase[Listing, ListingCreate, ListingUpdate]):
             )
         ).first()
     
+    def get_existing_external_ids(self, db: Session, *, source: str, external_ids: List[str]) -> Set[str]:
+        """Какие из внешних ID источника уже есть в базе (одним запросом)"""
+        if not external_ids:
+            return set()
+        rows = db.query(Listing.external_id).filter(
+            and_(
+                Listing.source == source,
+                Listing.external_id.in_(set(external_ids))
+            )
+        ).all()
+        return {row[0] for row in rows}
+    
+    def get_card_snapshots(self, db: Session, *, source: str, external_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Поля карточки (цена, заголовок, наличие описания) для уже сохраненных объявлений"""
+        if not external_ids:
+            return {}
+        rows = db.query(
+            Listing.external_id,
+            Listing.price,
+            Listing.title,
+            Listing.description,
+            Listing.updated_at,
+            Listing.scraped_at
+        ).filter(
+            and_(
+                Listing.source == source,
+                Listing.external_id.in_(set(external_ids))
+            )
+        ).all()
+        return {
+            row.external_id: {
+                'price': row.price,
+                'title': row.title,
+                'description': bool(row.description),
+                'updated_at': row.updated_at or row.scraped_at,
+            }
+            for row in rows
+        }
+    
+    def get_coordinates(self, db: Session, *, source: str, external_ids: List[str]) -> Dict[str, Tuple[float, float]]:
+        """Сохраненные координаты объявлений: external_id -> (lat, lon)"""
+        if not external_ids:
+            return {}
+        rows = db.query(Listing.external_id, Listing.latitude, Listing.longitude).filter(
+            and_(
+                Listing.source == source,
+                Listing.external_id.in_(set(external_ids)),
+                Listing.latitude.isnot(None),
+                Listing.longitude.isnot(None)
+            )
+        ).all()
+        return {row.external_id: (row.latitude, row.longitude) for row in rows}
+    
+    def get_analysis_chunk(
+        self,
+        db: Session,
+        *,
+        after_id: int,
+        limit: int,
+        below_version: Optional[int] = None
+    ) -> List[Any]:
+        """
+        Следующие по id объявления с описанием для переанализа
+        
+        below_version: только посчитанные более старой версией правил (или без версии)
+        """
+        query = db.query(
+            Listing.id,
+            Listing.source,
+            Listing.description,
+            Listing.floor,
+            *[getattr(Listing, field) for field in ANALYZED_FIELDS]
+        ).filter(
+            Listing.id > after_id,
+            Listing.description.isnot(None),
+            Listing.description != ''
+        )
+        if below_version is not None:
+            query = query.filter(or_(
+                Listing.analyzer_version.is_(None),
+                Listing.analyzer_version < below_version
+            ))
+        return query.order_by(Listing.id).limit(limit).all()
+    
+    def bulk_update_analysis(
+        self,
+        db: Session,
+        *,
+        changes: List[Dict[str, Any]],
+        ids: List[int],
+        version: int
+    ) -> None:
+        """Записывает изменившиеся поля анализа и версию правил для всей пачки"""
+        if changes:
+            db.bulk_update_mappings(Listing, changes)
+        if ids:
+            db.query(Listing).filter(Listing.id.in_(ids)).update(
+                {Listing.analyzer_version: version}, synchronize_session=False
+            )
+        db.commit()
+    
     def get_by_url(self, db: Session, *, url: str) -> Optional[Listing]:
         """Получить объявление по URL"""
         return db.query(Listing).filter(Listing.url == url).first()
     
-    def search(
+    def _filtered_query(
         self,
         db: Session,
         *,
@@ -87,12 +194,20 @@ class CRUDListing(CRUDBase[Listing, ListingCreate, ListingUpdate]):
         max_area: Optional[float] = None,
         furnished: Optional[bool] = None,
         pets_allowed: Optional[bool] = None,
-        skip: int = 0,
-        limit: int = 50
-    ) -> List[Listing]:
-        """Поиск объявлений с фильтрами"""
+        exclude_sent_to_user: Optional[int] = None
+    ):
+        """Активные объявления, подходящие под параметры фильтра (без сортировки)"""
         query = db.query(Listing).filter(Listing.is_active == True)
         
+        if exclude_sent_to_user is not None:
+            already_sent = exists().where(
+                and_(
+                    SentNotification.user_id == exclude_sent_to_user,
+                    SentNotification.listing_id == Listing.id
+                )
+            )
+            query = query.filter(~already_sent)
+        
         # Применяем фильтры
         if city:
             query = query.filter(func.lower(Listing.city).ilike(f"%{city.lower()}%"))
@@ -124,11 +239,92 @@ class CRUDListing(CRUDBase[Listing, ListingCreate, ListingUpdate]):
         if pets_allowed is not None:
             query = query.filter(Listing.pets_allowed == pets_allowed)
         
+        return query
+    
+    def search(
+        self,
+        db: Session,
+        *,
+        city: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        property_type: Optional[str] = None,
+        min_rooms: Optional[int] = None,
+        max_rooms: Optional[int] = None,
+        min_area: Optional[float] = None,
+        max_area: Optional[float] = None,
+        furnished: Optional[bool] = None,
+        pets_allowed: Optional[bool] = None,
+        exclude_sent_to_user: Optional[int] = None,
+        skip: int = 0,
+        limit: int = 50
+    ) -> List[Listing]:
+        """
+        Поиск объявлений с фильтрами
+        
+        exclude_sent_to_user: без объявлений, уже отправленных пользователю
+        (NOT EXISTS по уникальному индексу sent_notifications (user_id, listing_id))
+        """
+        query = self._filtered_query(
+            db,
+            city=city,
+            min_price=min_price,
+            max_price=max_price,
+            property_type=property_type,
+            min_rooms=min_rooms,
+            max_rooms=max_rooms,
+            min_area=min_area,
+            max_area=max_area,
+            furnished=furnished,
+            pets_allowed=pets_allowed,
+            exclude_sent_to_user=exclude_sent_to_user
+        )
+        
         # Сортировка по дате добавления (новые первыми)
         query = query.order_by(desc(Listing.scraped_at))
         
         return query.offset(skip).limit(limit).all()
     
+    def get_new_for_filter(
+        self,
+        db: Session,
+        *,
+        after_id: int,
+        up_to_id: int,
+        exclude_sent_to_user: Optional[int] = None,
+        page_size: int = 500,
+        **filters: Any
+    ) -> List[Listing]:
+        """
+        Все подходящие объявления с id в (after_id, up_to_id] - новые с прошлого прохода
+        
+        Страницы по первичному ключу до конца диапазона, без OFFSET и без
+        обрезки по лимиту. Результат - новые первыми.
+        """
+        query = self._filtered_query(db, exclude_sent_to_user=exclude_sent_to_user, **filters).filter(
+            Listing.id <= up_to_id
+        )
+        found: List[Listing] = []
+        last_id = after_id
+        while True:
+            page = query.filter(Listing.id > last_id).order_by(Listing.id).limit(page_size).all()
+            found.extend(page)
+            if len(page) < page_size:
+                break
+            last_id = page[-1].id
+        found.reverse()
+        return found
+    
+    def get_max_id(self, db: Session) -> int:
+        """Последний id объявления (верхняя граница прохода уведомлений)"""
+        return db.query(func.max(Listing.id)).scalar() or 0
+    
+    def get_id_floor_since(self, db: Session, *, hours: int = 24) -> int:
+        """id, после которого идут объявления, добавленные за последние N часов"""
+        cutoff_time = datetime.utcnow() - timedelta(hours=hours)
+        first_id = db.query(func.min(Listing.id)).filter(Listing.created_at >= cutoff_time).scalar()
+        return first_id - 1 if first_id is not None else self.get_max_id(db)
+    
     def get_recent(self, db: Session, *, hours: int = 24, limit: int = 100) -> List[Listing]:
         """Получить недавние объявления"""
         cutoff_time = datetime.utcnow() - timedelta(hours=hours)
@@ -139,6 +335,16 @@ class CRUDListing(CRUDBase[Listing, ListingCreate, ListingUpdate]):
             )
         ).order_by(desc(Listing.scraped_at)).limit(limit).all()
     
+    def get_id_range(self, db: Session, *, after_id: int, up_to_id: int) -> List[Listing]:
+        """Активные объявления с id в (after_id, up_to_id] (новые первыми)"""
+        return db.query(Listing).filter(
+            and_(
+                Listing.is_active == True,
+                Listing.id > after_id,
+                Listing.id <= up_to_id
+            )
+        ).order_by(desc(Listing.id)).all()
+    
     def get_by_source(self, db: Session, *, source: str, skip: int = 0, limit: int = 100) -> List[Listing]:
         """Получить объявления по источнику"""
         return db.query(Listing).filter(
@@ -0,0 +1,183 @@
+"""
+CRUD операции для outbox уведомлений
+
+Сообщение канала ставится в очередь (status=pending) в транзакции подбора,
+без коммита. Воркер доставки захватывает строки пачками: на PostgreSQL -
+SELECT ... FOR UPDATE SKIP LOCKED, на SQLite - UPDATE с проверкой прежнего
+числа попыток (как в crud_crawl_task). Захваченная строка (sending) с
+истекшей арендой - упавший воркер - возвращается в очередь.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List
+
+from pydantic import BaseModel
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from src.crud.base import CRUDBase
+from src.db.models import Notification
+
+OUTBOX_STATUSES = ("pending", "sending", "sent", "failed")
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class CRUDNotification(CRUDBase[Notification, BaseModel, BaseModel]):
+    """CRUD операции для уведомлений и их outbox"""
+
+    def enqueue(
+        self,
+        db: Session,
+        *,
+        user_id: int,
+        filter_id: int,
+        listing_ids: List[int],
+        channels: Iterable[str],
+        max_attempts: int = 5,
+        notification_type: str = "new_listing",
+    ) -> List[Notification]:
+        """
+        Поставить сообщение в очередь каждого канала
+
+        Не коммитит: строки outbox фиксируются вместе с подбором.
+        """
+        now = _utcnow()
+        created = []
+        for channel in channels:
+            db_obj = Notification(
+                user_id=user_id,
+                filter_id=filter_id,
+                listing_id=listing_ids[0],
+                listing_ids=list(listing_ids),
+                channel=channel,
+                notification_type=notification_type,
+                status="pending",
+                attempts=0,
+                max_attempts=max_attempts,
+                available_at=now,
+                created_at=now,
+                message=f"{len(listing_ids)} объявлений",
+            )
+            db.add(db_obj)
+            created.append(db_obj)
+        return created
+
+    def _claimable(self, now: datetime):
+        """Ожидающие сообщения и сообщения с истекшей арендой (воркер упал)"""
+        return and_(
+            Notification.channel.isnot(None),
+            Notification.attempts < Notification.max_attempts,
+            or_(
+                and_(Notification.status == "pending", Notification.available_at <= now),
+                and_(Notification.status == "sending", Notification.lease_expires_at < now),
+            ),
+        )
+
+    def claim(self, db: Session, *, lease_seconds: int, limit: int = 50) -> List[Notification]:
+        """Захватить до limit сообщений для доставки в аренду на lease_seconds"""
+        now = _utcnow()
+        lease = {'status': "sending", 'lease_expires_at': now + timedelta(seconds=lease_seconds)}
+        query = db.query(Notification).filter(self._claimable(now)).order_by(
+            Notification.available_at, Notification.id
+        )
+
+        if db.get_bind().dialect.name == "postgresql":
+            notifications = query.limit(limit).with_for_update(skip_locked=True).all()
+            for notification in notifications:
+                for key, value in lease.items():
+                    setattr(notification, key, value)
+                notification.attempts += 1
+            db.commit()
+            return notifications
+
+        # Без SKIP LOCKED: кандидатов с запасом, строку забирает тот, чей UPDATE сработал
+        claimed_ids = []
+        for candidate in query.limit(limit * 3).all():
+            updated = db.query(Notification).filter(
+                Notification.id == candidate.id,
+                Notification.attempts == candidate.attempts,
+                self._claimable(now),
+            ).update({**lease, 'attempts': candidate.attempts + 1}, synchronize_session=False)
+            db.commit()
+            if updated:
+                claimed_ids.append(candidate.id)
+                if len(claimed_ids) >= limit:
+                    break
+        db.expire_all()
+        if not claimed_ids:
+            return []
+        return db.query(Notification).filter(Notification.id.in_(claimed_ids)).order_by(Notification.id).all()
+
+    def _claimed(self, db: Session, notification_id: int, attempts: int):
+        """Строка все еще захвачена этой попыткой (аренду не забрал другой воркер)"""
+        return db.query(Notification).filter(
+            Notification.id == notification_id,
+            Notification.status == "sending",
+            Notification.attempts == attempts,
+        )
+
+    def mark_sent(self, db: Session, *, notification_id: int, attempts: int) -> bool:
+        """Отметить сообщение доставленным"""
+        updated = self._claimed(db, notification_id, attempts).update(
+            {'status': "sent", 'sent_at': _utcnow(), 'lease_expires_at': None, 'error_message': None},
+            synchronize_session=False,
+        )
+        db.commit()
+        return bool(updated)
+
+    def mark_failed(
+        self,
+        db: Session,
+        *,
+        notification_id: int,
+        attempts: int,
+        max_attempts: int,
+        error: str,
+        retry_delay_seconds: int,
+        permanent: bool = False,
+    ) -> bool:
+        """
+        Ошибка доставки: вернуть в очередь с экспоненциальной задержкой
+        или отметить failed, если попытки исчерпаны (или повтор бессмыслен)
+        """
+        values = {'error_message': error[:2000], 'lease_expires_at': None}
+        if permanent or attempts >= max_attempts:
+            values['status'] = "failed"
+        else:
+            delay = retry_delay_seconds * 2 ** max(attempts - 1, 0)
+            values.update(status="pending", available_at=_utcnow() + timedelta(seconds=delay))
+        updated = self._claimed(db, notification_id, attempts).update(values, synchronize_session=False)
+        db.commit()
+        return bool(updated)
+
+    def fail_expired(self, db: Session) -> int:
+        """Сообщения с истекшей арендой и исчерпанными попытками - в failed"""
+        now = _utcnow()
+        updated = db.query(Notification).filter(
+            Notification.channel.isnot(None),
+            Notification.status == "sending",
+            Notification.lease_expires_at < now,
+            Notification.attempts >= Notification.max_attempts,
+        ).update(
+            {'status': "failed", 'error_message': "lease expired", 'lease_expires_at': None},
+            synchronize_session=False,
+        )
+        db.commit()
+        return updated
+
+    def get_status_counts(self, db: Session) -> Dict[str, Dict[str, int]]:
+        """Число сообщений outbox по каналам и статусам"""
+        rows = db.query(
+            Notification.channel, Notification.status, func.count(Notification.id)
+        ).filter(
+            Notification.channel.isnot(None)
+        ).group_by(Notification.channel, Notification.status).all()
+        counts: Dict[str, Dict[str, int]] = {}
+        for channel, status, count in rows:
+            counts.setdefault(channel, dict.fromkeys(OUTBOX_STATUSES, 0))[status] = count
+        return counts
+
+
+notification = CRUDNotification(Notification)
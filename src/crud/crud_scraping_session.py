@@ -0,0 +1,65 @@
+"""
+CRUD операции для сессий парсинга (статистика обходов по источнику и городу)
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from src.crud.base import CRUDBase
+from src.db.models import ScrapingSession
+
+
+class CRUDScrapingSession(CRUDBase[ScrapingSession, BaseModel, BaseModel]):
+    """CRUD операции для сессий парсинга"""
+
+    def record_crawl(
+        self,
+        db: Session,
+        *,
+        source: str,
+        city: str,
+        found: int,
+        new: int,
+        started_at: datetime,
+        completed_at: datetime,
+        filters_used: Optional[Dict[str, Any]] = None,
+        status: str = "completed",
+        errors: Optional[Dict[str, int]] = None,
+    ) -> ScrapingSession:
+        """
+        Сохранить итог обхода одной пары (источник, город)
+
+        errors - ошибки запросов и разбора по видам (timeout, server_error, ...)
+        """
+        errors = {kind: count for kind, count in (errors or {}).items() if count}
+        db_obj = ScrapingSession(
+            source=source,
+            status=status,
+            total_listings_found=found,
+            new_listings_added=new,
+            errors_count=sum(errors.values()),
+            error_details=[f"{kind}: {count}" for kind, count in errors.items()] or None,
+            filters_used={**(filters_used or {}), 'city': city},
+            started_at=started_at,
+            completed_at=completed_at,
+            duration_seconds=int((completed_at - started_at).total_seconds()),
+        )
+        db.add(db_obj)
+        db.commit()
+        db.refresh(db_obj)
+        return db_obj
+
+    def get_finished_since(self, db: Session, *, since: datetime) -> List[ScrapingSession]:
+        """Завершенные и неудачные обходы начиная с указанного времени (от старых к новым)"""
+        return db.query(ScrapingSession).filter(
+            and_(
+                ScrapingSession.status.in_(("completed", "failed")),
+                ScrapingSession.started_at >= since
+            )
+        ).order_by(ScrapingSession.started_at).all()
+
+
+scraping_session = CRUDScrapingSession(ScrapingSession)
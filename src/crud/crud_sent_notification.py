@@ -0,0 +1,92 @@
+"""
+CRUD операции для отправленных уведомлений
+
+Запись отправленных объявлений - один INSERT ... ON CONFLICT (user_id,
+listing_id) DO NOTHING на пачку (PostgreSQL и SQLite) без коммита: она
+входит в транзакцию, которая обновляет Filter.last_notification_sent.
+"""
+from datetime import datetime, timezone
+from typing import Iterable, List, Set
+
+from pydantic import BaseModel
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from src.crud.base import CRUDBase
+from src.db.models import SentNotification
+
+# Диалекты с INSERT ... ON CONFLICT DO NOTHING
+UPSERT_DIALECTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+class CRUDSentNotification(CRUDBase[SentNotification, BaseModel, BaseModel]):
+    """CRUD операции для отправленных уведомлений"""
+
+    def record_sent(
+        self,
+        db: Session,
+        *,
+        user_id: int,
+        filter_id: int,
+        listing_ids: Iterable[int],
+        notification_type: str = "new_listing"
+    ) -> None:
+        """
+        Отметить объявления отправленными пользователю (уже отмеченные пропускаются)
+
+        Не коммитит: вызывающий код фиксирует запись вместе с остальными изменениями.
+        """
+        listing_ids = list(dict.fromkeys(listing_ids))
+        if not listing_ids:
+            return
+        sent_at = datetime.now(timezone.utc)
+        rows = [
+            {
+                "user_id": user_id,
+                "filter_id": filter_id,
+                "listing_id": listing_id,
+                "sent_at": sent_at,
+                "notification_type": notification_type,
+            }
+            for listing_id in listing_ids
+        ]
+
+        insert = UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+        if insert is not None:
+            db.execute(
+                insert(SentNotification)
+                .values(rows)
+                .on_conflict_do_nothing(index_elements=["user_id", "listing_id"])
+            )
+            return
+
+        # Прочие БД: одна проверка на пачку и вставка недостающих
+        existing = self.get_sent_listing_ids(db, user_id=user_id, listing_ids=listing_ids)
+        db.add_all([SentNotification(**row) for row in rows if row["listing_id"] not in existing])
+        db.flush()
+
+    def get_sent_listing_ids(self, db: Session, *, user_id: int, listing_ids: List[int]) -> Set[int]:
+        """Какие из данных объявлений уже отправлены пользователю"""
+        if not listing_ids:
+            return set()
+        rows = db.query(SentNotification.listing_id).filter(
+            SentNotification.user_id == user_id,
+            SentNotification.listing_id.in_(set(listing_ids))
+        ).all()
+        return {row[0] for row in rows}
+
+    def forget(self, db: Session, *, user_id: int, listing_ids: Iterable[int]) -> int:
+        """Удалить отметки об отправке (режим отладки - повторная отправка). Без коммита"""
+        listing_ids = list(listing_ids)
+        if not listing_ids:
+            return 0
+        return db.query(SentNotification).filter(
+            SentNotification.user_id == user_id,
+            SentNotification.listing_id.in_(listing_ids)
+        ).delete(synchronize_session=False)
+
+
+sent_notification = CRUDSentNotification(SentNotification)
@@ -4,7 +4,7 @@
 """
 from sqlalchemy import (
     Column, Integer, String, Boolean, DateTime, Float, 
-    ForeignKey, JSON, Text, Index, UniqueConstraint
+    ForeignKey, JSON, Text, Index, UniqueConstraint, text
 )
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from sqlalchemy.sql import func
@@ -124,6 +124,8 @@ class Filter(Base):
     notification_enabled: Mapped[bool] = mapped_column(default=True)
     notification_frequency_hours: Mapped[int] = mapped_column(default=24)  # Частота в часах
     last_notification_sent: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    # Водяной знак: объявления с id до него включительно фильтр уже обработал
+    last_seen_listing_id: Mapped[Optional[int]] = mapped_column(Integer)
     
     # Каналы уведомлений
     notify_telegram: Mapped[bool] = mapped_column(default=True)
@@ -206,6 +208,7 @@ class Listing(Base):
     year_built: Mapped[Optional[int]] = mapped_column(Integer, index=True)  # год постройки
     park_nearby: Mapped[Optional[bool]] = mapped_column(Boolean, index=True)  # есть ли парк рядом
     noisy_roads_nearby: Mapped[Optional[bool]] = mapped_column(Boolean, index=True)  # есть ли шумные дороги
+    analyzer_version: Mapped[Optional[int]] = mapped_column(Integer, index=True)  # DescriptionAnalyzer.RULES_VERSION полей выше
     
     # Геолокация
     address: Mapped[Optional[str]] = mapped_column(Text)  # Убираем ограничение на адрес
@@ -287,6 +290,13 @@ class Notification(Base):
     attempts: Mapped[int] = mapped_column(Integer, default=0)
     max_attempts: Mapped[int] = mapped_column(Integer, default=3)
 
+    # Outbox: сообщение одного канала ставится в очередь вместе с подбором,
+    # доставляет его отдельный воркер (статусы pending, sending, sent, failed)
+    channel: Mapped[Optional[str]] = mapped_column(String(20), index=True)  # telegram, email, whatsapp
+    listing_ids: Mapped[Optional[List[int]]] = mapped_column(JSON)
+    available_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))  # Не раньше (повтор)
+    lease_expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+
     # Связи
     user: Mapped["User"] = relationship(back_populates="notifications")
     filter: Mapped["Filter"] = relationship(back_populates="notifications")
@@ -297,6 +307,7 @@ class Notification(Base):
         Index('idx_notification_status_created', 'status', 'created_at'),
         Index('idx_notification_user_filter', 'user_id', 'filter_id'),
         Index('idx_notification_pending', 'status', 'attempts', 'max_attempts'),
+        Index('idx_notification_outbox', 'status', 'available_at'),
     )
 
     def __repr__(self):
@@ -346,6 +357,63 @@ class ScrapingSession(Base):
         return f"<ScrapingSession(id={self.id}, source={self.source}, status={self.status})>"
 
 
+class CrawlTask(Base):
+    """
+    Задача обхода в очереди (источник × город × глубина)
+    Несколько реплик воркера парсинга делят задачи через аренду (lease):
+    задача упавшей реплики возвращается в очередь, когда аренда истекает
+    """
+    __tablename__ = "crawl_tasks"
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+
+    # Что обходить
+    source: Mapped[str] = mapped_column(String(50), index=True)
+    city: Mapped[str] = mapped_column(String(100))
+    max_pages: Mapped[int] = mapped_column(Integer, default=1)
+    incremental: Mapped[bool] = mapped_column(Boolean, default=False)
+
+    # Состояние
+    status: Mapped[str] = mapped_column(
+        String(20), default="pending", index=True
+    )  # pending, running, done, failed
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer, default=3)
+    available_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )  # Не раньше (отложенный повтор после ошибки)
+
+    # Аренда
+    lease_owner: Mapped[Optional[str]] = mapped_column(String(100))
+    lease_expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+
+    # Результат
+    result_count: Mapped[Optional[int]] = mapped_column(Integer)
+    last_error: Mapped[Optional[str]] = mapped_column(Text)
+
+    # Временные метки
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
+    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+
+    # Индексы
+    __table_args__ = (
+        Index('idx_crawl_task_claim', 'status', 'available_at'),
+        Index('idx_crawl_task_pair', 'source', 'city', 'status'),
+        # Пара в очереди или в работе - не больше одной задачи (реплики ставят план одновременно)
+        Index(
+            'uq_crawl_task_active_pair', 'source', 'city', unique=True,
+            postgresql_where=text("status IN ('pending', 'running')"),
+            sqlite_where=text("status IN ('pending', 'running')"),
+        ),
+    )
+
+    def __repr__(self):
+        return f"<CrawlTask(id={self.id}, source={self.source}, city={self.city}, status={self.status})>"
+
+
 class SentNotification(Base):
     """
     Модель для отслеживания отправленных уведомлений
@@ -2,6 +2,7 @@
 Парсеры для извлечения данных с сайтов недвижимости
 """
 from .base_parser import BaseParser
+from .async_scraper import AsyncScraper
 from .casa_scraper import CasaScraper
 from .subito_scraper import SubitoScraper
 from .idealista_scraper import IdealistaScraper
@@ -9,6 +10,7 @@ from .immobiliare_scraper import ImmobiliareScraper
 
 __all__ = [
     'BaseParser',
+    'AsyncScraper',
     'CasaScraper',
     'SubitoScraper',
     'IdealistaScraper',
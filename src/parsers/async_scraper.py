@@ -0,0 +1,482 @@
+"""
+Общая асинхронная основа скраперов
+
+Все скраперы ходят в ScraperAPI одинаково: общая HTTP сессия, общий
+лимитер, уровни запросов, повторы при 429/5xx/таймаутах, кеш детальных
+страниц. Здесь это сделано один раз, а скрапер источника описывает только
+URL страниц списка, разбор страницы и (если нужно) догрузку деталей.
+
+Контракт - iter_listings(): асинхронный поток объявлений. Страницы списка
+грузятся параллельно (в инкрементальном режиме - по одной), каждая
+загруженная страница сразу уходит на догрузку деталей и отдается
+потребителю, не дожидаясь остальных страниц.
+"""
+import asyncio
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+from src.core.config import settings
+from src.parsers.cities import DEFAULT_CITY, city_name, normalize_city
+from src.parsers.detail_cache import DetailFetchPolicy, detail_cache
+from src.parsers.fetch_strategy import CIRCUIT_OPEN, FetchOutcome, fetch_strategies
+from src.parsers.http_client import build_timeout, get_http_session
+from src.parsers.incremental import IncrementalCrawl
+from src.parsers.rate_limiter import scraperapi_limiter
+from src.parsers.resilience import (
+    ERROR_KINDS, backoff_delay, circuit_breakers, classify_error, counts_for_breaker
+)
+
+# Ответы ScraperAPI, после которых имеет смысл повторить запрос
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _new_error_counts() -> Dict[str, int]:
+    return {kind: 0 for kind in ERROR_KINDS}
+
+
+def _new_stats() -> Dict[str, Any]:
+    return {
+        'requests': 0,
+        'retries': 0,
+        'circuit_rejected': 0,
+        'errors': _new_error_counts(),
+        'pages_ok': 0,
+        'pages_failed': 0,
+        'listings': 0,
+        'duplicates': 0,
+        'detail_cache_hits': 0,
+        'details_skipped': 0,
+        'elapsed_seconds': 0.0,
+    }
+
+
+class AsyncScraper:
+    """
+    Основа скрапера источника
+
+    Подкласс задает source, base_url, page_url() и parse_page(),
+    при необходимости - enrich() (детальные страницы) и report_lines().
+    """
+
+    source: str = ''
+    title: str = ''
+    base_url: str = ''
+    api_url: str = "https://api.scraperapi.com/"
+    request_timeout: float = 90
+    # Параметры ScraperAPI для источников без подбора уровня
+    request_params: Dict[str, str] = {}
+    # Уровень запроса подбирается по статистике (src/parsers/fetch_strategy.py)
+    adaptive_tiers: bool = False
+    # Страница списка дает только карточки, объявления собираются с детальных страниц
+    cards_only: bool = False
+
+    def __init__(
+        self,
+        city: str = DEFAULT_CITY,
+        max_concurrent: Optional[int] = 10,
+        enable_geocoding: bool = False,
+        transport: Optional[Any] = None,
+        max_retries: Optional[int] = None,
+    ):
+        """
+        Args:
+            city: Город поиска (slug или написание из src.parsers.cities)
+            max_concurrent: Собственный потолок одновременных запросов источника (None - без потолка)
+            enable_geocoding: Для совместимости с интерфейсом
+            transport: Объект с интерфейсом aiohttp.ClientSession.get (по умолчанию - общая сессия)
+            max_retries: Повторов запроса при 429/5xx/таймауте (по умолчанию из настроек)
+        """
+        self.city = normalize_city(city)
+        if self.city is None:
+            raise ValueError(f"Город не поддерживается: {city}")
+        self.city_name = city_name(self.city)
+        self.api_key = settings.SCRAPERAPI_KEY
+        self.max_concurrent = max_concurrent
+        if max_concurrent is not None:
+            # Параллельность ограничивается общим лимитером ScraperAPI
+            scraperapi_limiter.configure_source(self.source, max_concurrent=max_concurrent)
+        self.fetch_strategy = fetch_strategies.get(self.source) if self.adaptive_tiers else None
+        self.enable_geocoding = enable_geocoding
+        self.transport = transport
+        self.max_retries = settings.SCRAPER_REQUEST_RETRIES if max_retries is None else max(0, max_retries)
+        self.retry_backoff = settings.SCRAPER_REQUEST_RETRY_BACKOFF_SECONDS
+        self.retry_backoff_max = settings.SCRAPER_REQUEST_RETRY_MAX_BACKOFF_SECONDS
+        self.circuit_breaker = circuit_breakers.get(self.source)
+        self.stats = _new_stats()
+        # Ошибки последнего обхода по видам (для статистики сессии парсинга)
+        self.crawl_errors = _new_error_counts()
+
+    # --- Запросы ---
+
+    async def get_session(self):
+        """Транспорт запросов: заданный в конструкторе или общая HTTP сессия"""
+        if self.transport is not None:
+            return self.transport
+        return await get_http_session()
+
+    def record_error(self, kind: str) -> None:
+        """Учесть ошибку (timeout, throttled, server_error, client_error, network, parse)"""
+        self.stats['errors'][kind] += 1
+        self.crawl_errors[kind] += 1
+
+    async def request_html(
+        self,
+        session,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+    ) -> Optional[str]:
+        """HTML страницы через ScraperAPI или None (подробности - request_page)"""
+        return (await self.request_page(session, url, params, timeout)).html
+
+    async def request_page(
+        self,
+        session,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+    ) -> FetchOutcome:
+        """
+        Запрос к ScraperAPI через общий лимитер
+
+        При 429/5xx/таймаутах - повторы с экспоненциальной паузой и случайным
+        разбросом. Если источник разомкнут выключателем - итог без запроса
+        (sent=False). Без HTML итог несет статус и вид последней ошибки, чтобы
+        подбор уровня отличал 404 от блокировки.
+
+        Args:
+            params: Параметры уровня (по умолчанию request_params источника)
+        """
+        request_params = {
+            'api_key': self.api_key,
+            'url': url,
+            **(self.request_params if params is None else params)
+        }
+        breaker = self.circuit_breaker
+        status = kind = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                # Слот лимитера не держим, пока ждем повтора
+                self.stats['retries'] += 1
+                await asyncio.sleep(backoff_delay(attempt, self.retry_backoff, self.retry_backoff_max))
+
+            if not breaker.allow():
+                self.stats['circuit_rejected'] += 1
+                return FetchOutcome(None, status=status, error=CIRCUIT_OPEN, sent=attempt > 0)
+
+            self.stats['requests'] += 1
+            status = None
+            async with scraperapi_limiter.slot(self.source) as slot:
+                try:
+                    request_timeout = build_timeout(timeout or self.request_timeout)
+                    async with session.get(self.api_url, params=request_params, timeout=request_timeout) as response:
+                        status = response.status
+                        slot.report(status=status)
+                        if status == 200:
+                            html = await response.text()
+                            breaker.record_success()
+                            return FetchOutcome(html, status=status)
+                        kind = classify_error(status=status)
+                        print(f"    ❌ HTTP {status}: {url}")
+                except asyncio.TimeoutError:
+                    slot.report(error='timeout')
+                    kind = classify_error(error='timeout')
+                    print(f"    ⏰ Таймаут: {url}")
+                except Exception as e:
+                    slot.report(error=str(e))
+                    kind = classify_error(error=str(e))
+                    print(f"    ❌ Ошибка: {e}")
+
+            self.record_error(kind)
+            if counts_for_breaker(kind, status):
+                breaker.record_failure()
+            else:
+                breaker.release()
+            if status is not None and status not in RETRY_STATUSES:
+                break
+        return FetchOutcome(None, status=status, error=kind)
+
+    def _counting_parse_failures(self, validate: Callable[[str], bool]) -> Callable[[str], bool]:
+        """Проверка ответа, которая учитывает ответы без данных как ошибки разбора"""
+        def check(html: str) -> bool:
+            if validate(html):
+                return True
+            self.record_error('parse')
+            return False
+        return check
+
+    def has_payload(self, html: str) -> bool:
+        """В ответе есть данные страницы списка (а не заглушка антибота)"""
+        return True
+
+    async def fetch_page(
+        self,
+        session,
+        url: str,
+        validate: Optional[Callable[[str], bool]] = None,
+        params: Optional[Dict[str, str]] = None,
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        HTML страницы. Возвращает (html, уровень)
+
+        Для источников с подбором уровня - самым дешевым рабочим уровнем,
+        с повышением, если в ответе нет данных. params - явные параметры
+        без подбора уровня.
+        """
+        validate = self._counting_parse_failures(validate or self.has_payload)
+        if self.fetch_strategy is not None and params is None:
+            return await self.fetch_strategy.fetch(
+                lambda tier_params: self.request_page(session, url, tier_params),
+                validate=validate
+            )
+
+        html = await self.request_html(session, url, params)
+        if html and not validate(html):
+            print(f"    ⚠️ Нет данных в ответе: {url}")
+            return None, None
+        return html, None
+
+    async def fetch_html(self, session, url: str) -> Optional[str]:
+        """HTML страницы через ScraperAPI"""
+        html, _ = await self.fetch_page(session, url)
+        return html
+
+    async def fetch_detail_html(
+        self,
+        session,
+        url: str,
+        use_cache: bool = True,
+        validate: Optional[Callable[[str], bool]] = None,
+        params: Optional[Dict[str, str]] = None,
+    ) -> Optional[str]:
+        """Детальная страница: сначала кеш на диске, потом ScraperAPI"""
+        if use_cache:
+            html = detail_cache.get(url)
+            if html:
+                self.stats['detail_cache_hits'] += 1
+                return html
+
+        html, tier = await self.fetch_page(session, url, validate=validate or (lambda _: True), params=params)
+        if html:
+            detail_cache.put(url, html)
+            if self.fetch_strategy is not None:
+                self.fetch_strategy.record_listings(tier, 1)
+        return html
+
+    # --- Описание источника ---
+
+    def page_url(self, page_num: int) -> str:
+        """URL страницы списка"""
+        raise NotImplementedError
+
+    def parse_page(self, html: str) -> List[Dict[str, Any]]:
+        """Объявления (или карточки) со страницы списка"""
+        raise NotImplementedError
+
+    async def enrich(
+        self,
+        session,
+        listings: List[Dict[str, Any]],
+        detail_policy: Optional[DetailFetchPolicy] = None,
+    ) -> List[Dict[str, Any]]:
+        """Догрузка деталей для объявлений одной страницы (по умолчанию не нужна)"""
+        return listings
+
+    def report_lines(self, listings: List[Dict[str, Any]]) -> List[str]:
+        """Строки итоговой статистики, специфичные для источника"""
+        return []
+
+    # --- Пагинация и поток объявлений ---
+
+    async def scrape_page(self, session, page_num: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Страница списка
+
+        Returns:
+            Объявления страницы или None, если страницу не удалось загрузить
+        """
+        url = self.page_url(page_num)
+        print(f"\n🔄 Страница {page_num}: {url}")
+
+        html, tier = await self.fetch_page(session, url)
+        if not html:
+            self.stats['pages_failed'] += 1
+            print(f"   ❌ Не удалось получить HTML")
+            return None
+
+        try:
+            listings = self.parse_page(html)
+        except Exception as e:
+            self.record_error('parse')
+            self.stats['pages_failed'] += 1
+            print(f"   ❌ Ошибка разбора страницы: {e}")
+            return None
+        self.stats['pages_ok'] += 1
+        print(f"   ✅ Найдено {len(listings)} объявлений")
+        if self.fetch_strategy is not None and not self.cards_only:
+            self.fetch_strategy.record_listings(tier, len(listings))
+        return listings
+
+    async def iter_pages(
+        self,
+        session,
+        num_pages: int,
+        incremental: Optional[IncrementalCrawl] = None,
+    ) -> AsyncIterator[Tuple[int, Optional[List[Dict[str, Any]]]]]:
+        """
+        Страницы списка (номер, объявления) по мере загрузки
+
+        Полный режим - все страницы параллельно, в порядке готовности.
+        Инкрементальный - по одной, пока загруженные страницы приносят новые объявления.
+        """
+        if incremental is None:
+            async def numbered(page_num: int):
+                return page_num, await self.scrape_page(session, page_num)
+
+            tasks = [asyncio.ensure_future(numbered(page_num)) for page_num in range(1, num_pages + 1)]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    yield await next_done
+            finally:
+                for task in tasks:
+                    task.cancel()
+            return
+
+        for page_num in range(1, num_pages + 1):
+            listings = await self.scrape_page(session, page_num)
+            if listings is None:
+                # Сбой загрузки - не страница без новых: пагинация продолжается
+                incremental.page_failed(page_num)
+            else:
+                incremental.check_page(page_num, [listing.get('external_id') for listing in listings])
+            yield page_num, listings
+            if incremental.should_stop:
+                print(f"   ⏹️ Новых объявлений нет {incremental.consecutive_stale_pages} стр. подряд - останавливаем пагинацию")
+                break
+
+    def _dedupe(self, listings: List[Dict[str, Any]], seen: Set[str]) -> List[Dict[str, Any]]:
+        """Объявления, еще не встречавшиеся на предыдущих страницах"""
+        unique = []
+        for listing in listings:
+            key = listing.get('external_id') or listing.get('url')
+            if key in seen:
+                self.stats['duplicates'] += 1
+                continue
+            seen.add(key)
+            unique.append(listing)
+        if len(unique) < len(listings):
+            print(f"    ⚠️  Пропущено {len(listings) - len(unique)} дубликатов")
+        return unique
+
+    async def iter_listings(
+        self,
+        num_pages: int,
+        incremental: Optional[IncrementalCrawl] = None,
+        detail_policy: Optional[DetailFetchPolicy] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Поток объявлений
+
+        Загрузка страниц списка и догрузка деталей идут одновременно:
+        пока грузятся следующие страницы, детали уже загруженных
+        обрабатываются, а готовые объявления отдаются сразу.
+        """
+        session = await self.get_session()
+        ready: asyncio.Queue = asyncio.Queue()
+        seen: Set[str] = set()
+
+        async def enrich_page(listings: List[Dict[str, Any]]) -> None:
+            try:
+                await ready.put(await self.enrich(session, listings, detail_policy))
+            except Exception as e:
+                print(f"   ❌ [{self.source}] Ошибка догрузки деталей: {e}")
+                await ready.put([])
+
+        async def produce() -> None:
+            enrich_tasks = []
+            try:
+                async for _, listings in self.iter_pages(session, num_pages, incremental):
+                    unique = self._dedupe(listings or [], seen)
+                    if unique:
+                        enrich_tasks.append(asyncio.ensure_future(enrich_page(unique)))
+                if enrich_tasks:
+                    await asyncio.gather(*enrich_tasks)
+            finally:
+                for task in enrich_tasks:
+                    task.cancel()
+                await ready.put(None)
+
+        producer = asyncio.ensure_future(produce())
+        try:
+            while True:
+                batch = await ready.get()
+                if batch is None:
+                    break
+                for listing in batch:
+                    self.stats['listings'] += 1
+                    yield listing
+            await producer
+        finally:
+            if not producer.done():
+                producer.cancel()
+
+    async def scrape(
+        self,
+        num_pages: int,
+        incremental: Optional[IncrementalCrawl] = None,
+        detail_policy: Optional[DetailFetchPolicy] = None,
+    ) -> List[Dict[str, Any]]:
+        """Собрать поток объявлений в список и вывести статистику"""
+        print("=" * 80)
+        concurrency = f" (до {self.max_concurrent} одновременно)" if self.max_concurrent else ""
+        print(f"🚀 ПАРАЛЛЕЛЬНЫЙ ПАРСИНГ {self.title}{concurrency}")
+        print("=" * 80)
+        print(f"📄 Страниц списка: {num_pages} ({self.city_name})")
+        print("=" * 80)
+
+        self.crawl_errors = _new_error_counts()
+        started = time.monotonic()
+        listings = [listing async for listing in self.iter_listings(num_pages, incremental, detail_policy)]
+        elapsed = time.monotonic() - started
+        self.stats['elapsed_seconds'] += elapsed
+
+        self.print_report(listings, elapsed)
+        return listings
+
+    async def scrape_multiple_pages(
+        self,
+        max_pages: int = 5,
+        incremental: Optional[IncrementalCrawl] = None,
+        detail_policy: Optional[DetailFetchPolicy] = None
+    ) -> List[Dict[str, Any]]:
+        """Основной метод (совместимый интерфейс ScrapingService)"""
+        return await self.scrape(max_pages, incremental=incremental, detail_policy=detail_policy)
+
+    def print_report(self, listings: List[Dict[str, Any]], elapsed: float) -> None:
+        stats = self.stats
+        print("\n" + "=" * 80)
+        print("📊 ИТОГОВАЯ СТАТИСТИКА")
+        print("=" * 80)
+        print(f"📄 Страниц: {stats['pages_ok']} загружено, {stats['pages_failed']} с ошибкой")
+        print(f"📦 Объявлений: {len(listings)} (дубликатов пропущено: {stats['duplicates']})")
+        print(f"🌐 Запросов: {stats['requests']}, повторов: {stats['retries']}")
+        errors = ", ".join(f"{kind}: {count}" for kind, count in stats['errors'].items() if count)
+        if errors:
+            print(f"⚠️ Ошибки: {errors}")
+        if stats['circuit_rejected'] or self.circuit_breaker.state != 'closed':
+            print(
+                f"⛔ Выключатель источника: {self.circuit_breaker.state}, "
+                f"отклонено запросов: {stats['circuit_rejected']}"
+            )
+        for line in self.report_lines(listings):
+            print(line)
+        if self.fetch_strategy is not None:
+            print()
+            self.fetch_strategy.print_report()
+            fetch_strategies.save()
+        print()
+        print(f"⏱️  Общее время: {elapsed:.1f} секунд")
+        if listings and elapsed > 0:
+            print(f"⚡ Среднее время на объявление: {elapsed / len(listings):.2f} сек")
+            print(f"🚀 Скорость: {len(listings) / elapsed * 60:.1f} объявлений/минуту")
@@ -6,11 +6,12 @@ import time
 import asyncio
 from abc import ABC, abstractmethod
 from typing import List, Dict, Any, Optional, Union
-import aiohttp
 import requests
 from bs4 import BeautifulSoup
 
 from src.core.config import settings
+from src.parsers.http_client import get_http_session, build_timeout
+from src.parsers.resilience import backoff_delay, circuit_breakers, classify_error, counts_for_breaker
 
 logger = logging.getLogger(__name__)
 
@@ -94,7 +95,17 @@ class BaseParser(ABC):
             'country_code': 'it'
         }
         
+        # Общий с асинхронными скраперами выключатель: при серии ошибок не тратим кредиты
+        breaker = circuit_breakers.get(self.name)
+        
         for attempt in range(retries):
+            if attempt:
+                time.sleep(backoff_delay(attempt, 5, 60))
+            if not breaker.allow():
+                logger.warning(f"⛔ [{self.name}] Запросы приостановлены после серии ошибок ScraperAPI")
+                return None
+            
+            status = None
             try:
                 logger.info(f"🌐 [{self.name}] Запрос через ScraperAPI: {url[:100]}...")
                 response = requests.get(
@@ -102,20 +113,29 @@ class BaseParser(ABC):
                     params=params, 
                     timeout=180
                 )
+                status = response.status_code
                 
-                if response.status_code >= 500:
-                    logger.warning(f"⚠️ [{self.name}] ScraperAPI вернул ошибку {response.status_code}. Попытка {attempt + 1}/{retries}")
-                    time.sleep(5 * (attempt + 1))
+                if status >= 500 or status == 429:
+                    logger.warning(f"⚠️ [{self.name}] ScraperAPI вернул ошибку {status}. Попытка {attempt + 1}/{retries}")
+                    breaker.record_failure()
                     continue
                     
                 response.raise_for_status()
+                breaker.record_success()
                 logger.info(f"✅ [{self.name}] Получен HTML контент ({len(response.text)} символов)")
                 return response.text
                 
             except requests.exceptions.RequestException as e:
                 logger.error(f"❌ [{self.name}] Ошибка при запросе через ScraperAPI: {e}")
-                if attempt < retries - 1:
-                    time.sleep(5 * (attempt + 1))
+                if status is None:
+                    kind = classify_error(error='timeout' if isinstance(e, requests.exceptions.Timeout) else str(e))
+                else:
+                    kind = classify_error(status=status)
+                if counts_for_breaker(kind, status):
+                    breaker.record_failure()
+                else:
+                    breaker.release()
+                    return None
                     
         return None
     
@@ -161,20 +181,22 @@ class BaseParser(ABC):
             'Accept-Language': 'it-IT,it;q=0.8,en-US;q=0.5,en;q=0.3',
         }
         
+        # Общая сессия: соединения переиспользуются между попытками и парсерами
+        session = await get_http_session()
+        
         for attempt in range(retries):
             try:
-                async with aiohttp.ClientSession() as session:
-                    logger.info(f"🌐 [{self.name}] Асинхронный запрос: {url[:100]}...")
-                    async with session.get(url, headers=headers, timeout=30) as response:
-                        response.raise_for_status()
-                        content = await response.text()
-                        logger.info(f"✅ [{self.name}] Получен HTML контент ({len(content)} символов)")
-                        return content
+                logger.info(f"🌐 [{self.name}] Асинхронный запрос: {url[:100]}...")
+                async with session.get(url, headers=headers, timeout=build_timeout(30)) as response:
+                    response.raise_for_status()
+                    content = await response.text()
+                    logger.info(f"✅ [{self.name}] Получен HTML контент ({len(content)} символов)")
+                    return content
                         
             except Exception as e:
                 logger.error(f"❌ [{self.name}] Ошибка при асинхронном запросе: {e}")
                 if attempt < retries - 1:
-                    await asyncio.sleep(2 * (attempt + 1))
+                    await asyncio.sleep(backoff_delay(attempt + 1, 2, 30))
                     
         return None
     
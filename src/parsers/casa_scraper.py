@@ -4,74 +4,38 @@
 Все данные в JSON - максимально быстро!
 """
 import asyncio
-import aiohttp
-from bs4 import BeautifulSoup
-from src.core.config import settings
 import json
-import re
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 from src.parsers.description_analyzer import DescriptionAnalyzer
+from src.parsers.async_scraper import AsyncScraper
+from src.parsers.http_client import close_http_session
+from src.parsers.incremental import IncrementalCrawl
+from src.parsers import json_extract
+from src.parsers.cities import DEFAULT_CITY, search_path
 
-class CasaScraper:
+class CasaScraper(AsyncScraper):
     """Параллельный парсер Casa.it"""
+
+    source = 'casa_it'
+    title = 'CASA.IT'
+    base_url = "https://www.casa.it"
+    # Уровень запроса (plain -> render -> premium -> ultra_premium) подбирается по статистике
+    adaptive_tiers = True
     
-    def __init__(self, max_concurrent: int = 10, enable_geocoding: bool = False):
-        self.base_url = "https://www.casa.it"
-        self.api_url = "https://api.scraperapi.com/"
-        self.api_key = settings.SCRAPERAPI_KEY
-        self.max_concurrent = max_concurrent
-        self.semaphore = asyncio.Semaphore(max_concurrent)
+    def __init__(self, max_concurrent: int = 10, enable_geocoding: bool = False, city: str = DEFAULT_CITY, **kwargs):
+        super().__init__(city=city, max_concurrent=max_concurrent, enable_geocoding=enable_geocoding, **kwargs)
         self.image_base_url = "https://images-1.casa.it/"
-        self.enable_geocoding = enable_geocoding  # Для совместимости с интерфейсом
-        
-        # Статистика
-        self.stats = {
-            'success': 0,
-            'failed': 0,
-            'pages_scraped': 0
-        }
+        self.stats.update({'success': 0, 'failed': 0})
     
-    async def fetch_html(self, session: aiohttp.ClientSession, url: str) -> Optional[str]:
-        """Получает HTML через ScraperAPI"""
-        async with self.semaphore:
-            params = {
-                'api_key': self.api_key,
-                'url': url,
-                'render': 'true',
-                'ultra_premium': 'true'
-            }
-            
-            try:
-                async with session.get(self.api_url, params=params, timeout=aiohttp.ClientTimeout(total=90)) as response:
-                    if response.status == 200:
-                        return await response.text()
-                    return None
-            except Exception as e:
-                return None
+    def has_payload(self, html: str) -> bool:
+        """В ответе есть данные страницы (без рендеринга их может не быть)"""
+        return json_extract.INITIAL_STATE_MARKER in html
     
     def extract_initial_state(self, html: str) -> Optional[Dict[str, Any]]:
-        """Извлекает JSON данные из window.__INITIAL_STATE__"""
+        """Извлекает JSON данные из window.__INITIAL_STATE__ (без полного разбора HTML)"""
         try:
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            for script in soup.find_all('script'):
-                if script.string and 'window.__INITIAL_STATE__' in script.string:
-                    # Извлекаем JSON строку
-                    match = re.search(r'JSON\.parse\("(.+?)"\);', script.string, re.DOTALL)
-                    
-                    if match:
-                        json_str = match.group(1)
-                        # Декодируем escape последовательности
-                        json_str = json_str.replace('\\"', '"')
-                        json_str = json_str.replace('\\/', '/')
-                        json_str = json_str.encode().decode('unicode_escape')
-                        
-                        data = json.loads(json_str)
-                        return data
-            
-            return None
-            
+            return json_extract.extract_initial_state(html)
         except Exception as e:
             print(f"❌ Ошибка извлечения JSON: {e}")
             return None
@@ -155,7 +119,7 @@ class CasaScraper:
             if geo_info.get('street'):
                 data['address'] = geo_info['street']
             
-            data['city'] = geo_info.get('city', 'Roma')
+            data['city'] = geo_info.get('city', self.city_name)
             data['district'] = geo_info.get('district_name', '')
             
             # Изображения
@@ -206,7 +170,7 @@ class CasaScraper:
             
             # Анализ описания для извлечения фильтров
             description = data.get('description', '')
-            analysis = DescriptionAnalyzer.analyze(description, floor=data.get('floor'))
+            analysis = DescriptionAnalyzer.analyze_cached(description, floor=data.get('floor'))
             
             # Приоритизируем данные из Casa.it JSON над DescriptionAnalyzer
             data['agency_commission'] = agency_commission_from_json if agency_commission_from_json is not None else analysis.get('agency_commission')
@@ -230,23 +194,14 @@ class CasaScraper:
             print(f"❌ Ошибка парсинга объявления: {e}")
             return None
     
-    async def scrape_page(self, session: aiohttp.ClientSession, page_num: int) -> List[Dict[str, Any]]:
-        """Парсит одну страницу со списком объявлений"""
-        
-        if page_num == 1:
-            url = f"{self.base_url}/affitto/residenziale/roma/"
-        else:
-            url = f"{self.base_url}/affitto/residenziale/roma/?p={page_num}"
-        
-        print(f"\n🔄 Страница {page_num}: {url}")
-        
-        html = await self.fetch_html(session, url)
-        
-        if not html:
-            print(f"   ❌ Не удалось получить HTML")
-            return []
-        
-        # Извлекаем JSON данные
+    def page_url(self, page_num: int) -> str:
+        url = f"{self.base_url}{search_path('casa_it', self.city)}"
+        if page_num > 1:
+            url = f"{url}?p={page_num}"
+        return url
+    
+    def parse_page(self, html: str) -> List[Dict[str, Any]]:
+        """Объявления из window.__INITIAL_STATE__ страницы списка"""
         initial_state = self.extract_initial_state(html)
         
         if not initial_state:
@@ -254,12 +209,8 @@ class CasaScraper:
             return []
         
         # Получаем список объявлений
-        search_data = initial_state.get('search', {})
-        listings_data = search_data.get('list', [])
-        
-        print(f"   ✅ Найдено {len(listings_data)} объявлений")
+        listings_data = initial_state.get('search', {}).get('list', [])
         
-        # Парсим все объявления
         parsed_listings = []
         for listing_data in listings_data:
             parsed = self.parse_listing(listing_data)
@@ -268,58 +219,23 @@ class CasaScraper:
                 self.stats['success'] += 1
             else:
                 self.stats['failed'] += 1
-        
-        self.stats['pages_scraped'] += 1
-        
         return parsed_listings
     
-    async def scrape_multiple_pages(self, max_pages: int = 5):
-        """Основной метод с параллельным парсингом (совместимый интерфейс)"""
-        return await self.scrape_parallel(num_pages=max_pages)
+    def report_lines(self, listings: List[Dict[str, Any]]) -> List[str]:
+        return [
+            f"✅ Успешно: {self.stats['success']}",
+            f"❌ Ошибки разбора: {self.stats['failed']}",
+        ]
     
-    async def scrape_parallel(self, num_pages: int = 5):
-        """Основной метод с параллельным парсингом"""
-        print("=" * 80)
-        print(f"🚀 ПАРАЛЛЕЛЬНЫЙ ПАРСИНГ CASA.IT (до {self.max_concurrent} одновременно)")
-        print("=" * 80)
-        print(f"📄 Страниц: {num_pages}")
-        print("=" * 80)
-        
-        start_time = datetime.utcnow()
-        
-        async with aiohttp.ClientSession() as session:
-            # Создаем задачи для всех страниц
-            tasks = [
-                self.scrape_page(session, page_num)
-                for page_num in range(1, num_pages + 1)
-            ]
-            
-            # Запускаем параллельно
-            results = await asyncio.gather(*tasks)
-            
-            # Объединяем результаты
-            all_listings = []
-            for page_listings in results:
-                all_listings.extend(page_listings)
-        
-        end_time = datetime.utcnow()
-        elapsed = (end_time - start_time).total_seconds()
-        
-        # Статистика
-        print("\n" + "=" * 80)
-        print("📊 ИТОГОВАЯ СТАТИСТИКА")
-        print("=" * 80)
-        print(f"✅ Успешно: {self.stats['success']}")
-        print(f"❌ Ошибки: {self.stats['failed']}")
-        print(f"📄 Страниц: {self.stats['pages_scraped']}")
-        print()
-        print(f"⏱️  Общее время: {elapsed:.1f} секунд")
-        if all_listings:
-            print(f"⚡ Среднее время на объявление: {elapsed/len(all_listings):.2f} сек")
-            print(f"🚀 Скорость: {len(all_listings)/elapsed*60:.1f} объявлений/минуту")
+    async def scrape_parallel(self, num_pages: int = 5, incremental: Optional[IncrementalCrawl] = None):
+        """
+        Основной метод с параллельным парсингом
         
-        return all_listings
-
+        Args:
+            num_pages: Максимум страниц списка
+            incremental: Инкрементальный режим - страницы по очереди, стоп когда нет новых
+        """
+        return await self.scrape(num_pages, incremental=incremental)
 
 async def main():
     """Основная функция"""
@@ -328,13 +244,17 @@ async def main():
     parser = argparse.ArgumentParser(description='Параллельный парсер Casa.it')
     parser.add_argument('--pages', type=int, default=5, help='Количество страниц (по умолчанию: 5)')
     parser.add_argument('--concurrent', type=int, default=5, help='Одновременных запросов (по умолчанию: 5)')
+    parser.add_argument('--city', default=DEFAULT_CITY, help='Город (по умолчанию: roma)')
     
     args = parser.parse_args()
     
-    scraper = CasaScraper(max_concurrent=args.concurrent)
+    scraper = CasaScraper(max_concurrent=args.concurrent, city=args.city)
     
     # Парсим
-    listings = await scraper.scrape_parallel(num_pages=args.pages)
+    try:
+        listings = await scraper.scrape_parallel(num_pages=args.pages)
+    finally:
+        await close_http_session()
     
     # Сохраняем
     if listings:
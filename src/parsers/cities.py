@@ -0,0 +1,56 @@
+"""
+Города и пути поиска на сайтах-источниках
+
+Фильтры пользователей хранят город в свободной форме ("Roma", "rome",
+"Milano "), а каждый сайт строит URL поиска по-своему. Здесь - единый
+ключ города (slug) и пути поиска для каждого источника.
+"""
+from typing import Dict, Optional
+
+DEFAULT_CITY = 'roma'
+
+# slug -> название для объявлений, регион (для Subito) и альтернативные написания
+CITIES: Dict[str, Dict] = {
+    'roma': {'name': 'Roma', 'region': 'lazio', 'aliases': ('rome',)},
+    'milano': {'name': 'Milano', 'region': 'lombardia', 'aliases': ('milan',)},
+    'firenze': {'name': 'Firenze', 'region': 'toscana', 'aliases': ('florence',)},
+    'napoli': {'name': 'Napoli', 'region': 'campania', 'aliases': ('naples',)},
+    'torino': {'name': 'Torino', 'region': 'piemonte', 'aliases': ('turin',)},
+    'venezia': {'name': 'Venezia', 'region': 'veneto', 'aliases': ('venice',)},
+    'bologna': {'name': 'Bologna', 'region': 'emilia-romagna', 'aliases': ()},
+    'genova': {'name': 'Genova', 'region': 'liguria', 'aliases': ('genoa',)},
+    'pisa': {'name': 'Pisa', 'region': 'toscana', 'aliases': ()},
+    'padova': {'name': 'Padova', 'region': 'veneto', 'aliases': ('padua',)},
+    'verona': {'name': 'Verona', 'region': 'veneto', 'aliases': ()},
+    'bari': {'name': 'Bari', 'region': 'puglia', 'aliases': ()},
+    'palermo': {'name': 'Palermo', 'region': 'sicilia', 'aliases': ()},
+    'catania': {'name': 'Catania', 'region': 'sicilia', 'aliases': ()},
+}
+
+_ALIASES = {alias: slug for slug, info in CITIES.items() for alias in (slug, *info['aliases'])}
+
+
+def normalize_city(city: Optional[str]) -> Optional[str]:
+    """Slug города из написания в фильтре или None, если город не поддерживается"""
+    if not city:
+        return None
+    return _ALIASES.get(city.strip().lower())
+
+
+def city_name(slug: str) -> str:
+    """Название города, как оно сохраняется в объявлениях"""
+    return CITIES[slug]['name']
+
+
+def search_path(source: str, slug: str) -> str:
+    """Путь первой страницы поиска аренды для источника"""
+    if source == 'casa_it':
+        return f"/affitto/residenziale/{slug}/"
+    if source == 'idealista':
+        # Для областных центров коммуна и провинция совпадают: roma-roma, milano-milano
+        return f"/affitto-case/{slug}-{slug}/"
+    if source == 'subito':
+        return f"/annunci-{CITIES[slug]['region']}/affitto/immobili/{slug}/"
+    if source == 'immobiliare':
+        return f"/affitto-case/{slug}/"
+    raise ValueError(f"Неизвестный источник: {source}")
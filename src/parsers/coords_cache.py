@@ -0,0 +1,123 @@
+"""
+Кеш координат объявлений
+
+Координаты объявления не меняются, а детальная страница ради них стоит
+запроса ScraperAPI с рендерингом. Кеш (источник, external_id) -> (lat, lon)
+хранится в JSON-файле между запусками; промахи кеша сверяются с базой,
+и только для объявлений, которых нет ни там, ни там, грузится детальная страница.
+"""
+import json
+import logging
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Coords = Tuple[float, float]
+
+# Координаты из базы: external_id -> (lat, lon) (например, crud_listing.get_coordinates)
+CoordsLookup = Callable[[List[str]], Dict[str, Coords]]
+
+
+class CoordsCache:
+    """Координаты объявлений по источникам в JSON-файле"""
+
+    def __init__(self, path: str, max_entries: int = 200000, enabled: bool = True):
+        self.path = path
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._data: Optional[Dict[str, Dict[str, List[float]]]] = None
+        self._dirty = False
+
+        self.stats = {'hits': 0, 'db_hits': 0, 'misses': 0, 'writes': 0}
+
+    @classmethod
+    def from_settings(cls) -> 'CoordsCache':
+        return cls(
+            path=settings.SCRAPER_COORDS_CACHE_PATH,
+            max_entries=settings.SCRAPER_COORDS_CACHE_MAX_ENTRIES,
+            enabled=settings.SCRAPER_COORDS_CACHE_ENABLED,
+        )
+
+    def _load(self) -> Dict[str, Dict[str, List[float]]]:
+        if self._data is None:
+            self._data = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, encoding='utf-8') as f:
+                        self._data = json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"⚠️ Не удалось прочитать кеш координат {self.path}: {e}")
+        return self._data
+
+    def put(self, source: str, external_id: str, latitude: float, longitude: float) -> None:
+        if not self.enabled or not external_id:
+            return
+        entries = self._load().setdefault(source, {})
+        value = [float(latitude), float(longitude)]
+        if entries.get(external_id) == value:
+            return
+        entries[external_id] = value
+        self._dirty = True
+        self.stats['writes'] += 1
+
+        # Вытесняем самые старые записи источника (словарь хранит порядок вставки)
+        overflow = len(entries) - self.max_entries
+        if overflow > 0:
+            for key in list(entries)[:overflow]:
+                del entries[key]
+
+    def resolve(
+        self,
+        source: str,
+        external_ids: Iterable[str],
+        db_lookup: Optional[CoordsLookup] = None,
+    ) -> Dict[str, Coords]:
+        """
+        Координаты известных объявлений: сначала кеш, затем база (одним запросом)
+
+        Returns:
+            external_id -> (lat, lon); объявления без записи в результат не попадают
+        """
+        ids = [external_id for external_id in external_ids if external_id]
+        found: Dict[str, Coords] = {}
+        if self.enabled:
+            entries = self._load().get(source, {})
+            for external_id in ids:
+                if external_id in entries:
+                    found[external_id] = tuple(entries[external_id])
+            self.stats['hits'] += len(found)
+
+        missing = [external_id for external_id in ids if external_id not in found]
+        if missing and db_lookup is not None:
+            try:
+                from_db = db_lookup(missing)
+            except Exception as e:
+                logger.error(f"❌ [{source}] Ошибка получения координат из базы: {e}")
+                from_db = {}
+            for external_id, (latitude, longitude) in from_db.items():
+                found[external_id] = (latitude, longitude)
+                self.put(source, external_id, latitude, longitude)
+            self.stats['db_hits'] += len(from_db)
+
+        self.stats['misses'] += len(ids) - len(found)
+        return found
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._data, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except OSError as e:
+            logger.warning(f"⚠️ Не удалось сохранить кеш координат {self.path}: {e}")
+
+
+# Глобальный кеш координат
+coords_cache = CoordsCache.from_settings()
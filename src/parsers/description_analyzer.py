@@ -1,15 +1,166 @@
 """
 Утилита для анализа описания объявления и извлечения информации о фильтрах
+
+Все списки ключевых слов собраны в одно регулярное выражение-префиксное
+дерево: текст описания просматривается один раз, а каждое найденное
+слово отображается на категории (без комиссии, запрет животных, ремонт...).
+
+Объявления переобходятся каждый цикл с тем же описанием, поэтому результаты
+кешируются (LRU) по хешу описания, параметров этажа и версии правил;
+analyze_many разбирает пачку, повторы внутри пачки считаются один раз,
+а промахи кеша при большой пачке можно отдать пулу процессов.
 """
 import re
 import json
-from typing import Optional, Dict, Any
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Dict, Any, FrozenSet, Iterable, List, Tuple
 from datetime import datetime
 
+from src.core.config import settings
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    """Альтернатива слов в виде префиксного дерева (самое длинное слово в позиции)"""
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: Dict[str, Any]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """
+    Поиск всех ключевых слов за один проход по тексту
+
+    Эквивалентно набору проверок `kw in text`: в каждой позиции находится
+    самое длинное слово, а более короткие слова, начинающиеся там же, -
+    его префиксы, поэтому их категории заранее добавлены к категориям длинного.
+    """
+
+    def __init__(self, categories: Dict[str, Iterable[str]]):
+        self.categories = {category: tuple(words) for category, words in categories.items()}
+        word_categories: Dict[str, set] = {}
+        for category, words in self.categories.items():
+            for word in words:
+                word_categories.setdefault(word, set()).add(category)
+
+        self._hits: Dict[str, FrozenSet[str]] = {
+            word: frozenset().union(*(
+                categories for prefix, categories in word_categories.items() if word.startswith(prefix)
+            ))
+            for word in word_categories
+        }
+        self._pattern = re.compile(_trie_regex(word_categories))
+
+    def match(self, text: str) -> FrozenSet[str]:
+        """Категории, слова которых встречаются в тексте"""
+        found = set()
+        search = self._pattern.search
+        match = search(text)
+        while match is not None:
+            found |= self._hits[match.group()]
+            # Следующий поиск - со следующего символа: слова могут перекрываться
+            match = search(text, match.start() + 1)
+        return frozenset(found)
+
+    def match_naive(self, text: str) -> FrozenSet[str]:
+        """Отдельная проверка каждого списка (эталон для тестов и бенчмарка)"""
+        return frozenset(
+            category for category, words in self.categories.items() if any(word in text for word in words)
+        )
+
+
+# Год постройки: шаблоны проверяются по порядку, первый подходящий год выигрывает
+YEAR_BUILT_PATTERNS: List[re.Pattern] = [
+    re.compile(pattern, re.IGNORECASE) for pattern in (
+        r"costruito\s+(?:nel|in|nel\s+)?(\d{4})",
+        r"built\s+(?:in\s+)?(\d{4})",
+        r"del\s+(\d{4})",
+        r"anno\s+(?:di\s+costruzione\s+)?(\d{4})",
+        r"(\d{4})\s+(?:anno|year)",
+        r"risale\s+al\s+(\d{4})",
+        r"datato\s+(\d{4})",
+        r"edificio\s+del\s+(\d{4})",
+        r"palazzo\s+del\s+(\d{4})",
+        r"realizzato\s+nel\s+(\d{4})",
+        r"anno\s+di\s+realizzazione:\s*(\d{4})",
+    )
+]
+
+# Этажность из поля этажа ("2 piani: 1, 2") и из текста описания
+FLOOR_FIELD_TOTAL_PATTERNS: List[re.Pattern] = [
+    re.compile(r"^(\d+)\s+piani", re.IGNORECASE),
+    re.compile(r"(\d+)\s+piani:", re.IGNORECASE),
+    re.compile(r"(\d+)\s+piani", re.IGNORECASE),
+]
+DESCRIPTION_TOTAL_PATTERNS: List[re.Pattern] = [
+    re.compile(r"piano\s+\d+\s+di\s+(\d+)", re.IGNORECASE),  # "piano 3 di 5"
+    re.compile(r"floor\s+\d+\s+of\s+(\d+)", re.IGNORECASE),  # "floor 3 of 5"
+    re.compile(r"(\d+)\s+(?:piani|piano|floors?|étages?)", re.IGNORECASE),  # "5 piani", "5 floors"
+]
+_NUMBER = re.compile(r'(\d+)')
+_LEADING_NUMBER = re.compile(r'^(\d+)')
+_MULTILEVEL = re.compile(r'(\d+)\s+piani:')
+
+
+class AnalysisCache:
+    """Результаты анализа по ключу описания (LRU в памяти процесса)"""
+
+    def __init__(self, max_entries: int = 50000):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+
+        self.stats = {'hits': 0, 'misses': 0, 'batch_duplicates': 0, 'pooled': 0}
+
+    @staticmethod
+    def key(rules_version: int, description: str, kwargs: Dict[str, Any]) -> str:
+        """Хеш (версия правил, описание, параметры этажа)"""
+        payload = json.dumps([rules_version, description or '', kwargs], sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        result = self._entries.get(key)
+        if result is None:
+            self.stats['misses'] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats['hits'] += 1
+        return result
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
 
 class DescriptionAnalyzer:
     """Анализирует описание объявления для извлечения данных фильтров"""
     
+    # Версия правил анализа: увеличивать при изменении ключевых слов или разбора,
+    # иначе кеш будет отдавать результаты старых правил
+    RULES_VERSION = 1
+    
     # Ключевые слова для поиска комиссии (ОТСУТСТВИЕ комиссии)
     NO_COMMISSION_KEYWORDS = [
         "senza commissioni", "senza commissione",
@@ -80,6 +231,42 @@ class DescriptionAnalyzer:
         "edificio completamente ristrutturato"
     ]
     
+    PETS_ALLOWED_KEYWORDS = [
+        "animali ammessi", "pets allowed", "pets welcome",
+        "animali domestici ammessi", "si accettano animali"
+    ]
+    
+    CHILDREN_ALLOWED_KEYWORDS = [
+        "bambini ammessi", "children allowed", "children welcome",
+        "adatto a famiglie", "family friendly", "si accettano bambini"
+    ]
+    
+    MODERN_BUILDING_KEYWORDS = ["moderno", "contemporaneo", "modern", "contemporary"]
+    
+    PARK_KEYWORDS = [
+        "parco", "parco pubblico", "verde pubblico",
+        "park nearby", "near park", "close to park",
+        "giardini", "gardens"
+    ]
+    
+    # Все списки - один проход по тексту (категория -> ключевые слова)
+    KEYWORDS = KeywordMatcher({
+        'no_commission': NO_COMMISSION_KEYWORDS,
+        'pets_ban': PETS_BAN_KEYWORDS,
+        'pets_allowed': PETS_ALLOWED_KEYWORDS,
+        'children_ban': CHILDREN_BAN_KEYWORDS,
+        'children_allowed': CHILDREN_ALLOWED_KEYWORDS,
+        'renovated': RENOVATED_KEYWORDS,
+        'new_construction': NEW_CONSTRUCTION_KEYWORDS,
+        'partially_renovated': PARTIALLY_RENOVATED_KEYWORDS,
+        'not_renovated': NOT_RENOVATED_KEYWORDS,
+        'historic_building': HISTORIC_BUILDING_KEYWORDS,
+        'new_building': NEW_BUILDING_KEYWORDS,
+        'renovated_building': RENOVATED_BUILDING_KEYWORDS,
+        'modern_building': MODERN_BUILDING_KEYWORDS,
+        'park': PARK_KEYWORDS,
+    })
+    
     @classmethod
     def analyze(cls, description: str, **kwargs) -> Dict[str, Any]:
         """
@@ -107,28 +294,82 @@ class DescriptionAnalyzer:
         if not description:
             return cls._get_defaults(**kwargs)
         
-        desc_lower = description.lower()
+        # Категории всех ключевых слов за один проход
+        hits = cls.KEYWORDS.match(description.lower())
         
         # Анализ этажей
         floor_data = cls._analyze_floor_normalized(description, **kwargs)
         
         result = {
-            'agency_commission': cls._analyze_commission(desc_lower),
-            'pets_allowed': cls._analyze_pets(desc_lower),
-            'children_friendly': cls._analyze_children(desc_lower),
-            'renovation_type': cls._analyze_renovation(desc_lower),
-            'building_type': cls._analyze_building_type(desc_lower),
+            'agency_commission': cls._analyze_commission(hits),
+            'pets_allowed': cls._analyze_pets(hits),
+            'children_friendly': cls._analyze_children(hits),
+            'renovation_type': cls._analyze_renovation(hits),
+            'building_type': cls._analyze_building_type(hits),
             'year_built': cls._analyze_year_built(description),
             'total_floors': floor_data.get('total_floors'),
             'floor_number': floor_data.get('floor_number'),
             'is_first_floor': floor_data.get('is_first_floor'),
             'is_top_floor': floor_data.get('is_top_floor'),
-            'park_nearby': cls._analyze_park(desc_lower),
+            'park_nearby': cls._analyze_park(hits),
             'noisy_roads_nearby': None,  # Пока недостаточно данных для определения
         }
         
         return result
     
+    @classmethod
+    def analyze_many(
+        cls,
+        items: Iterable[Tuple[str, Dict[str, Any]]],
+        workers: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Анализ пачки описаний с кешем
+        
+        Args:
+            items: Пары (описание, параметры analyze - floor и т.п.)
+            workers: Процессов для промахов кеша (None - из настроек, 0/1 - в текущем процессе)
+        
+        Returns:
+            Результаты analyze в порядке items (копии - их можно менять)
+        """
+        items = list(items)
+        keys = [analysis_cache.key(cls.RULES_VERSION, description, kwargs) for description, kwargs in items]
+        
+        results: Dict[str, Dict[str, Any]] = {}
+        pending: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        for key, item in zip(keys, items):
+            if key in results or key in pending:
+                analysis_cache.stats['batch_duplicates'] += 1
+                continue
+            cached = analysis_cache.get(key)
+            if cached is not None:
+                results[key] = cached
+            else:
+                pending[key] = item
+        
+        if workers is None:
+            workers = settings.DESCRIPTION_ANALYSIS_WORKERS
+        if workers > 1 and len(pending) >= settings.DESCRIPTION_ANALYSIS_POOL_MIN_BATCH:
+            # Разбор - чистый CPU: в потоках GIL не даст ускорения
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                chunksize = max(1, len(pending) // (workers * 4))
+                computed = list(pool.map(_analyze_item, pending.values(), chunksize=chunksize))
+            analysis_cache.stats['pooled'] += len(computed)
+        else:
+            computed = [cls.analyze(description, **kwargs) for description, kwargs in pending.values()]
+        
+        for key, result in zip(pending, computed):
+            analysis_cache.put(key, result)
+            results[key] = result
+        
+        return [dict(results[key]) for key in keys]
+    
+    @classmethod
+    def analyze_cached(cls, description: str, **kwargs) -> Dict[str, Any]:
+        """analyze одного описания через кеш"""
+        return cls.analyze_many([(description, kwargs)], workers=0)[0]
+    
     @classmethod
     def _get_defaults(cls, **kwargs) -> Dict[str, Any]:
         """Возвращает значения по умолчанию"""
@@ -150,7 +391,7 @@ class DescriptionAnalyzer:
         }
     
     @classmethod
-    def _analyze_commission(cls, desc_lower: str) -> Optional[bool]:
+    def _analyze_commission(cls, hits: FrozenSet[str]) -> Optional[bool]:
         """
         Анализирует наличие комиссии
         
@@ -158,12 +399,12 @@ class DescriptionAnalyzer:
             False - нет комиссии
             None - не указано / есть комиссия
         """
-        if any(kw in desc_lower for kw in cls.NO_COMMISSION_KEYWORDS):
+        if 'no_commission' in hits:
             return False
         return None
     
     @classmethod
-    def _analyze_pets(cls, desc_lower: str) -> Optional[bool]:
+    def _analyze_pets(cls, hits: FrozenSet[str]) -> Optional[bool]:
         """
         Анализирует политику по животным
         
@@ -172,23 +413,15 @@ class DescriptionAnalyzer:
             True - явное разрешение в описании
             None - информация отсутствует
         """
-        # Проверяем явные запреты
-        if any(kw in desc_lower for kw in cls.PETS_BAN_KEYWORDS):
+        # Явный запрет важнее явного разрешения
+        if 'pets_ban' in hits:
             return False
-        
-        # Проверяем явные разрешения
-        pets_allowed_keywords = [
-            "animali ammessi", "pets allowed", "pets welcome",
-            "animali domestici ammessi", "si accettano animali"
-        ]
-        if any(kw in desc_lower for kw in pets_allowed_keywords):
+        if 'pets_allowed' in hits:
             return True
-        
-        # Если ничего не указано - возвращаем None
         return None
     
     @classmethod
-    def _analyze_children(cls, desc_lower: str) -> Optional[bool]:
+    def _analyze_children(cls, hits: FrozenSet[str]) -> Optional[bool]:
         """
         Анализирует политику по детям
         
@@ -197,59 +430,41 @@ class DescriptionAnalyzer:
             True - явное разрешение в описании
             None - информация отсутствует
         """
-        # Проверяем явные запреты
-        if any(kw in desc_lower for kw in cls.CHILDREN_BAN_KEYWORDS):
+        if 'children_ban' in hits:
             return False
-        
-        # Проверяем явные разрешения
-        children_allowed_keywords = [
-            "bambini ammessi", "children allowed", "children welcome",
-            "adatto a famiglie", "family friendly", "si accettano bambini"
-        ]
-        if any(kw in desc_lower for kw in children_allowed_keywords):
+        if 'children_allowed' in hits:
             return True
-        
-        # Если ничего не указано - возвращаем None
         return None
     
+    # Категории в порядке приоритета -> значение поля
+    RENOVATION_PRIORITY: List[Tuple[str, str]] = [
+        ('renovated', "renovated"),
+        ('new_construction', "new_construction"),
+        ('partially_renovated', "partially_renovated"),
+        ('not_renovated', "not_renovated"),
+    ]
+    
+    BUILDING_TYPE_PRIORITY: List[Tuple[str, str]] = [
+        ('historic_building', "historic"),
+        ('new_building', "new_construction"),
+        ('renovated_building', "renovated_building"),
+        ('modern_building', "modern"),
+    ]
+    
     @classmethod
-    def _analyze_renovation(cls, desc_lower: str) -> Optional[str]:
+    def _analyze_renovation(cls, hits: FrozenSet[str]) -> Optional[str]:
         """Анализирует тип ремонта"""
-        
-        # Проверяем типы в порядке приоритета
-        if any(kw in desc_lower for kw in cls.RENOVATED_KEYWORDS):
-            return "renovated"
-        
-        if any(kw in desc_lower for kw in cls.NEW_CONSTRUCTION_KEYWORDS):
-            return "new_construction"
-        
-        if any(kw in desc_lower for kw in cls.PARTIALLY_RENOVATED_KEYWORDS):
-            return "partially_renovated"
-        
-        if any(kw in desc_lower for kw in cls.NOT_RENOVATED_KEYWORDS):
-            return "not_renovated"
-        
+        for category, value in cls.RENOVATION_PRIORITY:
+            if category in hits:
+                return value
         return None
     
     @classmethod
-    def _analyze_building_type(cls, desc_lower: str) -> Optional[str]:
+    def _analyze_building_type(cls, hits: FrozenSet[str]) -> Optional[str]:
         """Анализирует тип здания"""
-        
-        if any(kw in desc_lower for kw in cls.HISTORIC_BUILDING_KEYWORDS):
-            return "historic"
-        
-        if any(kw in desc_lower for kw in cls.NEW_BUILDING_KEYWORDS):
-            return "new_construction"
-        
-        # Если есть слово "ristrutturato" в контексте здания
-        if any(kw in desc_lower for kw in cls.RENOVATED_BUILDING_KEYWORDS):
-            return "renovated_building"
-        
-        # Если упоминается современность
-        if any(kw in desc_lower for kw in ["moderno", "contemporaneo", "modern", "contemporary"]):
-            return "modern"
-        
-        # Если ничего не указано - возвращаем None
+        for category, value in cls.BUILDING_TYPE_PRIORITY:
+            if category in hits:
+                return value
         return None
     
     @classmethod
@@ -259,22 +474,8 @@ class DescriptionAnalyzer:
         
         Ищет паттерны вроде "costruito nel 1950", "built in 1950", "del 1950"
         """
-        patterns = [
-            r"costruito\s+(?:nel|in|nel\s+)?(\d{4})",
-            r"built\s+(?:in\s+)?(\d{4})",
-            r"del\s+(\d{4})",
-            r"anno\s+(?:di\s+costruzione\s+)?(\d{4})",
-            r"(\d{4})\s+(?:anno|year)",
-            r"risale\s+al\s+(\d{4})",
-            r"datato\s+(\d{4})",
-            r"edificio\s+del\s+(\d{4})",
-            r"palazzo\s+del\s+(\d{4})",
-            r"realizzato\s+nel\s+(\d{4})",
-            r"anno\s+di\s+realizzazione:\s*(\d{4})",
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, description, re.IGNORECASE)
+        for pattern in YEAR_BUILT_PATTERNS:
+            match = pattern.search(description)
             if match:
                 year = int(match.group(1))
                 # Проверяем что год разумный (1800-текущий год)
@@ -321,27 +522,16 @@ class DescriptionAnalyzer:
             
             if floor_str:
                 # Ищем паттерны вроде "2 piani", "3 piani", "2 piani:" в начале или везде
-                patterns = [
-                    r"^(\d+)\s+piani",  # "2 piani" в начале
-                    r"(\d+)\s+piani:",  # "2 piani:" с двоеточием
-                    r"(\d+)\s+piani",   # "2 piani" где угодно
-                ]
-                for pattern in patterns:
-                    match = re.search(pattern, str(floor_str), re.IGNORECASE)
+                for pattern in FLOOR_FIELD_TOTAL_PATTERNS:
+                    match = pattern.search(str(floor_str))
                     if match:
                         floors = int(match.group(1))
                         if 1 <= floors <= 50:
                             return floors
         
         # Ищем паттерны вроде "3º piano di 5", "piano 3 di 5", "floor 3 of 5"
-        patterns = [
-            r"piano\s+\d+\s+di\s+(\d+)",  # "piano 3 di 5"
-            r"floor\s+\d+\s+of\s+(\d+)",  # "floor 3 of 5"
-            r"(\d+)\s+(?:piani|piano|floors?|étages?)",  # "5 piani", "5 floors"
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, description, re.IGNORECASE)
+        for pattern in DESCRIPTION_TOTAL_PATTERNS:
+            match = pattern.search(description)
             if match:
                 floors = int(match.group(1))
                 if 1 <= floors <= 50:  # Разумный диапазон
@@ -350,21 +540,14 @@ class DescriptionAnalyzer:
         return None
     
     @classmethod
-    def _analyze_park(cls, desc_lower: str) -> Optional[bool]:
+    def _analyze_park(cls, hits: FrozenSet[str]) -> Optional[bool]:
         """
         Анализирует наличие парка рядом
         
         Ищет слова вроде "parco", "park", "giardino"
         """
-        park_keywords = [
-            "parco", "parco pubblico", "verde pubblico",
-            "park nearby", "near park", "close to park",
-            "giardini", "gardens"
-        ]
-        
-        if any(kw in desc_lower for kw in park_keywords):
+        if 'park' in hits:
             return True
-        
         return None
     
     @classmethod
@@ -415,18 +598,18 @@ class DescriptionAnalyzer:
                 elif 'ultimo' in floor_value_lower:
                     result['is_top_floor'] = True
                     # Пытаемся извлечь номер
-                    match = re.search(r'(\d+)', floor_value_lower)
+                    match = _NUMBER.search(floor_value_lower)
                     if match:
                         result['floor_number'] = int(match.group(1))
                 else:
                     # Ищем число
-                    match = re.search(r'^(\d+)', floor_value_lower)
+                    match = _LEADING_NUMBER.search(floor_value_lower)
                     if match:
                         result['floor_number'] = int(match.group(1))
                 
                 # Проверка на многоэтажность (2 piani: ...)
                 if 'piani:' in floor_value_lower:
-                    match = re.search(r'(\d+)\s+piani:', floor_value_lower)
+                    match = _MULTILEVEL.search(floor_value_lower)
                     if match:
                         # Это квартира на нескольких этажах, берем первый
                         result['total_floors'] = int(match.group(1))
@@ -443,7 +626,7 @@ class DescriptionAnalyzer:
                     result['floor_number'] = 0
                 elif 'ultimo' in floor_str:
                     result['is_top_floor'] = True
-                    match = re.search(r'(\d+)', floor_str)
+                    match = _NUMBER.search(floor_str)
                     if match:
                         result['floor_number'] = int(match.group(1))
                 else:
@@ -452,7 +635,7 @@ class DescriptionAnalyzer:
                         result['floor_number'] = int(floor_str)
                     except ValueError:
                         # Пытаемся извлечь число из строки типа "3° piano"
-                        match = re.search(r'(\d+)', floor_str)
+                        match = _NUMBER.search(floor_str)
                         if match:
                             result['floor_number'] = int(match.group(1))
         
@@ -476,3 +659,13 @@ class DescriptionAnalyzer:
                 result['is_top_floor'] = False
         
         return result
+
+
+def _analyze_item(item: Tuple[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Анализ одного описания в процессе пула"""
+    description, kwargs = item
+    return DescriptionAnalyzer.analyze(description, **kwargs)
+
+
+# Глобальный кеш результатов анализа
+analysis_cache = AnalysisCache(max_entries=settings.DESCRIPTION_ANALYSIS_CACHE_SIZE)
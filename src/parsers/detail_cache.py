@@ -0,0 +1,256 @@
+"""
+Кеш детальных страниц и политика их загрузки
+
+DetailCache - кеш HTML на диске: файл адресуется sha256 от URL,
+хранится сжатым, живет TTL и вытесняется по LRU при превышении размера.
+
+DetailFetchPolicy - решает, какие детальные страницы грузить: объявления,
+которые уже есть в базе с тем же набором полей карточки (цена, заголовок),
+повторно не запрашиваются.
+"""
+import gzip
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class DetailCache:
+    """Кеш детальных страниц на диске (TTL + LRU по суммарному размеру)"""
+
+    def __init__(self, directory: str, ttl_seconds: float, max_bytes: int, enabled: bool = True):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+
+        # path -> (размер, время последнего обращения); строится лениво сканом каталога
+        self._index: Optional[Dict[str, Tuple[int, float]]] = None
+        self._total_bytes = 0
+
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'writes': 0, 'evicted': 0}
+
+    @classmethod
+    def from_settings(cls) -> 'DetailCache':
+        return cls(
+            directory=settings.SCRAPER_DETAIL_CACHE_DIR,
+            ttl_seconds=settings.SCRAPER_DETAIL_CACHE_TTL_HOURS * 3600,
+            max_bytes=settings.SCRAPER_DETAIL_CACHE_MAX_MB * 1024 * 1024,
+            enabled=settings.SCRAPER_DETAIL_CACHE_ENABLED,
+        )
+
+    @staticmethod
+    def key_for(url: str) -> str:
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.html.gz")
+
+    def _load_index(self) -> Dict[str, Tuple[int, float]]:
+        if self._index is None:
+            self._index = {}
+            self._total_bytes = 0
+            if os.path.isdir(self.directory):
+                for root, _, files in os.walk(self.directory):
+                    for name in files:
+                        if not name.endswith('.html.gz'):
+                            continue
+                        path = os.path.join(root, name)
+                        try:
+                            stat = os.stat(path)
+                        except OSError:
+                            continue
+                        self._index[path] = (stat.st_size, stat.st_atime)
+                        self._total_bytes += stat.st_size
+        return self._index
+
+    def _forget(self, path: str) -> None:
+        index = self._load_index()
+        entry = index.pop(path, None)
+        if entry:
+            self._total_bytes -= entry[0]
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def get(self, url: str) -> Optional[str]:
+        """HTML из кеша или None (нет записи или истек TTL)"""
+        if not self.enabled:
+            return None
+
+        path = self._path(self.key_for(url))
+        index = self._load_index()
+        if path not in index:
+            self.stats['misses'] += 1
+            return None
+
+        try:
+            written_at = os.stat(path).st_mtime
+            if time.time() - written_at > self.ttl_seconds:
+                self.stats['expired'] += 1
+                self._forget(path)
+                return None
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                html = f.read()
+            # atime - время последнего обращения для LRU, mtime остается временем записи
+            now = time.time()
+            os.utime(path, (now, written_at))
+            index[path] = (index[path][0], now)
+        except (OSError, EOFError) as e:
+            logger.warning(f"⚠️ Поврежденная запись кеша {path}: {e}")
+            self._forget(path)
+            self.stats['misses'] += 1
+            return None
+
+        self.stats['hits'] += 1
+        return html
+
+    def put(self, url: str, html: str) -> None:
+        """Сохранить HTML и при необходимости вытеснить самые старые записи"""
+        if not self.enabled or not html:
+            return
+
+        path = self._path(self.key_for(url))
+        index = self._load_index()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+                f.write(html)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            logger.warning(f"⚠️ Не удалось записать кеш {path}: {e}")
+            return
+
+        previous = index.get(path)
+        if previous:
+            self._total_bytes -= previous[0]
+        index[path] = (size, time.time())
+        self._total_bytes += size
+        self.stats['writes'] += 1
+
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self) -> None:
+        """LRU: удаляем давно не использованные записи до 90% лимита"""
+        index = self._load_index()
+        target = int(self.max_bytes * 0.9)
+        for path, _ in sorted(index.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= target:
+                break
+            self._forget(path)
+            self.stats['evicted'] += 1
+
+    def size_bytes(self) -> int:
+        self._load_index()
+        return self._total_bytes
+
+
+# Снимок карточки из базы: external_id -> {'price', 'title', 'description', 'updated_at'}
+CardSnapshotLookup = Callable[[List[str]], Dict[str, Dict[str, Any]]]
+
+
+class DetailFetchPolicy:
+    """Какие детальные страницы грузить на этом проходе"""
+
+    def __init__(
+        self,
+        source: str,
+        snapshot_lookup: CardSnapshotLookup,
+        compare_fields: Iterable[str] = ('price', 'title'),
+        require_description: bool = False,
+        refresh_after_days: Optional[float] = None,
+    ):
+        """
+        Args:
+            source: Источник
+            snapshot_lookup: Снимки карточек из БД (например, crud_listing.get_card_snapshots)
+            compare_fields: Поля карточки списка, изменение которых требует повторной загрузки
+            require_description: Грузить, если в базе нет описания
+            refresh_after_days: Все равно обновлять детальную страницу раз в N дней
+        """
+        self.source = source
+        self.snapshot_lookup = snapshot_lookup
+        self.compare_fields = tuple(compare_fields)
+        self.require_description = require_description
+        self.refresh_after_days = refresh_after_days
+
+        self.stats = {'new': 0, 'changed': 0, 'unchanged': 0}
+
+    @staticmethod
+    def _same(card_value: Any, db_value: Any) -> bool:
+        if card_value is None or db_value is None:
+            return card_value is None and db_value is None
+        if isinstance(card_value, (int, float)) or isinstance(db_value, (int, float)):
+            try:
+                return abs(float(card_value) - float(db_value)) < 0.01
+            except (TypeError, ValueError):
+                return False
+        return str(card_value).strip().lower() == str(db_value).strip().lower()
+
+    def _is_stale(self, snapshot: Dict[str, Any]) -> bool:
+        if self.refresh_after_days is None:
+            return False
+        updated_at = snapshot.get('updated_at')
+        if updated_at is None:
+            return True
+        if updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=timezone.utc)
+        return datetime.now(timezone.utc) - updated_at > timedelta(days=self.refresh_after_days)
+
+    def plan(self, cards: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Разбить карточки списка на группы (одним запросом к БД)
+
+        Returns:
+            {'new': [...], 'changed': [...], 'unchanged': [...]}
+            new - нет в базе (можно брать из кеша), changed - карточка изменилась
+            (кеш устарел), unchanged - детальную страницу не грузим
+        """
+        ids = [card['external_id'] for card in cards if card.get('external_id')]
+        try:
+            snapshots = self.snapshot_lookup(ids) if ids else {}
+        except Exception as e:
+            # Без базы решить не можем - грузим все, как раньше
+            logger.error(f"❌ [{self.source}] Ошибка получения снимков карточек: {e}")
+            snapshots = {}
+
+        groups: Dict[str, List[Dict[str, Any]]] = {'new': [], 'changed': [], 'unchanged': []}
+        for card in cards:
+            snapshot = snapshots.get(card.get('external_id'))
+            if snapshot is None:
+                group = 'new'
+            elif any(
+                field in card and not self._same(card[field], snapshot.get(field))
+                for field in self.compare_fields
+            ):
+                group = 'changed'
+            elif self.require_description and not snapshot.get('description'):
+                group = 'changed'
+            elif self._is_stale(snapshot):
+                group = 'changed'
+            else:
+                group = 'unchanged'
+            groups[group].append(card)
+
+        for group, items in groups.items():
+            self.stats[group] += len(items)
+
+        print(
+            f"   🗂️ Детальные страницы: {len(groups['new'])} новых, "
+            f"{len(groups['changed'])} изменившихся, {len(groups['unchanged'])} без изменений (пропускаем)"
+        )
+        return groups
+
+
+# Глобальный кеш детальных страниц
+detail_cache = DetailCache.from_settings()
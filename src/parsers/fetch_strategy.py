@@ -0,0 +1,266 @@
+"""
+Стратегия уровней запросов ScraperAPI
+
+Уровни от дешевого к дорогому: обычный запрос, render, premium, ultra_premium.
+Для каждого источника запрос начинается с самого дешевого уровня, который
+по накопленной статистике работает, и повышается только при блокировке
+(403/429), ошибке сервера или сети и отсутствии данных в ответе. Ответ
+404/410 и другие 4xx окончательный - дорогой уровень его не изменит, а
+запрос, отклоненный выключателем источника, не отправлялся и в статистику
+уровня не попадает. Статистика по уровням сохраняется в JSON-файл, чтобы
+следующие запуски сразу начинали с нужного уровня.
+"""
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Параметры ScraperAPI и стоимость в кредитах для каждого уровня
+TIERS: Dict[str, Dict[str, Any]] = {
+    'plain': {'params': {}, 'credits': 1},
+    'render': {'params': {'render': 'true'}, 'credits': 10},
+    'premium': {'params': {'render': 'true', 'premium': 'true'}, 'credits': 25},
+    'ultra_premium': {'params': {'render': 'true', 'ultra_premium': 'true'}, 'credits': 75},
+}
+TIER_ORDER = ['plain', 'render', 'premium', 'ultra_premium']
+
+# Доля успеха считается как EWMA, чтобы статистика следовала за изменениями сайта
+SUCCESS_EWMA_ALPHA = 0.1
+
+# 4xx, при которых стоит повысить уровень: антибот сайта или лимит запросов
+ESCALATE_STATUSES = {403, 429}
+
+# Вид ошибки запроса, отклоненного выключателем источника без отправки
+CIRCUIT_OPEN = 'circuit_open'
+
+
+class FetchOutcome(NamedTuple):
+    """Итог запроса одного уровня: HTML и причина, если его нет"""
+
+    html: Optional[str]
+    status: Optional[int] = None  # HTTP статус последней попытки
+    error: Optional[str] = None  # Вид ошибки (classify_error) или CIRCUIT_OPEN
+    sent: bool = True  # Запрос отправлялся (иначе кредиты не потрачены)
+
+    @property
+    def definitive(self) -> bool:
+        """Страницы нет (404, 410 и другие 4xx) - повышение уровня не поможет"""
+        return (
+            self.html is None and self.status is not None
+            and 400 <= self.status < 500 and self.status not in ESCALATE_STATUSES
+        )
+
+
+def _new_tier_stats() -> Dict[str, Any]:
+    return {
+        'attempts': 0,
+        'successes': 0,
+        'success_rate': None,
+        'latency_seconds': 0.0,
+        'credits': 0,
+        'listings': 0,
+    }
+
+
+class FetchStrategy:
+    """Выбор уровня запроса и учет статистики для одного источника"""
+
+    def __init__(
+        self,
+        source: str,
+        tiers: Optional[List[str]] = None,
+        stats: Optional[Dict[str, Dict[str, Any]]] = None,
+        min_success_rate: float = 0.6,
+        min_samples: int = 5,
+        explore_every: int = 50,
+    ):
+        """
+        Args:
+            source: Источник
+            tiers: Допустимые уровни от дешевого к дорогому
+            stats: Сохраненная статистика по уровням
+            min_success_rate: Ниже этой доли успеха уровень пропускается
+            min_samples: Сколько попыток нужно, чтобы доверять доле успеха
+            explore_every: Каждый N-й запрос снова пробует самый дешевый уровень
+        """
+        self.source = source
+        self.tiers = [tier for tier in TIER_ORDER if tier in (tiers or TIER_ORDER)]
+        self.min_success_rate = min_success_rate
+        self.min_samples = min_samples
+        self.explore_every = max(1, explore_every)
+        self.stats: Dict[str, Dict[str, Any]] = {tier: _new_tier_stats() for tier in self.tiers}
+        for tier, tier_stats in (stats or {}).items():
+            if tier in self.stats:
+                self.stats[tier].update(tier_stats)
+        self._requests = 0
+
+    def _is_reliable(self, tier: str) -> bool:
+        """Уровень стоит пробовать: статистики мало или доля успеха достаточная"""
+        tier_stats = self.stats[tier]
+        if tier_stats['attempts'] < self.min_samples or tier_stats['success_rate'] is None:
+            return True
+        return tier_stats['success_rate'] >= self.min_success_rate
+
+    def start_tier(self) -> str:
+        """Самый дешевый уровень, который сейчас работает"""
+        for tier in self.tiers:
+            if self._is_reliable(tier):
+                return tier
+        return self.tiers[-1]
+
+    def tier_plan(self) -> List[str]:
+        """Уровни для одного запроса: от стартового и выше"""
+        self._requests += 1
+        if self._requests % self.explore_every == 0:
+            # Периодически проверяем, не заработал ли снова дешевый уровень
+            return list(self.tiers)
+        start = self.tiers.index(self.start_tier())
+        return self.tiers[start:]
+
+    def params_for(self, tier: str) -> Dict[str, str]:
+        return dict(TIERS[tier]['params'])
+
+    def record(self, tier: str, success: bool, latency: float) -> None:
+        tier_stats = self.stats[tier]
+        tier_stats['attempts'] += 1
+        tier_stats['successes'] += int(success)
+        tier_stats['latency_seconds'] += latency
+        tier_stats['credits'] += TIERS[tier]['credits']
+        previous = tier_stats['success_rate']
+        value = 1.0 if success else 0.0
+        tier_stats['success_rate'] = value if previous is None else (
+            previous + SUCCESS_EWMA_ALPHA * (value - previous)
+        )
+
+    def record_listings(self, tier: Optional[str], count: int) -> None:
+        """Сколько объявлений получено с ответов этого уровня (для кредитов на объявление)"""
+        if tier in self.stats and count > 0:
+            self.stats[tier]['listings'] += count
+
+    async def fetch(
+        self,
+        request: Callable[[Dict[str, str]], Awaitable[FetchOutcome]],
+        validate: Optional[Callable[[str], bool]] = None,
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Выполнить запрос с повышением уровня
+
+        Args:
+            request: Корутина-запрос, принимает дополнительные параметры ScraperAPI
+            validate: Проверка, что в ответе есть нужные данные
+
+        Returns:
+            (html, уровень) или (None, None)
+        """
+        plan = self.tier_plan()
+        for i, tier in enumerate(plan):
+            started = time.monotonic()
+            outcome = await request(self.params_for(tier))
+            if not outcome.sent:
+                # Выключатель отклонил запрос: кредиты не потрачены, другие уровни он тоже отклонит
+                return None, None
+            if outcome.definitive:
+                # Уровень дошел до сайта (ScraperAPI берет кредиты и за 404), но страницы нет
+                self.record(tier, True, time.monotonic() - started)
+                return None, None
+
+            html = outcome.html
+            success = bool(html) and (validate is None or validate(html))
+            self.record(tier, success, time.monotonic() - started)
+            if success:
+                return html, tier
+            if outcome.error == CIRCUIT_OPEN:
+                # Повторы уровня разомкнули выключатель - следующие уровни будут отклонены
+                return None, None
+            if i + 1 < len(plan):
+                reason = "нет данных в ответе" if html else "ошибка запроса"
+                print(f"    ⬆️ [{self.source}] {tier}: {reason}, повышаем до {plan[i + 1]}")
+        return None, None
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """Сводка по уровням: попытки, доля успеха, задержка, кредиты на объявление"""
+        report = {}
+        for tier in self.tiers:
+            tier_stats = self.stats[tier]
+            attempts = tier_stats['attempts']
+            report[tier] = {
+                'attempts': attempts,
+                'success_rate': round(tier_stats['successes'] / attempts, 3) if attempts else None,
+                'recent_success_rate': round(tier_stats['success_rate'], 3) if tier_stats['success_rate'] is not None else None,
+                'avg_latency_seconds': round(tier_stats['latency_seconds'] / attempts, 2) if attempts else None,
+                'credits': tier_stats['credits'],
+                'listings': tier_stats['listings'],
+                'credits_per_listing': round(tier_stats['credits'] / tier_stats['listings'], 2) if tier_stats['listings'] else None,
+            }
+        return report
+
+    def print_report(self) -> None:
+        print(f"🎚️ Уровни ScraperAPI [{self.source}] (старт: {self.start_tier()}):")
+        for tier, tier_report in self.report().items():
+            if not tier_report['attempts']:
+                continue
+            print(
+                f"   {tier}: {tier_report['attempts']} запросов, успех {tier_report['success_rate']:.0%}, "
+                f"{tier_report['avg_latency_seconds']}с, {tier_report['credits']} кредитов, "
+                f"кредитов на объявление: {tier_report['credits_per_listing']}"
+            )
+
+
+class FetchStrategyStore:
+    """Стратегии всех источников со статистикой в JSON-файле"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._strategies: Dict[str, FetchStrategy] = {}
+        self._saved_stats = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Не удалось прочитать статистику уровней {self.path}: {e}")
+            return {}
+
+    def get(self, source: str, tiers: Optional[List[str]] = None) -> FetchStrategy:
+        if source not in self._strategies:
+            self._strategies[source] = FetchStrategy(
+                source,
+                tiers=tiers,
+                stats=self._saved_stats.get(source),
+                min_success_rate=settings.SCRAPER_FETCH_MIN_SUCCESS_RATE,
+                min_samples=settings.SCRAPER_FETCH_MIN_SAMPLES,
+                explore_every=settings.SCRAPER_FETCH_EXPLORE_EVERY,
+            )
+        return self._strategies[source]
+
+    def save(self) -> None:
+        data = dict(self._saved_stats)
+        for source, strategy in self._strategies.items():
+            data[source] = strategy.stats
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+            self._saved_stats = data
+        except OSError as e:
+            logger.warning(f"⚠️ Не удалось сохранить статистику уровней {self.path}: {e}")
+
+    def report(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        return {
+            source: {'start_tier': strategy.start_tier(), 'tiers': strategy.report()}
+            for source, strategy in self._strategies.items()
+        }
+
+
+# Глобальное хранилище стратегий
+fetch_strategies = FetchStrategyStore(settings.SCRAPER_FETCH_STATS_PATH)
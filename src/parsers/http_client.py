@@ -0,0 +1,99 @@
+"""
+Общий HTTP клиент для всех парсеров
+
+Один aiohttp.ClientSession с настроенным TCPConnector на весь процесс воркера:
+переиспользование соединений (keep-alive), кеш DNS и TLS-сессий вместо
+нового пула на каждый скрапер или попытку запроса.
+"""
+import asyncio
+import logging
+from typing import Any, Optional
+
+import aiohttp
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_session: Optional[aiohttp.ClientSession] = None
+_session_loop: Optional[asyncio.AbstractEventLoop] = None
+# Подмена сессии (воспроизведение записанных страниц, см. src/parsers/replay.py)
+_session_override: Optional[Any] = None
+
+
+def set_http_session_override(session: Optional[Any]) -> None:
+    """
+    Подменить общую сессию объектом с интерфейсом aiohttp.ClientSession.get
+
+    Пока подмена установлена, get_http_session() возвращает ее, и все скраперы
+    ходят через нее. None - вернуть обычную сессию.
+    """
+    global _session_override
+    _session_override = session
+
+
+def build_connector() -> aiohttp.TCPConnector:
+    """Создает TCPConnector с лимитами, keep-alive и кешем DNS из настроек"""
+    return aiohttp.TCPConnector(
+        limit=settings.SCRAPER_HTTP_POOL_LIMIT,
+        limit_per_host=settings.SCRAPER_HTTP_LIMIT_PER_HOST,
+        use_dns_cache=True,
+        ttl_dns_cache=settings.SCRAPER_HTTP_DNS_TTL_SECONDS,
+        keepalive_timeout=settings.SCRAPER_HTTP_KEEPALIVE_SECONDS,
+        enable_cleanup_closed=True,
+    )
+
+
+def build_timeout(total: Optional[float] = None) -> aiohttp.ClientTimeout:
+    """
+    Таймаут запроса
+
+    Args:
+        total: Общий таймаут в секундах (по умолчанию SCRAPER_HTTP_TIMEOUT_SECONDS)
+    """
+    return aiohttp.ClientTimeout(
+        total=total if total is not None else settings.SCRAPER_HTTP_TIMEOUT_SECONDS,
+        connect=settings.SCRAPER_HTTP_CONNECT_TIMEOUT_SECONDS,
+    )
+
+
+async def get_http_session() -> aiohttp.ClientSession:
+    """
+    Получить общую сессию для текущего event loop
+
+    Сессия создается лениво и живет до close_http_session(). Если loop
+    сменился (например, синхронная обертка создала новый), создается новая
+    сессия - aiohttp не позволяет использовать сессию из чужого loop.
+    """
+    global _session, _session_loop
+
+    if _session_override is not None:
+        return _session_override
+
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        if _session is not None and not _session.closed and _session_loop is not loop:
+            logger.debug("🔁 Event loop сменился, создаем новую HTTP сессию")
+        _session = aiohttp.ClientSession(
+            connector=build_connector(),
+            timeout=build_timeout(),
+        )
+        _session_loop = loop
+        logger.info(
+            f"🌐 Создана общая HTTP сессия (limit={settings.SCRAPER_HTTP_POOL_LIMIT}, "
+            f"per_host={settings.SCRAPER_HTTP_LIMIT_PER_HOST}, dns_ttl={settings.SCRAPER_HTTP_DNS_TTL_SECONDS}s)"
+        )
+    return _session
+
+
+async def close_http_session() -> None:
+    """Закрыть общую сессию (при остановке воркера или в конце CLI-скрипта)"""
+    global _session, _session_loop
+
+    session, session_loop = _session, _session_loop
+    _session = None
+    _session_loop = None
+    # Сессию из другого (уже закрытого) loop закрыть нельзя - просто отпускаем
+    if session is not None and not session.closed and session_loop is asyncio.get_running_loop():
+        await session.close()
+        logger.info("🔌 Общая HTTP сессия закрыта")
@@ -6,33 +6,38 @@
 import asyncio
 import aiohttp
 from bs4 import BeautifulSoup
-from src.core.config import settings
 from src.parsers.description_analyzer import DescriptionAnalyzer
+from src.parsers.async_scraper import AsyncScraper
+from src.parsers.http_client import close_http_session
+from src.parsers.incremental import IncrementalCrawl
+from src.parsers.detail_cache import DetailFetchPolicy
+from src.parsers.cities import DEFAULT_CITY, search_path
 import json
 import re
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 from urllib.parse import urljoin
 
-class IdealistaScraper:
+class IdealistaScraper(AsyncScraper):
     """Параллельный парсер с ограничением одновременных запросов"""
+
+    source = 'idealista'
+    title = 'IDEALISTA'
+    base_url = "https://www.idealista.it"
+    # Уровень запроса (plain -> render -> premium -> ultra_premium) подбирается по статистике
+    adaptive_tiers = True
+    # Объявления собираются с детальных страниц, список дает только карточки
+    cards_only = True
     
-    def __init__(self, max_concurrent: int = 10, enable_geocoding: bool = False):
-        self.base_url = "https://www.idealista.it"
-        self.api_url = "https://api.scraperapi.com/"
-        self.api_key = settings.SCRAPERAPI_KEY
-        self.max_concurrent = max_concurrent  # Максимум одновременных запросов
-        self.semaphore = asyncio.Semaphore(max_concurrent)
-        self.enable_geocoding = enable_geocoding  # Для совместимости с интерфейсом
-        
-        # Статистика
-        self.stats = {
+    def __init__(self, max_concurrent: int = 10, enable_geocoding: bool = False, city: str = DEFAULT_CITY, **kwargs):
+        super().__init__(city=city, max_concurrent=max_concurrent, enable_geocoding=enable_geocoding, **kwargs)
+        self.stats.update({
             'success': 0,
             'failed': 0,
             'coords_from_html': 0,
             'coords_from_geocoding': 0,
-            'coords_not_found': 0
-        }
+            'coords_not_found': 0,
+        })
     
     def extract_area_from_features(self, features: List[str]) -> Optional[int]:
         """Извлекает площадь из features"""
@@ -132,24 +137,18 @@ class IdealistaScraper:
         
         return result
 
-    async def fetch_html(self, session: aiohttp.ClientSession, url: str) -> Optional[str]:
-        """Получает HTML через ScraperAPI с семафором для ограничения параллелизма"""
-        async with self.semaphore:  # Ограничиваем количество одновременных запросов
-            params = {
-                'api_key': self.api_key,
-                'url': url,
-                'render': 'true',
-                'ultra_premium': 'true'
-            }
-            
-            try:
-                async with session.get(self.api_url, params=params, timeout=aiohttp.ClientTimeout(total=90)) as response:
-                    if response.status == 200:
-                        return await response.text()
-                    else:
-                        return None
-            except Exception as e:
-                return None
+    @staticmethod
+    def has_list_payload(html: str) -> bool:
+        """Страница списка с карточками (а не заглушка антибота)"""
+        return 'class="item' in html
+    
+    @staticmethod
+    def has_detail_payload(html: str) -> bool:
+        """Детальная страница с основным блоком объявления"""
+        return 'main-info__title' in html
+    
+    def has_payload(self, html: str) -> bool:
+        return self.has_list_payload(html)
     
     def parse_listing_card(self, container) -> Optional[Dict[str, Any]]:
         """Парсит карточку объявления из списка"""
@@ -164,9 +163,19 @@ class IdealistaScraper:
             
             detail_url = self.base_url + title_elem['href']
             
+            # Цена из карточки - для решения, нужно ли перезагружать детальную страницу
+            price = None
+            price_elem = container.find('span', class_='item-price')
+            if price_elem:
+                numbers = re.findall(r'\d+', price_elem.get_text(strip=True).replace('.', ''))
+                if numbers:
+                    price = int(''.join(numbers))
+            
             return {
                 'external_id': f"idealista_{external_id}",
-                'url': detail_url
+                'url': detail_url,
+                'title': title_elem.get_text(strip=True),
+                'price': price
             }
         except Exception as e:
             return None
@@ -256,7 +265,7 @@ class IdealistaScraper:
                 data['external_id'] = f"idealista_{id_match.group(1)}"
             
             data['source'] = 'idealista'
-            data['city'] = 'Roma'
+            data['city'] = self.city_name
             
             # Извлечение характеристик из features
             renovation_type_from_features = None
@@ -289,7 +298,7 @@ class IdealistaScraper:
             # Анализ описания для извлечения фильтров
             if 'description' in data and data['description']:
                 # Передаем floor данные в анализатор для лучшего определения total_floors
-                analysis = DescriptionAnalyzer.analyze(
+                analysis = DescriptionAnalyzer.analyze_cached(
                     data['description'],
                     floor=data.get('floor')
                 )
@@ -318,11 +327,22 @@ class IdealistaScraper:
             print(f"❌ Ошибка парсинга: {e}")
             return None
     
-    async def scrape_single_listing(self, session: aiohttp.ClientSession, url: str, index: int, total: int) -> Optional[Dict[str, Any]]:
+    async def fetch_detail_html(self, session: aiohttp.ClientSession, url: str, use_cache: bool = True) -> Optional[str]:
+        """Детальная страница: сначала кеш на диске, потом ScraperAPI"""
+        return await super().fetch_detail_html(session, url, use_cache=use_cache, validate=self.has_detail_payload)
+    
+    async def scrape_single_listing(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        index: int,
+        total: int,
+        use_cache: bool = True
+    ) -> Optional[Dict[str, Any]]:
         """Парсит одно объявление"""
         print(f"[{index}/{total}] Запрашиваем: {url}")
         
-        html = await self.fetch_html(session, url)
+        html = await self.fetch_detail_html(session, url, use_cache=use_cache)
         
         if not html:
             self.stats['failed'] += 1
@@ -350,104 +370,75 @@ class IdealistaScraper:
     
     async def scrape_list_page(self, session: aiohttp.ClientSession, page_num: int) -> List[str]:
         """Парсит страницу списка объявлений"""
+        cards = await self.scrape_list_page_cards(session, page_num)
+        return [card['url'] for card in cards]
+    
+    def page_url(self, page_num: int) -> str:
+        city_url = f"{self.base_url}{search_path('idealista', self.city)}"
         if page_num == 1:
-            list_url = f"{self.base_url}/affitto-case/roma-roma/?ordine=pubblicazione-desc"
-        else:
-            list_url = f"{self.base_url}/affitto-case/roma-roma/lista-{page_num}.htm?ordine=pubblicazione-desc"
-        
-        print(f"\n🔄 Страница {page_num}: {list_url}")
-        
-        html = await self.fetch_html(session, list_url)
-        
-        if not html:
-            print(f"   ❌ Не удалось получить HTML")
-            return []
-        
+            return f"{city_url}?ordine=pubblicazione-desc"
+        return f"{city_url}lista-{page_num}.htm?ordine=pubblicazione-desc"
+    
+    def parse_page(self, html: str) -> List[Dict[str, Any]]:
+        """Карточки (external_id, url, цена) со страницы списка"""
         soup = BeautifulSoup(html, 'html.parser')
-        containers = soup.find_all('article', class_='item')
-        
-        print(f"   ✅ Найдено {len(containers)} объявлений")
-        
-        urls = []
-        for container in containers:
+        cards = []
+        for container in soup.find_all('article', class_='item'):
             listing_data = self.parse_listing_card(container)
             if listing_data:
-                urls.append(listing_data['url'])
-        
-        return urls
+                cards.append(listing_data)
+        return cards
     
-    async def scrape_multiple_pages(self, max_pages: int = 5):
-        """Основной метод с параллельным парсингом (совместимый интерфейс)"""
-        return await self.scrape_parallel(num_pages=max_pages)
+    async def scrape_list_page_cards(self, session: aiohttp.ClientSession, page_num: int) -> List[Dict[str, Any]]:
+        """Парсит страницу списка объявлений и возвращает карточки (external_id, url)"""
+        return await self.scrape_page(session, page_num) or []
     
-    async def scrape_parallel(self, num_pages: int = 2):
-        """Основной метод с параллельным парсингом"""
-        print("=" * 80)
-        print(f"🚀 ПАРАЛЛЕЛЬНЫЙ ПАРСИНГ IDEALISTA (до {self.max_concurrent} одновременно)")
-        print("=" * 80)
-        print(f"📄 Страниц списка: {num_pages}")
-        print("=" * 80)
-        
-        start_time = datetime.utcnow()
-        
-        async with aiohttp.ClientSession() as session:
-            # ЭТАП 1: Собираем URL со страниц списков
-            print("\n📋 ЭТАП 1: Сбор URL объявлений")
-            print("-" * 80)
-            
-            # Параллельно парсим все страницы списков
-            list_tasks = [
-                self.scrape_list_page(session, page_num)
-                for page_num in range(1, num_pages + 1)
-            ]
-            
-            list_results = await asyncio.gather(*list_tasks)
-            
-            # Объединяем все URL
-            all_urls = []
-            for urls in list_results:
-                all_urls.extend(urls)
-            
-            # Убираем дубликаты
-            all_urls = list(dict.fromkeys(all_urls))
-            
-            print(f"\n{'=' * 80}")
-            print(f"📊 ИТОГО собрано {len(all_urls)} уникальных URL")
-            print(f"{'=' * 80}")
-            
-            # ЭТАП 2: Параллельно парсим детальные страницы
-            print("\n🔍 ЭТАП 2: Параллельный парсинг детальных страниц")
-            print("-" * 80)
-            
-            # Создаем задачи для всех URL
-            detail_tasks = [
-                self.scrape_single_listing(session, url, i+1, len(all_urls))
-                for i, url in enumerate(all_urls)
-            ]
-            
-            # Запускаем все задачи параллельно
-            results = await asyncio.gather(*detail_tasks)
-            
-            # Фильтруем None
-            all_listings = [r for r in results if r is not None]
-        
-        end_time = datetime.utcnow()
-        elapsed = (end_time - start_time).total_seconds()
+    async def enrich(
+        self,
+        session: aiohttp.ClientSession,
+        cards: List[Dict[str, Any]],
+        detail_policy: Optional[DetailFetchPolicy] = None
+    ) -> List[Dict[str, Any]]:
+        """Детальные страницы карточек одной страницы списка"""
+        # Детальные страницы неизменившихся объявлений не грузим
+        refresh_urls = set()
+        if detail_policy is not None:
+            groups = detail_policy.plan(cards)
+            cards = groups['new'] + groups['changed']
+            refresh_urls = {card['url'] for card in groups['changed']}
+            self.stats['details_skipped'] += len(groups['unchanged'])
         
-        # ИТОГОВАЯ СТАТИСТИКА
-        print("\n" + "=" * 80)
-        print("📊 ИТОГОВАЯ СТАТИСТИКА")
-        print("=" * 80)
-        print(f"✅ Успешно: {self.stats['success']}")
-        print(f"❌ Ошибки: {self.stats['failed']}")
-        print(f"🌍 Координаты из HTML: {self.stats['coords_from_html']}/{self.stats['success']} ({self.stats['coords_from_html']/max(self.stats['success'],1)*100:.1f}%)")
-        print()
-        print(f"⏱️  Общее время: {elapsed:.1f} секунд")
-        print(f"⚡ Среднее время на объявление: {elapsed/len(all_urls):.1f} сек")
-        print(f"🚀 Скорость: {len(all_urls)/elapsed*60:.1f} объявлений/минуту")
+        # Для изменившихся карточек кеш устарел - идем в ScraperAPI
+        results = await asyncio.gather(*[
+            self.scrape_single_listing(session, card['url'], i + 1, len(cards), use_cache=card['url'] not in refresh_urls)
+            for i, card in enumerate(cards)
+        ])
+        return [r for r in results if r is not None]
+    
+    def report_lines(self, listings: List[Dict[str, Any]]) -> List[str]:
+        stats = self.stats
+        return [
+            f"✅ Успешно: {stats['success']}",
+            f"❌ Ошибки: {stats['failed']}",
+            f"🌍 Координаты из HTML: {stats['coords_from_html']}/{stats['success']} ({stats['coords_from_html']/max(stats['success'],1)*100:.1f}%)",
+            f"🗂️ Из кеша: {stats['detail_cache_hits']}, пропущено без изменений: {stats['details_skipped']}",
+        ]
+    
+    async def scrape_parallel(
+        self,
+        num_pages: int = 2,
+        incremental: Optional[IncrementalCrawl] = None,
+        detail_policy: Optional[DetailFetchPolicy] = None
+    ):
+        """
+        Основной метод с параллельным парсингом
         
-        return all_listings
-
+        Args:
+            num_pages: Максимум страниц списка
+            incremental: Инкрементальный режим - страницы по очереди, стоп когда нет новых
+            detail_policy: Пропуск детальных страниц объявлений, не изменившихся с прошлого прохода
+        """
+        return await self.scrape(num_pages, incremental=incremental, detail_policy=detail_policy)
 
 async def main():
     """Основная функция"""
@@ -456,13 +447,17 @@ async def main():
     parser = argparse.ArgumentParser(description='Параллельный парсер Idealista')
     parser.add_argument('--pages', type=int, default=2, help='Количество страниц (по умолчанию: 2)')
     parser.add_argument('--concurrent', type=int, default=10, help='Одновременных запросов (по умолчанию: 10)')
+    parser.add_argument('--city', default=DEFAULT_CITY, help='Город (по умолчанию: roma)')
     
     args = parser.parse_args()
     
-    scraper = IdealistaScraper(max_concurrent=args.concurrent)
+    scraper = IdealistaScraper(max_concurrent=args.concurrent, city=args.city)
     
     # Парсим
-    listings = await scraper.scrape_parallel(num_pages=args.pages)
+    try:
+        listings = await scraper.scrape_parallel(num_pages=args.pages)
+    finally:
+        await close_http_session()
     
     # Сохраняем
     if listings:
@@ -6,74 +6,52 @@
 import asyncio
 import aiohttp
 from bs4 import BeautifulSoup
-from src.core.config import settings
 from src.parsers.description_analyzer import DescriptionAnalyzer
+from src.parsers.async_scraper import AsyncScraper
+from src.parsers.http_client import close_http_session
+from src.parsers.rate_limiter import scraperapi_limiter
+from src.parsers.incremental import IncrementalCrawl
+from src.parsers import json_extract
+from src.parsers.detail_cache import DetailFetchPolicy
+from src.parsers.cities import DEFAULT_CITY, search_path
 import json
 import re
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
-class ImmobiliareScraper:
+class ImmobiliareScraper(AsyncScraper):
     """Простой парсер Immobiliare без лишних параметров"""
+
+    source = 'immobiliare'
+    title = 'IMMOBILIARE.IT'
+    base_url = "https://www.immobiliare.it"
+    # Для детальных страниц используем ultra_premium
+    DETAIL_PARAMS = {'render': 'true', 'ultra_premium': 'true'}
     
-    def __init__(self, enable_geocoding: bool = False):
-        self.base_url = "https://www.immobiliare.it"
-        self.search_url = "https://www.immobiliare.it/affitto-case/roma/?criterio=data&ordine=desc"
-        self.api_url = "https://api.scraperapi.com/"
-        self.api_key = settings.SCRAPERAPI_KEY
-        self.enable_geocoding = enable_geocoding  # Для совместимости с интерфейсом
+    def __init__(self, max_concurrent: int = 10, enable_geocoding: bool = False, city: str = DEFAULT_CITY, **kwargs):
+        super().__init__(city=city, max_concurrent=max_concurrent, enable_geocoding=enable_geocoding, **kwargs)
+        self.search_url = f"{self.base_url}{search_path('immobiliare', self.city)}?criterio=data&ordine=desc"
+        self.max_details = 0
+        self._details_budget = 0
         
-        self.stats = {
-            'list_pages_success': 0,
-            'list_pages_failed': 0,
+        self.stats.update({
             'details_success': 0,
             'details_failed': 0,
             'with_description': 0,
-            'with_coords': 0,
-        }
+        })
     
     async def fetch_html(self, session: aiohttp.ClientSession, url: str, use_simple: bool = True) -> Optional[str]:
-        """Получает HTML через ScraperAPI"""
-        if use_simple:
-            # Простой запрос - быстрый и дешевый
-            params = {
-                'api_key': self.api_key,
-                'url': url
-            }
-        else:
-            # Для детальных страниц используем ultra_premium
-            params = {
-                'api_key': self.api_key,
-                'url': url,
-                'render': 'true',
-                'ultra_premium': 'true'
-            }
-        
-        try:
-            timeout = aiohttp.ClientTimeout(total=90)
-            async with session.get(self.api_url, params=params, timeout=timeout) as response:
-                if response.status == 200:
-                    return await response.text()
-                else:
-                    print(f"    ❌ HTTP {response.status}")
-                return None
-        except asyncio.TimeoutError:
-            print(f"    ⏰ Таймаут")
-            return None
-        except Exception as e:
-            print(f"    ❌ Ошибка: {e}")
-            return None
+        """Получает HTML через ScraperAPI (простой запрос - быстрый и дешевый)"""
+        return await self.request_html(session, url, None if use_simple else self.DETAIL_PARAMS)
+    
+    async def fetch_detail_html(self, session: aiohttp.ClientSession, url: str, use_cache: bool = True) -> Optional[str]:
+        """Детальная страница: сначала кеш на диске, потом ScraperAPI (ultra_premium)"""
+        return await super().fetch_detail_html(session, url, use_cache=use_cache, params=self.DETAIL_PARAMS)
     
     def extract_next_data(self, html: str) -> Optional[Dict[str, Any]]:
-        """Извлекает данные из __NEXT_DATA__"""
+        """Извлекает данные из __NEXT_DATA__ (без полного разбора дерева)"""
         try:
-            soup = BeautifulSoup(html, 'html.parser')
-            script = soup.find('script', id='__NEXT_DATA__')
-            
-            if script and script.string:
-                return json.loads(script.string)
-            
-            return None
+            return json_extract.extract_next_data(html)
         except Exception:
             return None
     
@@ -127,7 +105,7 @@ class ImmobiliareScraper:
                     'features': [],
                     'description': '',  # Будет заполнено позже
                     'source': 'immobiliare',
-                    'city': 'Roma',
+                    'city': self.city_name,
                     'scraped_at': datetime.utcnow().isoformat()
                 }
                 
@@ -149,7 +127,7 @@ class ImmobiliareScraper:
                 
                 # Анализируем floor даже без описания
                 from src.parsers.description_analyzer import DescriptionAnalyzer
-                analysis = DescriptionAnalyzer.analyze('', floor=listing['floor'])
+                analysis = DescriptionAnalyzer.analyze_cached('', floor=listing['floor'])
                 listing['floor_number'] = analysis.get('floor_number')
                 listing['is_first_floor'] = analysis.get('is_first_floor')
                 listing['is_top_floor'] = analysis.get('is_top_floor')
@@ -277,126 +255,164 @@ class ImmobiliareScraper:
         except Exception as e:
             return None
     
-    async def scrape_multiple_pages(self, max_pages: int = 5):
-        """Основной метод с параллельным парсингом (совместимый интерфейс)"""
-        return await self.scrape_listings(num_pages=max_pages, max_details=0)
+    def page_url(self, page_num: int) -> str:
+        if page_num == 1:
+            return self.search_url
+        return f"{self.search_url}&pag={page_num}"
     
-    async def scrape_listings(self, num_pages: int = 2, max_details: int = 10):
-        """Основной метод парсинга"""
-        print("=" * 80)
-        print(f"🚀 ПАРСИНГ IMMOBILIARE.IT С ДЕТАЛЬНОЙ ИНФОРМАЦИЕЙ")
-        print("=" * 80)
-        print(f"📄 Страниц списков: {num_pages}")
-        print(f"📝 Детальных страниц: до {max_details}")
-        print("=" * 80)
+    def parse_page(self, html: str) -> List[Dict[str, Any]]:
+        return self.parse_list_page(html)
+    
+    async def scrape_detail(
+        self,
+        session: aiohttp.ClientSession,
+        listing: Dict[str, Any],
+        index: int,
+        total: int,
+        use_cache: bool = True
+    ) -> Dict[str, bool]:
+        """
+        Загружает детальную страницу и дополняет объявление описанием и анализом
         
-        start_time = datetime.utcnow()
+        Returns:
+            {'fetched': ..., 'has_description': ...} - для подсчета статистики после gather
+        """
+        detail_html = await self.fetch_detail_html(session, listing['url'], use_cache=use_cache)
         
-        async with aiohttp.ClientSession() as session:
-            # ЭТАП 1: Собираем URL со страниц списков
-            print("\n📋 ЭТАП 1: Сбор базовой информации")
-            print("-" * 80)
-            
-            all_listings = []
-            for page_num in range(1, num_pages + 1):
-                if page_num == 1:
-                    page_url = self.search_url
-                else:
-                    page_url = f"{self.search_url}&pag={page_num}"
-                
-                print(f"Страница {page_num}: {page_url}")
-                html = await self.fetch_html(session, page_url, use_simple=True)
-                
-                if html:
-                    print(f"    ✅ Получено {len(html)} символов")
-                    listings = self.parse_list_page(html)
-                    print(f"    📊 Найдено {len(listings)} объявлений")
-                    all_listings.extend(listings)
-                    self.stats['list_pages_success'] += 1
-                else:
-                    print(f"    ❌ Не удалось получить HTML")
-                    self.stats['list_pages_failed'] += 1
-            
-            print(f"\n📊 ВСЕГО: {len(all_listings)} объявлений")
-            
-            # Ограничиваем количество детальных страниц
-            listings_to_detail = all_listings[:max_details]
-            
-            # ЭТАП 2: Парсим детальные страницы
-            print("\n" + "=" * 80)
-            print(f"🔍 ЭТАП 2: Парсинг детальных страниц ({len(listings_to_detail)} шт)")
-            print("=" * 80)
-            
-            for i, listing in enumerate(listings_to_detail, 1):
-                print(f"[{i}/{len(listings_to_detail)}] {listing['url']}")
-                
-                detail_html = await self.fetch_html(session, listing['url'], use_simple=False)
-                
-                if detail_html:
-                    description = self.parse_detail_page(detail_html)
-                    
-                    if description:
-                        listing['description'] = description
-                        self.stats['with_description'] += 1
-                        print(f"    ✅ Описание: {len(description)} символов")
-                    else:
-                        print(f"    ⚠️ Описание не найдено")
-                    
-                    # Анализ описания для извлечения фильтров
-                    # Всегда вызываем анализатор, даже без описания (для этажей и других данных)
-                    analysis = DescriptionAnalyzer.analyze(description or '', floor=listing['floor'])
-                    
-                    # Используем данные из API если они уже есть, иначе из анализа описания
-                    listing['agency_commission'] = listing.get('agency_commission') or analysis.get('agency_commission')
-                    listing['renovation_type'] = listing.get('renovation_type') or analysis.get('renovation_type')
-                    listing['building_type'] = listing.get('building_type') or analysis.get('building_type')
-                    
-                    # Остальные поля всегда из анализа описания
-                    listing['pets_allowed'] = analysis.get('pets_allowed')
-                    listing['children_friendly'] = analysis.get('children_friendly')
-                    listing['year_built'] = analysis.get('year_built')
-                    listing['total_floors'] = analysis.get('total_floors')
-                    listing['floor_number'] = analysis.get('floor_number')
-                    listing['is_first_floor'] = analysis.get('is_first_floor')
-                    listing['is_top_floor'] = analysis.get('is_top_floor')
-                    listing['park_nearby'] = analysis.get('park_nearby')
-                    listing['noisy_roads_nearby'] = analysis.get('noisy_roads_nearby')
-                    
-                    self.stats['details_success'] += 1
-                else:
-                    print(f"    ❌ Не удалось получить страницу")
-                    self.stats['details_failed'] += 1
-                
-                # Статистика координат
-                if listing.get('latitude'):
-                    self.stats['with_coords'] += 1
+        if not detail_html:
+            print(f"[{index}/{total}] ❌ Не удалось получить страницу: {listing['url']}")
+            return {'fetched': False, 'has_description': False}
         
-        end_time = datetime.utcnow()
-        elapsed = (end_time - start_time).total_seconds()
+        description = self.parse_detail_page(detail_html)
         
-        # ИТОГИ
-        print("\n" + "=" * 80)
-        print("📊 ИТОГОВАЯ СТАТИСТИКА")
-        print("=" * 80)
-        print(f"📄 Страниц списков:")
-        print(f"   ✅ Успешно: {self.stats['list_pages_success']}")
-        print(f"   ❌ Ошибки: {self.stats['list_pages_failed']}")
-        print()
-        print(f"📝 Детальные страницы:")
-        print(f"   ✅ Успешно: {self.stats['details_success']}")
-        print(f"   ❌ Ошибки: {self.stats['details_failed']}")
-        print()
-        print(f"📊 Качество данных:")
-        print(f"   📝 С полным описанием: {self.stats['with_description']}/{len(listings_to_detail)}")
-        print(f"   🌍 С координатами: {self.stats['with_coords']}/{len(all_listings)}")
-        print(f"   🖼️  С изображениями: {sum(1 for l in all_listings if l.get('images'))}/{len(all_listings)}")
-        print()
-        print(f"⏱️  Общее время: {elapsed:.1f} секунд")
-        if listings_to_detail:
-            print(f"⚡ Среднее время детальной страницы: {elapsed/len(listings_to_detail):.2f} сек")
+        if description:
+            listing['description'] = description
+            print(f"[{index}/{total}] ✅ Описание: {len(description)} символов")
+        else:
+            print(f"[{index}/{total}] ⚠️ Описание не найдено: {listing['url']}")
         
-        return all_listings
-
+        # Анализ описания для извлечения фильтров
+        # Всегда вызываем анализатор, даже без описания (для этажей и других данных)
+        analysis = DescriptionAnalyzer.analyze_cached(description or '', floor=listing['floor'])
+        
+        # Используем данные из API если они уже есть, иначе из анализа описания
+        listing['agency_commission'] = listing.get('agency_commission') or analysis.get('agency_commission')
+        listing['renovation_type'] = listing.get('renovation_type') or analysis.get('renovation_type')
+        listing['building_type'] = listing.get('building_type') or analysis.get('building_type')
+        
+        # Остальные поля всегда из анализа описания
+        listing['pets_allowed'] = analysis.get('pets_allowed')
+        listing['children_friendly'] = analysis.get('children_friendly')
+        listing['year_built'] = analysis.get('year_built')
+        listing['total_floors'] = analysis.get('total_floors')
+        listing['floor_number'] = analysis.get('floor_number')
+        listing['is_first_floor'] = analysis.get('is_first_floor')
+        listing['is_top_floor'] = analysis.get('is_top_floor')
+        listing['park_nearby'] = analysis.get('park_nearby')
+        listing['noisy_roads_nearby'] = analysis.get('noisy_roads_nearby')
+        
+        return {'fetched': True, 'has_description': bool(description)}
+    
+    async def enrich(
+        self,
+        session: aiohttp.ClientSession,
+        listings: List[Dict[str, Any]],
+        detail_policy: Optional[DetailFetchPolicy] = None
+    ) -> List[Dict[str, Any]]:
+        """Детальные страницы объявлений одной страницы списка (не больше max_details за обход)"""
+        if self._details_budget <= 0:
+            return listings
+        
+        # Детальные страницы неизменившихся объявлений не грузим
+        detail_candidates = listings
+        refresh_urls = set()
+        if detail_policy is not None:
+            groups = detail_policy.plan(listings)
+            detail_candidates = groups['new'] + groups['changed']
+            refresh_urls = {listing['url'] for listing in groups['changed']}
+            self.stats['details_skipped'] += len(groups['unchanged'])
+            for listing in groups['unchanged']:
+                # Описание и данные из него уже в базе - не затираем пустыми значениями
+                for key in ('description', 'agency_commission'):
+                    listing.pop(key, None)
+                for key in ('renovation_type', 'building_type'):
+                    if listing.get(key) is None:
+                        listing.pop(key, None)
+        
+        # Ограничиваем количество детальных страниц
+        listings_to_detail = detail_candidates[:self._details_budget]
+        self._details_budget -= len(listings_to_detail)
+        
+        detail_results = await asyncio.gather(*[
+            self.scrape_detail(
+                session, listing, i, len(listings_to_detail),
+                use_cache=listing['url'] not in refresh_urls
+            )
+            for i, listing in enumerate(listings_to_detail, 1)
+        ])
+        
+        # Статистика считается по результатам, а не в порядке завершения задач
+        details_success = sum(1 for r in detail_results if r['fetched'])
+        self.stats['details_success'] += details_success
+        self.stats['details_failed'] += len(detail_results) - details_success
+        self.stats['with_description'] += sum(1 for r in detail_results if r['has_description'])
+        return listings
+    
+    def report_lines(self, listings: List[Dict[str, Any]]) -> List[str]:
+        stats = self.stats
+        return [
+            f"📝 Детальные страницы: ✅ {stats['details_success']}, ❌ {stats['details_failed']}",
+            "📊 Качество данных:",
+            f"   📝 С полным описанием: {stats['with_description']}/{stats['details_success'] + stats['details_failed']}",
+            f"   🌍 С координатами: {sum(1 for l in listings if l.get('latitude'))}/{len(listings)}",
+            f"   🖼️  С изображениями: {sum(1 for l in listings if l.get('images'))}/{len(listings)}",
+            f"   🗂️ Из кеша: {stats['detail_cache_hits']}, пропущено без изменений: {stats['details_skipped']}",
+        ]
+    
+    async def scrape(
+        self,
+        num_pages: int,
+        incremental: Optional[IncrementalCrawl] = None,
+        detail_policy: Optional[DetailFetchPolicy] = None
+    ) -> List[Dict[str, Any]]:
+        self._details_budget = self.max_details
+        return await super().scrape(num_pages, incremental=incremental, detail_policy=detail_policy)
+    
+    async def scrape_multiple_pages(
+        self,
+        max_pages: int = 5,
+        incremental: Optional[IncrementalCrawl] = None,
+        detail_policy: Optional[DetailFetchPolicy] = None
+    ):
+        """Основной метод с параллельным парсингом (совместимый интерфейс, без детальных страниц)"""
+        return await self.scrape_listings(
+            num_pages=max_pages, max_details=0, incremental=incremental, detail_policy=detail_policy
+        )
+    
+    async def scrape_listings(
+        self,
+        num_pages: int = 2,
+        max_details: int = 10,
+        incremental: Optional[IncrementalCrawl] = None,
+        detail_policy: Optional[DetailFetchPolicy] = None,
+        max_concurrent: Optional[int] = None
+    ):
+        """
+        Основной метод парсинга: страницы списков и детальные страницы грузятся параллельно
+        
+        Args:
+            num_pages: Максимум страниц списка
+            max_details: Сколько детальных страниц загрузить
+            incremental: Инкрементальный режим - стоп пагинации когда нет новых объявлений
+            detail_policy: Пропуск детальных страниц объявлений, не изменившихся с прошлого прохода
+            max_concurrent: Одновременных запросов на этот запуск (по умолчанию - из конструктора)
+        """
+        if max_concurrent is not None:
+            self.max_concurrent = max_concurrent
+            scraperapi_limiter.configure_source('immobiliare', max_concurrent=max_concurrent)
+        
+        self.max_details = max_details
+        return await self.scrape(num_pages, incremental=incremental, detail_policy=detail_policy)
 
 async def main():
     import argparse
@@ -404,11 +420,16 @@ async def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--pages', type=int, default=2, help='Страниц списков')
     parser.add_argument('--details', type=int, default=10, help='Детальных страниц')
+    parser.add_argument('--concurrent', type=int, default=10, help='Одновременных запросов (по умолчанию: 10)')
+    parser.add_argument('--city', default=DEFAULT_CITY, help='Город (по умолчанию: roma)')
     
     args = parser.parse_args()
     
-    scraper = ImmobiliareScraper()
-    listings = await scraper.scrape_listings(num_pages=args.pages, max_details=args.details)
+    scraper = ImmobiliareScraper(max_concurrent=args.concurrent, city=args.city)
+    try:
+        listings = await scraper.scrape_listings(num_pages=args.pages, max_details=args.details)
+    finally:
+        await close_http_session()
     
     if listings:
         output_file = '/tmp/immobiliare_results.json'
@@ -0,0 +1,82 @@
+"""
+Инкрементальный обход страниц списков
+
+Сайты отдают объявления от новых к старым, поэтому после последнего
+прохода новые объявления лежат в начале выдачи. Трекер сверяет внешние ID
+каждой страницы с базой (один запрос на страницу) и говорит скраперу
+остановить пагинацию, когда подряд идут страницы без новых объявлений.
+Незагруженная страница (ошибка запроса, выключатель источника) ничего не
+говорит о новизне: она учитывается отдельно и остановку не приближает.
+"""
+import logging
+from typing import Callable, Iterable, Set
+
+logger = logging.getLogger(__name__)
+
+# Функция проверки: список внешних ID -> те, что уже есть в базе
+KnownIdsLookup = Callable[[list], Set[str]]
+
+
+class IncrementalCrawl:
+    """Трекер новизны страниц для одного источника на один проход"""
+
+    def __init__(self, source: str, known_ids_lookup: KnownIdsLookup, stop_after_pages: int = 1):
+        """
+        Args:
+            source: Источник (casa_it, idealista, subito, immobiliare)
+            known_ids_lookup: Проверка ID по базе (например, crud_listing.get_existing_external_ids)
+            stop_after_pages: Сколько страниц подряд без новых объявлений до остановки
+        """
+        self.source = source
+        self.known_ids_lookup = known_ids_lookup
+        self.stop_after_pages = max(1, stop_after_pages)
+        self.consecutive_stale_pages = 0
+
+        self.stats = {
+            'pages_checked': 0,
+            'pages_failed': 0,
+            'new_ids': 0,
+            'known_ids': 0,
+            'stopped_at_page': None,
+        }
+
+    def check_page(self, page_num: int, external_ids: Iterable[str]) -> Set[str]:
+        """
+        Учесть страницу и вернуть новые (отсутствующие в базе) ID
+
+        Пустая страница считается страницей без новых объявлений
+        (незагруженная - page_failed).
+        """
+        ids = [external_id for external_id in dict.fromkeys(external_ids) if external_id]
+        try:
+            known = self.known_ids_lookup(ids) if ids else set()
+        except Exception as e:
+            # Без базы не можем решить - считаем все новыми и не останавливаемся
+            logger.error(f"❌ [{self.source}] Ошибка проверки известных ID: {e}")
+            known = set()
+
+        new_ids = {external_id for external_id in ids if external_id not in known}
+
+        self.stats['pages_checked'] += 1
+        self.stats['new_ids'] += len(new_ids)
+        self.stats['known_ids'] += len(ids) - len(new_ids)
+
+        if new_ids:
+            self.consecutive_stale_pages = 0
+        else:
+            self.consecutive_stale_pages += 1
+            if self.should_stop and self.stats['stopped_at_page'] is None:
+                self.stats['stopped_at_page'] = page_num
+
+        print(f"   🆕 Новых: {len(new_ids)}/{len(ids)} (страниц подряд без новых: {self.consecutive_stale_pages})")
+        return new_ids
+
+    def page_failed(self, page_num: int) -> None:
+        """Страница не загрузилась: новизна неизвестна, счетчик страниц без новых не меняется"""
+        self.stats['pages_failed'] += 1
+        print(f"   ⚠️ Страница {page_num} не загружена - не считается страницей без новых")
+
+    @property
+    def should_stop(self) -> bool:
+        """Пора ли прекращать пагинацию"""
+        return self.consecutive_stale_pages >= self.stop_after_pages
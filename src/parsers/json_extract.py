@@ -0,0 +1,141 @@
+"""
+Извлечение встроенного JSON из HTML без построения дерева
+
+Страницы Casa.it, Subito и Immobiliare несут все данные в одном теге script:
+- Next.js: <script id="__NEXT_DATA__" type="application/json">{...}</script>
+- Casa.it: window.__INITIAL_STATE__ = JSON.parse("...");
+
+Быстрый путь ищет маркер и вырезает JSON прямо из строки HTML.
+Полный разбор BeautifulSoup выполняется только если быстрый путь не сработал
+(изменилась разметка), поэтому результат всегда совпадает со старым способом.
+"""
+import json
+import logging
+import re
+from typing import Any, Dict, Optional
+
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+NEXT_DATA_ID = '__NEXT_DATA__'
+INITIAL_STATE_MARKER = 'window.__INITIAL_STATE__'
+JSON_PARSE_PREFIX = 'JSON.parse("'
+JSON_PARSE_SUFFIX = '");'
+
+_JSON_PARSE_RE = re.compile(r'JSON\.parse\("(.+?)"\);', re.DOTALL)
+_NEXT_DATA_TAG_RE = re.compile(r'<script\b[^>]*\bid=["\']?__NEXT_DATA__["\']?[^>]*>', re.IGNORECASE)
+
+
+def decode_json_parse_string(raw: str) -> Dict[str, Any]:
+    """Декодирует строковый литерал из JSON.parse("...") так же, как это делал CasaScraper"""
+    json_str = raw.replace('\\"', '"')
+    json_str = json_str.replace('\\/', '/')
+    json_str = json_str.encode().decode('unicode_escape')
+    return json.loads(json_str)
+
+
+# --- __NEXT_DATA__ ---
+
+def _next_data_fast(html: str) -> Optional[str]:
+    tag = _NEXT_DATA_TAG_RE.search(html)
+    if not tag:
+        return None
+    body_end = html.find('</script>', tag.end())
+    if body_end == -1:
+        return None
+    return html[tag.end():body_end]
+
+
+def _next_data_soup(html: str) -> Optional[str]:
+    soup = BeautifulSoup(html, 'html.parser')
+    script = soup.find('script', id=NEXT_DATA_ID)
+    if script and script.string:
+        return script.string
+    return None
+
+
+def extract_next_data(html: str) -> Optional[Dict[str, Any]]:
+    """
+    Данные Next.js из <script id="__NEXT_DATA__">
+
+    Raises:
+        json.JSONDecodeError: если найденный скрипт не является валидным JSON
+    """
+    if not html:
+        return None
+
+    raw = _next_data_fast(html)
+    if raw is not None and raw.strip():
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            logger.debug("⚠️ Быстрое извлечение __NEXT_DATA__ не удалось, разбираем дерево")
+
+    raw = _next_data_soup(html)
+    if raw is None:
+        return None
+    return json.loads(raw)
+
+
+# --- window.__INITIAL_STATE__ ---
+
+def _initial_state_fast(html: str) -> Optional[str]:
+    search_from = 0
+    while True:
+        marker = html.find(INITIAL_STATE_MARKER, search_from)
+        if marker == -1:
+            return None
+        search_from = marker + len(INITIAL_STATE_MARKER)
+
+        # Маркер должен быть внутри тега script
+        script_start = html.rfind('<script', 0, marker)
+        if script_start == -1 or html.rfind('</script>', script_start, marker) != -1:
+            continue
+        script_end = html.find('</script>', marker)
+        if script_end == -1:
+            return None
+
+        # Как и регулярка по тексту скрипта: первый JSON.parse(" ... "); внутри этого скрипта
+        content_start = html.find('>', script_start, marker) + 1
+        start = html.find(JSON_PARSE_PREFIX, content_start, script_end)
+        if start == -1:
+            continue
+        start += len(JSON_PARSE_PREFIX)
+        end = html.find(JSON_PARSE_SUFFIX, start + 1, script_end)
+        if end == -1:
+            continue
+        return html[start:end]
+
+
+def _initial_state_soup(html: str) -> Optional[str]:
+    soup = BeautifulSoup(html, 'html.parser')
+    for script in soup.find_all('script'):
+        if script.string and INITIAL_STATE_MARKER in script.string:
+            match = _JSON_PARSE_RE.search(script.string)
+            if match:
+                return match.group(1)
+    return None
+
+
+def extract_initial_state(html: str) -> Optional[Dict[str, Any]]:
+    """
+    Данные Casa.it из window.__INITIAL_STATE__ = JSON.parse("...")
+
+    Raises:
+        ValueError: если найденная строка не декодируется в JSON
+    """
+    if not html:
+        return None
+
+    raw = _initial_state_fast(html)
+    if raw is not None:
+        try:
+            return decode_json_parse_string(raw)
+        except ValueError:
+            logger.debug("⚠️ Быстрое извлечение __INITIAL_STATE__ не удалось, разбираем дерево")
+
+    raw = _initial_state_soup(html)
+    if raw is None:
+        return None
+    return decode_json_parse_string(raw)
@@ -0,0 +1,290 @@
+"""
+Общий адаптивный лимитер запросов к ScraperAPI
+
+Один экземпляр на процесс для всех источников:
+- token bucket ограничивает частоту запросов;
+- AIMD ограничивает число одновременных запросов: лимит медленно растет
+  на успешных ответах и умножается на коэффициент при 429/5xx/таймаутах;
+- при конкуренции слоты выдаются по весам источников (weighted fair queueing);
+- метрики по каждому источнику доступны через snapshot().
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Optional
+
+from src.core.config import settings
+from src.core.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+def _new_source_metrics() -> Dict[str, Any]:
+    return {
+        'requests': 0,
+        'success': 0,
+        'throttled': 0,
+        'server_errors': 0,
+        'client_errors': 0,
+        'timeouts': 0,
+        'errors': 0,
+        'wait_seconds': 0.0,
+        'latency_seconds': 0.0,
+    }
+
+
+class LimiterSlot:
+    """
+    Слот лимитера для одного запроса
+
+    Использование:
+        async with scraperapi_limiter.slot('casa_it') as slot:
+            ...
+            slot.report(status=response.status)
+    """
+
+    def __init__(self, limiter: 'ScraperAPILimiter', source: str):
+        self.limiter = limiter
+        self.source = source
+        self._acquired_at: Optional[float] = None
+        self._reported = False
+
+    async def __aenter__(self) -> 'LimiterSlot':
+        await self.limiter._acquire(self.source)
+        self._acquired_at = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        if not self._reported and exc_type is not None and exc_type is not asyncio.CancelledError:
+            if issubclass(exc_type, asyncio.TimeoutError):
+                self.report(error='timeout')
+            else:
+                self.report(error=exc_type.__name__)
+        self.limiter._release(self.source)
+        return False
+
+    def report(self, status: Optional[int] = None, error: Optional[str] = None) -> None:
+        """Сообщить результат запроса (HTTP статус или текст ошибки)"""
+        if self._reported:
+            return
+        self._reported = True
+        latency = time.monotonic() - self._acquired_at if self._acquired_at else 0.0
+        self.limiter._record(self.source, status=status, error=error, latency=latency)
+
+
+class ScraperAPILimiter:
+    """Token bucket + AIMD лимит одновременных запросов с весами источников"""
+
+    def __init__(
+        self,
+        max_concurrent: int = 10,
+        min_concurrent: int = 1,
+        initial_concurrent: Optional[int] = None,
+        requests_per_second: float = 5.0,
+        burst: Optional[float] = None,
+        backoff_factor: float = 0.5,
+        backoff_cooldown_seconds: float = 5.0,
+        weights: Optional[Dict[str, float]] = None,
+    ):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.min_concurrent = max(1, min(int(min_concurrent), self.max_concurrent))
+        initial = initial_concurrent if initial_concurrent is not None else self.max_concurrent
+        self.limit = float(min(max(initial, self.min_concurrent), self.max_concurrent))
+        self.backoff_factor = backoff_factor
+        self.backoff_cooldown_seconds = backoff_cooldown_seconds
+        self.bucket = TokenBucket(requests_per_second, burst)
+
+        self.in_flight = 0
+        self.decreases = 0
+        self._last_decrease = 0.0
+
+        self._weights: Dict[str, float] = dict(weights or {})
+        self._source_caps: Dict[str, int] = {}
+        self._source_in_flight: Dict[str, int] = defaultdict(int)
+        self._vtime: Dict[str, float] = defaultdict(float)
+        self._waiters: Dict[str, Deque[asyncio.Future]] = defaultdict(deque)
+        self._metrics: Dict[str, Dict[str, Any]] = defaultdict(_new_source_metrics)
+
+    @classmethod
+    def from_settings(cls) -> 'ScraperAPILimiter':
+        return cls(
+            max_concurrent=settings.SCRAPERAPI_MAX_CONCURRENT,
+            min_concurrent=settings.SCRAPERAPI_MIN_CONCURRENT,
+            initial_concurrent=settings.SCRAPERAPI_INITIAL_CONCURRENT,
+            requests_per_second=settings.SCRAPERAPI_REQUESTS_PER_SECOND,
+            burst=settings.SCRAPERAPI_BURST,
+            backoff_factor=settings.SCRAPERAPI_BACKOFF_FACTOR,
+            weights=settings.SCRAPERAPI_SOURCE_WEIGHTS,
+        )
+
+    def configure_source(
+        self,
+        source: str,
+        weight: Optional[float] = None,
+        max_concurrent: Optional[int] = None,
+    ) -> None:
+        """
+        Настроить источник
+
+        Args:
+            source: Имя источника (casa_it, idealista, subito, immobiliare)
+            weight: Приоритет при конкуренции за слоты (больше = чаще)
+            max_concurrent: Собственный потолок одновременных запросов источника
+        """
+        if weight is not None and weight > 0:
+            self._weights[source] = float(weight)
+        if max_concurrent is not None:
+            self._source_caps[source] = max(1, int(max_concurrent))
+
+    def slot(self, source: str) -> LimiterSlot:
+        return LimiterSlot(self, source)
+
+    # --- выдача слотов ---
+
+    def _weight(self, source: str) -> float:
+        return self._weights.get(source, 1.0)
+
+    def _under_cap(self, source: str) -> bool:
+        cap = self._source_caps.get(source)
+        return cap is None or self._source_in_flight[source] < cap
+
+    async def _acquire(self, source: str) -> None:
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+
+        if not self._waiters[source] and self._source_in_flight[source] == 0:
+            # Источник "просыпается": не даем ему накопленный за простой приоритет
+            active = [self._vtime[s] for s, q in self._waiters.items() if q]
+            if active:
+                self._vtime[source] = max(self._vtime[source], min(active))
+
+        self._waiters[source].append(waiter)
+        started = time.monotonic()
+        self._dispatch()
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Слот уже был выдан - возвращаем
+                self._release(source)
+            else:
+                try:
+                    self._waiters[source].remove(waiter)
+                except ValueError:
+                    pass
+            raise
+
+        # Слот получен, теперь ждем токен частоты
+        try:
+            await self.bucket.acquire()
+        except asyncio.CancelledError:
+            self._release(source)
+            raise
+        metrics = self._metrics[source]
+        metrics['requests'] += 1
+        metrics['wait_seconds'] += time.monotonic() - started
+
+    def _dispatch(self) -> None:
+        while self.in_flight < int(self.limit):
+            candidates = [s for s, q in self._waiters.items() if q and self._under_cap(s)]
+            if not candidates:
+                return
+            source = min(candidates, key=lambda s: self._vtime[s])
+            waiter = self._waiters[source].popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            self._source_in_flight[source] += 1
+            self._vtime[source] += 1.0 / self._weight(source)
+            waiter.set_result(None)
+
+    def _release(self, source: str) -> None:
+        self.in_flight = max(0, self.in_flight - 1)
+        self._source_in_flight[source] = max(0, self._source_in_flight[source] - 1)
+        self._dispatch()
+
+    # --- AIMD ---
+
+    def _record(self, source: str, status: Optional[int], error: Optional[str], latency: float) -> None:
+        metrics = self._metrics[source]
+        metrics['latency_seconds'] += latency
+
+        if error is not None:
+            if error == 'timeout':
+                metrics['timeouts'] += 1
+                self._decrease(source, 'timeout')
+            else:
+                metrics['errors'] += 1
+            return
+
+        if status == 429:
+            metrics['throttled'] += 1
+            self._decrease(source, 'HTTP 429')
+        elif status is not None and status >= 500:
+            metrics['server_errors'] += 1
+            self._decrease(source, f'HTTP {status}')
+        elif status is not None and status >= 400:
+            metrics['client_errors'] += 1
+        else:
+            metrics['success'] += 1
+            self._increase()
+
+    def _increase(self) -> None:
+        # Аддитивный рост: примерно +1 слот за "окно" из limit успешных запросов
+        previous = int(self.limit)
+        self.limit = min(float(self.max_concurrent), self.limit + 1.0 / self.limit)
+        if int(self.limit) > previous:
+            self._dispatch()
+
+    def _decrease(self, source: str, reason: str) -> None:
+        now = time.monotonic()
+        # Одна волна ошибок = одно снижение
+        if now - self._last_decrease < self.backoff_cooldown_seconds:
+            return
+        self._last_decrease = now
+        previous = self.limit
+        self.limit = max(float(self.min_concurrent), self.limit * self.backoff_factor)
+        self.decreases += 1
+        logger.warning(
+            f"⚠️ [ScraperAPI] {reason} от {source}: лимит параллельности {previous:.1f} → {self.limit:.1f}"
+        )
+
+    # --- метрики ---
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Текущее состояние лимитера и метрики по источникам"""
+        sources = {}
+        for source in sorted(set(self._metrics) | set(self._weights)):
+            metrics = self._metrics[source]
+            requests = metrics['requests']
+            sources[source] = {
+                'weight': self._weight(source),
+                'max_concurrent': self._source_caps.get(source),
+                'in_flight': self._source_in_flight[source],
+                'waiting': len(self._waiters[source]),
+                'requests': requests,
+                'success': metrics['success'],
+                'throttled': metrics['throttled'],
+                'server_errors': metrics['server_errors'],
+                'client_errors': metrics['client_errors'],
+                'timeouts': metrics['timeouts'],
+                'errors': metrics['errors'],
+                'avg_wait_seconds': round(metrics['wait_seconds'] / requests, 3) if requests else 0.0,
+                'avg_latency_seconds': round(metrics['latency_seconds'] / requests, 3) if requests else 0.0,
+            }
+
+        return {
+            'limit': round(self.limit, 2),
+            'min_concurrent': self.min_concurrent,
+            'max_concurrent': self.max_concurrent,
+            'in_flight': self.in_flight,
+            'requests_per_second': self.bucket.rate,
+            'decreases': self.decreases,
+            'sources': sources,
+        }
+
+
+# Глобальный лимитер для всех скраперов процесса
+scraperapi_limiter = ScraperAPILimiter.from_settings()
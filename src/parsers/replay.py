@@ -0,0 +1,197 @@
+"""
+Запись и воспроизведение ответов сайтов без сети
+
+FixtureStore - каталог сохраненных страниц по источникам:
+    <root>/index.json                  # целевой URL -> файл, источник, тип страницы
+    <root>/<source>/<name>.html
+
+ReplaySession - подменяет aiohttp.ClientSession в общем HTTP клиенте
+(set_http_session_override) и отдает страницы из хранилища. Запросы идут
+через ScraperAPI, поэтому страница ищется по параметру url, а не по адресу API.
+
+RecordingSession - обертка над настоящей сессией, которая сохраняет
+успешные ответы в хранилище (для пополнения фикстур).
+"""
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = 'index.json'
+
+# Источник по домену целевого URL
+SOURCE_DOMAINS = {
+    'casa.it': 'casa_it',
+    'idealista.it': 'idealista',
+    'subito.it': 'subito',
+    'immobiliare.it': 'immobiliare',
+}
+
+
+def source_for_url(url: str) -> Optional[str]:
+    host = urlparse(url).netloc.lower()
+    for domain, source in SOURCE_DOMAINS.items():
+        if host == domain or host.endswith('.' + domain):
+            return source
+    return None
+
+
+def target_url(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """Адрес страницы сайта: для запросов через ScraperAPI - параметр url"""
+    if params and params.get('url'):
+        return str(params['url'])
+    return url
+
+
+class FixtureStore:
+    """Хранилище записанных страниц"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.index: Dict[str, Dict[str, Any]] = self._load_index()
+
+    def _index_path(self) -> str:
+        return os.path.join(self.root, INDEX_FILE)
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        path = self._index_path()
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_index(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        with open(self._index_path(), 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+    def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        return self.index.get(url)
+
+    def read(self, url: str) -> Optional[str]:
+        """Сохраненная страница для URL или None"""
+        entry = self.lookup(url)
+        if not entry:
+            return None
+        with open(os.path.join(self.root, entry['file']), encoding='utf-8') as f:
+            return f.read()
+
+    def record(self, url: str, html: str, kind: str, source: Optional[str] = None, status: int = 200) -> str:
+        """Сохранить страницу и вернуть путь относительно хранилища"""
+        source = source or source_for_url(url) or 'other'
+        name = f"{kind}_{hashlib.sha256(url.encode('utf-8')).hexdigest()[:12]}.html"
+        relative = f"{source}/{name}"
+        os.makedirs(os.path.join(self.root, source), exist_ok=True)
+        with open(os.path.join(self.root, relative), 'w', encoding='utf-8') as f:
+            f.write(html)
+        self.index[url] = {'file': relative, 'source': source, 'kind': kind, 'status': status}
+        return relative
+
+    def pages(self, source: str, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Страницы источника (опционально одного типа): [{'url', 'html', 'kind'}]"""
+        pages = []
+        for url, entry in sorted(self.index.items()):
+            if entry['source'] != source or (kind and entry['kind'] != kind):
+                continue
+            with open(os.path.join(self.root, entry['file']), encoding='utf-8') as f:
+                pages.append({'url': url, 'html': f.read(), 'kind': entry['kind']})
+        return pages
+
+
+class ReplayResponse:
+    """Минимальный ответ с интерфейсом aiohttp, который используют скраперы"""
+
+    def __init__(self, url: str, status: int, body: str):
+        self.url = url
+        self.status = status
+        self._body = body
+
+    async def text(self) -> str:
+        return self._body
+
+    async def json(self) -> Any:
+        return json.loads(self._body)
+
+    async def __aenter__(self) -> 'ReplayResponse':
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        return None
+
+
+class ReplaySession:
+    """Сессия, отдающая страницы из FixtureStore (неизвестный URL - 404)"""
+
+    def __init__(self, store: FixtureStore):
+        self.store = store
+        self.closed = False
+        self.stats = {'hits': 0, 'misses': 0}
+        self.missing: List[str] = []
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None, **kwargs) -> ReplayResponse:
+        target = target_url(url, params)
+        entry = self.store.lookup(target)
+        if entry is None:
+            self.stats['misses'] += 1
+            self.missing.append(target)
+            logger.debug(f"📼 Нет записи для {target}")
+            return ReplayResponse(target, 404, 'Not Found')
+        self.stats['hits'] += 1
+        return ReplayResponse(target, entry.get('status', 200), self.store.read(target))
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+class _RecordingRequest:
+    def __init__(self, owner: 'RecordingSession', url: str, params: Optional[Dict[str, Any]], kwargs: Dict[str, Any]):
+        self.owner = owner
+        self.url = url
+        self.params = params
+        self.kwargs = kwargs
+
+    async def __aenter__(self) -> ReplayResponse:
+        target = target_url(self.url, self.params)
+        async with self.owner.session.get(self.url, params=self.params, **self.kwargs) as response:
+            body = await response.text()
+            status = response.status
+        if status == 200:
+            self.owner.store.record(target, body, kind=self.owner.kind_for(target))
+            self.owner.recorded += 1
+        return ReplayResponse(target, status, body)
+
+    async def __aexit__(self, *exc) -> None:
+        return None
+
+
+class RecordingSession:
+    """Обертка над настоящей сессией: успешные ответы сохраняются в FixtureStore"""
+
+    def __init__(self, session: aiohttp.ClientSession, store: FixtureStore):
+        self.session = session
+        self.store = store
+        self.recorded = 0
+
+    @property
+    def closed(self) -> bool:
+        return self.session.closed
+
+    @staticmethod
+    def kind_for(url: str) -> str:
+        """Тип страницы по URL: детальные страницы объявлений или списки"""
+        path = urlparse(url).path
+        if '/immobile/' in path or '/annunci/' in path or (path.endswith('.htm') and '/lista-' not in path):
+            return 'detail'
+        return 'list'
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None, **kwargs) -> _RecordingRequest:
+        return _RecordingRequest(self, url, params, kwargs)
+
+    async def close(self) -> None:
+        self.store.save_index()
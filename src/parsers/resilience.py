@@ -0,0 +1,147 @@
+"""
+Повторы запросов и автоматический выключатель по источникам
+
+backoff_delay - экспоненциальная пауза со случайным разбросом (full jitter),
+чтобы параллельные запросы после сбоя не повторялись одновременно.
+
+CircuitBreaker - после N сбоев подряд источник "размыкается": запросы
+сразу отклоняются, не тратя кредиты ScraperAPI. Через recovery_seconds
+пропускается один пробный запрос; успех замыкает цепь, сбой снова
+размыкает ее на тот же срок.
+
+classify_error - вид ошибки для статистики (таймаут, 4xx, 5xx, 429,
+сеть, разбор), общий для скраперов и сессий парсинга.
+"""
+import logging
+import random
+import time
+from typing import Any, Dict, Optional
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Виды ошибок запросов и разбора
+ERROR_KINDS = ('timeout', 'throttled', 'server_error', 'client_error', 'network', 'parse')
+
+# Ошибки, говорящие о проблеме источника или ScraperAPI, а не конкретной страницы
+BREAKER_ERROR_KINDS = {'timeout', 'throttled', 'server_error', 'network'}
+# 401/403 от ScraperAPI - ключ или кредиты: дальше будет так же
+BREAKER_CLIENT_STATUSES = {401, 403}
+
+
+def classify_error(status: Optional[int] = None, error: Optional[str] = None) -> Optional[str]:
+    """Вид ошибки по статусу ответа или исключению; None - успешный ответ"""
+    if error is not None:
+        return 'timeout' if error == 'timeout' else 'network'
+    if status is None or status < 400:
+        return None
+    if status == 429:
+        return 'throttled'
+    if status >= 500:
+        return 'server_error'
+    return 'client_error'
+
+
+def counts_for_breaker(kind: Optional[str], status: Optional[int] = None) -> bool:
+    """Учитывать ли ошибку в выключателе источника"""
+    return kind in BREAKER_ERROR_KINDS or (kind == 'client_error' and status in BREAKER_CLIENT_STATUSES)
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Пауза перед повтором attempt (с 1): случайная в [0, min(cap, base * 2^(attempt-1))]"""
+    return random.uniform(0, min(cap, base * 2 ** max(attempt - 1, 0)))
+
+
+class CircuitBreaker:
+    """Выключатель запросов одного источника: closed -> open -> half_open -> closed"""
+
+    def __init__(self, source: str, failure_threshold: int = 5, recovery_seconds: float = 120):
+        self.source = source
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_seconds = recovery_seconds
+
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+        self.stats = {'opened': 0, 'rejected': 0, 'probes': 0}
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос (в полуоткрытом состоянии - один пробный)"""
+        if self.state == 'closed':
+            return True
+        if self.state == 'open' and time.monotonic() - self.opened_at >= self.recovery_seconds:
+            self.state = 'half_open'
+            self._probe_in_flight = False
+        if self.state == 'half_open' and not self._probe_in_flight:
+            self._probe_in_flight = True
+            self.stats['probes'] += 1
+            return True
+        self.stats['rejected'] += 1
+        return False
+
+    def record_success(self) -> None:
+        if self.state != 'closed':
+            logger.info(f"🔌 [{self.source}] Источник восстановился - запросы возобновлены")
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.state == 'half_open' or (
+            self.state == 'closed' and self.consecutive_failures >= self.failure_threshold
+        ):
+            self._open()
+
+    def release(self) -> None:
+        """Запрос завершился без вердикта об источнике (например, 404 страницы)"""
+        self._probe_in_flight = False
+
+    def _open(self) -> None:
+        if self.state != 'open':
+            self.stats['opened'] += 1
+            logger.warning(
+                f"⛔ [{self.source}] {self.consecutive_failures} ошибок подряд - "
+                f"запросы приостановлены на {self.recovery_seconds:.0f}с"
+            )
+        self.state = 'open'
+        self.opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            **self.stats,
+        }
+
+
+class CircuitBreakerRegistry:
+    """Выключатели всех источников процесса"""
+
+    def __init__(self, failure_threshold: int = 5, recovery_seconds: float = 120):
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, source: str) -> CircuitBreaker:
+        if source not in self._breakers:
+            self._breakers[source] = CircuitBreaker(
+                source,
+                failure_threshold=self.failure_threshold,
+                recovery_seconds=self.recovery_seconds,
+            )
+        return self._breakers[source]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {source: breaker.snapshot() for source, breaker in self._breakers.items()}
+
+
+# Глобальные выключатели источников
+circuit_breakers = CircuitBreakerRegistry(
+    failure_threshold=settings.SCRAPER_CIRCUIT_FAILURE_THRESHOLD,
+    recovery_seconds=settings.SCRAPER_CIRCUIT_RECOVERY_SECONDS,
+)
@@ -60,7 +60,7 @@ async def main(max_pages: int = 2):
     casa_scraper = CasaScraper(max_concurrent=5, enable_geocoding=False)
     subito_scraper = SubitoScraper(enable_geocoding=False, fetch_coords=False)
     idealista_scraper = IdealistaScraper(max_concurrent=5, enable_geocoding=False)
-    immobiliare_scraper = ImmobiliareScraper(enable_geocoding=False)
+    immobiliare_scraper = ImmobiliareScraper(max_concurrent=5, enable_geocoding=False)
     scraping_service = ScrapingService()
     
     try:
@@ -5,64 +5,60 @@
 """
 import asyncio
 import aiohttp
-from bs4 import BeautifulSoup
-from src.core.config import settings
 from src.parsers.description_analyzer import DescriptionAnalyzer
+from src.parsers.async_scraper import AsyncScraper
+from src.parsers.http_client import close_http_session
+from src.parsers.rate_limiter import scraperapi_limiter
+from src.parsers.incremental import IncrementalCrawl
+from src.parsers.detail_cache import DetailFetchPolicy
+from src.parsers.coords_cache import CoordsLookup, coords_cache
+from src.parsers import json_extract
+from src.parsers.cities import DEFAULT_CITY, search_path
 import json
 import re
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 from urllib.parse import urljoin
 
-class SubitoScraper:
+class SubitoScraper(AsyncScraper):
     """Быстрый парсер Subito через JSON"""
+
+    source = 'subito'
+    title = 'SUBITO.IT'
+    base_url = "https://www.subito.it"
+    request_timeout = 120
+    # ВАЖНО: Subito требует JS-рендеринга для пагинации
+    request_params = {'render': 'true'}
     
-    def __init__(self, enable_geocoding: bool = False, fetch_coords: bool = False):
-        self.base_url = "https://www.subito.it"
+    def __init__(
+        self,
+        enable_geocoding: bool = False,
+        fetch_coords: bool = False,
+        city: str = DEFAULT_CITY,
+        max_coords_fetch: int = 20,
+        **kwargs
+    ):
+        kwargs.setdefault('max_concurrent', None)
+        super().__init__(city=city, enable_geocoding=enable_geocoding, **kwargs)
         # URL с фильтрами: advt=0 (только частные), bc указывает состояние недвижимости
-        self.search_url = "https://www.subito.it/annunci-lazio/affitto/immobili/roma/"
-        self.api_url = "https://api.scraperapi.com/"
-        self.api_key = settings.SCRAPERAPI_KEY
-        self.enable_geocoding = enable_geocoding  # Для совместимости с интерфейсом
+        self.search_url = f"{self.base_url}{search_path('subito', self.city)}"
         self.fetch_coords = fetch_coords  # Парсить координаты с детальных страниц
+        self.max_coords_fetch = max_coords_fetch  # Детальных страниц за обход
+        self._coords_budget = 0
+        # Координаты из базы на время обхода (см. scrape_multiple_pages)
+        self.coords_lookup: Optional[CoordsLookup] = None
         
-        self.stats = {
-            'success': 0,
-            'failed': 0,
+        self.stats.update({
             'with_coords': 0,
             'with_images': 0,
-        }
-    
-    async def fetch_html(self, session: aiohttp.ClientSession, url: str) -> Optional[str]:
-        """Получает HTML через ScraperAPI с рендерингом JavaScript для пагинации"""
-        params = {
-            'api_key': self.api_key,
-            'url': url,
-            'render': 'true',  # ВАЖНО: Subito требует JS-рендеринга для пагинации
-        }
-        
-        try:
-            timeout = aiohttp.ClientTimeout(total=120)
-            async with session.get(self.api_url, params=params, timeout=timeout) as response:
-                if response.status == 200:
-                    return await response.text()
-                else:
-                    print(f"    ❌ HTTP {response.status}: {await response.text()}")
-                return None
-        except Exception as e:
-            print(f"    ❌ Ошибка: {e}")
-            return None
+            'coords_known': 0,
+            'coords_fetched': 0,
+        })
     
     def extract_next_data(self, html: str) -> Optional[Dict[str, Any]]:
-        """Извлекает __NEXT_DATA__ из HTML"""
+        """Извлекает __NEXT_DATA__ из HTML (без полного разбора дерева)"""
         try:
-            soup = BeautifulSoup(html, 'html.parser')
-            script = soup.find('script', id='__NEXT_DATA__')
-            
-            if script and script.string:
-                return json.loads(script.string)
-            
-            return None
+            return json_extract.extract_next_data(html)
         except Exception as e:
             print(f"    ❌ Ошибка парсинга JSON: {e}")
             return None
@@ -252,7 +248,7 @@ class SubitoScraper:
                 'latitude': float(latitude) if latitude else None,
                 'longitude': float(longitude) if longitude else None,
                 'address': address or town,
-                'city': 'Roma',
+                'city': self.city_name,
                 'district': town,
                 'images': images,
                 'published_at': published_at,
@@ -261,7 +257,7 @@ class SubitoScraper:
             
             # Анализ описания для извлечения фильтров
             if description:
-                analysis = DescriptionAnalyzer.analyze(description, floor=floor)
+                analysis = DescriptionAnalyzer.analyze_cached(description, floor=floor)
                 
                 # Используем данные из Subito API если они есть, иначе из анализа описания
                 listing_data['agency_commission'] = agency_commission if agency_commission is not None else analysis.get('agency_commission')
@@ -349,137 +345,150 @@ class SubitoScraper:
         except Exception as e:
             return None
     
-    async def scrape_multiple_pages(self, max_pages: int = 5):
-        """Основной метод с параллельным парсингом (совместимый интерфейс)"""
-        return await self.scrape_pages(num_pages=max_pages, fetch_coords=self.fetch_coords)
+    def page_url(self, page_num: int) -> str:
+        if page_num == 1:
+            return self.search_url
+        return f"{self.search_url}?o={page_num}"
     
-    async def scrape_pages(self, num_pages: int = 2, fetch_coords: bool = False, max_coords_fetch: int = 20, coords_concurrent: int = 10):
-        """Параллельный парсинг нескольких страниц"""
-        print("=" * 80)
-        print(f"🚀 ПАРАЛЛЕЛЬНЫЙ ПАРСИНГ SUBITO.IT")
-        print("=" * 80)
-        print(f"📄 Страниц списков: {num_pages}")
-        if fetch_coords:
-            print(f"🌍 Получение координат: до {max_coords_fetch} объявлений")
-            print(f"⚡ Параллельных запросов: {coords_concurrent}")
-        print("=" * 80)
+    async def enrich(
+        self,
+        session: aiohttp.ClientSession,
+        listings: List[Dict[str, Any]],
+        detail_policy: Optional[DetailFetchPolicy] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Координаты объявлений без координат в списке
+
+        Сначала кеш координат и база, детальные страницы - только для новых
+        объявлений (не больше max_coords_fetch за обход)
+        """
+        if not self.fetch_coords:
+            return listings
+        
+        # Координаты со страницы списка запоминаем, остальные ищем в кеше и базе
+        without_coords = []
+        for listing in listings:
+            if listing.get('latitude') and listing.get('longitude'):
+                coords_cache.put(self.source, listing.get('external_id'), listing['latitude'], listing['longitude'])
+            else:
+                without_coords.append(listing)
         
-        start_time = datetime.utcnow()
+        known = coords_cache.resolve(
+            self.source, [listing.get('external_id') for listing in without_coords], self.coords_lookup
+        )
+        unknown = []
+        for listing in without_coords:
+            coords = known.get(listing.get('external_id'))
+            if coords:
+                listing['latitude'], listing['longitude'] = coords
+                self.stats['with_coords'] += 1
+                self.stats['coords_known'] += 1
+            else:
+                unknown.append(listing)
         
-        async with aiohttp.ClientSession() as session:
-            # Генерируем URLs для страниц
-            page_urls = []
-            for page_num in range(1, num_pages + 1):
-                if page_num == 1:
-                    page_urls.append(self.search_url)
-                else:
-                    page_urls.append(f"{self.search_url}?o={page_num}")
-            
-            print(f"\n📋 Загрузка {len(page_urls)} страниц...")
-            print("-" * 80)
-            
-            # Параллельная загрузка
-            tasks = [self.fetch_html(session, url) for url in page_urls]
-            htmls = await asyncio.gather(*tasks)
-            
-            # Парсинг всех страниц
-            all_listings = []
-            seen_ids = set()  # Для дедупликации
+        if not unknown or self._coords_budget <= 0:
+            return listings
+        
+        listings_to_fetch = unknown[:self._coords_budget]
+        self._coords_budget -= len(listings_to_fetch)
+        print(f"📍 Координаты: {len(known)} известны, {len(listings_to_fetch)} с детальных страниц...")
+        
+        async def fetch_and_parse_coords(listing, index):
+            detail_html = await self.fetch_html(session, listing['url'])
             
-            for i, html in enumerate(htmls, 1):
-                if html:
-                    print(f"Страница {i}: {len(html)} символов")
-                    listings = self.parse_page(html)
-                    print(f"    ✅ Найдено {len(listings)} объявлений")
-                    
-                    # Дедупликация (временное решение для проблемы с пагинацией)
-                    unique_listings = []
-                    for listing in listings:
-                        external_id = listing.get('external_id')
-                        if external_id and external_id not in seen_ids:
-                            seen_ids.add(external_id)
-                            unique_listings.append(listing)
-                    
-                    if len(unique_listings) < len(listings):
-                        duplicates = len(listings) - len(unique_listings)
-                        print(f"    ⚠️  Пропущено {duplicates} дубликатов (проблема пагинации ScraperAPI)")
-                    
-                    all_listings.extend(unique_listings)
-                    self.stats['success'] += 1
-                else:
-                    print(f"Страница {i}: ❌ не загружена")
-                    self.stats['failed'] += 1
-            
-            # ЭТАП 2: Получение координат с детальных страниц (если включено)
-            if fetch_coords and all_listings:
-                print("\n" + "=" * 80)
-                print(f"🌍 ЭТАП 2: Параллельное получение координат")
-                print("=" * 80)
-                
-                listings_to_fetch = all_listings[:max_coords_fetch]
-                print(f"📍 Обрабатываем {len(listings_to_fetch)} объявлений параллельно...")
-                
-                # Параллельная загрузка детальных страниц
-                semaphore = asyncio.Semaphore(coords_concurrent)
+            if detail_html:
+                coords = self.parse_detail_page_for_coords(detail_html)
                 
-                async def fetch_and_parse_coords(listing, index):
-                    async with semaphore:
-                        detail_html = await self.fetch_html(session, listing['url'])
-                        
-                        if detail_html:
-                            coords = self.parse_detail_page_for_coords(detail_html)
-                            
-                            if coords:
-                                listing['latitude'], listing['longitude'] = coords
-                                self.stats['with_coords'] += 1
-                                print(f"[{index}/{len(listings_to_fetch)}] ✅ {listing['title'][:40]}... → {coords[0]:.6f}, {coords[1]:.6f}")
-                                return True
-                            else:
-                                print(f"[{index}/{len(listings_to_fetch)}] ⚠️ {listing['title'][:40]}... → координаты не найдены")
-                                return False
-                        else:
-                            print(f"[{index}/{len(listings_to_fetch)}] ❌ {listing['title'][:40]}... → не загружена")
-                            return False
-                
-                # Запускаем все задачи параллельно
-                tasks = [fetch_and_parse_coords(listing, i) for i, listing in enumerate(listings_to_fetch, 1)]
-                await asyncio.gather(*tasks)
+                if coords:
+                    listing['latitude'], listing['longitude'] = coords
+                    coords_cache.put(self.source, listing.get('external_id'), *coords)
+                    self.stats['with_coords'] += 1
+                    self.stats['coords_fetched'] += 1
+                    print(f"[{index}/{len(listings_to_fetch)}] ✅ {listing['title'][:40]}... → {coords[0]:.6f}, {coords[1]:.6f}")
+                    return True
+                else:
+                    print(f"[{index}/{len(listings_to_fetch)}] ⚠️ {listing['title'][:40]}... → координаты не найдены")
+                    return False
+            else:
+                print(f"[{index}/{len(listings_to_fetch)}] ❌ {listing['title'][:40]}... → не загружена")
+                return False
+        
+        await asyncio.gather(*[fetch_and_parse_coords(listing, i) for i, listing in enumerate(listings_to_fetch, 1)])
+        return listings
+    
+    def report_lines(self, listings: List[Dict[str, Any]]) -> List[str]:
+        if not listings:
+            return []
+        total = len(listings)
         
-        end_time = datetime.utcnow()
-        elapsed = (end_time - start_time).total_seconds()
+        def share(count: int) -> str:
+            return f"{count}/{total} ({count/total*100:.0f}%)"
         
-        # ИТОГИ
-        print("\n" + "=" * 80)
-        print("📊 ИТОГОВАЯ СТАТИСТИКА")
-        print("=" * 80)
-        print(f"✅ Успешно загружено страниц: {self.stats['success']}")
-        print(f"❌ Ошибок загрузки: {self.stats['failed']}")
-        print(f"📦 Всего объявлений: {len(all_listings)}")
-        print()
-        print(f"📊 Качество данных:")
-        if all_listings:
-            print(f"   🌍 С координатами: {self.stats['with_coords']}/{len(all_listings)} ({self.stats['with_coords']/len(all_listings)*100:.0f}%)")
-            print(f"   🖼️  С изображениями: {self.stats['with_images']}/{len(all_listings)} ({self.stats['with_images']/len(all_listings)*100:.0f}%)")
+        return [
+            "📊 Качество данных:",
+            f"   🌍 С координатами: {share(self.stats['with_coords'])}",
+            f"   🖼️  С изображениями: {share(self.stats['with_images'])}",
+            f"   🗂️ Координаты из кеша/базы: {self.stats['coords_known']}, с детальных страниц: {self.stats['coords_fetched']}",
+            f"   💰 С ценой: {share(sum(1 for l in listings if l.get('price')))}",
+            f"   🚪 С комнатами: {share(sum(1 for l in listings if l.get('rooms')))}",
+            f"   📐 С площадью: {share(sum(1 for l in listings if l.get('area_sqm')))}",
+            f"   📝 С описанием: {share(sum(1 for l in listings if l.get('description')))}",
+        ]
+    
+    async def scrape(
+        self,
+        num_pages: int,
+        incremental: Optional[IncrementalCrawl] = None,
+        detail_policy: Optional[DetailFetchPolicy] = None
+    ) -> List[Dict[str, Any]]:
+        self._coords_budget = self.max_coords_fetch if self.fetch_coords else 0
+        try:
+            return await super().scrape(num_pages, incremental=incremental, detail_policy=detail_policy)
+        finally:
+            coords_cache.save()
+    
+    async def scrape_multiple_pages(
+        self,
+        max_pages: int = 5,
+        incremental: Optional[IncrementalCrawl] = None,
+        detail_policy: Optional[DetailFetchPolicy] = None,
+        coords_lookup: Optional[CoordsLookup] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Основной метод (совместимый интерфейс ScrapingService)
         
-        # Статистика других полей
-        if all_listings:
-            with_price = sum(1 for l in all_listings if l.get('price'))
-            with_rooms = sum(1 for l in all_listings if l.get('rooms'))
-            with_area = sum(1 for l in all_listings if l.get('area_sqm'))
-            with_description = sum(1 for l in all_listings if l.get('description'))
-            
-            print(f"   💰 С ценой: {with_price}/{len(all_listings)} ({with_price/len(all_listings)*100:.0f}%)")
-            print(f"   🚪 С комнатами: {with_rooms}/{len(all_listings)} ({with_rooms/len(all_listings)*100:.0f}%)")
-            print(f"   📐 С площадью: {with_area}/{len(all_listings)} ({with_area/len(all_listings)*100:.0f}%)")
-            print(f"   📝 С описанием: {with_description}/{len(all_listings)} ({with_description/len(all_listings)*100:.0f}%)")
-        print()
-        print(f"⏱️  Общее время: {elapsed:.1f} секунд")
-        if all_listings:
-            print(f"⚡ Скорость: {len(all_listings)/elapsed*60:.1f} объявлений/минуту")
-            print(f"📈 Среднее время: {elapsed/len(all_listings):.2f} сек/объявление")
+        Args:
+            coords_lookup: Координаты уже сохраненных объявлений из базы
+        """
+        self.coords_lookup = coords_lookup
+        try:
+            return await self.scrape(max_pages, incremental=incremental, detail_policy=detail_policy)
+        finally:
+            self.coords_lookup = None
+    
+    async def scrape_pages(
+        self,
+        num_pages: int = 2,
+        fetch_coords: bool = False,
+        max_coords_fetch: int = 20,
+        coords_concurrent: int = 10,
+        incremental: Optional[IncrementalCrawl] = None
+    ):
+        """
+        Параллельный парсинг нескольких страниц
         
-        return all_listings
-
+        Args:
+            fetch_coords: Догружать координаты с детальных страниц
+            max_coords_fetch: Максимум детальных страниц за обход
+            coords_concurrent: Параллельных запросов (потолок - в общем лимитере)
+            incremental: Инкрементальный режим - страницы по очереди, стоп когда нет новых
+        """
+        self.fetch_coords = fetch_coords
+        self.max_coords_fetch = max_coords_fetch
+        if fetch_coords:
+            self.max_concurrent = coords_concurrent
+            scraperapi_limiter.configure_source('subito', max_concurrent=coords_concurrent)
+        return await self.scrape(num_pages, incremental=incremental)
 
 async def main():
     import argparse
@@ -489,16 +498,20 @@ async def main():
     parser.add_argument('--coords', action='store_true', help='Получить координаты с детальных страниц')
     parser.add_argument('--max-coords', type=int, default=20, help='Максимум объявлений для получения координат')
     parser.add_argument('--concurrent', type=int, default=10, help='Параллельных запросов для координат (default: 10)')
+    parser.add_argument('--city', default=DEFAULT_CITY, help='Город (по умолчанию: roma)')
     
     args = parser.parse_args()
     
-    scraper = SubitoScraper()
-    listings = await scraper.scrape_pages(
-        num_pages=args.pages,
-        fetch_coords=args.coords,
-        max_coords_fetch=args.max_coords,
-        coords_concurrent=args.concurrent
-    )
+    scraper = SubitoScraper(city=args.city)
+    try:
+        listings = await scraper.scrape_pages(
+            num_pages=args.pages,
+            fetch_coords=args.coords,
+            max_coords_fetch=args.max_coords,
+            coords_concurrent=args.concurrent
+        )
+    finally:
+        await close_http_session()
     
     if listings:
         output_file = '/tmp/subito_results.json'
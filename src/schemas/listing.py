@@ -49,6 +49,7 @@ class ListingBase(BaseModel):
     year_built: Optional[int] = None
     park_nearby: Optional[bool] = None
     noisy_roads_nearby: Optional[bool] = None
+    analyzer_version: Optional[int] = None
 
 
 class ListingCreate(ListingBase):
@@ -0,0 +1,202 @@
+"""
+Переанализ сохраненных описаний при смене правил DescriptionAnalyzer
+
+Объявления в базе хранят поля фильтров (животные, ремонт, этажи...),
+посчитанные той версией правил, которая была при парсинге. Задача идет
+по объявлениям с описанием пачками по возрастанию id, разбирает пачку
+через DescriptionAnalyzer.analyze_many (промахи кеша - в пуле процессов)
+и записывает одним bulk-обновлением только изменившиеся поля, а версию
+правил - для всей пачки. После каждой пачки последний id сохраняется в
+файл: прерванный запуск продолжается с того же места.
+"""
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from src.core.config import settings
+from src.crud.crud_listing import ANALYZED_FIELDS, listing as crud_listing
+from src.db.database import SessionLocal
+from src.parsers.description_analyzer import DescriptionAnalyzer
+
+logger = logging.getLogger(__name__)
+
+# Поля, в которых скрапер предпочитает структурированные данные источника
+# анализу описания: сохраненное значение могло прийти со страницы, поэтому
+# переанализ только заполняет их, если они пустые
+SOURCE_PREFERRED_FIELDS = {
+    'subito': {'agency_commission', 'renovation_type', 'building_type'},
+    'immobiliare': {'agency_commission', 'renovation_type', 'building_type'},
+    'idealista': {'renovation_type', 'building_type', 'floor_number', 'is_first_floor', 'is_top_floor'},
+    'casa_it': {'agency_commission'},
+}
+
+
+def reanalyzed_changes(row: Any, analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """Поля объявления, которые меняет новый результат анализа"""
+    preferred = SOURCE_PREFERRED_FIELDS.get(row.source, set())
+    changes = {}
+    for field in ANALYZED_FIELDS:
+        current = getattr(row, field)
+        value = analysis.get(field)
+        if field in preferred and current is not None:
+            continue
+        if value != current:
+            changes[field] = value
+    return changes
+
+
+class AnalysisBackfill:
+    """Возобновляемый переанализ описаний объявлений"""
+
+    def __init__(
+        self,
+        chunk_size: int = 500,
+        workers: Optional[int] = None,
+        checkpoint_path: Optional[str] = None,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ):
+        """
+        Args:
+            chunk_size: Объявлений в пачке (одно чтение и одна запись)
+            workers: Процессов для анализа (None - из настроек DescriptionAnalyzer)
+            checkpoint_path: Файл с прогрессом (None - без сохранения прогресса)
+            session_factory: Фабрика сессий БД
+        """
+        self.chunk_size = max(1, chunk_size)
+        self.workers = workers
+        self.checkpoint_path = checkpoint_path
+        self.session_factory = session_factory
+        self.version = DescriptionAnalyzer.RULES_VERSION
+
+        self.stats = {'chunks': 0, 'processed': 0, 'changed': 0, 'fields': {}}
+
+    @classmethod
+    def from_settings(cls, **kwargs) -> 'AnalysisBackfill':
+        kwargs.setdefault('chunk_size', settings.ANALYSIS_BACKFILL_CHUNK_SIZE)
+        kwargs.setdefault('checkpoint_path', settings.ANALYSIS_BACKFILL_CHECKPOINT_PATH)
+        return cls(**kwargs)
+
+    def load_checkpoint(self, force: bool = False) -> int:
+        """Последний обработанный id для текущей версии правил и режима (0 - с начала)"""
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return 0
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Не удалось прочитать прогресс переанализа {self.checkpoint_path}: {e}")
+            return 0
+        # Прогресс другой версии правил не подходит: все нужно проверить заново
+        if checkpoint.get('rules_version') != self.version or checkpoint.get('force', False) != force:
+            return 0
+        # Завершенная полная проверка повторяется целиком
+        if force and checkpoint.get('completed'):
+            return 0
+        return int(checkpoint.get('last_id') or 0)
+
+    def save_checkpoint(self, last_id: int, force: bool = False, completed: bool = False) -> None:
+        if not self.checkpoint_path:
+            return
+        directory = os.path.dirname(self.checkpoint_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        checkpoint = {
+            'rules_version': self.version,
+            'last_id': last_id,
+            'force': force,
+            'completed': completed,
+            'processed': self.stats['processed'],
+            'changed': self.stats['changed'],
+            'updated_at': datetime.now(timezone.utc).isoformat(),
+        }
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def process_chunk(self, db: Session, rows: List[Any], dry_run: bool = False) -> int:
+        """Переанализ пачки; возвращает число изменившихся объявлений"""
+        analyses = DescriptionAnalyzer.analyze_many(
+            ((row.description, {'floor': row.floor}) for row in rows),
+            workers=self.workers,
+        )
+        changes = []
+        for row, analysis in zip(rows, analyses):
+            row_changes = reanalyzed_changes(row, analysis)
+            if row_changes:
+                changes.append({'id': row.id, **row_changes})
+                for field in row_changes:
+                    self.stats['fields'][field] = self.stats['fields'].get(field, 0) + 1
+
+        if not dry_run:
+            crud_listing.bulk_update_analysis(
+                db, changes=changes, ids=[row.id for row in rows], version=self.version
+            )
+        return len(changes)
+
+    def run(
+        self,
+        limit: Optional[int] = None,
+        force: bool = False,
+        dry_run: bool = False,
+        restart: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Переанализ объявлений с описанием
+
+        Args:
+            limit: Максимум объявлений за запуск
+            force: Проверить все объявления, а не только со старой версией правил
+            dry_run: Только посчитать изменения, ничего не записывая
+            restart: Начать с начала, игнорируя сохраненный прогресс
+        """
+        started = time.monotonic()
+        last_id = 0 if restart or dry_run else self.load_checkpoint(force)
+        if last_id:
+            logger.info(f"⏩ Переанализ продолжается с id > {last_id}")
+
+        db = self.session_factory()
+        completed = False
+        try:
+            while limit is None or self.stats['processed'] < limit:
+                size = self.chunk_size if limit is None else min(self.chunk_size, limit - self.stats['processed'])
+                rows = crud_listing.get_analysis_chunk(
+                    db,
+                    after_id=last_id,
+                    limit=size,
+                    below_version=None if force else self.version,
+                )
+                if not rows:
+                    completed = True
+                    break
+
+                changed = self.process_chunk(db, rows, dry_run=dry_run)
+                last_id = rows[-1].id
+                self.stats['chunks'] += 1
+                self.stats['processed'] += len(rows)
+                self.stats['changed'] += changed
+                if not dry_run:
+                    self.save_checkpoint(last_id, force=force)
+
+                logger.info(
+                    f"🔁 Переанализ: {self.stats['processed']} объявлений, "
+                    f"{self.stats['changed']} изменилось (id до {last_id})"
+                )
+        finally:
+            db.close()
+
+        if completed and not dry_run:
+            self.save_checkpoint(last_id, force=force, completed=True)
+
+        return {
+            **self.stats,
+            'rules_version': self.version,
+            'last_id': last_id,
+            'completed': completed,
+            'elapsed_seconds': round(time.monotonic() - started, 1),
+        }
@@ -0,0 +1,195 @@
+"""
+Планировщик обхода по спросу
+
+Строит задачи (источник × город × глубина пагинации) из активных фильтров
+пользователей: бюджет кредитов ScraperAPI на цикл делится между городами
+пропорционально числу активных фильтров, чтобы свежие данные появлялись
+там, где есть подписчики, а не только в Риме.
+"""
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from src.core.config import settings
+from src.crud.crud_filter import filter as crud_filter
+from src.parsers.cities import DEFAULT_CITY, normalize_city
+from src.parsers.fetch_strategy import TIERS, fetch_strategies
+
+logger = logging.getLogger(__name__)
+
+SOURCES = ('casa_it', 'subito', 'idealista', 'immobiliare')
+
+# Запросов на одну страницу списка и уровень ScraperAPI по умолчанию.
+# Idealista грузит детальную страницу для каждой карточки (~30 на странице).
+PAGE_REQUESTS = {
+    'casa_it': (1, 'plain'),
+    'subito': (1, 'render'),
+    'idealista': (31, 'plain'),
+    'immobiliare': (1, 'plain'),
+}
+# Источники, у которых уровень подбирается по статистике (src/parsers/fetch_strategy.py)
+ADAPTIVE_SOURCES = {'casa_it', 'idealista'}
+
+
+def page_credits(source: str) -> int:
+    """Оценка кредитов ScraperAPI на одну страницу списка источника"""
+    requests, tier = PAGE_REQUESTS[source]
+    if source in ADAPTIVE_SOURCES:
+        tier = fetch_strategies.get(source).start_tier()
+    return requests * TIERS[tier]['credits']
+
+
+class CrawlPlanner:
+    """Распределение бюджета ScraperAPI между городами по спросу"""
+
+    def __init__(
+        self,
+        budget_credits: Optional[int] = None,
+        max_pages: int = 10,
+        min_pages: int = 1,
+        max_cities: int = 10,
+        default_city: str = DEFAULT_CITY,
+        sources: Sequence[str] = SOURCES,
+    ):
+        """
+        Args:
+            budget_credits: Кредитов на цикл (None - как у прежнего обхода одного города на max_pages)
+            max_pages: Максимальная глубина пагинации одной задачи
+            min_pages: Минимальная глубина для города, попавшего в план
+            max_cities: Сколько городов с наибольшим спросом брать в план
+            default_city: Город, который обходится всегда (исторические данные)
+            sources: Источники
+        """
+        self.budget_credits = budget_credits
+        self.max_pages = max(1, max_pages)
+        self.min_pages = max(1, min(min_pages, self.max_pages))
+        self.max_cities = max(1, max_cities)
+        self.default_city = default_city
+        self.sources = list(sources)
+
+    @classmethod
+    def from_settings(cls) -> 'CrawlPlanner':
+        return cls(
+            budget_credits=settings.SCRAPER_CRAWL_BUDGET_CREDITS or None,
+            max_pages=settings.SCRAPER_WORKER_MAX_PAGES,
+            min_pages=settings.SCRAPER_CRAWL_MIN_PAGES,
+            max_cities=settings.SCRAPER_CRAWL_MAX_CITIES,
+        )
+
+    def depth_credits(self) -> int:
+        """Кредитов на одну страницу в каждом источнике (одна единица глубины города)"""
+        return sum(page_credits(source) for source in self.sources)
+
+    def get_demand(self, db: Session) -> Dict[str, int]:
+        """Спрос по городам: число активных фильтров, написания города сведены к одному slug"""
+        demand: Dict[str, int] = {}
+        unsupported = []
+        for city, count in crud_filter.get_popular_cities(db, limit=100):
+            slug = normalize_city(city)
+            if slug is None:
+                unsupported.append(city)
+                continue
+            demand[slug] = demand.get(slug, 0) + count
+
+        if unsupported:
+            logger.info(f"🗺️ Города без поддержки на сайтах-источниках: {', '.join(sorted(set(unsupported)))}")
+
+        # Город по умолчанию обходится всегда, даже без фильтров
+        demand.setdefault(self.default_city, 0)
+        demand[self.default_city] = max(demand[self.default_city], 1)
+        return demand
+
+    def allocate(self, demand: Dict[str, int]) -> Dict[str, int]:
+        """
+        Глубина пагинации по городам
+
+        Каждый город получает min_pages, остаток бюджета делится пропорционально
+        спросу (метод наибольших остатков) с потолком max_pages. Если бюджета не
+        хватает на минимум для всех, отбрасываются города с наименьшим спросом.
+        """
+        ranked = sorted(
+            ((city, count) for city, count in demand.items() if count > 0),
+            key=lambda item: (-item[1], item[0])
+        )[:self.max_cities]
+        if not ranked:
+            return {}
+
+        budget = self.budget_credits
+        if budget is None:
+            budget = self.max_pages * self.depth_credits()
+        total_depth = int(budget // max(1, self.depth_credits()))
+
+        ranked = ranked[:max(1, total_depth // self.min_pages)]
+        depths = {city: self.min_pages for city, _ in ranked}
+        remaining = total_depth - self.min_pages * len(ranked)
+
+        while remaining > 0:
+            open_cities = [(city, count) for city, count in ranked if depths[city] < self.max_pages]
+            if not open_cities:
+                break
+            total_demand = sum(count for _, count in open_cities)
+            shares = {city: remaining * count / total_demand for city, count in open_cities}
+
+            granted = 0
+            for city, share in shares.items():
+                add = min(int(share), self.max_pages - depths[city])
+                depths[city] += add
+                granted += add
+
+            if granted == 0:
+                # Остаток меньше числа городов - по странице тем, у кого больше дробная часть
+                by_remainder = sorted(shares, key=lambda city: shares[city] - int(shares[city]), reverse=True)
+                for city in by_remainder[:remaining]:
+                    depths[city] += 1
+                    granted += 1
+            remaining -= granted
+
+        return depths
+
+    def plan(self, demand: Dict[str, int]) -> List[Dict[str, Any]]:
+        """Задачи обхода: [{'source', 'city', 'max_pages', 'demand', 'estimated_credits'}]"""
+        tasks = []
+        for city, depth in self.allocate(demand).items():
+            for source in self.sources:
+                tasks.append({
+                    'source': source,
+                    'city': city,
+                    'max_pages': depth,
+                    'demand': demand.get(city, 0),
+                    'estimated_credits': depth * page_credits(source),
+                })
+        return tasks
+
+    def build_plan(self, db: Session) -> List[Dict[str, Any]]:
+        """План на цикл по текущему спросу из базы"""
+        try:
+            demand = self.get_demand(db)
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения спроса по городам: {e}")
+            demand = {self.default_city: 1}
+
+        tasks = self.plan(demand)
+        self.log_plan(tasks)
+        return tasks
+
+    @staticmethod
+    def summary(tasks: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Сводка плана по городам"""
+        cities: Dict[str, Dict[str, Any]] = {}
+        for task in tasks:
+            city = cities.setdefault(task['city'], {'demand': task['demand'], 'max_pages': task['max_pages'], 'credits': 0})
+            city['credits'] += task['estimated_credits']
+        return cities
+
+    def log_plan(self, tasks: List[Dict[str, Any]]) -> None:
+        total = sum(task['estimated_credits'] for task in tasks)
+        logger.info(f"🗺️ План обхода: {len(tasks)} задач, ~{total} кредитов ScraperAPI")
+        for city, info in self.summary(tasks).items():
+            logger.info(
+                f"   📍 {city}: фильтров {info['demand']}, глубина {info['max_pages']} стр., ~{info['credits']} кредитов"
+            )
+
+
+# Глобальный планировщик
+crawl_planner = CrawlPlanner.from_settings()
@@ -0,0 +1,227 @@
+"""
+Очередь задач обхода для нескольких реплик воркера парсинга
+
+Задачи плана (источник × город × глубина) лежат в таблице crawl_tasks.
+Любая реплика ставит в очередь задачи, которым пора обходиться (пара,
+уже стоящая в очереди или обойденная за текущий интервал, не дублируется),
+и забирает их в аренду пачками.
+Пока задача выполняется, аренда продлевается heartbeat'ом; если реплика
+упала, аренда истекает и задачу забирает другая. Ошибка задачи - повтор
+с экспоненциальной задержкой до max_attempts.
+"""
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from src.core.config import settings
+from src.crud.crud_crawl_task import crawl_task as crud_crawl_task
+from src.db.database import SessionLocal
+from src.db.models import CrawlTask
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_id() -> str:
+    """Имя реплики: хост и PID"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class CrawlQueue:
+    """Распределение задач обхода между репликами через аренду в БД"""
+
+    def __init__(
+        self,
+        worker_id: Optional[str] = None,
+        lease_seconds: int = 600,
+        heartbeat_seconds: int = 60,
+        batch_size: int = 8,
+        max_attempts: int = 3,
+        retry_delay_seconds: int = 300,
+        retention_days: int = 7,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ):
+        """
+        Args:
+            worker_id: Имя реплики (по умолчанию хост и PID)
+            lease_seconds: Срок аренды задачи без heartbeat
+            heartbeat_seconds: Как часто продлевать аренду
+            batch_size: Сколько задач реплика берет за раз (выполняются параллельно)
+            max_attempts: Попыток на задачу
+            retry_delay_seconds: Задержка перед первым повтором (дальше удваивается)
+            retention_days: Сколько хранить завершенные задачи
+            session_factory: Фабрика сессий БД для heartbeat
+        """
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = max(1, min(heartbeat_seconds, lease_seconds // 3 or 1))
+        self.batch_size = max(1, batch_size)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay_seconds = retry_delay_seconds
+        self.retention_days = retention_days
+        self.session_factory = session_factory
+        self.stats = {'enqueued': 0, 'claimed': 0, 'done': 0, 'failed': 0, 'lost_leases': 0}
+
+    @classmethod
+    def from_settings(cls) -> 'CrawlQueue':
+        return cls(
+            worker_id=settings.SCRAPER_QUEUE_WORKER_ID or None,
+            lease_seconds=settings.SCRAPER_QUEUE_LEASE_SECONDS,
+            heartbeat_seconds=settings.SCRAPER_QUEUE_HEARTBEAT_SECONDS,
+            batch_size=settings.SCRAPER_QUEUE_BATCH_SIZE,
+            max_attempts=settings.SCRAPER_QUEUE_MAX_ATTEMPTS,
+            retry_delay_seconds=settings.SCRAPER_QUEUE_RETRY_DELAY_SECONDS,
+        )
+
+    def enqueue(
+        self,
+        db: Session,
+        tasks: List[Dict[str, Any]],
+        incremental: bool = False,
+        min_interval_seconds: Optional[int] = None,
+    ) -> int:
+        """
+        Поставить задачи в очередь, пропуская пары, которые уже ждут или выполняются
+        (и успешно обойденные за min_interval_seconds)
+        """
+        created = crud_crawl_task.enqueue(
+            db,
+            tasks=tasks,
+            incremental=incremental,
+            max_attempts=self.max_attempts,
+            min_interval_seconds=min_interval_seconds,
+        )
+        self.stats['enqueued'] += len(created)
+        if created:
+            logger.info(f"📥 В очередь обхода добавлено {len(created)} задач из {len(tasks)}")
+        return len(created)
+
+    @staticmethod
+    def as_plan_task(task: CrawlTask) -> Dict[str, Any]:
+        """Задача очереди в формате плана обхода"""
+        return {'source': task.source, 'city': task.city, 'max_pages': task.max_pages}
+
+    async def _heartbeat(self, task_ids: List[int], lost: set) -> None:
+        """Продлевать аренду задач, пока они выполняются"""
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            db = self.session_factory()
+            try:
+                for task_id in task_ids:
+                    if task_id in lost:
+                        continue
+                    if not crud_crawl_task.heartbeat(
+                        db, task_id=task_id, worker_id=self.worker_id, lease_seconds=self.lease_seconds
+                    ):
+                        lost.add(task_id)
+                        self.stats['lost_leases'] += 1
+                        logger.warning(f"⚠️ Аренда задачи обхода #{task_id} потеряна")
+            except Exception as e:
+                logger.error(f"❌ Ошибка продления аренды задач обхода: {e}")
+            finally:
+                db.close()
+
+    async def run_batch(self, scraping_service, db: Session) -> Optional[Dict[str, int]]:
+        """
+        Захватить пачку задач, выполнить и сохранить результат
+
+        Returns:
+            Статистика пачки или None, если брать нечего
+        """
+        crud_crawl_task.fail_expired(db)
+        tasks = crud_crawl_task.claim(
+            db, worker_id=self.worker_id, lease_seconds=self.lease_seconds, limit=self.batch_size
+        )
+        if not tasks:
+            return None
+        self.stats['claimed'] += len(tasks)
+        logger.info(
+            f"📤 [{self.worker_id}] Взято задач обхода: {len(tasks)} "
+            f"({', '.join(f'{task.source}/{task.city}' for task in tasks)})"
+        )
+
+        lost: set = set()
+        heartbeat = asyncio.create_task(self._heartbeat([task.id for task in tasks], lost))
+        try:
+            # Инкрементальные и полные задачи запускаются раздельно: режим общий на вызов
+            results: Dict[int, List[Dict[str, Any]]] = {}
+            for incremental in (True, False):
+                group = [task for task in tasks if task.incremental == incremental]
+                if not group:
+                    continue
+                group_results = await scraping_service.scrape_tasks(
+                    [self.as_plan_task(task) for task in group],
+                    db=db,
+                    incremental=incremental,
+                    record_ingest=True,
+                )
+                results.update({task.id: listings for task, listings in zip(group, group_results)})
+
+            listings = [listing for task in tasks for listing in results.get(task.id, [])]
+            saved = scraping_service.save_listings_to_db(listings, db) if listings else {'created': 0}
+        finally:
+            heartbeat.cancel()
+
+        batch = {'tasks': len(tasks), 'listings': len(listings), 'saved': saved['created'], 'done': 0, 'failed': 0}
+        for task in tasks:
+            if task.id in lost:
+                continue
+            found = len(results.get(task.id, []))
+            if found:
+                crud_crawl_task.complete(db, task_id=task.id, worker_id=self.worker_id, result_count=found)
+                batch['done'] += 1
+            else:
+                # Пустой обход - ошибка сайта или ScraperAPI: повторяем позже
+                crud_crawl_task.fail(
+                    db, task=task, worker_id=self.worker_id,
+                    error="no listings", retry_delay_seconds=self.retry_delay_seconds
+                )
+                batch['failed'] += 1
+        self.stats['done'] += batch['done']
+        self.stats['failed'] += batch['failed']
+        return batch
+
+    async def drain(self, scraping_service, db: Session) -> Dict[str, int]:
+        """Выполнять задачи, пока в очереди есть доступные"""
+        total = {'batches': 0, 'tasks': 0, 'listings': 0, 'saved': 0, 'done': 0, 'failed': 0}
+        while True:
+            batch = await self.run_batch(scraping_service, db)
+            if batch is None:
+                break
+            total['batches'] += 1
+            for key, value in batch.items():
+                total[key] += value
+
+        older_than = datetime.now(timezone.utc) - timedelta(days=self.retention_days)
+        crud_crawl_task.purge_finished(db, older_than=older_than)
+        return total
+
+    def snapshot(self, db: Session) -> Dict[str, Any]:
+        """Состояние очереди для API"""
+        return {
+            'worker_id': self.worker_id,
+            'counts': crud_crawl_task.get_status_counts(db),
+            'active': [
+                {
+                    'id': task.id,
+                    'source': task.source,
+                    'city': task.city,
+                    'max_pages': task.max_pages,
+                    'status': task.status,
+                    'attempts': task.attempts,
+                    'lease_owner': task.lease_owner,
+                    'lease_expires_at': task.lease_expires_at,
+                    'available_at': task.available_at,
+                }
+                for task in crud_crawl_task.get_active(db)
+            ],
+            'stats': self.stats,
+        }
+
+
+# Глобальная очередь задач обхода этой реплики
+crawl_queue = CrawlQueue.from_settings()
@@ -9,6 +9,7 @@ from typing import Optional, List
 from datetime import datetime
 
 from src.core.config import settings
+from src.services.message_cache import message_cache
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +17,9 @@ logger = logging.getLogger(__name__)
 class EmailService:
     """Сервис для отправки email уведомлений через Resend API"""
     
+    # Версия шаблона карточки объявления: увеличивать при изменении _format_listing_card_html
+    LISTING_TEMPLATE_VERSION = 1
+    
     def __init__(self):
         self.resend_token = settings.RESEND_API_TOKEN
         
@@ -193,32 +197,16 @@ class EmailService:
     
     def _format_listings_html(self, listings: List[dict], filter_name: str) -> str:
         """Форматирование объявлений в HTML формат"""
-        listings_html = []
-        
-        for listing in listings[:10]:  # Максимум 10 объявлений
-            listing_html = f"""
-            <div style="border: 1px solid #e0e0e0; border-radius: 8px; padding: 16px; margin-bottom: 16px; background-color: #ffffff;">
-                <h3 style="margin: 0 0 8px 0; color: #2563eb;">{listing.get('title', 'Без названия')}</h3>
-                <p style="margin: 4px 0; font-size: 18px; font-weight: bold; color: #1f2937;">€{listing.get('price', 'N/A')}</p>
-            """
-            
-            details = []
-            if listing.get('rooms'):
-                details.append(f"🚪 {listing.get('rooms')} комн.")
-            if listing.get('area'):
-                details.append(f"📐 {listing.get('area')} м²")
-            
-            if details:
-                listing_html += f'<p style="margin: 4px 0; color: #6b7280;">{" • ".join(details)}</p>'
-            
-            if listing.get('address'):
-                listing_html += f'<p style="margin: 4px 0; color: #6b7280;">📍 {listing.get("address")}</p>'
-            
-            if listing.get('url'):
-                listing_html += f'<p style="margin: 8px 0 0 0;"><a href="{listing.get("url")}" style="color: #2563eb; text-decoration: none;">👀 Посмотреть объявление →</a></p>'
-            
-            listing_html += "</div>"
-            listings_html.append(listing_html)
+        # Карточки объявлений одинаковы для всех получателей - из кеша прохода
+        listings_html = [
+            message_cache.get_or_render(
+                listing.get('id'),
+                'email_html',
+                lambda listing=listing: self._format_listing_card_html(listing),
+                template_version=self.LISTING_TEMPLATE_VERSION,
+            )
+            for listing in listings[:10]  # Максимум 10 объявлений
+        ]
         
         if len(listings) > 10:
             listings_html.append(f"<p style='text-align: center; color: #6b7280;'>... и еще {len(listings) - 10} объявлений</p>")
@@ -258,6 +246,32 @@ class EmailService:
         
         return html
     
+    def _format_listing_card_html(self, listing: dict) -> str:
+        """HTML карточка одного объявления"""
+        listing_html = f"""
+            <div style="border: 1px solid #e0e0e0; border-radius: 8px; padding: 16px; margin-bottom: 16px; background-color: #ffffff;">
+                <h3 style="margin: 0 0 8px 0; color: #2563eb;">{listing.get('title', 'Без названия')}</h3>
+                <p style="margin: 4px 0; font-size: 18px; font-weight: bold; color: #1f2937;">€{listing.get('price', 'N/A')}</p>
+            """
+        
+        details = []
+        if listing.get('rooms'):
+            details.append(f"🚪 {listing.get('rooms')} комн.")
+        if listing.get('area'):
+            details.append(f"📐 {listing.get('area')} м²")
+        
+        if details:
+            listing_html += f'<p style="margin: 4px 0; color: #6b7280;">{" • ".join(details)}</p>'
+        
+        if listing.get('address'):
+            listing_html += f'<p style="margin: 4px 0; color: #6b7280;">📍 {listing.get("address")}</p>'
+        
+        if listing.get('url'):
+            listing_html += f'<p style="margin: 8px 0 0 0;"><a href="{listing.get("url")}" style="color: #2563eb; text-decoration: none;">👀 Посмотреть объявление →</a></p>'
+        
+        listing_html += "</div>"
+        return listing_html
+    
     async def send_test_email(self, to_email: str) -> bool:
         """
         Отправка тестового email
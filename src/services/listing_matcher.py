@@ -0,0 +1,299 @@
+"""
+Обратный подбор: новые объявления -> подходящие фильтры
+
+Вместо поиска объявлений для каждого фильтра (запрос в БД на фильтр)
+фильтры один раз раскладываются в индекс в памяти: по городу, а внутри
+города - по корзинам диапазонов цены, комнат и площади. Для объявления
+берутся фильтры его корзин (пересечение трех множеств), и только они
+проверяются точно (matches_search_params - те же условия, что у
+crud_listing.search, поэтому подбор по индексу и поиск по фильтру дают
+одинаковый результат). Работа пропорциональна числу новых объявлений,
+а не фильтров.
+
+Там, где поиск по фильтру остается (первый запуск, отладка), одинаковые
+по смыслу фильтры разных пользователей ищутся один раз за цикл
+(SharedFilterSearch), а уже отправленные исключаются для каждого отдельно.
+"""
+import logging
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from src.crud.crud_filter import filter as crud_filter
+from src.crud.crud_listing import listing as crud_listing
+from src.crud.crud_sent_notification import sent_notification as crud_sent_notification
+from src.db.models import Filter, Listing
+
+logger = logging.getLogger(__name__)
+
+# Поля объявления, которые проверяет matches_search_params
+MATCH_FIELDS = ('city', 'price', 'rooms', 'area', 'property_type')
+
+# Диапазоны фильтра: поле объявления -> (нижняя граница, верхняя граница)
+RANGE_FIELDS = {
+    'price': ('min_price', 'max_price'),
+    'rooms': ('min_rooms', 'max_rooms'),
+    'area': ('min_area', 'max_area'),
+}
+
+
+def filter_search_params(filter_obj: Filter) -> Dict[str, Any]:
+    """Параметры crud_listing.search для фильтра (без пустых значений)"""
+    search_params = {
+        "city": filter_obj.city,
+        "min_price": filter_obj.min_price,
+        "max_price": filter_obj.max_price,
+        "property_type": filter_obj.property_type,
+        "min_rooms": filter_obj.min_rooms,
+        "max_rooms": filter_obj.max_rooms,
+        "min_area": filter_obj.min_area,
+        "max_area": filter_obj.max_area,
+    }
+    return {k: v for k, v in search_params.items() if v is not None}
+
+
+def matches_search_params(search_params: Dict[str, Any], listing_data: Dict[str, Any]) -> bool:
+    """
+    Подходит ли объявление под параметры поиска - так же, как в
+    crud_listing._filtered_query: город - подстрока без учета регистра,
+    тип - точное совпадение, а заданная граница диапазона не пропускает
+    объявление без значения (NULL в SQL не проходит сравнение)
+    """
+    city = search_params.get('city')
+    if city:
+        listing_city = listing_data.get('city')
+        if not listing_city or city.lower() not in listing_city.lower():
+            return False
+
+    property_type = search_params.get('property_type')
+    if property_type and listing_data.get('property_type') != property_type:
+        return False
+
+    for field, (low_key, high_key) in RANGE_FIELDS.items():
+        value = listing_data.get(field)
+        low = search_params.get(low_key)
+        high = search_params.get(high_key)
+        if low is not None and (value is None or value < low):
+            return False
+        if high is not None and (value is None or value > high):
+            return False
+    return True
+
+
+class RangeBuckets:
+    """
+    Фильтры по корзинам одного диапазона (цена, комнаты, площадь)
+
+    Фильтр [low, high] попадает во все корзины от low до high (пустая или
+    нулевая граница раскладывается как открытая - кандидатов не меньше
+    точных совпадений). Значения выше max_value попадают в последнюю корзину.
+    Объявление без значения подходит только фильтрам без границ диапазона.
+    """
+
+    def __init__(self, width: float, max_value: float):
+        self.width = width
+        self.top = int(max_value // width)
+        self._buckets: Dict[int, Set[int]] = {}
+        self.all: Set[int] = set()
+        self.unbounded: Set[int] = set()
+
+    def _bucket(self, value: float) -> int:
+        return min(max(int(value // self.width), 0), self.top)
+
+    def add(self, filter_id: int, low: Optional[float], high: Optional[float]) -> None:
+        self.all.add(filter_id)
+        if low is None and high is None:
+            self.unbounded.add(filter_id)
+        first = self._bucket(low) if low else 0
+        last = self._bucket(high) if high else self.top
+        for bucket in range(first, last + 1):
+            self._buckets.setdefault(bucket, set()).add(filter_id)
+
+    def candidates(self, value: Optional[float]) -> Set[int]:
+        """Фильтры, диапазон которых может включать значение"""
+        if value is None:
+            # NULL не проходит ни одну заданную границу
+            return self.unbounded
+        return self._buckets.get(self._bucket(value), set())
+
+
+class CityBucket:
+    """Фильтры одного города (или без города) с корзинами диапазонов"""
+
+    def __init__(self):
+        self.price = RangeBuckets(width=100, max_value=10000)
+        self.rooms = RangeBuckets(width=1, max_value=10)
+        self.area = RangeBuckets(width=10, max_value=500)
+
+    def add(self, filter_obj: Filter) -> None:
+        self.price.add(filter_obj.id, filter_obj.min_price, filter_obj.max_price)
+        self.rooms.add(filter_obj.id, filter_obj.min_rooms, filter_obj.max_rooms)
+        self.area.add(filter_obj.id, filter_obj.min_area, filter_obj.max_area)
+
+    def candidates(self, listing_data: Dict[str, Any]) -> Set[int]:
+        sets = sorted(
+            (
+                self.price.candidates(listing_data.get('price')),
+                self.rooms.candidates(listing_data.get('rooms')),
+                self.area.candidates(listing_data.get('area')),
+            ),
+            key=len,
+        )
+        return sets[0].intersection(*sets[1:])
+
+
+class FilterIndex:
+    """Индекс активных фильтров для подбора по новым объявлениям"""
+
+    def __init__(self, filters: Iterable[Filter]):
+        self.filters: Dict[int, Filter] = {}
+        self._params: Dict[int, Dict[str, Any]] = {}
+        # Город фильтра (нижний регистр) -> корзина; None - фильтры без города
+        self._cities: Dict[Optional[str], CityBucket] = {}
+        self._city_keys_cache: Dict[str, Tuple[Optional[str], ...]] = {}
+
+        for filter_obj in filters:
+            self.add(filter_obj)
+
+        self.stats = {'listings': 0, 'candidates': 0, 'matches': 0}
+
+    def add(self, filter_obj: Filter) -> None:
+        self.filters[filter_obj.id] = filter_obj
+        self._params[filter_obj.id] = filter_search_params(filter_obj)
+        city = filter_obj.city.lower() if filter_obj.city else None
+        self._cities.setdefault(city, CityBucket()).add(filter_obj)
+        self._city_keys_cache.clear()
+
+    def _city_keys(self, listing_city: Optional[str]) -> Iterable[Optional[str]]:
+        """Корзины городов для объявления: город фильтра - подстрока города объявления"""
+        if not listing_city:
+            # Город объявления неизвестен - подходят только фильтры без города
+            return (None,) if None in self._cities else ()
+        listing_city = listing_city.lower()
+        keys = self._city_keys_cache.get(listing_city)
+        if keys is None:
+            keys = tuple(city for city in self._cities if city is None or city in listing_city)
+            self._city_keys_cache[listing_city] = keys
+        return keys
+
+    def candidates(self, listing_data: Dict[str, Any]) -> FrozenSet[int]:
+        found: Set[int] = set()
+        for city in self._city_keys(listing_data.get('city')):
+            found |= self._cities[city].candidates(listing_data)
+        return frozenset(found)
+
+    def match_listing(self, listing_data: Dict[str, Any]) -> List[Filter]:
+        """Фильтры, которым соответствует объявление"""
+        candidates = self.candidates(listing_data)
+        self.stats['listings'] += 1
+        self.stats['candidates'] += len(candidates)
+        matched = [
+            self.filters[filter_id]
+            for filter_id in sorted(candidates)
+            if matches_search_params(self._params[filter_id], listing_data)
+        ]
+        self.stats['matches'] += len(matched)
+        return matched
+
+    def match(self, listings: Iterable[Any]) -> List[Tuple[Filter, Any]]:
+        """Пары (фильтр, объявление) для новых объявлений (ORM-объекты или словари)"""
+        pairs = []
+        for listing in listings:
+            for filter_obj in self.match_listing(listing_as_dict(listing)):
+                pairs.append((filter_obj, listing))
+        return pairs
+
+    def group_by_filter(self, listings: Iterable[Any]) -> Dict[int, List[Any]]:
+        """id фильтра -> подходящие объявления (в порядке входного списка)"""
+        grouped: Dict[int, List[Any]] = {}
+        for filter_obj, listing in self.match(listings):
+            grouped.setdefault(filter_obj.id, []).append(listing)
+        return grouped
+
+
+def listing_as_dict(listing: Any) -> Dict[str, Any]:
+    """Поля объявления для проверки фильтра"""
+    if isinstance(listing, dict):
+        return listing
+    return {field: getattr(listing, field, None) for field in MATCH_FIELDS}
+
+
+def match_recent_listings(db: Session, *, after_id: int, up_to_id: int) -> Dict[int, List[Any]]:
+    """id фильтра -> объявления с id в (after_id, up_to_id], подходящие фильтру (новые первыми)"""
+    index = FilterIndex(crud_filter.get_all_active(db))
+    listings = crud_listing.get_id_range(db, after_id=after_id, up_to_id=up_to_id)
+    grouped = index.group_by_filter(listings)
+    logger.info(
+        f"🧭 Подбор: {len(listings)} новых объявлений × {len(index.filters)} фильтров - "
+        f"{index.stats['candidates']} проверок, {index.stats['matches']} совпадений"
+    )
+    return grouped
+
+
+def filter_signature(search_params: Dict[str, Any]) -> Tuple[Tuple[str, Any], ...]:
+    """
+    Канонический вид параметров поиска: фильтры, которые дают один и тот же
+    запрос crud_listing.search, получают одну подпись
+    """
+    canonical = {}
+    for key, value in search_params.items():
+        if value is None:
+            continue
+        if key in ('city', 'property_type'):
+            if not value:
+                # Пустая строка - без ограничения, как и None
+                continue
+            if key == 'city':
+                # search сравнивает город без учета регистра
+                value = value.lower()
+        canonical[key] = value
+    return tuple(sorted(canonical.items()))
+
+
+class SharedFilterSearch:
+    """
+    Поиск кандидатов один раз на подпись фильтра за цикл уведомлений
+
+    Общий список берется с запасом (pool_factor × limit) без исключения
+    отправленных, затем для каждого пользователя отправленные исключаются
+    одним запросом по id кандидатов. Если после исключения осталось меньше
+    limit, а запас мог обрезать подходящие объявления, - обычный поиск с
+    NOT EXISTS для этого пользователя: результат тот же, что без общего списка.
+    """
+
+    def __init__(self, pool_factor: int = 4):
+        self.pool_factor = max(1, pool_factor)
+        # Подпись -> (кандидаты, размер запаса, с которым они взяты)
+        self._pools: Dict[Tuple, Tuple[List[Listing], int]] = {}
+        self.stats = {'filters': 0, 'queries': 0, 'fallbacks': 0}
+
+    def search(self, db: Session, *, user_id: int, limit: int, search_params: Dict[str, Any]) -> List[Listing]:
+        """До limit самых свежих подходящих объявлений, еще не отправленных пользователю"""
+        self.stats['filters'] += 1
+        signature = filter_signature(search_params)
+        pool_size = limit * self.pool_factor
+
+        cached = self._pools.get(signature)
+        if cached is None or cached[1] < pool_size:
+            cached = (crud_listing.search(db, limit=pool_size, **dict(signature)), pool_size)
+            self._pools[signature] = cached
+            self.stats['queries'] += 1
+        pool, size = cached
+
+        sent = crud_sent_notification.get_sent_listing_ids(
+            db, user_id=user_id, listing_ids=[listing.id for listing in pool]
+        )
+        found = [listing for listing in pool if listing.id not in sent]
+        if len(found) >= limit or len(pool) < size:
+            return found[:limit]
+
+        self.stats['fallbacks'] += 1
+        return crud_listing.search(db, limit=limit, exclude_sent_to_user=user_id, **dict(signature))
+
+    def report(self) -> Dict[str, Any]:
+        """Статистика цикла: фильтров, различных запросов и их доля"""
+        filters = self.stats['filters']
+        return {
+            **self.stats,
+            'distinct_ratio': round(self.stats['queries'] / filters, 3) if filters else 0.0,
+        }
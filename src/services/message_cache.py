@@ -0,0 +1,67 @@
+"""
+Кеш отрисованных сообщений об объявлениях
+
+Новое объявление в Риме уходит сотням пользователей, и каждый канал
+рисовал его тело (заголовок, цена, детали, разбор этажа) заново для
+каждого получателя. Тело объявления не зависит от получателя: оно
+рисуется один раз на (id объявления, канал, версия шаблона, локаль), а
+заголовок и подпись фильтра добавляются вокруг готового тела.
+Кеш живет один проход рассылки: в начале прохода он очищается, чтобы
+изменения объявлений (например, цены) попадали в сообщения.
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+from src.core.config import settings
+
+DEFAULT_LOCALE = 'ru'
+
+CacheKey = Tuple[Any, str, int, str]
+
+
+class RenderedMessageCache:
+    """Тела сообщений об объявлениях по ключу (id, канал, версия шаблона, локаль), LRU"""
+
+    def __init__(self, max_entries: int = 20000):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[CacheKey, str]' = OrderedDict()
+
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def get_or_render(
+        self,
+        listing_id: Optional[Any],
+        channel: str,
+        render: Callable[[], str],
+        template_version: int = 1,
+        locale: str = DEFAULT_LOCALE,
+    ) -> str:
+        """Готовое тело из кеша или render() с сохранением (без id объявления - без кеша)"""
+        if listing_id is None or self.max_entries <= 0:
+            return render()
+
+        key = (listing_id, channel, template_version, locale)
+        body = self._entries.get(key)
+        if body is not None:
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return body
+
+        self.stats['misses'] += 1
+        body = render()
+        self._entries[key] = body
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return body
+
+    def clear(self) -> None:
+        """Новый проход рассылки"""
+        self._entries.clear()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Общий кеш тел сообщений всех каналов
+message_cache = RenderedMessageCache(settings.NOTIFICATION_MESSAGE_CACHE_SIZE)
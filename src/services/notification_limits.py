@@ -0,0 +1,119 @@
+"""
+Лимиты каналов уведомлений и параллельная рассылка
+
+Вместо фиксированных пауз между пользователями и сообщениями темп
+задают token bucket'ы с ограничениями провайдеров:
+- Telegram: общий лимит бота и отдельный лимит на каждый чат;
+- WhatsApp: лимит номера отправителя и лимит на одного получателя;
+- Email: лимит запросов к Resend.
+
+Пользователи обрабатываются параллельно (run_bounded), а ожидание
+возникает только там, где его требует конкретный лимит.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, TypeVar
+
+from src.core.config import settings
+from src.core.rate_limit import KeyedTokenBuckets, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+CHANNELS = ('telegram', 'whatsapp', 'email')
+
+
+class NotificationRateLimits:
+    """Token bucket'ы каналов: общий на канал и (для Telegram/WhatsApp) на получателя"""
+
+    def __init__(
+        self,
+        telegram_rate: float = 25.0,
+        telegram_chat_rate: float = 1.0,
+        whatsapp_rate: float = 20.0,
+        whatsapp_recipient_rate: float = 0.17,
+        whatsapp_recipient_burst: float = 5,
+        email_rate: float = 2.0,
+    ):
+        # Без всплесков: провайдеры считают сообщения за каждую секунду,
+        # и запас корзины сверх темпа превысил бы лимит в первую же секунду
+        self._channels: Dict[str, TokenBucket] = {
+            'telegram': TokenBucket(telegram_rate, 1),
+            'whatsapp': TokenBucket(whatsapp_rate, 1),
+            'email': TokenBucket(email_rate, 1),
+        }
+        self._recipients: Dict[str, KeyedTokenBuckets] = {
+            'telegram': KeyedTokenBuckets(telegram_chat_rate, 1),
+            'whatsapp': KeyedTokenBuckets(whatsapp_recipient_rate, whatsapp_recipient_burst),
+        }
+
+        self.stats = {channel: {'messages': 0, 'wait_seconds': 0.0} for channel in CHANNELS}
+
+    @classmethod
+    def from_settings(cls) -> 'NotificationRateLimits':
+        return cls(
+            telegram_rate=settings.NOTIFICATION_TELEGRAM_RATE,
+            telegram_chat_rate=settings.NOTIFICATION_TELEGRAM_CHAT_RATE,
+            whatsapp_rate=settings.NOTIFICATION_WHATSAPP_RATE,
+            whatsapp_recipient_rate=settings.NOTIFICATION_WHATSAPP_RECIPIENT_RATE,
+            whatsapp_recipient_burst=settings.NOTIFICATION_WHATSAPP_RECIPIENT_BURST,
+            email_rate=settings.NOTIFICATION_EMAIL_RATE,
+        )
+
+    async def acquire(self, channel: str, recipient: Optional[str] = None) -> float:
+        """
+        Дождаться права отправить одно сообщение (запрос к API канала) получателю
+
+        Сначала дожидаемся лимита получателя, не забирая токен, затем
+        забираем общий и только после него - токен получателя: иначе
+        ожидание общего лимита сокращало бы интервал между сообщениями
+        одному получателю, а токен канала не простаивает, пока сообщение
+        ждет своего чата.
+
+        Returns:
+            Сколько секунд пришлось ждать
+        """
+        waited = 0.0
+        bucket = None
+        recipients = self._recipients.get(channel)
+        if recipients is not None and recipient is not None:
+            bucket = recipients.get(str(recipient))
+            waited += await bucket.wait()
+        waited += await self._channels[channel].acquire()
+        if bucket is not None and not bucket.try_acquire():
+            # Токен получателя забрало параллельное сообщение тому же получателю
+            waited += await bucket.acquire()
+
+        self.stats[channel]['messages'] += 1
+        self.stats[channel]['wait_seconds'] += waited
+        return waited
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            channel: {
+                'messages': stats['messages'],
+                'wait_seconds': round(stats['wait_seconds'], 1),
+            }
+            for channel, stats in self.stats.items()
+        }
+
+
+async def run_bounded(
+    items: Iterable[T],
+    handler: Callable[[T], Awaitable[R]],
+    concurrency: int,
+) -> List[R]:
+    """Обработка элементов не более чем concurrency одновременно (результаты в порядке items)"""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(item: T) -> R:
+        async with semaphore:
+            return await handler(item)
+
+    return await asyncio.gather(*(run(item) for item in items))
+
+
+# Глобальные лимиты каналов уведомлений
+notification_limits = NotificationRateLimits.from_settings()
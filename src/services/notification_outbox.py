@@ -0,0 +1,219 @@
+"""
+Outbox уведомлений и доставка с повторами
+
+Подбор не отправляет сообщения сам: в той же транзакции, где фильтр
+отмечается обработанным, для каждого канала пользователя добавляется
+строка notifications (pending). Воркер доставки забирает их пачками
+(SKIP LOCKED), отправляет параллельно в пределах лимитов каналов и при
+ошибке возвращает в очередь с экспоненциальной задержкой. Темп подбора
+больше не зависит от задержек Telegram, WhatsApp и Resend, а сбой канала
+не теряет сообщение.
+"""
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from src.core.config import settings
+from src.crud.crud_notification import notification as crud_notification
+from src.db.database import SessionLocal
+from src.db.models import Filter, Listing, User
+from src.services.message_cache import message_cache
+from src.services.notification_limits import run_bounded
+
+logger = logging.getLogger(__name__)
+
+# Отправка сообщения канала: (пользователь, фильтр, объявления) -> доставлено ли
+Sender = Callable[[User, Filter, List[Listing]], Awaitable[bool]]
+
+
+class NotificationOutbox:
+    """Очередь сообщений в таблице notifications и их доставка"""
+
+    def __init__(
+        self,
+        batch_size: int = 50,
+        lease_seconds: int = 300,
+        max_attempts: int = 5,
+        retry_delay_seconds: int = 60,
+        concurrency: int = 20,
+        senders: Optional[Dict[str, Sender]] = None,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ):
+        """
+        Args:
+            batch_size: Сколько сообщений воркер захватывает за раз
+            lease_seconds: Срок аренды сообщения (потом его заберет другой воркер)
+            max_attempts: Попыток доставки на сообщение
+            retry_delay_seconds: Задержка перед первым повтором (дальше удваивается)
+            concurrency: Сообщений одновременно (темп задают лимиты каналов)
+            senders: Отправка по каналам (по умолчанию - методы NotificationService)
+            session_factory: Фабрика сессий БД для воркера
+        """
+        self.batch_size = max(1, batch_size)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay_seconds = retry_delay_seconds
+        self.concurrency = concurrency
+        self.senders = senders
+        self.session_factory = session_factory
+        self.stats = {'enqueued': 0, 'claimed': 0, 'sent': 0, 'retried': 0, 'failed': 0}
+
+    @classmethod
+    def from_settings(cls) -> 'NotificationOutbox':
+        return cls(
+            batch_size=settings.NOTIFICATION_OUTBOX_BATCH_SIZE,
+            lease_seconds=settings.NOTIFICATION_OUTBOX_LEASE_SECONDS,
+            max_attempts=settings.NOTIFICATION_OUTBOX_MAX_ATTEMPTS,
+            retry_delay_seconds=settings.NOTIFICATION_OUTBOX_RETRY_DELAY_SECONDS,
+            concurrency=settings.NOTIFICATION_DISPATCH_CONCURRENCY,
+        )
+
+    def _get_senders(self) -> Dict[str, Sender]:
+        if self.senders is None:
+            # Ленивый импорт: сервис уведомлений поднимает Telegram бота
+            from src.services.notification_service import notification_service
+            self.senders = {
+                'telegram': notification_service.send_telegram_listings,
+                'email': notification_service.send_email_listings,
+                'whatsapp': notification_service.send_whatsapp_listings,
+            }
+        return self.senders
+
+    def enqueue(
+        self,
+        db: Session,
+        *,
+        user_id: int,
+        filter_id: int,
+        listing_ids: List[int],
+        channels: List[str],
+    ) -> int:
+        """Поставить сообщение в очередь каналов (без коммита - в транзакции подбора)"""
+        if not listing_ids or not channels:
+            return 0
+        created = crud_notification.enqueue(
+            db,
+            user_id=user_id,
+            filter_id=filter_id,
+            listing_ids=listing_ids,
+            channels=channels,
+            max_attempts=self.max_attempts,
+        )
+        self.stats['enqueued'] += len(created)
+        return len(created)
+
+    async def run_batch(self, db: Session) -> Optional[Dict[str, int]]:
+        """
+        Захватить пачку сообщений, доставить и записать результат
+
+        Returns:
+            Статистика пачки или None, если доставлять нечего
+        """
+        crud_notification.fail_expired(db)
+        claimed = crud_notification.claim(db, lease_seconds=self.lease_seconds, limit=self.batch_size)
+        if not claimed:
+            return None
+        self.stats['claimed'] += len(claimed)
+
+        # Все нужное из БД - до отправки: сессия не используется параллельными задачами
+        jobs = [
+            {
+                'id': notification.id,
+                'channel': notification.channel,
+                'attempts': notification.attempts,
+                'max_attempts': notification.max_attempts,
+                'user_id': notification.user_id,
+                'filter_id': notification.filter_id,
+                'listing_ids': list(notification.listing_ids or []),
+            }
+            for notification in claimed
+        ]
+        users = self._load(db, User, {job['user_id'] for job in jobs})
+        filters = self._load(db, Filter, {job['filter_id'] for job in jobs})
+        listings = self._load(db, Listing, {listing_id for job in jobs for listing_id in job['listing_ids']})
+        senders = self._get_senders()
+
+        async def deliver(job: Dict[str, Any]) -> Dict[str, Any]:
+            user = users.get(job['user_id'])
+            filter_obj = filters.get(job['filter_id'])
+            job_listings = [listings[i] for i in job['listing_ids'] if i in listings]
+            sender = senders.get(job['channel'])
+            if user is None or filter_obj is None or not job_listings or sender is None:
+                # Повтор не поможет: пользователь, фильтр или объявления удалены
+                return {**job, 'error': "nothing to deliver", 'permanent': True}
+            try:
+                if await sender(user, filter_obj, job_listings):
+                    return {**job, 'error': None}
+                return {**job, 'error': f"{job['channel']} delivery failed", 'permanent': False}
+            except Exception as e:
+                return {**job, 'error': f"{type(e).__name__}: {e}", 'permanent': False}
+
+        results = await run_bounded(jobs, deliver, self.concurrency)
+
+        batch = {'claimed': len(jobs), 'sent': 0, 'retried': 0, 'failed': 0}
+        for result in results:
+            if result['error'] is None:
+                crud_notification.mark_sent(db, notification_id=result['id'], attempts=result['attempts'])
+                batch['sent'] += 1
+                continue
+            crud_notification.mark_failed(
+                db,
+                notification_id=result['id'],
+                attempts=result['attempts'],
+                max_attempts=result['max_attempts'],
+                error=result['error'],
+                retry_delay_seconds=self.retry_delay_seconds,
+                permanent=result['permanent'],
+            )
+            if result['permanent'] or result['attempts'] >= result['max_attempts']:
+                batch['failed'] += 1
+                logger.error(f"❌ Уведомление #{result['id']} ({result['channel']}) не доставлено: {result['error']}")
+            else:
+                batch['retried'] += 1
+                logger.warning(
+                    f"⚠️ Уведомление #{result['id']} ({result['channel']}): {result['error']}, "
+                    f"повтор (попытка {result['attempts']}/{result['max_attempts']})"
+                )
+
+        for key in ('sent', 'retried', 'failed'):
+            self.stats[key] += batch[key]
+        return batch
+
+    @staticmethod
+    def _load(db: Session, model, ids) -> Dict[int, Any]:
+        if not ids:
+            return {}
+        return {obj.id: obj for obj in db.query(model).filter(model.id.in_(ids)).all()}
+
+    async def drain(self, db: Session) -> Dict[str, int]:
+        """Доставлять сообщения, пока в очереди есть доступные"""
+        # Тела сообщений общие для получателей в пределах одного прохода
+        message_cache.clear()
+        total = {'batches': 0, 'claimed': 0, 'sent': 0, 'retried': 0, 'failed': 0}
+        while True:
+            batch = await self.run_batch(db)
+            if batch is None:
+                break
+            total['batches'] += 1
+            for key, value in batch.items():
+                total[key] += value
+        return total
+
+    def snapshot(self, db: Session) -> Dict[str, Any]:
+        """Состояние outbox для API: сообщения по каналам и статусам"""
+        counts = crud_notification.get_status_counts(db)
+        totals: Dict[str, int] = {}
+        for channel_counts in counts.values():
+            for status, count in channel_counts.items():
+                totals[status] = totals.get(status, 0) + count
+        return {
+            'enabled': settings.NOTIFICATION_OUTBOX_ENABLED,
+            'counts': totals,
+            'by_channel': counts,
+            'stats': self.stats,
+        }
+
+
+# Глобальный outbox уведомлений
+notification_outbox = NotificationOutbox.from_settings()
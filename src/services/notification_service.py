@@ -4,31 +4,54 @@ MVP версия для отправки уведомлений о новых о
 """
 import asyncio
 import logging
+from contextvars import ContextVar
 from datetime import datetime, timedelta, timezone
-from typing import List, Optional, Dict, Any
+from typing import Callable, List, Optional, Dict, Any
 
 from sqlalchemy.orm import Session
 
 from src.core.config import settings
-from src.db.database import get_db
+from src.db.database import SessionLocal, get_db
 from src.db.models import User, Filter, Listing, Notification, SentNotification
 # from src.crud.crud_user import get_all_active_users  # Не используется в MVP
 from src.crud.crud_filter import filter as crud_filter
-from src.crud.crud_listing import search_listings
+from src.crud.crud_listing import listing as crud_listing, search_listings
+from src.crud.crud_sent_notification import sent_notification as crud_sent_notification
+from src.services.listing_matcher import SharedFilterSearch, filter_search_params, match_recent_listings
+from src.services.message_cache import message_cache
+from src.services.notification_limits import notification_limits, run_bounded
+from src.services.notification_outbox import notification_outbox
 from src.services.telegram_bot import send_notification_to_user
 
 logger = logging.getLogger(__name__)
 
+# Сессия пользователя, которого обрабатывает текущая задача диспетчера
+_user_session: ContextVar[Optional[Session]] = ContextVar('notification_user_session', default=None)
+
 
 class NotificationService:
     """Сервис для управления уведомлениями пользователей"""
     
-    def __init__(self):
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal):
         self.db = None
+        # Фабрика сессий для пользователей, обрабатываемых параллельно
+        self.session_factory = session_factory
+        # Новые объявления по фильтрам на текущий проход диспетчера (обратный подбор)
+        self._recent_matches: Optional[Dict[int, List[Listing]]] = None
+        # Общие результаты поиска одинаковых фильтров на текущий проход
+        self._shared_search: Optional[SharedFilterSearch] = None
+        # Границы прохода: последний id объявления и id, после которого идут объявления за 24 часа
+        self._high_water: Optional[int] = None
+        self._window_floor: Optional[int] = None
+        # Фильтр -> водяной знак, до которого он продвинется после доставки
+        self._pending_watermarks: Dict[int, int] = {}
         self._ensure_sent_notifications_table()
     
     def get_db(self) -> Session:
-        """Получение сессии базы данных"""
+        """Получение сессии базы данных (в задаче диспетчера - сессии ее пользователя)"""
+        user_db = _user_session.get()
+        if user_db is not None:
+            return user_db
         if not self.db:
             self.db = next(get_db())
         return self.db
@@ -45,54 +68,22 @@ class NotificationService:
     
     def _save_sent_notifications(self, db, user_id: int, filter_id: int, listings: List):
         """
-        Сохраняет записи об отправленных уведомлениях с учетом режима отладки
+        Отмечает объявления отправленными одним INSERT ... ON CONFLICT DO NOTHING
+        
+        Без коммита: запись фиксируется в одной транзакции с last_notification_sent фильтра.
+        В режиме отладки старые отметки удаляются, чтобы объявления можно было отправить снова.
         """
         from src.core.config import settings
-        debug_mode = settings.DEBUG_NOTIFICATIONS
+        listing_ids = [listing.id for listing in listings]
         
-        if debug_mode:
-            # В режиме отладки: массовое удаление всех старых записей для этого пользователя
-            try:
-                listing_ids = [listing.id for listing in listings]
-                deleted_count = db.query(SentNotification).filter(
-                    SentNotification.user_id == user_id,
-                    SentNotification.listing_id.in_(listing_ids)
-                ).delete(synchronize_session=False)
-                
-                if deleted_count > 0:
-                    logger.debug(f"🐛 [DEBUG] Удалено {deleted_count} старых записей для режима отладки")
-                    
-            except Exception as e:
-                logger.warning(f"🐛 [DEBUG] Ошибка удаления старых записей: {e}")
+        if settings.DEBUG_NOTIFICATIONS:
+            deleted_count = crud_sent_notification.forget(db, user_id=user_id, listing_ids=listing_ids)
+            if deleted_count > 0:
+                logger.debug(f"🐛 [DEBUG] Удалено {deleted_count} старых записей для режима отладки")
         
-        # Создаем новые записи
-        for listing in listings:
-            try:
-                # Проверяем, есть ли уже такая запись (в обычном режиме)
-                if not debug_mode:
-                    existing = db.query(SentNotification).filter(
-                        SentNotification.user_id == user_id,
-                        SentNotification.listing_id == listing.id
-                    ).first()
-                    
-                    if existing:
-                        logger.debug(f"Объявление {listing.id} уже было отправлено пользователю {user_id}")
-                        continue
-                
-                # Создаем новую запись
-                sent_notification = SentNotification(
-                    user_id=user_id,
-                    filter_id=filter_id,
-                    listing_id=listing.id,
-                    notification_type="new_listing"
-                )
-                db.add(sent_notification)
-                
-            except Exception as e:
-                if debug_mode:
-                    logger.warning(f"🐛 [DEBUG] Ошибка сохранения sent_notification для listing {listing.id}: {e}")
-                else:
-                    logger.debug(f"Ошибка сохранения sent_notification для listing {listing.id}: {e}")
+        crud_sent_notification.record_sent(
+            db, user_id=user_id, filter_id=filter_id, listing_ids=listing_ids
+        )
     
     def should_send_notification(self, user: User, filter_obj: Filter) -> bool:
         """
@@ -191,8 +182,11 @@ class NotificationService:
         
         Логика:
         1. Если первый запуск фильтра (нет last_notification_sent) - до 30 самых свежих
-        2. Если повторный запуск - только новые за 24 часа
+        2. Если повторный запуск - все объявления с id выше водяного знака фильтра
+           (last_seen_listing_id; без него - за 24 часа) и не выше границы прохода
         3. Исключаем уже отправленные объявления
+        
+        Водяной знак продвигается до границы прохода после доставки (_advance_watermark).
         """
         try:
             from src.core.config import settings
@@ -209,30 +203,20 @@ class NotificationService:
             else:
                 logger.info(f"🚀 Фильтр {filter_obj.id}: {'первый запуск' if is_first_run else 'повторный запуск'}")
             
-            # Создаем параметры поиска из фильтра
-            search_params = {
-                "city": filter_obj.city,
-                "min_price": filter_obj.min_price,
-                "max_price": filter_obj.max_price,
-                "property_type": filter_obj.property_type,
-                "min_rooms": filter_obj.min_rooms,
-                "max_rooms": filter_obj.max_rooms,
-                "min_area": filter_obj.min_area,
-                "max_area": filter_obj.max_area,
-            }
-            
-            # Удаляем None значения
-            search_params = {k: v for k, v in search_params.items() if v is not None}
+            # Создаем параметры поиска из фильтра (без None значений) - те же,
+            # что проверяет подбор по индексу
+            search_params = filter_search_params(filter_obj)
             
             if debug_mode:
                 logger.info(f"🐛 [DEBUG] Параметры поиска: {search_params}")
             
-            # Ищем объявления напрямую через CRUD
-            from src.crud.crud_listing import listing as crud_listing
+            # Граница прохода: объявления, добавленные позже, достанутся следующему
+            high_water = self._high_water if self._high_water is not None else crud_listing.get_max_id(db)
             
+            # Ищем объявления через CRUD (одинаковые фильтры - одним запросом за проход)
             if is_first_run or debug_mode:
                 # Первый запуск или режим отладки - берем до 30 самых свежих объявлений
-                all_listings = crud_listing.search(db, limit=30, **search_params)
+                all_listings = self._search_candidates(db, user_id, 30, search_params)
                 
                 # Подсчитываем по источникам
                 source_stats = {}
@@ -247,27 +231,36 @@ class NotificationService:
                     logger.info(f"🔍 Первый запуск: найдено {len(all_listings)} объявлений (лимит 30)")
                     logger.info(f"📊 По источникам: {source_stats}")
             else:
-                # Повторный запуск - только новые за 24 часа
-                since_time = datetime.now(timezone.utc) - timedelta(hours=24)
-                all_listings = crud_listing.search(db, limit=50, **search_params)
+                # Повторный запуск - все новые с прошлого прохода (выше водяного знака)
+                window_floor = self._window_floor
+                if window_floor is None:
+                    window_floor = crud_listing.get_id_floor_since(db, hours=24)
+                watermark = filter_obj.last_seen_listing_id
+                if watermark is None:
+                    # Фильтр без водяного знака (до миграции) - объявления за 24 часа
+                    watermark = window_floor
                 
-                # Фильтруем по дате
-                fresh_listings = []
-                for listing in all_listings:
-                    if listing.created_at:
-                        listing_time = listing.created_at
-                        compare_time = since_time
-                        
-                        # Приводим к единому формату
-                        if listing_time.tzinfo is None and compare_time.tzinfo is not None:
-                            compare_time = compare_time.replace(tzinfo=None)
-                        elif listing_time.tzinfo is not None and compare_time.tzinfo is None:
-                            listing_time = listing_time.replace(tzinfo=None)
-                        
-                        if listing_time >= compare_time:
-                            fresh_listings.append(listing)
-
-                all_listings = fresh_listings
+                if self._recent_matches is not None and watermark >= window_floor:
+                    # Подобрано заранее для всех фильтров по объявлениям прохода,
+                    # отправленные проверяем только среди них
+                    matched = [
+                        listing for listing in self._recent_matches.get(filter_obj.id, [])
+                        if listing.id > watermark
+                    ]
+                    sent_listing_ids = crud_sent_notification.get_sent_listing_ids(
+                        db, user_id=user_id, listing_ids=[listing.id for listing in matched]
+                    )
+                    all_listings = [listing for listing in matched if listing.id not in sent_listing_ids]
+                else:
+                    # Водяной знак старше окна подбора: постранично по id до границы прохода
+                    all_listings = crud_listing.get_new_for_filter(
+                        db,
+                        after_id=watermark,
+                        up_to_id=high_water,
+                        exclude_sent_to_user=user_id,
+                        page_size=settings.NOTIFICATION_WATERMARK_PAGE_SIZE,
+                        **search_params
+                    )
                 
                 # Подсчитываем по источникам
                 source_stats = {}
@@ -275,26 +268,14 @@ class NotificationService:
                     source = listing.source or 'unknown'
                     source_stats[source] = source_stats.get(source, 0) + 1
                 
-                logger.info(f"🔍 Повторный запуск: найдено {len(all_listings)} новых объявлений за 24ч")
+                logger.info(f"🔍 Повторный запуск: найдено {len(all_listings)} новых объявлений после id {watermark}")
                 logger.info(f"📊 По источникам: {source_stats}")
             
-            # Получаем список уже отправленных объявлений для этого пользователя
-            sent_listing_ids = set(
-                row[0] for row in 
-                db.query(SentNotification.listing_id)
-                .filter(SentNotification.user_id == user_id)
-                .all()
-            )
-            
-            # ВСЕГДА исключаем уже отправленные объявления
-            new_listings = [
-                listing for listing in all_listings 
-                if listing.id not in sent_listing_ids
-            ]
+            # Уже отправленные объявления ВСЕГДА исключены - в самом запросе (NOT EXISTS),
+            # без загрузки всей истории отправок пользователя
+            new_listings = all_listings
             
             if debug_mode:
-                logger.info(f"🐛 [DEBUG] Найдено уже отправленных: {len(sent_listing_ids)}")
-                logger.info(f"🐛 [DEBUG] Всего объявлений по фильтру: {len(all_listings)}")
                 logger.info(f"🐛 [DEBUG] Новых объявлений для отправки: {len(new_listings)}")
                 
                 # Дополнительная статистика в режиме отладки
@@ -305,7 +286,6 @@ class NotificationService:
                         new_source_stats[source] = new_source_stats.get(source, 0) + 1
                     logger.info(f"🐛 [DEBUG] К отправке по источникам: {new_source_stats}")
             else:
-                logger.info(f"📋 Исключено {len(all_listings) - len(new_listings)} уже отправленных объявлений")
                 logger.info(f"✅ Найдено {len(new_listings)} новых объявлений для отправки")
                 
                 # Статистика финальных объявлений по источникам
@@ -315,6 +295,9 @@ class NotificationService:
                         source = listing.source or 'unknown'
                         final_source_stats[source] = final_source_stats.get(source, 0) + 1
                     logger.info(f"📊 К отправке по источникам: {final_source_stats}")
+                
+                # После доставки водяной знак фильтра продвинется до границы прохода
+                self._pending_watermarks[filter_obj.id] = high_water
             
             return new_listings
             
@@ -322,6 +305,27 @@ class NotificationService:
             logger.error(f"Ошибка поиска новых объявлений для фильтра {filter_obj.id}: {e}")
             return []
     
+    def _advance_watermark(self, filter_obj: Filter) -> bool:
+        """
+        Продвинуть водяной знак фильтра до границы его последнего поиска (без коммита)
+        
+        Вызывается в транзакции доставки, поэтому знак не уходит вперед
+        неотправленных объявлений.
+        """
+        bound = self._pending_watermarks.pop(filter_obj.id, None)
+        if bound is None or (filter_obj.last_seen_listing_id or 0) >= bound:
+            return False
+        filter_obj.last_seen_listing_id = bound
+        return True
+    
+    def _search_candidates(self, db: Session, user_id: int, limit: int, search_params: Dict[str, Any]) -> List[Listing]:
+        """Поиск по фильтру без отправленных пользователю: в проходе диспетчера - один запрос на одинаковые фильтры"""
+        if self._shared_search is not None:
+            # Общие списки живут весь проход - читаются через сессию диспетчера,
+            # которая в проходе не коммитится (объекты не истекают)
+            return self._shared_search.search(self.db or db, user_id=user_id, limit=limit, search_params=search_params)
+        return crud_listing.search(db, limit=limit, exclude_sent_to_user=user_id, **search_params)
+    
     def format_notification_message(self, listings: List[Listing], filter_obj: Filter) -> str:
         """
         Форматирование сообщения с уведомлением о новых объявлениях
@@ -396,10 +400,181 @@ class NotificationService:
         
         return message
     
+    def get_channels(self, user: User, filter_obj: Filter) -> List[str]:
+        """Каналы, включенные и в фильтре, и у пользователя"""
+        from src.core.config import settings
+        
+        channels = []
+        if (filter_obj.notify_telegram and
+            user.telegram_chat_id and
+            user.telegram_notifications_enabled):
+            channels.append('telegram')
+        if filter_obj.notify_email and user.email_notifications_enabled:
+            channels.append('email')
+        if (filter_obj.notify_whatsapp and
+            user.whatsapp_phone and
+            user.whatsapp_enabled and
+            settings.WHATSAPP_ENABLED):
+            channels.append('whatsapp')
+        return channels
+    
+    def _can_send_email(self, user: User) -> bool:
+        """Есть адрес, Resend настроен и прошел час с прошлого письма (защита от спама)"""
+        from src.core.config import settings
+        from src.services.email_service import email_service
+        
+        # Используем notification_email если он установлен, иначе основной email
+        notification_email = user.notification_email or user.email
+        if not notification_email:
+            logger.warning(f"⚠️ User {user.id} has no notification email configured")
+            return False
+        
+        if user.email_last_sent_at and not settings.DEBUG_NOTIFICATIONS:
+            # Минимум 1 час между email уведомлениями (только в production)
+            time_since_last = datetime.now(timezone.utc).replace(tzinfo=None) - user.email_last_sent_at
+            if time_since_last < timedelta(hours=1):
+                logger.info(f"⏰ Email для {notification_email} пропущен - слишком рано (прошло {time_since_last})")
+                return False
+        
+        return email_service.is_enabled()
+    
+    async def send_telegram_listings(self, user: User, filter_obj: Filter, listings: List[Listing]) -> bool:
+        """Каждое объявление отдельным сообщением в Telegram (максимум 5)"""
+        from src.services.telegram_bot import send_listing_notification
+        
+        telegram_count = 0
+        for listing in listings[:5]:
+            try:
+                # Темп задают лимиты Telegram (бот и чат), а не фиксированная пауза
+                await notification_limits.acquire('telegram', user.telegram_chat_id)
+                notification_sent = await send_listing_notification(
+                    telegram_chat_id=user.telegram_chat_id,
+                    listing=listing,
+                    filter_obj=filter_obj
+                )
+                
+                if notification_sent:
+                    telegram_count += 1
+                
+            except Exception as e:
+                logger.error(f"Ошибка отправки Telegram уведомления об объявлении {listing.id}: {e}")
+                continue
+        
+        if telegram_count:
+            logger.info(f"📱 Telegram: отправлено {telegram_count} уведомлений пользователю {user.email}")
+        return telegram_count > 0
+    
+    async def send_email_listings(self, user: User, filter_obj: Filter, listings: List[Listing]) -> bool:
+        """Одно письмо с объявлениями (максимум 10)"""
+        from src.services.email_service import email_service
+        
+        notification_email = user.notification_email or user.email
+        
+        # Конвертируем объекты Listing в словари для email
+        listings_data = []
+        for listing in listings[:10]:  # Email: максимум 10 объявлений
+            listings_data.append({
+                'id': listing.id,
+                'title': listing.title,
+                'price': listing.price,
+                'address': listing.address,
+                'city': listing.city,
+                'rooms': listing.rooms,
+                'area': listing.area,
+                'url': listing.url,
+                'source': listing.source
+            })
+        
+        await notification_limits.acquire('email')
+        email_sent = await email_service.send_listing_notification_email(
+            to_email=notification_email,
+            listings=listings_data,
+            filter_name=filter_obj.name
+        )
+        
+        if email_sent:
+            logger.info(f"📧 Email: отправлено уведомление с {len(listings_data)} объявлениями на {notification_email}")
+        return email_sent
+    
+    async def send_whatsapp_listings(self, user: User, filter_obj: Filter, listings: List[Listing]) -> bool:
+        """Сообщение WhatsApp с объявлениями (максимум 3)"""
+        from src.services.whatsapp_service import send_whatsapp_listing_notification
+        
+        # Конвертируем объекты Listing в словари
+        listings_data = []
+        for listing in listings[:3]:  # WhatsApp: максимум 3 объявления
+            listings_data.append({
+                'id': listing.id,
+                'title': listing.title,
+                'price': listing.price,
+                'address': listing.address,
+                'city': listing.city,
+                'rooms': listing.rooms,
+                'area': listing.area,
+                'url': listing.url,
+                'source': listing.source,
+                'images': listing.images if hasattr(listing, 'images') and listing.images else [],
+                'furnished': listing.furnished if hasattr(listing, 'furnished') else None,
+                'pets_allowed': listing.pets_allowed if hasattr(listing, 'pets_allowed') else None,
+                'floor': listing.floor if hasattr(listing, 'floor') else None
+            })
+        
+        whatsapp_sent = await send_whatsapp_listing_notification(
+            phone_number=user.whatsapp_phone,
+            listings=listings_data,
+            filter_name=filter_obj.name
+        )
+        
+        if whatsapp_sent:
+            logger.info(f"📱 WhatsApp: отправлено уведомление с {len(listings_data)} объявлениями пользователю {user.email}")
+        return whatsapp_sent
+    
+    def enqueue_notification_for_filter(self, user: User, filter_obj: Filter, listings: List[Listing]) -> bool:
+        """
+        Поставить уведомление в outbox вместо отправки
+        
+        Одна транзакция: last_notification_sent фильтра, отметки отправленных
+        объявлений и сообщения каналов (их доставит воркер outbox с повторами).
+        """
+        channels = self.get_channels(user, filter_obj)
+        if 'email' in channels and not self._can_send_email(user):
+            channels.remove('email')
+        if not channels:
+            return False
+        
+        db = self.get_db()
+        try:
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            filter_obj.last_notification_sent = now
+            self._advance_watermark(filter_obj)
+            db.add(filter_obj)
+            if 'email' in channels:
+                # Час между письмами считается от постановки в очередь
+                user.email_last_sent_at = now
+                db.add(user)
+            
+            self._save_sent_notifications(db, user.id, filter_obj.id, listings)
+            notification_outbox.enqueue(
+                db,
+                user_id=user.id,
+                filter_id=filter_obj.id,
+                listing_ids=[listing.id for listing in listings],
+                channels=channels,
+            )
+            db.commit()
+            logger.info(f"📥 Уведомление для {user.email} ({len(listings)} объявлений) в очереди: {', '.join(channels)}")
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка постановки уведомления в очередь: {e}")
+            db.rollback()
+            return False
+    
     async def send_notification_for_filter(self, user: User, filter_obj: Filter, listings: List[Listing]) -> bool:
         """
         Отправка уведомлений пользователю о новых объявлениях
         Поддерживает Telegram, WhatsApp и Email
+        
+        С NOTIFICATION_OUTBOX_ENABLED сообщения ставятся в outbox, отправляет их воркер доставки.
         """
         try:
             from src.core.config import settings
@@ -407,136 +582,43 @@ class NotificationService:
             if not listings:
                 return False
             
+            if settings.NOTIFICATION_OUTBOX_ENABLED:
+                return self.enqueue_notification_for_filter(user, filter_obj, listings)
+            
+            channels = self.get_channels(user, filter_obj)
             telegram_success = False
             whatsapp_success = False
             email_success = False
             
             # Отправка через Telegram (если включен в фильтре и у пользователя)
-            if (filter_obj.notify_telegram and 
-                user.telegram_chat_id and 
-                user.telegram_notifications_enabled):
+            if 'telegram' in channels:
                 try:
-                    from src.services.telegram_bot import send_listing_notification
-                    
-                    telegram_count = 0
-                    # Отправляем каждое объявление отдельным сообщением в Telegram
-                    for listing in listings[:5]:  # Максимум 5 объявлений за раз
-                        try:
-                            notification_sent = await send_listing_notification(
-                                telegram_chat_id=user.telegram_chat_id,
-                                listing=listing,
-                                filter_obj=filter_obj
-                            )
-                            
-                            if notification_sent:
-                                telegram_count += 1
-                                
-                            # Пауза между сообщениями чтобы не спамить
-                            await asyncio.sleep(2)
-                            
-                        except Exception as e:
-                            logger.error(f"Ошибка отправки Telegram уведомления об объявлении {listing.id}: {e}")
-                            continue
-                    
-                    telegram_success = telegram_count > 0
-                    if telegram_success:
-                        logger.info(f"📱 Telegram: отправлено {telegram_count} уведомлений пользователю {user.email}")
-                    
+                    telegram_success = await self.send_telegram_listings(user, filter_obj, listings)
                 except Exception as e:
                     logger.error(f"Ошибка отправки Telegram уведомлений: {e}")
             
             # Отправка через Email (если включен в фильтре и у пользователя)
-            if (filter_obj.notify_email and 
-                user.email_notifications_enabled):
+            if 'email' in channels:
                 try:
-                    from src.services.email_service import email_service
-                    from datetime import datetime, timedelta
-                    
-                    # Используем notification_email если он установлен, иначе основной email
-                    notification_email = user.notification_email or user.email
-                    
-                    if not notification_email:
-                        logger.warning(f"⚠️ User {user.id} has no notification email configured")
-                    else:
-                        # Проверяем, не отправляли ли мы недавно email (защита от спама)
-                        can_send_email = True
-                        if user.email_last_sent_at and not settings.DEBUG_NOTIFICATIONS:
-                            # Минимум 1 час между email уведомлениями (только в production)
-                            time_since_last = datetime.now(timezone.utc).replace(tzinfo=None) - user.email_last_sent_at
-                            if time_since_last < timedelta(hours=1):
-                                can_send_email = False
-                                logger.info(f"⏰ Email для {notification_email} пропущен - слишком рано (прошло {time_since_last})")
-                        
-                        if can_send_email and email_service.is_enabled():
-                            # Конвертируем объекты Listing в словари для email
-                            listings_data = []
-                            for listing in listings[:10]:  # Email: максимум 10 объявлений
-                                listings_data.append({
-                                    'title': listing.title,
-                                    'price': listing.price,
-                                    'address': listing.address,
-                                    'city': listing.city,
-                                    'rooms': listing.rooms,
-                                    'area': listing.area,
-                                    'url': listing.url,
-                                    'source': listing.source
-                                })
-                            
-                            email_sent = await email_service.send_listing_notification_email(
-                                to_email=notification_email,
-                                listings=listings_data,
-                                filter_name=filter_obj.name
-                            )
-                            
-                            email_success = email_sent
-                            if email_success:
-                                # Обновляем время последней отправки email
-                                db = self.get_db()
+                    if self._can_send_email(user):
+                        email_success = await self.send_email_listings(user, filter_obj, listings)
+                        if email_success:
+                            # Обновляем время последней отправки email
+                            db = self.get_db()
+                            try:
                                 user.email_last_sent_at = datetime.now(timezone.utc).replace(tzinfo=None)
                                 db.add(user)
                                 db.commit()
-                                logger.info(f"📧 Email: отправлено уведомление с {len(listings_data)} объявлениями на {notification_email}")
-                    
+                            except Exception:
+                                db.rollback()
+                                raise
                 except Exception as e:
                     logger.error(f"Ошибка отправки Email уведомлений: {e}")
             
             # Отправка через WhatsApp (если включен в фильтре и у пользователя)
-            if (filter_obj.notify_whatsapp and
-                user.whatsapp_phone and 
-                user.whatsapp_enabled and 
-                settings.WHATSAPP_ENABLED):
+            if 'whatsapp' in channels:
                 try:
-                    from src.services.whatsapp_service import send_whatsapp_listing_notification
-                    
-                    # Конвертируем объекты Listing в словари
-                    listings_data = []
-                    for listing in listings[:3]:  # WhatsApp: максимум 3 объявления
-                        listings_data.append({
-                            'id': listing.id,
-                            'title': listing.title,
-                            'price': listing.price,
-                            'address': listing.address,
-                            'city': listing.city,
-                            'rooms': listing.rooms,
-                            'area': listing.area,
-                            'url': listing.url,
-                            'source': listing.source,
-                            'images': listing.images if hasattr(listing, 'images') and listing.images else [],
-                            'furnished': listing.furnished if hasattr(listing, 'furnished') else None,
-                            'pets_allowed': listing.pets_allowed if hasattr(listing, 'pets_allowed') else None,
-                            'floor': listing.floor if hasattr(listing, 'floor') else None
-                        })
-                    
-                    whatsapp_sent = await send_whatsapp_listing_notification(
-                        phone_number=user.whatsapp_phone,
-                        listings=listings_data,
-                        filter_name=filter_obj.name
-                    )
-                    
-                    whatsapp_success = whatsapp_sent
-                    if whatsapp_success:
-                        logger.info(f"📱 WhatsApp: отправлено уведомление с {len(listings_data)} объявлениями пользователю {user.email}")
-                    
+                    whatsapp_success = await self.send_whatsapp_listings(user, filter_obj, listings)
                 except Exception as e:
                     logger.error(f"Ошибка отправки WhatsApp уведомлений: {e}")
             
@@ -546,29 +628,32 @@ class NotificationService:
             if success:
                 db = self.get_db()
                 
-                # Обновляем время последнего уведомления
-                filter_obj.last_notification_sent = datetime.now(timezone.utc).replace(tzinfo=None)
-                db.add(filter_obj)
-                
-                # Сохраняем каждое отправленное объявление в SentNotification
-                self._save_sent_notifications(db, user.id, filter_obj.id, listings)
-                
-                # Создаем общую запись в Notification для статистики
-                try:
-                    notification = Notification(
-                        user_id=user.id,
-                        filter_id=filter_obj.id,
-                        listing_id=listings[0].id if listings else None,
-                        notification_type="new_listing",
-                        status="sent",
-                        sent_at=datetime.now(timezone.utc).replace(tzinfo=None),
-                        message=f"Отправлено {len(listings)} объявлений"
-                    )
-                    db.add(notification)
-                except Exception as e:
-                    logger.warning(f"Не удалось сохранить запись статистики: {e}")
-                
+                # Все записи - одна транзакция: при ошибке откатываются вместе,
+                # и сессия остается пригодной для следующих фильтров
                 try:
+                    # Обновляем время последнего уведомления
+                    filter_obj.last_notification_sent = datetime.now(timezone.utc).replace(tzinfo=None)
+                    self._advance_watermark(filter_obj)
+                    db.add(filter_obj)
+                    
+                    # Сохраняем каждое отправленное объявление в SentNotification
+                    self._save_sent_notifications(db, user.id, filter_obj.id, listings)
+                    
+                    # Создаем общую запись в Notification для статистики
+                    try:
+                        notification = Notification(
+                            user_id=user.id,
+                            filter_id=filter_obj.id,
+                            listing_id=listings[0].id if listings else None,
+                            notification_type="new_listing",
+                            status="sent",
+                            sent_at=datetime.now(timezone.utc).replace(tzinfo=None),
+                            message=f"Отправлено {len(listings)} объявлений"
+                        )
+                        db.add(notification)
+                    except Exception as e:
+                        logger.warning(f"Не удалось сохранить запись статистики: {e}")
+                    
                     db.commit()
                     # Формируем детальный отчет об отправке
                     channels = []
@@ -642,6 +727,15 @@ class NotificationService:
                 if not new_listings:
                     if debug_mode:
                         logger.info(f"🐛 [DEBUG] Для фильтра {filter_obj.id} '{filter_obj.name}' новых объявлений не найдено")
+                    elif self._advance_watermark(filter_obj):
+                        # Отправлять нечего - знак продвигается сразу, чтобы не просматривать диапазон снова
+                        db = self.get_db()
+                        try:
+                            db.add(filter_obj)
+                            db.commit()
+                        except Exception as e:
+                            logger.error(f"Ошибка сохранения водяного знака фильтра {filter_obj.id}: {e}")
+                            db.rollback()
                     continue
                 
                 if debug_mode:
@@ -656,9 +750,6 @@ class NotificationService:
                     sent_count += 1
                     if debug_mode:
                         logger.info(f"🐛 [DEBUG] Уведомление для фильтра {filter_obj.id} отправлено успешно")
-                
-                # Небольшая пауза между уведомлениями
-                await asyncio.sleep(1)
             
             return sent_count
             
@@ -715,8 +806,33 @@ class NotificationService:
             logger.info(f"  - Telegram: {telegram_users}")
             logger.info(f"  - WhatsApp: {whatsapp_users}")
             
-            for user in users:
+            self._shared_search = SharedFilterSearch(pool_factor=settings.NOTIFICATION_SHARED_POOL_FACTOR)
+            # Тела сообщений рисуются заново раз за проход (объявления могли измениться)
+            message_cache.clear()
+            self._high_water = crud_listing.get_max_id(self.get_db())
+            self._window_floor = crud_listing.get_id_floor_since(self.get_db(), hours=24)
+            
+            # Один проход по новым объявлениям вместо поиска для каждого фильтра
+            if not debug_mode:
+                try:
+                    self._recent_matches = match_recent_listings(
+                        self.get_db(), after_id=self._window_floor, up_to_id=self._high_water
+                    )
+                except Exception as e:
+                    logger.warning(f"⚠️ Обратный подбор не удался, поиск по каждому фильтру: {e}")
+                    self._recent_matches = None
+            
+            async def process_user(user: User) -> None:
+                # Своя сессия на пользователя: пользователи обрабатываются параллельно,
+                # и ошибка записи одного не должна ломать транзакции других
+                db = self.session_factory()
+                token = _user_session.set(db)
                 try:
+                    current = db.get(User, user.id)
+                    if current is None:
+                        # Пользователь удален после выборки прохода
+                        return
+                    user = current
                     if debug_mode:
                         logger.info(f"🐛 [DEBUG] Обрабатываем пользователя: {user.email} (ID: {user.id}, Chat ID: {user.telegram_chat_id})")
                     
@@ -729,12 +845,15 @@ class NotificationService:
                     elif debug_mode:
                         logger.info(f"🐛 [DEBUG] Уведомления не отправлены пользователю {user.email}")
                     
-                    # Пауза между пользователями для предотвращения rate limiting
-                    await asyncio.sleep(0.5)
-                    
                 except Exception as e:
                     logger.error(f"Ошибка обработки пользователя {user.email}: {e}")
                     stats["errors"] += 1
+                finally:
+                    _user_session.reset(token)
+                    db.close()
+            
+            # Пользователи параллельно; темп отправки - лимиты каналов (notification_limits)
+            await run_bounded(users, process_user, settings.NOTIFICATION_DISPATCH_CONCURRENCY)
             
             logger.info(
                 f"✅ Диспетчер уведомлений завершен. "
@@ -742,6 +861,22 @@ class NotificationService:
                 f"Отправлено уведомлений: {stats['notifications_sent']}, "
                 f"Ошибок: {stats['errors']}"
             )
+            logger.info(f"📶 Лимиты каналов: {notification_limits.snapshot()}")
+            if message_cache.stats['misses']:
+                logger.info(
+                    f"🧾 Кеш сообщений: отрисовано {message_cache.stats['misses']}, "
+                    f"взято готовых {message_cache.stats['hits']}"
+                )
+            
+            search_report = self._shared_search.report()
+            stats["filter_searches"] = search_report["filters"]
+            stats["distinct_queries"] = search_report["queries"]
+            if search_report["filters"]:
+                logger.info(
+                    f"🧮 Поиск по фильтрам: {search_report['filters']} фильтров -> "
+                    f"{search_report['queries']} различных запросов "
+                    f"(доля {search_report['distinct_ratio']:.0%}, дополнительных {search_report['fallbacks']})"
+                )
             
             return stats
             
@@ -749,6 +884,12 @@ class NotificationService:
             logger.error(f"Критическая ошибка диспетчера уведомлений: {e}")
             stats["errors"] += 1
             return stats
+        finally:
+            self._recent_matches = None
+            self._shared_search = None
+            self._high_water = None
+            self._window_floor = None
+            self._pending_watermarks.clear()
 
 
 # Глобальный экземпляр сервиса
@@ -0,0 +1,301 @@
+"""
+Адаптивные интервалы повторного обхода по источнику и городу
+
+Вместо одного SCRAPER_WORKER_INTERVAL_HOURS на всё планировщик оценивает
+темп появления новых объявлений λ (в час) для каждой пары (источник, город)
+по истории обходов (таблица scraping_sessions) и подбирает интервалы так,
+чтобы доля новых объявлений, увиденных не позже N минут после появления,
+достигла цели (например, 90%) в пределах бюджета кредитов ScraperAPI в час.
+
+Модель: при обходе раз в T часов объявление ждет в среднем равномерно от 0
+до T, поэтому за N часов видна доля min(1, N / T). Частота обхода f = 1/T
+окупается пропорционально λ / стоимость обхода, поэтому частота повышается
+сначала у пар с наибольшим числом новых объявлений на кредит, пока не
+достигнута цель или не кончился бюджет. Каждая пара обходится не реже
+раза в SCRAPER_RECRAWL_MAX_INTERVAL_HOURS.
+
+Следующий обход отсчитывается от последней попытки, в том числе неудачной;
+после неудачных обходов подряд интервал удваивается (не дольше
+SCRAPER_RECRAWL_MAX_INTERVAL_HOURS), чтобы недоступная пара не обходилась
+на каждом такте.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from src.core.config import settings
+from src.crud.crud_listing import listing as crud_listing
+from src.crud.crud_scraping_session import scraping_session as crud_scraping_session
+
+logger = logging.getLogger(__name__)
+
+Pair = Tuple[str, str]
+
+
+def _as_utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """Время из БД в наивном UTC (SQLite и PostgreSQL возвращают по-разному)"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class RecrawlScheduler:
+    """Интервалы обхода пар (источник, город) по наблюдаемому темпу новых объявлений"""
+
+    def __init__(
+        self,
+        freshness_target: float = 0.9,
+        freshness_window_minutes: float = 60,
+        budget_credits_per_hour: Optional[float] = None,
+        max_interval_hours: float = 24,
+        default_interval_hours: float = 6,
+        history_sessions: int = 10,
+        history_days: int = 14,
+    ):
+        """
+        Args:
+            freshness_target: Целевая доля новых объявлений, увиденных за окно
+            freshness_window_minutes: Окно свежести N, минут
+            budget_credits_per_hour: Бюджет ScraperAPI в час (None - как при обходе раз в default_interval_hours)
+            max_interval_hours: Каждая пара обходится не реже
+            default_interval_hours: Интервал для пар без истории
+            history_sessions: Сколько последних обходов пары учитывать в оценке темпа
+            history_days: Насколько далеко смотреть в историю
+        """
+        self.freshness_target = min(max(freshness_target, 0.0), 1.0)
+        self.window_hours = max(freshness_window_minutes, 1) / 60
+        self.budget_credits_per_hour = budget_credits_per_hour
+        self.max_interval_hours = max(max_interval_hours, self.window_hours)
+        self.default_interval_hours = default_interval_hours
+        self.history_sessions = max(2, history_sessions)
+        self.history_days = history_days
+        self.last_schedule: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_settings(cls) -> 'RecrawlScheduler':
+        return cls(
+            freshness_target=settings.SCRAPER_FRESHNESS_TARGET,
+            freshness_window_minutes=settings.SCRAPER_FRESHNESS_WINDOW_MINUTES,
+            budget_credits_per_hour=settings.SCRAPER_RECRAWL_BUDGET_CREDITS_PER_HOUR or None,
+            max_interval_hours=settings.SCRAPER_RECRAWL_MAX_INTERVAL_HOURS,
+            default_interval_hours=settings.SCRAPER_WORKER_INTERVAL_HOURS,
+            history_sessions=settings.SCRAPER_RECRAWL_HISTORY_SESSIONS,
+        )
+
+    # --- Статистика обходов ---
+
+    def record_crawl(
+        self,
+        db: Session,
+        *,
+        source: str,
+        city: str,
+        external_ids: Iterable[str],
+        started_at: datetime,
+        filters_used: Optional[Dict[str, Any]] = None,
+        errors: Optional[Dict[str, int]] = None,
+    ) -> Optional[int]:
+        """
+        Сохранить итог обхода пары: сколько объявлений найдено и сколько из них новых
+        (и ошибки запросов по видам)
+
+        Вызывается до сохранения объявлений в базу, иначе все они будут известными.
+        Обход без объявлений считается неудачным: он не участвует в оценке темпа,
+        но сдвигает следующий обход (с удвоением интервала).
+
+        Returns:
+            Число новых объявлений или None при ошибке
+        """
+        ids = [external_id for external_id in dict.fromkeys(external_ids) if external_id]
+        try:
+            known = crud_listing.get_existing_external_ids(db, source=source, external_ids=ids)
+            new = len(ids) - len(known)
+            crud_scraping_session.record_crawl(
+                db,
+                source=source,
+                city=city,
+                found=len(ids),
+                new=new,
+                started_at=started_at,
+                completed_at=datetime.utcnow(),
+                filters_used=filters_used,
+                status="completed" if ids else "failed",
+                errors=errors,
+            )
+            return new
+        except Exception as e:
+            logger.error(f"❌ [{source}/{city}] Ошибка сохранения статистики обхода: {e}")
+            db.rollback()
+            return None
+
+    def estimate_rates(self, db: Session) -> Dict[Pair, Dict[str, Any]]:
+        """
+        Темп новых объявлений по парам из последних обходов
+
+        λ = новые объявления в обходах после первого / время между первым и последним обходом
+        (только завершенные обходы). last_crawl_at - последняя попытка любого статуса,
+        failures - неудачные попытки подряд после последнего завершенного обхода.
+        """
+        since = datetime.utcnow() - timedelta(days=self.history_days)
+        history: Dict[Pair, List[Any]] = {}
+        for session in crud_scraping_session.get_finished_since(db, since=since):
+            city = (session.filters_used or {}).get('city')
+            if city:
+                history.setdefault((session.source, city), []).append(session)
+
+        rates = {}
+        for pair, attempts in history.items():
+            failures = 0
+            for session in reversed(attempts):
+                if session.status != "failed":
+                    break
+                failures += 1
+
+            rate, samples = None, 0
+            sessions = [session for session in attempts if session.status != "failed"][-self.history_sessions:]
+            if len(sessions) > 1:
+                first_at = _as_utc_naive(sessions[0].started_at)
+                hours = (_as_utc_naive(sessions[-1].started_at) - first_at).total_seconds() / 3600
+                new = sum(session.new_listings_added or 0 for session in sessions[1:])
+                rate = new / hours if hours > 0 else None
+                samples = len(sessions) - 1
+            rates[pair] = {
+                'rate_per_hour': rate,
+                'samples': samples,
+                'last_crawl_at': _as_utc_naive(attempts[-1].started_at),
+                'failures': failures,
+            }
+        return rates
+
+    # --- Расписание ---
+
+    def compute_schedule(
+        self,
+        tasks: List[Dict[str, Any]],
+        rates: Dict[Pair, Dict[str, Any]],
+        now: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        """
+        Интервалы для задач плана обхода
+
+        Args:
+            tasks: Задачи планировщика обхода ({'source', 'city', 'max_pages', 'estimated_credits'})
+            rates: Оценки темпа (estimate_rates)
+            now: Текущее время (наивный UTC)
+        """
+        now = now or datetime.utcnow()
+        window = self.window_hours
+
+        budget = self.budget_credits_per_hour
+        if budget is None:
+            budget = sum(task['estimated_credits'] for task in tasks) / max(self.default_interval_hours, window)
+
+        pairs = []
+        for task in tasks:
+            rate_info = rates.get((task['source'], task['city']), {})
+            rate = rate_info.get('rate_per_hour')
+            pairs.append({
+                'source': task['source'],
+                'city': task['city'],
+                'max_pages': task['max_pages'],
+                'cost_credits': max(task['estimated_credits'], 1),
+                'rate_per_hour': round(rate, 3) if rate is not None else None,
+                'last_crawl_at': rate_info.get('last_crawl_at'),
+                'failures': rate_info.get('failures', 0),
+                # Базовая частота: пары без истории - по умолчанию, остальные - не реже max_interval
+                'frequency': 1 / (self.default_interval_hours if rate is None else self.max_interval_hours),
+            })
+
+        spent = sum(pair['cost_credits'] * pair['frequency'] for pair in pairs)
+        known = [pair for pair in pairs if pair['rate_per_hour'] is not None]
+        total_rate = sum(pair['rate_per_hour'] for pair in known)
+
+        def coverage(pair: Dict[str, Any]) -> float:
+            return min(1.0, window * pair['frequency'])
+
+        value = sum(pair['rate_per_hour'] * coverage(pair) for pair in known)
+        target_value = self.freshness_target * total_rate
+
+        # Повышаем частоту парам с наибольшим числом новых объявлений на кредит
+        for pair in sorted(known, key=lambda p: p['rate_per_hour'] / p['cost_credits'], reverse=True):
+            if value >= target_value or pair['rate_per_hour'] <= 0 or spent >= budget:
+                break
+            headroom = 1 / window - pair['frequency']
+            if headroom <= 0:
+                continue
+            needed = (target_value - value) / (pair['rate_per_hour'] * window)
+            affordable = (budget - spent) / pair['cost_credits']
+            extra = min(headroom, needed, affordable)
+            pair['frequency'] += extra
+            spent += extra * pair['cost_credits']
+            value += extra * pair['rate_per_hour'] * window
+
+        # После неудачных обходов подряд интервал удваивается (не дольше max_interval)
+        for pair in pairs:
+            failures = min(pair['failures'], 16)
+            if not failures:
+                continue
+            backoff_hours = min(2 ** failures / pair['frequency'], self.max_interval_hours)
+            frequency = min(pair['frequency'], 1 / backoff_hours)
+            spent -= (pair['frequency'] - frequency) * pair['cost_credits']
+            if pair['rate_per_hour'] is not None:
+                value -= pair['rate_per_hour'] * (coverage(pair) - min(1.0, window * frequency))
+            pair['frequency'] = frequency
+
+        for pair in pairs:
+            interval_hours = 1 / pair['frequency']
+            last_crawl_at = pair['last_crawl_at']
+            pair['interval_minutes'] = round(interval_hours * 60, 1)
+            pair['next_crawl_at'] = last_crawl_at + timedelta(hours=interval_hours) if last_crawl_at else now
+            pair['expected_freshness'] = round(coverage(pair), 3)
+            pair['credits_per_hour'] = round(pair['cost_credits'] * pair['frequency'], 2)
+            del pair['frequency']
+
+        return {
+            'computed_at': now,
+            'freshness_target': self.freshness_target,
+            'freshness_window_minutes': round(window * 60),
+            'expected_freshness': round(value / total_rate, 3) if total_rate else None,
+            'budget_credits_per_hour': round(budget, 2),
+            'credits_per_hour': round(spent, 2),
+            'pairs': sorted(pairs, key=lambda pair: pair['next_crawl_at']),
+        }
+
+    def schedule(self, db: Session, tasks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Расписание по текущей истории обходов (последнее сохраняется для просмотра)"""
+        try:
+            rates = self.estimate_rates(db)
+        except Exception as e:
+            logger.error(f"❌ Ошибка оценки темпа новых объявлений: {e}")
+            rates = {}
+        self.last_schedule = self.compute_schedule(tasks, rates)
+        return self.last_schedule
+
+    def due_tasks(self, db: Session, tasks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Задачи плана, которым пора обходиться"""
+        schedule = self.schedule(db, tasks)
+        now = schedule['computed_at']
+        due = {(pair['source'], pair['city']) for pair in schedule['pairs'] if pair['next_crawl_at'] <= now}
+        self.log_schedule(schedule, due)
+        return [task for task in tasks if (task['source'], task['city']) in due]
+
+    @staticmethod
+    def log_schedule(schedule: Dict[str, Any], due: Optional[set] = None) -> None:
+        freshness = schedule['expected_freshness']
+        logger.info(
+            f"⏱️ Расписание обхода: свежесть {freshness if freshness is not None else 'н/д'} "
+            f"(цель {schedule['freshness_target']} за {schedule['freshness_window_minutes']} мин), "
+            f"{schedule['credits_per_hour']}/{schedule['budget_credits_per_hour']} кредитов в час"
+        )
+        for pair in schedule['pairs']:
+            mark = "▶️" if due and (pair['source'], pair['city']) in due else "⏸️"
+            logger.info(
+                f"   {mark} {pair['source']}/{pair['city']}: λ={pair['rate_per_hour']}/ч, "
+                f"каждые {pair['interval_minutes']} мин, следующий {pair['next_crawl_at']:%H:%M %d.%m}"
+            )
+
+
+# Глобальный планировщик интервалов
+recrawl_scheduler = RecrawlScheduler.from_settings()
@@ -4,11 +4,22 @@
 import logging
 import asyncio
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
 
 from src.parsers import CasaScraper, SubitoScraper, IdealistaScraper, ImmobiliareScraper
+from src.parsers.http_client import get_http_session, close_http_session
+from src.parsers.rate_limiter import scraperapi_limiter
+from src.parsers.resilience import circuit_breakers
+from src.parsers.incremental import IncrementalCrawl
+from src.parsers.detail_cache import DetailFetchPolicy, detail_cache
+from src.parsers.coords_cache import CoordsLookup, coords_cache
+from src.parsers.description_analyzer import DescriptionAnalyzer, analysis_cache
+from src.parsers.fetch_strategy import fetch_strategies
+from src.parsers.cities import DEFAULT_CITY, normalize_city
+from src.core.config import settings
 from src.crud.crud_listing import listing as crud_listing
+from src.services.recrawl_scheduler import recrawl_scheduler
 from src.schemas.listing import ListingCreate
 from src.db.models import Listing
 
@@ -22,15 +33,111 @@ class ScrapingService:
     """
     
     def __init__(self):
-        # Инициализируем все скраперы
+        # Все скраперы ходят через общую HTTP сессию (src.parsers.http_client)
         self.casa_scraper = CasaScraper(max_concurrent=5, enable_geocoding=False)
-        self.subito_scraper = SubitoScraper(enable_geocoding=False, fetch_coords=False)
+        self.subito_scraper = self._build_subito_scraper(DEFAULT_CITY)
         self.idealista_scraper = IdealistaScraper(max_concurrent=5, enable_geocoding=False)
-        self.immobiliare_scraper = ImmobiliareScraper(enable_geocoding=False)
+        self.immobiliare_scraper = ImmobiliareScraper(max_concurrent=5, enable_geocoding=False)
+        
+        # Скраперы других городов создаются по требованию: (источник, город) -> скрапер
+        self._scrapers: Dict[Tuple[str, str], Any] = {
+            ('casa_it', DEFAULT_CITY): self.casa_scraper,
+            ('subito', DEFAULT_CITY): self.subito_scraper,
+            ('idealista', DEFAULT_CITY): self.idealista_scraper,
+            ('immobiliare', DEFAULT_CITY): self.immobiliare_scraper,
+        }
         
         # Настройки по умолчанию
         self.default_max_pages = 5
         
+    async def close(self) -> None:
+        """Закрыть общую HTTP сессию скраперов (при остановке воркера)"""
+        await close_http_session()
+    
+    @staticmethod
+    def _build_subito_scraper(city: str) -> SubitoScraper:
+        """Subito: координаты новых объявлений с детальных страниц (известные - из кеша и базы)"""
+        return SubitoScraper(
+            enable_geocoding=False,
+            fetch_coords=settings.SCRAPER_SUBITO_FETCH_COORDS,
+            max_coords_fetch=settings.SCRAPER_SUBITO_MAX_COORDS_FETCH,
+            city=city,
+        )
+    
+    def get_scraper(self, source: str, city: str = DEFAULT_CITY):
+        """Скрапер источника для города (slug из src.parsers.cities)"""
+        key = (source, city)
+        if key not in self._scrapers:
+            if source == 'casa_it':
+                scraper = CasaScraper(max_concurrent=5, enable_geocoding=False, city=city)
+            elif source == 'subito':
+                scraper = self._build_subito_scraper(city)
+            elif source == 'idealista':
+                scraper = IdealistaScraper(max_concurrent=5, enable_geocoding=False, city=city)
+            elif source == 'immobiliare':
+                scraper = ImmobiliareScraper(max_concurrent=5, enable_geocoding=False, city=city)
+            else:
+                raise ValueError(f"Неизвестный источник: {source}")
+            self._scrapers[key] = scraper
+        return self._scrapers[key]
+    
+    def _resolve_city(self, filters: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Город из фильтров (по умолчанию Рим); None - город не поддерживается"""
+        requested = (filters or {}).get('city')
+        if not requested:
+            return DEFAULT_CITY
+        city = normalize_city(requested)
+        if city is None:
+            logger.warning(f"⚠️ Город '{requested}' не поддерживается сайтами-источниками")
+        return city
+    
+    def get_rate_limiter_stats(self) -> Dict[str, Any]:
+        """Метрики общего лимитера ScraperAPI и выключателей по источникам"""
+        return {**scraperapi_limiter.snapshot(), 'circuit_breakers': circuit_breakers.snapshot()}
+    
+    def _build_incremental(self, source: str, db: Session) -> IncrementalCrawl:
+        """Трекер инкрементального обхода: сверяет ID страницы с базой одним запросом"""
+        return IncrementalCrawl(
+            source=source,
+            known_ids_lookup=lambda ids: crud_listing.get_existing_external_ids(
+                db, source=source, external_ids=ids
+            ),
+            stop_after_pages=settings.SCRAPER_INCREMENTAL_STOP_AFTER_PAGES,
+        )
+    
+    def _build_detail_policy(self, source: str, db: Session) -> DetailFetchPolicy:
+        """Политика пропуска детальных страниц по снимкам карточек из базы"""
+        # Заголовок карточки Idealista не совпадает с заголовком детальной страницы,
+        # который хранится в базе - сравниваем только цену
+        compare_fields = ('price',) if source == 'idealista' else ('price', 'title')
+        return DetailFetchPolicy(
+            source=source,
+            snapshot_lookup=lambda ids: crud_listing.get_card_snapshots(
+                db, source=source, external_ids=ids
+            ),
+            compare_fields=compare_fields,
+            require_description=source == 'immobiliare',
+            refresh_after_days=settings.SCRAPER_DETAIL_REFRESH_DAYS,
+        )
+    
+    def _build_coords_lookup(self, source: str, db: Session) -> CoordsLookup:
+        """Координаты уже сохраненных объявлений (промахи кеша координат сверяются с базой)"""
+        return lambda ids: crud_listing.get_coordinates(db, source=source, external_ids=ids)
+    
+    def _log_incremental_stats(self, incremental: Optional[IncrementalCrawl]) -> None:
+        if incremental is None:
+            return
+        stats = incremental.stats
+        stopped = f"остановлен на странице {stats['stopped_at_page']}" if stats['stopped_at_page'] else "дошел до max_pages"
+        logger.info(
+            f"🆕 [{incremental.source}] Инкрементальный обход: {stats['pages_checked']} страниц "
+            f"(не загружено {stats['pages_failed']}), {stats['new_ids']} новых, {stats['known_ids']} известных, {stopped}"
+        )
+    
+    def get_fetch_strategy_report(self) -> Dict[str, Any]:
+        """Статистика уровней ScraperAPI: задержка, кредиты на объявление, доля успеха"""
+        return fetch_strategies.report()
+    
     def get_available_sources(self) -> List[str]:
         """Получить список доступных источников"""
         return ['casa_it', 'subito', 'idealista', 'immobiliare']
@@ -38,16 +145,22 @@ class ScrapingService:
     async def scrape_casa_async(
         self,
         filters: Dict[str, Any],
-        max_pages: int = None
+        max_pages: int = None,
+        incremental: Optional[IncrementalCrawl] = None
     ) -> List[Dict[str, Any]]:
         """Асинхронный парсинг Casa.it"""
         if max_pages is None:
             max_pages = self.default_max_pages
+        
+        city = self._resolve_city(filters)
+        if city is None:
+            return []
             
         try:
-            logger.info(f"🚀 Запускаем парсинг Casa.it на {max_pages} страниц")
-            listings = await self.casa_scraper.scrape_multiple_pages(max_pages=max_pages)
-            logger.info(f"✅ Получено {len(listings)} объявлений из Casa.it")
+            logger.info(f"🚀 Запускаем парсинг Casa.it ({city}) на {max_pages} страниц")
+            listings = await self.get_scraper('casa_it', city).scrape_multiple_pages(max_pages=max_pages, incremental=incremental)
+            logger.info(f"✅ Получено {len(listings)} объявлений из Casa.it ({city})")
+            self._log_incremental_stats(incremental)
             return listings
         except Exception as e:
             logger.error(f"❌ Ошибка парсинга Casa.it: {e}")
@@ -56,16 +169,25 @@ class ScrapingService:
     async def scrape_subito_async(
         self,
         filters: Dict[str, Any],
-        max_pages: int = None
+        max_pages: int = None,
+        incremental: Optional[IncrementalCrawl] = None,
+        coords_lookup: Optional[CoordsLookup] = None
     ) -> List[Dict[str, Any]]:
         """Асинхронный парсинг Subito"""
         if max_pages is None:
             max_pages = self.default_max_pages
+        
+        city = self._resolve_city(filters)
+        if city is None:
+            return []
             
         try:
-            logger.info(f"🚀 Запускаем парсинг Subito.it на {max_pages} страниц")
-            listings = await self.subito_scraper.scrape_multiple_pages(max_pages=max_pages)
-            logger.info(f"✅ Получено {len(listings)} объявлений из Subito.it")
+            logger.info(f"🚀 Запускаем парсинг Subito.it ({city}) на {max_pages} страниц")
+            listings = await self.get_scraper('subito', city).scrape_multiple_pages(
+                max_pages=max_pages, incremental=incremental, coords_lookup=coords_lookup
+            )
+            logger.info(f"✅ Получено {len(listings)} объявлений из Subito.it ({city})")
+            self._log_incremental_stats(incremental)
             return listings
         except Exception as e:
             logger.error(f"❌ Ошибка парсинга Subito.it: {e}")
@@ -74,16 +196,25 @@ class ScrapingService:
     async def scrape_idealista_async(
         self,
         filters: Dict[str, Any],
-        max_pages: int = None
+        max_pages: int = None,
+        incremental: Optional[IncrementalCrawl] = None,
+        detail_policy: Optional[DetailFetchPolicy] = None
     ) -> List[Dict[str, Any]]:
         """Асинхронный парсинг Idealista"""
         if max_pages is None:
             max_pages = self.default_max_pages
+        
+        city = self._resolve_city(filters)
+        if city is None:
+            return []
             
         try:
-            logger.info(f"🚀 Запускаем парсинг Idealista.it на {max_pages} страниц")
-            listings = await self.idealista_scraper.scrape_multiple_pages(max_pages=max_pages)
-            logger.info(f"✅ Получено {len(listings)} объявлений из Idealista.it")
+            logger.info(f"🚀 Запускаем парсинг Idealista.it ({city}) на {max_pages} страниц")
+            listings = await self.get_scraper('idealista', city).scrape_multiple_pages(
+                max_pages=max_pages, incremental=incremental, detail_policy=detail_policy
+            )
+            logger.info(f"✅ Получено {len(listings)} объявлений из Idealista.it ({city})")
+            self._log_incremental_stats(incremental)
             return listings
         except Exception as e:
             logger.error(f"❌ Ошибка парсинга Idealista.it: {e}")
@@ -92,16 +223,25 @@ class ScrapingService:
     async def scrape_immobiliare_async(
         self,
         filters: Dict[str, Any],
-        max_pages: int = None
+        max_pages: int = None,
+        incremental: Optional[IncrementalCrawl] = None,
+        detail_policy: Optional[DetailFetchPolicy] = None
     ) -> List[Dict[str, Any]]:
         """Асинхронный парсинг Immobiliare.it"""
         if max_pages is None:
             max_pages = self.default_max_pages
+        
+        city = self._resolve_city(filters)
+        if city is None:
+            return []
             
         try:
-            logger.info(f"🚀 Запускаем парсинг Immobiliare.it на {max_pages} страниц")
-            listings = await self.immobiliare_scraper.scrape_multiple_pages(max_pages=max_pages)
-            logger.info(f"✅ Получено {len(listings)} объявлений из Immobiliare.it")
+            logger.info(f"🚀 Запускаем парсинг Immobiliare.it ({city}) на {max_pages} страниц")
+            listings = await self.get_scraper('immobiliare', city).scrape_multiple_pages(
+                max_pages=max_pages, incremental=incremental, detail_policy=detail_policy
+            )
+            logger.info(f"✅ Получено {len(listings)} объявлений из Immobiliare.it ({city})")
+            self._log_incremental_stats(incremental)
             return listings
         except Exception as e:
             logger.error(f"❌ Ошибка парсинга Immobiliare.it: {e}")
@@ -110,42 +250,194 @@ class ScrapingService:
     async def scrape_all_sources(
         self,
         filters: Dict[str, Any],
-        max_pages: int = None
+        max_pages: int = None,
+        db: Optional[Session] = None,
+        incremental: bool = False,
+        record_ingest: bool = False
     ) -> List[Dict[str, Any]]:
         """
         ОСНОВНОЙ МЕТОД: Асинхронный парсинг всех источников
         
         Args:
-            filters: Фильтры поиска
+            filters: Фильтры поиска (city - город обхода, по умолчанию Рим)
             max_pages: Максимальное количество страниц на источник
+            db: Сессия БД (нужна для инкрементального режима)
+            incremental: Останавливать пагинацию, когда страницы перестают давать новые объявления.
+                         False - полный обход всех max_pages (сверка)
+            record_ingest: Сохранить статистику обхода (сколько новых объявлений) для расписания
             
         Returns:
             List[Dict]: Объединенный список объявлений из всех источников
         """
         if max_pages is None:
             max_pages = self.default_max_pages
+        
+        city = self._resolve_city(filters)
+        if city is None:
+            return []
+        
+        tasks = [
+            {'source': source, 'city': city, 'max_pages': max_pages}
+            for source in self.get_available_sources()
+        ]
+        return await self.scrape_planned(tasks, db=db, incremental=incremental, record_ingest=record_ingest)
+    
+    async def scrape_planned(
+        self,
+        tasks: List[Dict[str, Any]],
+        db: Optional[Session] = None,
+        incremental: bool = False,
+        record_ingest: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Парсинг по плану: задачи (источник, город, глубина) выполняются параллельно
+        
+        Args:
+            tasks: [{'source', 'city', 'max_pages'}] (см. src/services/crawl_planner.py)
+            db: Сессия БД (нужна для инкрементального режима)
+            incremental: Останавливать пагинацию, когда страницы перестают давать новые объявления
+            record_ingest: Сохранить статистику каждой задачи в scraping_sessions
+                           (до сохранения объявлений, иначе новые не отличить от известных)
             
-        logger.info(f"🔍 Начинаем парсинг всех источников (max_pages={max_pages})")
+        Returns:
+            List[Dict]: Объединенный список объявлений по всем задачам
+        """
+        results = await self.scrape_tasks(tasks, db=db, incremental=incremental, record_ingest=record_ingest)
+        all_listings = [listing for result in results for listing in result]
+        logger.info(f"📊 Всего получено {len(all_listings)} объявлений из всех источников")
+        return all_listings
+    
+    async def scrape_tasks(
+        self,
+        tasks: List[Dict[str, Any]],
+        db: Optional[Session] = None,
+        incremental: bool = False,
+        record_ingest: bool = False
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Параллельный парсинг задач с результатом по каждой (для очереди задач обхода)
         
-        # Запускаем парсинг всех источников параллельно
-        results = await asyncio.gather(
-            self.scrape_casa_async(filters, max_pages),
-            self.scrape_subito_async(filters, max_pages),
-            self.scrape_idealista_async(filters, max_pages),
-            self.scrape_immobiliare_async(filters, max_pages),
-            return_exceptions=True
+        Returns:
+            List[List[Dict]]: Объявления каждой задачи в порядке tasks (пустой список при ошибке)
+        """
+        if incremental and db is None:
+            logger.warning("⚠️ Инкрементальный режим требует сессию БД - выполняем полный обход")
+            incremental = False
+        
+        mode = "инкрементальный" if incremental else "полный"
+        cities = sorted({task['city'] for task in tasks})
+        logger.info(
+            f"🔍 Начинаем парсинг: {len(tasks)} задач, города: {', '.join(cities)} (режим: {mode})"
         )
         
-        # Объединяем результаты
-        all_listings = []
-        for result in results:
+        detail_policies = {
+            source: self._build_detail_policy(source, db)
+            if db is not None and settings.SCRAPER_DETAIL_SKIP_UNCHANGED else None
+            for source in ('idealista', 'immobiliare')
+        }
+        runners = {
+            'casa_it': self.scrape_casa_async,
+            'subito': self.scrape_subito_async,
+            'idealista': self.scrape_idealista_async,
+            'immobiliare': self.scrape_immobiliare_async,
+        }
+        
+        # Прогреваем общую сессию до запуска, чтобы все источники делили один пул
+        await get_http_session()
+        started_at = datetime.utcnow()
+        
+        # Задачи всех источников и городов запускаются параллельно - нагрузку ограничивает общий лимитер
+        coroutines = []
+        for task in tasks:
+            source = task['source']
+            args = [
+                {'city': task['city']},
+                task['max_pages'],
+                self._build_incremental(source, db) if incremental else None,
+            ]
+            if source in detail_policies:
+                args.append(detail_policies[source])
+            elif source == 'subito' and db is not None:
+                args.append(self._build_coords_lookup(source, db))
+            coroutines.append(runners[source](*args))
+        results = await asyncio.gather(*coroutines, return_exceptions=True)
+        
+        # Результаты по задачам
+        task_listings = []
+        for task, result in zip(tasks, results):
             if isinstance(result, Exception):
                 logger.error(f"❌ Ошибка парсинга: {result}")
-            elif isinstance(result, list):
-                all_listings.extend(result)
+            if not isinstance(result, list):
+                result = []
+            task_listings.append(result)
+            if record_ingest and db is not None:
+                recrawl_scheduler.record_crawl(
+                    db,
+                    source=task['source'],
+                    city=task['city'],
+                    external_ids=[listing.get('external_id') for listing in result],
+                    started_at=started_at,
+                    filters_used={'max_pages': task['max_pages'], 'incremental': incremental},
+                    errors=self.get_scraper(task['source'], task['city']).crawl_errors,
+                )
         
-        logger.info(f"📊 Всего получено {len(all_listings)} объявлений из всех источников")
-        return all_listings
+        self._log_cycle_reports(detail_policies)
+        return task_listings
+    
+    def _log_cycle_reports(self, detail_policies: Dict[str, Optional[DetailFetchPolicy]]) -> None:
+        """Сводки цикла: детальные страницы, уровни ScraperAPI, лимитер"""
+        for source, policy in detail_policies.items():
+            if policy is not None:
+                logger.info(
+                    f"🗂️ [{source}] Детальные страницы: {policy.stats['new']} новых, "
+                    f"{policy.stats['changed']} изменившихся, {policy.stats['unchanged']} пропущено"
+                )
+        logger.info(
+            f"🗂️ Кеш детальных страниц: {detail_cache.stats['hits']} попаданий, "
+            f"{detail_cache.stats['misses']} промахов, {detail_cache.size_bytes() / 1024 / 1024:.1f} МБ"
+        )
+        
+        logger.info(
+            f"📍 Кеш координат: {coords_cache.stats['hits']} из кеша, {coords_cache.stats['db_hits']} из базы, "
+            f"{coords_cache.stats['misses']} неизвестных"
+        )
+        
+        logger.info(
+            f"📝 Кеш анализа описаний: {analysis_cache.stats['hits']} попаданий, "
+            f"{analysis_cache.stats['misses']} разобрано, {len(analysis_cache)} записей"
+        )
+        
+        for source, source_report in self.get_fetch_strategy_report().items():
+            for tier, tier_report in source_report['tiers'].items():
+                if tier_report['attempts']:
+                    logger.info(
+                        f"🎚️ [{source}] {tier}: {tier_report['attempts']} запросов, "
+                        f"успех {tier_report['success_rate']}, {tier_report['avg_latency_seconds']}с, "
+                        f"кредитов на объявление {tier_report['credits_per_listing']}"
+                    )
+        
+        limiter_stats = self.get_rate_limiter_stats()
+        logger.info(
+            f"🚦 ScraperAPI лимитер: лимит {limiter_stats['limit']}, снижений {limiter_stats['decreases']}"
+        )
+        for source, breaker in limiter_stats['circuit_breakers'].items():
+            if breaker['opened']:
+                logger.info(
+                    f"   ⛔ {source}: выключатель {breaker['state']}, размыканий {breaker['opened']}, "
+                    f"отклонено запросов {breaker['rejected']}"
+                )
+        for source, source_stats in limiter_stats['sources'].items():
+            logger.info(
+                f"   📌 {source}: {source_stats['requests']} запросов, {source_stats['success']} успешно, "
+                f"{source_stats['throttled']} 429, {source_stats['server_errors']} 5xx, "
+                f"{source_stats['timeouts']} таймаутов, ожидание {source_stats['avg_wait_seconds']}с"
+            )
+    
+    @staticmethod
+    def _stamp_analyzer_version(listing_data: Dict[str, Any]) -> None:
+        """Поля фильтров из описания посчитаны текущей версией правил DescriptionAnalyzer"""
+        if listing_data.get('description'):
+            listing_data.setdefault('analyzer_version', DescriptionAnalyzer.RULES_VERSION)
     
     def save_listings_to_db(
         self,
@@ -196,6 +488,8 @@ class ScrapingService:
                     stats["by_source"][source]["errors"] += 1
                     continue
                 
+                self._stamp_analyzer_version(listing_data)
+                
                 # Сначала проверяем по external_id + source (основной способ)
                 existing = crud_listing.get_by_external_id(
                     db=db,
@@ -300,6 +594,8 @@ class ScrapingService:
                 logger.warning("⚠️ Объявление без external_id, пропускаем")
                 return "error"
             
+            self._stamp_analyzer_version(listing_data)
+            
             existing = crud_listing.get_by_external_id(
                 db=db,
                 external_id=external_id,
@@ -335,7 +631,9 @@ class ScrapingService:
         self,
         filters: Dict[str, Any],
         db: Session,
-        max_pages: int = None
+        max_pages: int = None,
+        incremental: bool = False,
+        plan: Optional[List[Dict[str, Any]]] = None
     ) -> Dict[str, Any]:
         """
         Полный цикл: парсинг + сохранение в БД
@@ -344,6 +642,8 @@ class ScrapingService:
             filters: Фильтры поиска
             db: Сессия базы данных
             max_pages: Максимальное количество страниц
+            incremental: Инкрементальный обход (стоп пагинации, когда нет новых объявлений)
+            plan: Задачи планировщика (источник × город × глубина) вместо filters/max_pages
             
         Returns:
             Dict: Результаты операции
@@ -352,7 +652,12 @@ class ScrapingService:
         
         try:
             # Шаг 1: Парсинг
-            listings = await self.scrape_all_sources(filters, max_pages)
+            if plan:
+                listings = await self.scrape_planned(plan, db=db, incremental=incremental, record_ingest=True)
+            else:
+                listings = await self.scrape_all_sources(
+                    filters, max_pages, db=db, incremental=incremental, record_ingest=True
+                )
             
             if not listings:
                 return {
@@ -376,6 +681,8 @@ class ScrapingService:
                 "updated_count": saved_stats["updated"],
                 "error_count": saved_stats["errors"],
                 "sources": ["casa_it", "subito", "idealista", "immobiliare"],
+                "cities": sorted({task['city'] for task in plan}) if plan else [self._resolve_city(filters)],
+                "incremental": incremental,
                 "elapsed_time": elapsed_time
             }
             
@@ -415,7 +722,9 @@ class ScrapingService:
             else:
                 logger.error(f"❌ Неподдерживаемый источник: {source}")
                 result = []
-                
+            
+            # Сессия привязана к этому loop - закрываем вместе с ним
+            loop.run_until_complete(close_http_session())
             loop.close()
             return result
             
@@ -18,6 +18,7 @@ from src.db.database import get_db
 from src.crud.crud_user import get_user_by_email, link_telegram, get_by_telegram_chat_id
 from src.crud.crud_filter import filter as crud_filter
 from src.schemas.user import UserTelegramLink
+from src.services.message_cache import message_cache
 
 # Настройка логирования
 logging.basicConfig(
@@ -623,17 +624,22 @@ def format_floor_info(floor_data) -> str:
         return str(floor_data).strip() if floor_data else ""
 
 
-def format_single_listing_message(listing, filter_obj) -> str:
+# Версия шаблона тела сообщения: увеличивать при изменении format_listing_body
+LISTING_TEMPLATE_VERSION = 1
+
+
+def _clean_text(text) -> str:
+    if not text:
+        return ""
+    return str(text).strip()
+
+
+def format_listing_body(listing) -> str:
     """
-    Форматирование сообщения для одного объявления
+    Тело сообщения об объявлении - одинаковое для всех получателей
     """
-    def clean_text(text: str) -> str:
-        if not text:
-            return ""
-        return str(text).strip()
-    
     # Заголовок
-    title = clean_text(listing.title) if listing.title else "Без названия"
+    title = _clean_text(listing.title) if listing.title else "Без названия"
     if len(title) > 80:
         title = title[:77] + "..."
     
@@ -641,7 +647,7 @@ def format_single_listing_message(listing, filter_obj) -> str:
     
     # Адрес
     if listing.address:
-        address = clean_text(listing.address)
+        address = _clean_text(listing.address)
         if len(address) > 100:
             address = address[:97] + "..."
         message += f"📍 {address}\n"
@@ -657,7 +663,7 @@ def format_single_listing_message(listing, filter_obj) -> str:
     if listing.area:
         details.append(f"📐 {listing.area} м²")
     if listing.property_type:
-        prop_type = clean_text(listing.property_type)
+        prop_type = _clean_text(listing.property_type)
         details.append(f"🏠 {prop_type}")
     if listing.floor:
         floor_info = format_floor_info(listing.floor)
@@ -683,11 +689,26 @@ def format_single_listing_message(listing, filter_obj) -> str:
     if listing.url:
         # Можно добавить редирект через наш сайт для аналитики
         # redirect_url = f"https://ita-rent-02.vercel.app/redirect/{listing.id}"
-        direct_url = clean_text(listing.url)
+        direct_url = _clean_text(listing.url)
         message += f"🔗 {direct_url}\n"
     
+    return message
+
+
+def format_single_listing_message(listing, filter_obj) -> str:
+    """
+    Форматирование сообщения для одного объявления
+    Тело берется из кеша прохода, подпись фильтра добавляется для получателя
+    """
+    message = message_cache.get_or_render(
+        getattr(listing, 'id', None),
+        'telegram',
+        lambda: format_listing_body(listing),
+        template_version=LISTING_TEMPLATE_VERSION,
+    )
+    
     # Информация о фильтре
-    message += f"\n🔍 Фильтр: {clean_text(filter_obj.name)}"
+    message += f"\n🔍 Фильтр: {_clean_text(filter_obj.name)}"
     
     # Управление
     message += f"\n/pause_{filter_obj.id} - приостановить фильтр"
@@ -11,6 +11,8 @@ from sqlalchemy.orm import Session
 from src.core.config import settings
 from src.db.database import get_db
 from src.crud.crud_user import get_user_by_whatsapp_phone, link_whatsapp, get_by_whatsapp_phone
+from src.services.message_cache import message_cache
+from src.services.notification_limits import notification_limits
 
 # Добавляем поддержку Twilio SDK
 try:
@@ -27,6 +29,9 @@ logger = logging.getLogger(__name__)
 class WhatsAppService:
     """Основной класс для работы с WhatsApp Business API"""
     
+    # Версия шаблона тела сообщения: увеличивать при изменении format_listing_body
+    LISTING_TEMPLATE_VERSION = 1
+    
     def __init__(self):
         if not settings.WHATSAPP_ENABLED:
             logger.warning("⚠️ WhatsApp уведомления отключены в конфигурации")
@@ -273,6 +278,24 @@ class WhatsAppService:
     def format_single_listing_message(self, listing: Dict, filter_name: str = "Ваш фильтр") -> str:
         """
         Форматирует сообщение для одного объявления (как в Telegram)
+        Тело берется из кеша прохода, подпись фильтра добавляется для получателя
+        """
+        body = message_cache.get_or_render(
+            listing.get('id'),
+            'whatsapp',
+            lambda: self.format_listing_body(listing),
+            template_version=self.LISTING_TEMPLATE_VERSION,
+        )
+        return "\n".join([
+            body,
+            "",
+            f"📍 _Фильтр: {filter_name}_",
+            "📱 *ITA_RENT_BOT*",
+        ])
+
+    def format_listing_body(self, listing: Dict) -> str:
+        """
+        Тело сообщения об объявлении - одинаковое для всех получателей
         """
         def clean_text(text) -> str:
             return str(text).strip() if text else ""
@@ -331,10 +354,6 @@ class WhatsAppService:
             domain = url.split('/')[2] if '/' in url else listing.get('source', 'источник')
             message_parts.append(f"🔗 {domain}")
         
-        message_parts.append("")
-        message_parts.append(f"📍 _Фильтр: {filter_name}_")
-        message_parts.append("📱 *ITA_RENT_BOT*")
-        
         return "\n".join(message_parts)
 
     async def send_individual_listings(self, phone_number: str, listings: List[Dict], filter_name: str) -> int:
@@ -360,11 +379,13 @@ class WhatsAppService:
                     first_image = images[0]
                     if first_image and (first_image.startswith('http://') or first_image.startswith('https://')):
                         logger.info(f"📸 Объявление {i}: отправляем с изображением")
+                        await notification_limits.acquire('whatsapp', phone_number)
                         success = await self.send_media_message(phone_number, message, first_image)
                 
                 # Если не получилось с изображением, отправляем без него
                 if not success:
                     logger.info(f"📝 Объявление {i}: отправляем без изображения")
+                    await notification_limits.acquire('whatsapp', phone_number)
                     success = await self.send_text_message(phone_number, message)
                 
                 if success:
@@ -372,10 +393,6 @@ class WhatsAppService:
                     logger.info(f"✅ Объявление {i}/{len(listings)} отправлено")
                 else:
                     logger.error(f"❌ Не удалось отправить объявление {i}")
-                
-                # Пауза между сообщениями (чтобы не спамить)
-                if i < len(listings):
-                    await asyncio.sleep(2)
                     
             except Exception as e:
                 logger.error(f"❌ Ошибка отправки объявления {i}: {e}")
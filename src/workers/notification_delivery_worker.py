@@ -0,0 +1,105 @@
+"""
+Воркер доставки уведомлений из outbox
+
+Забирает сообщения из таблицы notifications пачками, доставляет их по
+каналам и возвращает неудачные в очередь с экспоненциальной задержкой.
+Когда очередь пуста, ждет NOTIFICATION_OUTBOX_POLL_SECONDS.
+"""
+import asyncio
+import logging
+import signal
+import sys
+from typing import Optional
+
+from src.core.config import settings
+from src.services.notification_outbox import NotificationOutbox, notification_outbox
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationDeliveryWorker:
+    """Фоновый воркер: доставляет сообщения outbox, пока они есть, и повторяет неудачные"""
+
+    def __init__(
+        self,
+        outbox: Optional[NotificationOutbox] = None,
+        poll_seconds: Optional[int] = None,
+        run_once: bool = False,
+    ) -> None:
+        self.outbox = outbox or notification_outbox
+        self.poll_seconds = max(1, int(poll_seconds or settings.NOTIFICATION_OUTBOX_POLL_SECONDS))
+        self.run_once = run_once
+        self._stopped = False
+        self._stop_event: Optional[asyncio.Event] = None
+
+    def _register_signal_handlers(self, loop: asyncio.AbstractEventLoop) -> None:
+        if sys.platform.startswith("win"):
+            return  # signal handlers недоступны в asyncio на Windows
+
+        def _stop_from_signal() -> None:
+            logger.info("🛑 Получен сигнал остановки, завершаем работу воркера доставки...")
+            self.stop()
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, _stop_from_signal)
+            except NotImplementedError:
+                logger.debug("Не удалось установить обработчик сигнала %s", sig)
+
+    def stop(self) -> None:
+        """Остановить воркер после текущего прохода"""
+        if not self._stopped:
+            self._stopped = True
+            if self._stop_event and not self._stop_event.is_set():
+                self._stop_event.set()
+
+    async def run_cycle(self) -> Optional[dict]:
+        """Один проход: доставить все доступные сообщения (None - при ошибке)"""
+        db = self.outbox.session_factory()
+        try:
+            stats = await self.outbox.drain(db)
+            if stats["claimed"]:
+                logger.info(
+                    "📬 Доставка уведомлений: взято %s, доставлено %s, повтор %s, ошибок %s",
+                    stats["claimed"],
+                    stats["sent"],
+                    stats["retried"],
+                    stats["failed"],
+                )
+            return stats
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("❌ Ошибка во время доставки уведомлений: %s", exc)
+            return None
+        finally:
+            db.close()
+
+    async def run(self) -> None:
+        """Основной цикл воркера"""
+        loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        self._register_signal_handlers(loop)
+
+        logger.info(
+            "🚀 Запуск NotificationDeliveryWorker (poll=%s сек, batch=%s, once=%s)",
+            self.poll_seconds,
+            self.outbox.batch_size,
+            self.run_once,
+        )
+
+        while not self._stopped:
+            await self.run_cycle()
+            if self.run_once:
+                break
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.poll_seconds)
+                break
+            except asyncio.TimeoutError:
+                pass  # очередь проверяется снова
+
+        logger.info("👋 NotificationDeliveryWorker остановлен")
+
+
+async def run_worker(poll_seconds: Optional[int] = None, run_once: bool = False) -> None:
+    """Точка входа для воркера доставки"""
+    worker = NotificationDeliveryWorker(poll_seconds=poll_seconds, run_once=run_once)
+    await worker.run()
@@ -17,6 +17,9 @@ import os
 sys.path.insert(0, '/app')
 
 from src.services.scraping_service import ScrapingService
+from src.services.crawl_planner import crawl_planner
+from src.services.recrawl_scheduler import recrawl_scheduler
+from src.services.crawl_queue import crawl_queue
 from src.db.database import SessionLocal, engine
 from src.db.models import Base
 from src.core.config import settings
@@ -41,6 +44,18 @@ class ScraperWorker:
         # Читаем настройки из переменных окружения
         self.interval_hours = settings.SCRAPER_WORKER_INTERVAL_HOURS
         self.max_pages = settings.SCRAPER_WORKER_MAX_PAGES
+        # Инкрементальный обход с периодическим полным (сверка)
+        self.incremental_enabled = settings.SCRAPER_INCREMENTAL_ENABLED
+        self.full_crawl_every = max(1, settings.SCRAPER_FULL_CRAWL_EVERY_CYCLES)
+        self.cycle_number = 0
+        # Города и глубина обхода по спросу из активных фильтров
+        self.planner_enabled = settings.SCRAPER_CRAWL_PLANNER_ENABLED
+        # Интервалы по парам (источник, город) по темпу новых объявлений: воркер
+        # просыпается каждые tick минут и обходит только те пары, которым пора
+        self.adaptive_enabled = settings.SCRAPER_RECRAWL_ADAPTIVE
+        self.tick_minutes = max(1, settings.SCRAPER_RECRAWL_TICK_MINUTES)
+        # Очередь задач в БД: несколько реплик делят задачи цикла
+        self.queue_enabled = settings.SCRAPER_QUEUE_ENABLED
         
         # Настройка обработчиков сигналов для graceful shutdown
         signal.signal(signal.SIGINT, self.signal_handler)
@@ -61,6 +76,12 @@ class ScraperWorker:
             logger.error(f"❌ Ошибка создания таблиц БД: {e}")
             raise
             
+    def is_full_crawl_cycle(self) -> bool:
+        """Первый цикл и каждый N-й после него - полный обход всех страниц"""
+        if not self.incremental_enabled:
+            return True
+        return (self.cycle_number - 1) % self.full_crawl_every == 0
+    
     async def run_scraping_cycle(self, show_next_run: bool = True) -> bool:
         """
         Запуск одного цикла парсинга
@@ -72,9 +93,7 @@ class ScraperWorker:
             bool: True если парсинг прошел успешно
         """
         try:
-            logger.info("🚀 Начинаем цикл парсинга...")
-            
-            # Фильтры для парсинга (пока парсим Рим)
+            # Фильтры по умолчанию (без планировщика обходим только Рим)
             filters = {
                 "city": "roma",
                 "property_type": "apartment"
@@ -84,21 +103,46 @@ class ScraperWorker:
             db = SessionLocal()
             
             try:
+                # План обхода: бюджет ScraperAPI делится между городами по числу фильтров
+                plan = crawl_planner.build_plan(db) if self.planner_enabled else None
+                
+                if (self.adaptive_enabled or self.queue_enabled) and not plan:
+                    plan = crawl_planner.plan({crawl_planner.default_city: 1})
+                
+                if self.adaptive_enabled:
+                    # Из плана остаются пары, у которых подошел срок по расписанию
+                    plan = recrawl_scheduler.due_tasks(db, plan)
+                
+                if self.queue_enabled:
+                    return await self.run_queue_cycle(db, plan)
+                
+                if self.adaptive_enabled and not plan:
+                    logger.info("⏸️ Ни одной паре источник/город еще не пора обходиться")
+                    return True
+                
+                self.cycle_number += 1
+                incremental = not self.is_full_crawl_cycle()
+                mode = "инкрементальный" if incremental else "полный (сверка)"
+                logger.info(f"🚀 Начинаем цикл парсинга #{self.cycle_number}, режим: {mode}...")
+                
                 # Запускаем парсинг и сохранение
                 result = await self.scraping_service.scrape_and_save(
                     filters=filters,
                     db=db,
-                    max_pages=self.max_pages
+                    max_pages=self.max_pages,
+                    incremental=incremental,
+                    plan=plan
                 )
                 
                 if result["success"]:
                     logger.info(f"✅ Парсинг завершен успешно:")
+                    logger.info(f"   📍 Города: {', '.join(result.get('cities', []))}")
                     logger.info(f"   📋 Спаршено: {result['scraped_count']} объявлений")
                     logger.info(f"   💾 Сохранено: {result['saved_count']} объявлений")
                     logger.info(f"   ⏱️ Время: {result['elapsed_time']:.2f} сек")
                     
                     # Показываем время до следующего запуска
-                    if show_next_run:
+                    if show_next_run and not self.adaptive_enabled:
                         next_run = datetime.now() + timedelta(hours=self.interval_hours)
                         logger.info(f"⏰ Следующий запуск: {next_run.strftime('%H:%M %d.%m.%Y')} (через {self.interval_hours}ч)")
                     
@@ -114,11 +158,53 @@ class ScraperWorker:
             logger.error(f"❌ Критическая ошибка в цикле парсинга: {e}")
             return False
             
+    async def run_queue_cycle(self, db, plan) -> bool:
+        """
+        Цикл через очередь задач: поставить свои задачи и выполнять общие,
+        пока они есть (в том числе поставленные другими репликами и повторы)
+        """
+        if plan:
+            self.cycle_number += 1
+            incremental = not self.is_full_crawl_cycle()
+            # Без адаптивных интервалов срок пары - общий интервал: пару, которую другая
+            # реплика обошла в этом интервале, не ставим снова (сроки адаптивного
+            # расписания и так общие - по истории обходов в БД)
+            min_interval = None if self.adaptive_enabled else self.interval_hours * 3600
+            crawl_queue.enqueue(db, plan, incremental=incremental, min_interval_seconds=min_interval)
+        
+        result = await crawl_queue.drain(self.scraping_service, db)
+        if result['tasks']:
+            logger.info(
+                f"✅ Задачи очереди выполнены: {result['done']} успешно, {result['failed']} с ошибкой, "
+                f"спаршено {result['listings']}, новых в базе {result['saved']}"
+            )
+        else:
+            logger.info("⏸️ В очереди обхода нет доступных задач")
+        return result['failed'] == 0
+    
+    def sleep_seconds(self) -> int:
+        """Пауза между запусками: фиксированный интервал или шаг проверки расписания"""
+        if self.adaptive_enabled:
+            return self.tick_minutes * 60
+        return self.interval_hours * 3600
+    
     async def run_worker(self):
         """Основной цикл воркера"""
         logger.info("🤖 Запуск воркера автоматического парсинга")
-        logger.info(f"⏰ Интервал парсинга: каждые {self.interval_hours} часов")
+        if self.adaptive_enabled:
+            logger.info(
+                f"⏰ Адаптивные интервалы: проверка каждые {self.tick_minutes} мин, "
+                f"цель свежести {settings.SCRAPER_FRESHNESS_TARGET:.0%} за {settings.SCRAPER_FRESHNESS_WINDOW_MINUTES} мин"
+            )
+        else:
+            logger.info(f"⏰ Интервал парсинга: каждые {self.interval_hours} часов")
         logger.info(f"📄 Максимум страниц за цикл: {self.max_pages}")
+        if self.incremental_enabled:
+            logger.info(f"🆕 Инкрементальный обход, полный - каждый {self.full_crawl_every}-й цикл")
+        if self.planner_enabled:
+            logger.info("🗺️ Города и глубина обхода - по спросу из активных фильтров")
+        if self.queue_enabled:
+            logger.info(f"📬 Очередь задач обхода в БД, реплика {crawl_queue.worker_id}")
         logger.info(f"🔑 ScraperAPI: {'✅ настроен' if settings.SCRAPERAPI_KEY else '❌ НЕ настроен'}")
         logger.info(f"🗄️ База данных: {settings.DATABASE_URL[:50]}...")
         
@@ -138,8 +224,7 @@ class ScraperWorker:
         while self.is_running:
             try:
                 # Спим по частям, чтобы можно было прервать
-                sleep_seconds = self.interval_hours * 3600
-                for _ in range(sleep_seconds):
+                for _ in range(self.sleep_seconds()):
                     if not self.is_running:
                         break
                     await asyncio.sleep(1)
@@ -149,14 +234,17 @@ class ScraperWorker:
                     break
                     
                 # Запускаем очередной цикл парсинга
-                logger.info(f"⏰ Время для нового цикла парсинга!")
+                if not self.adaptive_enabled:
+                    logger.info(f"⏰ Время для нового цикла парсинга!")
                 await self.run_scraping_cycle(show_next_run=True)
                 
             except Exception as e:
                 logger.error(f"❌ Ошибка в основном цикле воркера: {e}")
                 # Ждем 5 минут перед повтором при ошибке
                 await asyncio.sleep(300)
-                
+        
+        # Общий пул соединений живет весь срок воркера - закрываем при выходе
+        await self.scraping_service.close()
         logger.info("🛑 Воркер парсинга завершен")
         
     async def health_check(self):
@@ -165,6 +253,9 @@ class ScraperWorker:
             "status": "healthy",
             "worker_type": "scraper",
             "interval_hours": self.interval_hours,
+            "adaptive_intervals": self.adaptive_enabled,
+            "queue": crawl_queue.stats if self.queue_enabled else None,
+            "cycle_number": self.cycle_number,
             "is_running": self.is_running,
             "timestamp": datetime.now().isoformat()
         }
@@ -0,0 +1,23 @@
+"""
+Общие фикстуры тестов
+"""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.db.models import Base
+
+
+@pytest.fixture
+def session_factory(request, tmp_path):
+    """
+    Фабрика сессий отдельной SQLite БД теста
+
+    Таблицы задаются в модуле теста: TABLES = [Listing, SentNotification, ...].
+    Фикстура модуля с тем же именем может запросить эту и заполнить БД.
+    """
+    tables = [getattr(model, '__table__', model) for model in request.module.TABLES]
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine, tables=tables)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
@@ -0,0 +1,77 @@
+"""
+Тесты переанализа сохраненных описаний
+"""
+import json
+
+import pytest
+
+from src.db.models import Listing
+from src.parsers.description_analyzer import DescriptionAnalyzer
+from src.services.analysis_backfill import AnalysisBackfill
+
+
+TABLES = [Listing]
+
+
+@pytest.fixture
+def session_factory(session_factory):
+    db = session_factory()
+    db.add_all([
+        # Устаревшее значение: описание запрещает животных
+        Listing(id=1, external_id='1', source='casa_it', url='u1', title='t', city='roma',
+                description='Appartamento, no animali', pets_allowed=None),
+        # Уже совпадает с анализом
+        Listing(id=2, external_id='2', source='casa_it', url='u2', title='t', city='roma',
+                description='Appartamento in centro'),
+        # Ремонт со страницы Subito не перезаписывается описанием
+        Listing(id=3, external_id='3', source='subito', url='u3', title='t', city='roma',
+                description='Appartamento da ristrutturare', renovation_type='renovated'),
+        # Без описания - не обрабатывается
+        Listing(id=4, external_id='4', source='casa_it', url='u4', title='t', city='roma'),
+    ])
+    db.commit()
+    db.close()
+    return session_factory
+
+
+def make_backfill(session_factory, tmp_path, **kwargs):
+    return AnalysisBackfill(
+        chunk_size=2, workers=0, checkpoint_path=str(tmp_path / 'backfill.json'),
+        session_factory=session_factory, **kwargs
+    )
+
+
+class TestAnalysisBackfill:
+    """Тесты переанализа"""
+
+    def test_updates_only_changed_fields(self, session_factory, tmp_path):
+        result = make_backfill(session_factory, tmp_path).run()
+
+        assert result['processed'] == 3 and result['changed'] == 1 and result['completed']
+        db = session_factory()
+        rows = {row.id: row for row in db.query(Listing).all()}
+        assert rows[1].pets_allowed is False
+        assert rows[3].renovation_type == 'renovated'
+        assert [rows[n].analyzer_version for n in (1, 2, 3, 4)] == [DescriptionAnalyzer.RULES_VERSION] * 3 + [None]
+
+        # Все посчитано текущей версией - повторный запуск ничего не делает
+        assert make_backfill(session_factory, tmp_path).run()['processed'] == 0
+
+    def test_resumes_from_checkpoint(self, session_factory, tmp_path):
+        first = make_backfill(session_factory, tmp_path).run(limit=2)
+        assert first['processed'] == 2 and not first['completed']
+        with open(tmp_path / 'backfill.json') as f:
+            assert json.load(f)['last_id'] == 2
+
+        second = make_backfill(session_factory, tmp_path).run(force=True)
+        assert second['processed'] == 3  # Полная проверка не продолжает обычный прогресс
+        third = make_backfill(session_factory, tmp_path).run(limit=2)
+        assert third['processed'] == 0 and third['completed']
+
+    def test_dry_run_writes_nothing(self, session_factory, tmp_path):
+        result = make_backfill(session_factory, tmp_path).run(dry_run=True)
+
+        assert result['changed'] == 1 and result['fields'] == {'pets_allowed': 1}
+        db = session_factory()
+        assert db.query(Listing).filter(Listing.analyzer_version.isnot(None)).count() == 0
+        assert not (tmp_path / 'backfill.json').exists()
@@ -0,0 +1,187 @@
+"""
+Тесты общей основы скраперов
+"""
+import asyncio
+import json
+from typing import Any, Dict, List
+
+from src.parsers.async_scraper import AsyncScraper
+from src.parsers.fetch_strategy import FetchStrategy
+from src.parsers.incremental import IncrementalCrawl
+from src.parsers.replay import ReplayResponse
+from src.parsers.resilience import CircuitBreaker
+
+
+class ScriptedTransport:
+    """Транспорт с заранее заданными ответами (статус, тело) для каждого URL"""
+
+    def __init__(self, responses: Dict[str, List[tuple]]):
+        self.responses = responses
+        self.calls: List[str] = []
+
+    def get(self, url: str, params: Dict[str, Any] = None, **kwargs) -> ReplayResponse:
+        target = params['url']
+        self.calls.append(target)
+        status, body = self.responses[target].pop(0)
+        return ReplayResponse(target, status, body)
+
+
+class JsonScraper(AsyncScraper):
+    """Источник, страница списка которого - JSON-массив объявлений"""
+
+    source = 'test_source'
+    base_url = 'https://example.test'
+
+    def page_url(self, page_num: int) -> str:
+        return f"{self.base_url}/list?p={page_num}"
+
+    def parse_page(self, html: str) -> List[Dict[str, Any]]:
+        return json.loads(html)
+
+    async def enrich(self, session, listings, detail_policy=None):
+        for listing in listings:
+            listing['enriched'] = True
+        return listings
+
+
+def page(*ids: str) -> str:
+    return json.dumps([{'external_id': external_id} for external_id in ids])
+
+
+def make_scraper(responses: Dict[str, List[tuple]], **kwargs) -> JsonScraper:
+    kwargs.setdefault('max_retries', 2)
+    scraper = JsonScraper(transport=ScriptedTransport(responses), max_concurrent=None, **kwargs)
+    scraper.retry_backoff = 0
+    scraper.circuit_breaker = CircuitBreaker('test_source', failure_threshold=3, recovery_seconds=60)
+    return scraper
+
+
+class TestRequestRetries:
+    """Тесты повторов запросов"""
+
+    def test_retries_server_errors(self):
+        url = 'https://example.test/list?p=1'
+        scraper = make_scraper({url: [(503, ''), (429, ''), (200, 'ok')]})
+        session = scraper.transport
+
+        assert asyncio.run(scraper.request_html(session, url)) == 'ok'
+        assert scraper.stats['retries'] == 2
+        assert scraper.stats['errors']['server_error'] == 1 and scraper.stats['errors']['throttled'] == 1
+
+    def test_client_error_is_not_retried(self):
+        url = 'https://example.test/list?p=1'
+        scraper = make_scraper({url: [(404, ''), (200, 'ok')]})
+
+        assert asyncio.run(scraper.request_html(scraper.transport, url)) is None
+        assert scraper.transport.calls == [url]
+        assert scraper.stats['errors']['client_error'] == 1
+        assert scraper.circuit_breaker.consecutive_failures == 0
+
+
+class TestTierEscalation:
+    """Тесты повышения уровня по итогу запроса"""
+
+    def test_removed_page_costs_one_request(self):
+        """Удаленное объявление (404) не проходит все уровни ScraperAPI"""
+        url = 'https://example.test/detail/1'
+        scraper = make_scraper({url: [(404, '')] * 4})
+        scraper.fetch_strategy = FetchStrategy('test_source', explore_every=1000)
+
+        html = asyncio.run(scraper.fetch_detail_html(scraper.transport, url, use_cache=False))
+        assert html is None and scraper.transport.calls == [url]
+        assert scraper.fetch_strategy.stats['render']['attempts'] == 0
+
+    def test_open_circuit_sends_nothing(self):
+        url = 'https://example.test/list?p=1'
+        scraper = make_scraper({url: [(200, page('a'))]})
+        scraper.fetch_strategy = FetchStrategy('test_source', explore_every=1000)
+        for _ in range(3):
+            scraper.circuit_breaker.record_failure()
+
+        assert asyncio.run(scraper.fetch_page(scraper.transport, url)) == (None, None)
+        assert scraper.transport.calls == []
+        assert all(tier_stats['attempts'] == 0 for tier_stats in scraper.fetch_strategy.stats.values())
+        assert scraper.stats['circuit_rejected'] == 1
+
+
+class TestCircuitBreaker:
+    """Тесты выключателя источника"""
+
+    def test_opens_after_sustained_errors(self):
+        """После серии ошибок запросы не отправляются, пока не пройдет пробный"""
+        url = 'https://example.test/list?p=1'
+        scraper = make_scraper({url: [(503, '')] * 3 + [(200, 'ok')]}, max_retries=5)
+        breaker = scraper.circuit_breaker
+
+        assert asyncio.run(scraper.request_html(scraper.transport, url)) is None
+        assert breaker.state == 'open' and len(scraper.transport.calls) == 3
+        assert scraper.stats['circuit_rejected'] == 1
+
+        # Срок истек: пробный запрос успешен - цепь замкнута
+        breaker.opened_at -= breaker.recovery_seconds
+        assert asyncio.run(scraper.request_html(scraper.transport, url)) == 'ok'
+        assert breaker.state == 'closed'
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker('test_source', failure_threshold=1, recovery_seconds=0)
+        breaker.record_failure()
+        assert breaker.state == 'open'
+
+        assert breaker.allow() and breaker.state == 'half_open'
+        assert not breaker.allow()  # Второй запрос ждет итога пробного
+        breaker.record_failure()
+        assert breaker.state == 'open' and breaker.stats['opened'] == 2
+
+
+class TestIterListings:
+    """Тесты потока объявлений"""
+
+    def test_streams_unique_enriched_listings(self):
+        scraper = make_scraper({
+            'https://example.test/list?p=1': [(200, page('a', 'b'))],
+            'https://example.test/list?p=2': [(200, page('b', 'c'))],
+            'https://example.test/list?p=3': [(500, '')] * 3,
+        })
+
+        async def collect():
+            return [listing async for listing in scraper.iter_listings(3)]
+
+        listings = asyncio.run(collect())
+        assert sorted(listing['external_id'] for listing in listings) == ['a', 'b', 'c']
+        assert all(listing['enriched'] for listing in listings)
+        assert scraper.stats['duplicates'] == 1
+        assert scraper.stats['pages_ok'] == 2 and scraper.stats['pages_failed'] == 1
+
+    def test_failed_first_page_does_not_stop_incremental(self):
+        """Сбой загрузки страницы 1 не останавливает пагинацию: новые ID страницы 2 доходят"""
+        scraper = make_scraper({
+            'https://example.test/list?p=1': [(500, '')] * 3,
+            'https://example.test/list?p=2': [(200, page('new1', 'old1'))],
+            'https://example.test/list?p=3': [(200, page('old2'))],
+            'https://example.test/list?p=4': [(200, page('old3'))],
+        })
+        scraper.circuit_breaker = CircuitBreaker('test_source', failure_threshold=10, recovery_seconds=60)
+        incremental = IncrementalCrawl('test_source', lambda ids: {'old1', 'old2', 'old3'} & set(ids))
+
+        async def collect():
+            return [listing async for listing in scraper.iter_listings(4, incremental=incremental)]
+
+        listings = asyncio.run(collect())
+        assert sorted(listing['external_id'] for listing in listings) == ['new1', 'old1', 'old2']
+        assert incremental.stats['pages_failed'] == 1 and incremental.stats['new_ids'] == 1
+        # Остановка - после загруженной страницы без новых, а не после сбоя
+        assert incremental.stats['stopped_at_page'] == 3
+
+    def test_early_exit_stops_crawl(self):
+        """Потребитель может прекратить обход, не дожидаясь остальных страниц"""
+        scraper = make_scraper({
+            f'https://example.test/list?p={n}': [(200, page(f'id{n}'))] for n in range(1, 6)
+        })
+
+        async def first():
+            stream = scraper.iter_listings(5)
+            async for listing in stream:
+                await stream.aclose()
+                return listing
+
+        assert asyncio.run(first())['external_id'].startswith('id')
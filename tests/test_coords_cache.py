@@ -0,0 +1,86 @@
+"""
+Тесты кеша координат и догрузки координат Subito
+"""
+import asyncio
+import json
+
+import pytest
+
+from src.parsers import subito_scraper
+from src.parsers.coords_cache import CoordsCache
+from src.parsers.replay import ReplayResponse
+from src.parsers.subito_scraper import SubitoScraper
+
+
+def detail_html(latitude: float, longitude: float) -> str:
+    data = {'props': {'pageProps': {'ad': {'geo': {'map': {'latitude': latitude, 'longitude': longitude}}}}}}
+    return f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(data)}</script>'
+
+
+class DetailTransport:
+    """Детальные страницы Subito по URL объявления"""
+
+    def __init__(self):
+        self.calls = []
+
+    def get(self, url, params=None, **kwargs):
+        self.calls.append(params['url'])
+        return ReplayResponse(params['url'], 200, detail_html(41.9, 12.5))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CoordsCache(str(tmp_path / 'coords.json'))
+
+
+class TestCoordsCache:
+    """Тесты кеша координат"""
+
+    def test_resolves_cache_then_db(self, cache, tmp_path):
+        cache.put('subito', 'a', 41.0, 12.0)
+        looked_up = []
+
+        def db_lookup(ids):
+            looked_up.extend(ids)
+            return {'b': (42.0, 13.0)}
+
+        found = cache.resolve('subito', ['a', 'b', 'c'], db_lookup)
+
+        assert found == {'a': (41.0, 12.0), 'b': (42.0, 13.0)}
+        assert looked_up == ['b', 'c']
+        assert cache.stats == {'hits': 1, 'db_hits': 1, 'misses': 1, 'writes': 2}
+
+        # Найденное в базе попадает в файл и читается новым экземпляром
+        cache.save()
+        reloaded = CoordsCache(str(tmp_path / 'coords.json'))
+        assert reloaded.resolve('subito', ['b']) == {'b': (42.0, 13.0)}
+
+    def test_evicts_oldest_entries(self, cache):
+        cache.max_entries = 2
+        for n in range(3):
+            cache.put('subito', f'id{n}', 41.0, 12.0)
+        assert set(cache.resolve('subito', ['id0', 'id1', 'id2'])) == {'id1', 'id2'}
+
+
+class TestSubitoCoords:
+    """Детальные страницы Subito грузятся только для неизвестных координат"""
+
+    def test_fetches_only_unknown_listings(self, cache, monkeypatch):
+        monkeypatch.setattr(subito_scraper, 'coords_cache', cache)
+        cache.put('subito', 'subito_1', 41.0, 12.0)
+        transport = DetailTransport()
+        scraper = SubitoScraper(fetch_coords=True, max_coords_fetch=1, transport=transport)
+        scraper.retry_backoff = 0
+        scraper._coords_budget = scraper.max_coords_fetch
+        scraper.coords_lookup = lambda ids: {'subito_2': (42.0, 13.0)}
+
+        listings = [
+            {'external_id': f'subito_{n}', 'url': f'https://www.subito.it/{n}.htm', 'title': f'Annuncio {n}'}
+            for n in range(1, 5)
+        ]
+        asyncio.run(scraper.enrich(transport, listings))
+
+        # 1 - из кеша, 2 - из базы, 3 - с детальной страницы, 4 - бюджет исчерпан
+        assert [listing.get('latitude') for listing in listings] == [41.0, 42.0, 41.9, None]
+        assert transport.calls == ['https://www.subito.it/3.htm']
+        assert scraper.stats['coords_known'] == 2 and scraper.stats['coords_fetched'] == 1
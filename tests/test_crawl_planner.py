@@ -0,0 +1,54 @@
+"""
+Тесты планировщика обхода по спросу
+"""
+from src.parsers.cities import normalize_city, search_path
+from src.services.crawl_planner import CrawlPlanner
+
+
+class TestCities:
+    """Тесты городов"""
+
+    def test_aliases(self):
+        """Разные написания города сводятся к одному slug"""
+        assert normalize_city(' Rome ') == 'roma'
+        assert normalize_city('Milan') == 'milano'
+        assert normalize_city('Pescara') is None
+
+    def test_search_paths(self):
+        assert search_path('subito', 'milano') == '/annunci-lombardia/affitto/immobili/milano/'
+        assert search_path('idealista', 'firenze') == '/affitto-case/firenze-firenze/'
+
+
+class TestCrawlPlanner:
+    """Тесты распределения бюджета"""
+
+    def _planner(self, depth_budget, **kwargs):
+        return CrawlPlanner(budget_credits=depth_budget, sources=['immobiliare'], **kwargs)
+
+    def test_proportional_allocation(self):
+        """Глубина пропорциональна числу фильтров, бюджет не превышается"""
+        planner = self._planner(12, max_pages=10)
+        depths = planner.allocate({'roma': 6, 'milano': 3, 'firenze': 1})
+        assert sum(depths.values()) == 12
+        assert depths['roma'] > depths['milano'] > depths['firenze'] >= 1
+
+    def test_cap_and_redistribution(self):
+        """Потолок глубины: излишек уходит другим городам"""
+        planner = self._planner(12, max_pages=5)
+        depths = planner.allocate({'roma': 100, 'milano': 1, 'firenze': 1})
+        assert depths['roma'] == 5
+        assert sum(depths.values()) == 12
+
+    def test_small_budget_drops_low_demand(self):
+        """Бюджета не хватает на всех - остаются города с наибольшим спросом"""
+        planner = self._planner(2, max_pages=10)
+        depths = planner.allocate({'roma': 1, 'milano': 5, 'firenze': 3})
+        assert depths == {'milano': 1, 'firenze': 1}
+
+    def test_plan_tasks(self):
+        """Задача на каждый источник каждого города"""
+        planner = CrawlPlanner(budget_credits=None, max_pages=2, sources=['immobiliare', 'casa_it'])
+        tasks = planner.plan({'roma': 1})
+        assert {(task['source'], task['city'], task['max_pages']) for task in tasks} == {
+            ('immobiliare', 'roma', 2), ('casa_it', 'roma', 2)
+        }
@@ -0,0 +1,126 @@
+"""
+Тесты очереди задач обхода
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from src.crud.crud_crawl_task import crawl_task as crud_crawl_task
+from src.db.models import CrawlTask
+from src.services.crawl_queue import CrawlQueue
+
+PLAN = [
+    {'source': 'casa_it', 'city': 'roma', 'max_pages': 2},
+    {'source': 'subito', 'city': 'roma', 'max_pages': 2},
+]
+
+
+TABLES = [CrawlTask]
+
+
+class FakeScrapingService:
+    """Casa.it отдает объявления, Subito - пустой обход"""
+
+    def __init__(self):
+        self.saved = []
+
+    async def scrape_tasks(self, tasks, db=None, incremental=False, record_ingest=False):
+        return [
+            [{'external_id': f"{task['source']}-{i}"} for i in range(3)] if task['source'] == 'casa_it' else []
+            for task in tasks
+        ]
+
+    def save_listings_to_db(self, listings, db):
+        self.saved.extend(listings)
+        return {'created': len(listings)}
+
+
+class TestCrawlTaskClaims:
+    """Тесты аренды задач"""
+
+    def test_enqueue_skips_active_pairs(self, session_factory):
+        db = session_factory()
+        assert len(crud_crawl_task.enqueue(db, tasks=PLAN)) == 2
+        assert len(crud_crawl_task.enqueue(db, tasks=PLAN)) == 0
+
+    def test_two_replicas_enqueue_once(self, session_factory):
+        """Реплики ставят один план: пара в очереди одна (дубликаты отсекает индекс)"""
+        replica_a, replica_b = session_factory(), session_factory()
+
+        created_a = crud_crawl_task.enqueue(replica_a, tasks=PLAN)
+        created_b = crud_crawl_task.enqueue(replica_b, tasks=PLAN + PLAN[:1])
+
+        assert len(created_a) == 2 and created_b == []
+        assert crud_crawl_task.get_status_counts(session_factory()) == {'pending': 2}
+
+    def test_active_pair_is_unique(self, session_factory):
+        db = session_factory()
+        crud_crawl_task.enqueue(db, tasks=PLAN[:1])
+        db.add(CrawlTask(source='casa_it', city='roma', status='pending'))
+        with pytest.raises(IntegrityError):
+            db.commit()
+        db.rollback()
+
+        # Завершенная задача пары не мешает новой
+        db.query(CrawlTask).update({'status': 'done'})
+        db.commit()
+        assert len(crud_crawl_task.enqueue(db, tasks=PLAN[:1])) == 1
+
+    def test_recently_done_pair_is_not_requeued(self, session_factory):
+        """Пару, которую реплика A обошла в этом интервале, реплика B не ставит снова"""
+        replica_a, replica_b = session_factory(), session_factory()
+        crud_crawl_task.enqueue(replica_a, tasks=PLAN[:1])
+        task = crud_crawl_task.claim(replica_a, worker_id='a', lease_seconds=60)[0]
+        crud_crawl_task.complete(replica_a, task_id=task.id, worker_id='a', result_count=3)
+
+        assert crud_crawl_task.enqueue(replica_b, tasks=PLAN, min_interval_seconds=6 * 3600)[0].source == 'subito'
+        assert crud_crawl_task.get_status_counts(replica_b) == {'done': 1, 'pending': 1}
+
+        replica_a.query(CrawlTask).filter(CrawlTask.status == 'done').update(
+            {'completed_at': datetime.now(timezone.utc) - timedelta(hours=7)}
+        )
+        replica_a.commit()
+        assert len(crud_crawl_task.enqueue(replica_b, tasks=PLAN, min_interval_seconds=6 * 3600)) == 1
+
+    def test_replicas_do_not_share_tasks(self, session_factory):
+        """Каждую задачу получает ровно одна реплика"""
+        crud_crawl_task.enqueue(session_factory(), tasks=PLAN)
+        first = crud_crawl_task.claim(session_factory(), worker_id='a', lease_seconds=60, limit=1)
+        second = crud_crawl_task.claim(session_factory(), worker_id='b', lease_seconds=60, limit=5)
+        third = crud_crawl_task.claim(session_factory(), worker_id='c', lease_seconds=60, limit=5)
+
+        assert len(first) == 1 and len(second) == 1 and third == []
+        assert first[0].id != second[0].id
+        assert second[0].lease_owner == 'b' and second[0].attempts == 1
+
+    def test_expired_lease_is_reclaimed(self, session_factory):
+        """Задача упавшей реплики достается другой, старая реплика теряет аренду"""
+        db = session_factory()
+        crud_crawl_task.enqueue(db, tasks=PLAN[:1])
+        task = crud_crawl_task.claim(db, worker_id='dead', lease_seconds=60)[0]
+        db.query(CrawlTask).update({'lease_expires_at': datetime.now(timezone.utc) - timedelta(seconds=1)})
+        db.commit()
+
+        reclaimed = crud_crawl_task.claim(db, worker_id='alive', lease_seconds=60)
+        assert [t.id for t in reclaimed] == [task.id]
+        assert reclaimed[0].attempts == 2
+        assert not crud_crawl_task.heartbeat(db, task_id=task.id, worker_id='dead', lease_seconds=60)
+
+
+class TestCrawlQueue:
+    """Тесты выполнения задач репликой"""
+
+    def test_drain_completes_and_retries(self, session_factory):
+        db = session_factory()
+        queue = CrawlQueue(worker_id='w1', max_attempts=2, retry_delay_seconds=0, session_factory=session_factory)
+        service = FakeScrapingService()
+        queue.enqueue(db, PLAN)
+
+        result = asyncio.run(queue.drain(service, db))
+
+        # Пустой Subito повторяется сразу (задержка 0) и после второй попытки - failed
+        assert result['done'] == 1 and result['failed'] == 2
+        assert len(service.saved) == 3
+        assert crud_crawl_task.get_status_counts(db) == {'done': 1, 'failed': 1}
@@ -0,0 +1,87 @@
+"""
+Тесты запросов объявлений
+"""
+import pytest
+
+from src.crud.crud_listing import listing as crud_listing
+from src.crud.crud_sent_notification import sent_notification as crud_sent_notification
+from src.db.models import Listing, SentNotification
+
+TABLES = [Listing, SentNotification]
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    session.add_all([
+        Listing(id=n, external_id=str(n), source='casa_it', url=f'u{n}', title='t', city='Roma', price=1000)
+        for n in range(1, 6)
+    ])
+    session.add_all([
+        SentNotification(user_id=1, filter_id=1, listing_id=2),
+        SentNotification(user_id=1, filter_id=1, listing_id=4),
+        SentNotification(user_id=2, filter_id=2, listing_id=1),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+class TestExcludeSent:
+    """Уже отправленные пользователю объявления исключаются в запросе"""
+
+    def test_search_excludes_sent(self, db):
+        found = crud_listing.search(db, city='roma', exclude_sent_to_user=1, limit=10)
+        assert sorted(listing.id for listing in found) == [1, 3, 5]
+
+        # Лимит применяется после исключения: отправленные не занимают места
+        assert len(crud_listing.search(db, exclude_sent_to_user=1, limit=3)) == 3
+        assert len(crud_listing.search(db, limit=10)) == 5
+
+    def test_sent_ids_among_candidates(self, db):
+        assert crud_sent_notification.get_sent_listing_ids(db, user_id=1, listing_ids=[1, 2, 3]) == {2}
+        assert crud_sent_notification.get_sent_listing_ids(db, user_id=1, listing_ids=[]) == set()
+
+
+class TestRecordSent:
+    """Отметки об отправке - одна идемпотентная вставка в транзакции вызывающего"""
+
+    def test_overlapping_batches_are_idempotent(self, db):
+        crud_sent_notification.record_sent(db, user_id=1, filter_id=1, listing_ids=[1, 2, 3, 3])
+        crud_sent_notification.record_sent(db, user_id=1, filter_id=1, listing_ids=[3, 4, 5])
+        db.commit()
+
+        rows = db.query(SentNotification.listing_id).filter(SentNotification.user_id == 1).all()
+        assert sorted(row[0] for row in rows) == [1, 2, 3, 4, 5]
+
+    def test_rollback_discards_records(self, db):
+        crud_sent_notification.record_sent(db, user_id=3, filter_id=3, listing_ids=[1, 2])
+        db.rollback()
+        assert crud_sent_notification.get_sent_listing_ids(db, user_id=3, listing_ids=[1, 2]) == set()
+
+    def test_forget_allows_resend(self, db):
+        assert crud_sent_notification.forget(db, user_id=1, listing_ids=[2]) == 1
+        crud_sent_notification.record_sent(db, user_id=1, filter_id=1, listing_ids=[2])
+        db.commit()
+        assert crud_sent_notification.get_sent_listing_ids(db, user_id=1, listing_ids=[2]) == {2}
+
+
+class TestWatermark:
+    """Новые объявления фильтра - по id выше водяного знака, без обрезки лимитом"""
+
+    def test_pages_to_completion(self, db):
+        found = crud_listing.get_new_for_filter(db, after_id=0, up_to_id=5, page_size=2, city='roma')
+        assert [listing.id for listing in found] == [5, 4, 3, 2, 1]
+
+    def test_respects_bounds_and_sent(self, db):
+        found = crud_listing.get_new_for_filter(
+            db, after_id=1, up_to_id=4, exclude_sent_to_user=1, page_size=2
+        )
+        assert [listing.id for listing in found] == [3]
+        assert crud_listing.get_new_for_filter(db, after_id=5, up_to_id=5) == []
+
+    def test_pass_bounds(self, db):
+        assert crud_listing.get_max_id(db) == 5
+        # Все объявления фикстуры добавлены только что
+        assert crud_listing.get_id_floor_since(db, hours=24) == 0
+        assert [listing.id for listing in crud_listing.get_id_range(db, after_id=2, up_to_id=4)] == [4, 3]
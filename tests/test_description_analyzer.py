@@ -2,7 +2,8 @@
 Тесты для DescriptionAnalyzer
 """
 import pytest
-from src.parsers.description_analyzer import DescriptionAnalyzer
+from src.parsers import description_analyzer
+from src.parsers.description_analyzer import AnalysisCache, DescriptionAnalyzer, KeywordMatcher
 
 
 class TestFloorNormalization:
@@ -218,6 +219,68 @@ class TestRenovationType:
         assert result['renovation_type'] == None
 
 
+class TestKeywordMatcher:
+    """Поиск всех ключевых слов за один проход совпадает с проверкой каждого списка"""
+
+    @pytest.mark.parametrize("text", [
+        "no animali ammessi, appartamento completamente ristrutturato",
+        "nuovo edificio di nuova costruzione, parzialmente ristrutturato",
+        "da ristrutturare, edificio storico vicino al parco",
+        "",
+    ])
+    def test_matches_naive_scan(self, text):
+        matcher = DescriptionAnalyzer.KEYWORDS
+        assert matcher.match(text) == matcher.match_naive(text)
+
+    def test_overlapping_keywords(self):
+        """Слова, начинающиеся внутри другого найденного слова, тоже находятся"""
+        matcher = KeywordMatcher({'a': ['ristrutturato'], 'b': ['completamente ristrutturato'], 'c': ['struttur']})
+        assert matcher.match("completamente ristrutturato") == {'a', 'b', 'c'}
+
+
+class TestAnalyzeMany:
+    """Тесты пакетного анализа с кешем"""
+
+    @pytest.fixture
+    def cache(self, monkeypatch):
+        cache = AnalysisCache(max_entries=100)
+        monkeypatch.setattr(description_analyzer, 'analysis_cache', cache)
+        return cache
+
+    def test_same_results_as_analyze(self, cache):
+        items = [
+            ("Appartamento completamente ristrutturato, no animali", {'floor': '3'}),
+            ("Palazzo del 1930, senza commissioni", {}),
+            ("", {'floor': 'piano terra'}),
+        ]
+        results = DescriptionAnalyzer.analyze_many(items)
+        assert results == [DescriptionAnalyzer.analyze(description, **kwargs) for description, kwargs in items]
+
+    def test_deduplicates_and_caches(self, cache):
+        item = ("Appartamento da ristrutturare", {'floor': '2'})
+        DescriptionAnalyzer.analyze_many([item, item, ("Appartamento da ristrutturare", {'floor': '4'})])
+        assert cache.stats['misses'] == 2 and cache.stats['batch_duplicates'] == 1
+
+        result = DescriptionAnalyzer.analyze_cached("Appartamento da ristrutturare", floor='2')
+        assert cache.stats['hits'] == 1
+        # Результат - копия: изменения не попадают в кеш
+        result['renovation_type'] = 'changed'
+        assert DescriptionAnalyzer.analyze_cached("Appartamento da ristrutturare", floor='2')['renovation_type'] == 'not_renovated'
+
+    def test_rules_version_invalidates(self, cache, monkeypatch):
+        DescriptionAnalyzer.analyze_cached("Appartamento privato")
+        monkeypatch.setattr(DescriptionAnalyzer, 'RULES_VERSION', DescriptionAnalyzer.RULES_VERSION + 1)
+        DescriptionAnalyzer.analyze_cached("Appartamento privato")
+        assert cache.stats['misses'] == 2
+
+    def test_process_pool(self, cache, monkeypatch):
+        monkeypatch.setattr(description_analyzer.settings, 'DESCRIPTION_ANALYSIS_POOL_MIN_BATCH', 2)
+        items = [(f"Palazzo del {1900 + n}, vicino al parco", {}) for n in range(4)]
+        results = DescriptionAnalyzer.analyze_many(items, workers=2)
+        assert [result['year_built'] for result in results] == [1900, 1901, 1902, 1903]
+        assert cache.stats['pooled'] == 4
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
 
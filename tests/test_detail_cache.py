@@ -0,0 +1,56 @@
+"""
+Тесты кеша детальных страниц и политики их загрузки
+"""
+import os
+import time
+
+from src.parsers.detail_cache import DetailCache, DetailFetchPolicy
+
+
+class TestDetailCache:
+    """Тесты кеша на диске"""
+
+    def test_roundtrip_and_ttl(self, tmp_path):
+        """Запись читается до истечения TTL"""
+        cache = DetailCache(str(tmp_path), ttl_seconds=3600, max_bytes=10 * 1024 * 1024)
+        cache.put('https://example.com/1', '<html>1</html>')
+        assert cache.get('https://example.com/1') == '<html>1</html>'
+        assert cache.get('https://example.com/2') is None
+
+        expired = DetailCache(str(tmp_path), ttl_seconds=0, max_bytes=10 * 1024 * 1024)
+        time.sleep(0.01)
+        assert expired.get('https://example.com/1') is None
+
+    def test_lru_eviction(self, tmp_path):
+        """При превышении размера вытесняются давно не читавшиеся записи"""
+        cache = DetailCache(str(tmp_path), ttl_seconds=3600, max_bytes=1)
+        cache.max_bytes = 10 ** 9
+        for i in range(3):
+            cache.put(f'https://example.com/{i}', os.urandom(200).hex())
+            time.sleep(0.01)
+        cache.get('https://example.com/0')
+
+        cache.max_bytes = cache.size_bytes() - 1
+        cache._evict()
+        assert cache.get('https://example.com/0') is not None
+        assert cache.get('https://example.com/1') is None
+
+
+class TestDetailFetchPolicy:
+    """Тесты пропуска неизменившихся объявлений"""
+
+    def test_plan_groups(self):
+        """Новые, изменившиеся и неизменившиеся карточки"""
+        snapshots = {
+            'a': {'price': 1000.0, 'title': 'Bilocale', 'description': True},
+            'b': {'price': 1000.0, 'title': 'Bilocale', 'description': True},
+        }
+        policy = DetailFetchPolicy('immobiliare', lambda ids: {i: snapshots[i] for i in ids if i in snapshots})
+        groups = policy.plan([
+            {'external_id': 'a', 'price': 1000, 'title': 'bilocale '},
+            {'external_id': 'b', 'price': 1100, 'title': 'Bilocale'},
+            {'external_id': 'c', 'price': 900, 'title': 'Trilocale'},
+        ])
+        assert [c['external_id'] for c in groups['unchanged']] == ['a']
+        assert [c['external_id'] for c in groups['changed']] == ['b']
+        assert [c['external_id'] for c in groups['new']] == ['c']
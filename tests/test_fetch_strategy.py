@@ -0,0 +1,95 @@
+"""
+Тесты выбора уровня запросов ScraperAPI
+"""
+import asyncio
+
+from src.parsers.fetch_strategy import CIRCUIT_OPEN, FetchOutcome, FetchStrategy, FetchStrategyStore
+
+
+def _fake_site(working_tiers):
+    """Сайт, который отдает данные только на указанных уровнях"""
+    calls = []
+
+    async def request(params):
+        tier = 'ultra_premium' if 'ultra_premium' in params else 'premium' if 'premium' in params \
+            else 'render' if 'render' in params else 'plain'
+        calls.append(tier)
+        return FetchOutcome('<html>DATA</html>' if tier in working_tiers else '<html>captcha</html>', status=200)
+
+    return request, calls
+
+
+class TestFetchStrategy:
+    """Тесты повышения уровня и обучения"""
+
+    def test_escalates_until_payload(self):
+        """Повышаем уровень, пока в ответе нет данных"""
+        strategy = FetchStrategy('casa_it', explore_every=1000)
+        request, calls = _fake_site({'premium', 'ultra_premium'})
+        html, tier = asyncio.run(strategy.fetch(request, validate=lambda h: 'DATA' in h))
+        assert tier == 'premium'
+        assert calls == ['plain', 'render', 'premium']
+
+    def test_learns_start_tier(self):
+        """После серии неудач дешевые уровни пропускаются"""
+        strategy = FetchStrategy('casa_it', min_samples=3, explore_every=1000)
+        request, calls = _fake_site({'render'})
+
+        async def run():
+            for _ in range(4):
+                await strategy.fetch(request, validate=lambda h: 'DATA' in h)
+
+        asyncio.run(run())
+        assert strategy.start_tier() == 'render'
+        assert calls[-1] == 'render' and calls[-2] == 'render'
+
+    def test_missing_page_is_not_escalated(self):
+        """404 - страницы нет: дорогие уровни не пробуются, дешевый не теряет доверия"""
+        strategy = FetchStrategy('idealista', explore_every=1000)
+        calls = []
+
+        async def request(params):
+            calls.append(params)
+            return FetchOutcome(None, status=404, error='client_error')
+
+        assert asyncio.run(strategy.fetch(request)) == (None, None)
+        assert calls == [{}]
+        assert strategy.stats['plain']['attempts'] == 1 and strategy.stats['plain']['success_rate'] == 1.0
+        assert strategy.stats['render']['attempts'] == 0
+
+    def test_block_is_escalated(self):
+        strategy = FetchStrategy('idealista', explore_every=1000)
+        outcomes = [FetchOutcome(None, status=403, error='client_error'), FetchOutcome('DATA', status=200)]
+
+        async def request(params):
+            return outcomes.pop(0)
+
+        assert asyncio.run(strategy.fetch(request)) == ('DATA', 'render')
+        assert strategy.stats['plain']['success_rate'] == 0.0
+
+    def test_circuit_rejection_is_not_recorded(self):
+        """Запрос, отклоненный выключателем, не стоит кредитов и не портит статистику"""
+        strategy = FetchStrategy('idealista', explore_every=1000)
+        calls = []
+
+        async def request(params):
+            calls.append(params)
+            return FetchOutcome(None, error=CIRCUIT_OPEN, sent=False)
+
+        assert asyncio.run(strategy.fetch(request)) == (None, None)
+        assert len(calls) == 1
+        assert all(tier_stats['attempts'] == 0 and tier_stats['credits'] == 0 for tier_stats in strategy.stats.values())
+
+    def test_stats_persist(self, tmp_path):
+        """Статистика сохраняется и загружается следующим запуском"""
+        path = str(tmp_path / 'stats.json')
+        store = FetchStrategyStore(path)
+        strategy = store.get('idealista')
+        for _ in range(10):
+            strategy.record('plain', False, 0.1)
+        strategy.record_listings('render', 3)
+        store.save()
+
+        restored = FetchStrategyStore(path).get('idealista')
+        assert restored.start_tier() == 'render'
+        assert restored.stats['render']['listings'] == 3
@@ -0,0 +1,44 @@
+"""
+Тесты для инкрементального обхода страниц
+"""
+from src.parsers.incremental import IncrementalCrawl
+
+
+class TestIncrementalCrawl:
+    """Тесты остановки пагинации"""
+
+    def test_stops_after_stale_pages(self):
+        """Останавливаемся после N страниц подряд без новых ID"""
+        known = {'a', 'b', 'c', 'd'}
+        crawl = IncrementalCrawl('casa_it', lambda ids: known & set(ids), stop_after_pages=2)
+
+        assert crawl.check_page(1, ['new1', 'a']) == {'new1'}
+        assert not crawl.should_stop
+        crawl.check_page(2, ['b', 'c'])
+        assert not crawl.should_stop
+        crawl.check_page(3, ['d'])
+        assert crawl.should_stop
+        assert crawl.stats['stopped_at_page'] == 3
+        assert crawl.stats['new_ids'] == 1
+
+    def test_new_page_resets_counter(self):
+        """Страница с новыми ID сбрасывает счетчик"""
+        crawl = IncrementalCrawl('subito', lambda ids: {'a'}, stop_after_pages=2)
+        crawl.check_page(1, ['a'])
+        crawl.check_page(2, ['x'])
+        assert crawl.consecutive_stale_pages == 0
+
+    def test_lookup_error_does_not_stop(self):
+        """Ошибка БД - считаем все ID новыми"""
+        def broken(ids):
+            raise RuntimeError("db down")
+
+        crawl = IncrementalCrawl('idealista', broken)
+        assert crawl.check_page(1, ['a']) == {'a'}
+        assert not crawl.should_stop
+
+    def test_failed_page_is_not_stale(self):
+        crawl = IncrementalCrawl('casa_it', lambda ids: set(), stop_after_pages=1)
+        crawl.page_failed(1)
+        assert not crawl.should_stop
+        assert crawl.stats['pages_failed'] == 1 and crawl.stats['pages_checked'] == 0
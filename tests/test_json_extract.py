@@ -0,0 +1,53 @@
+"""
+Тесты извлечения встроенного JSON
+"""
+import json
+
+from src.parsers import json_extract
+
+
+NEXT_DATA = {'props': {'pageProps': {'items': [{'id': 1, 'title': 'Bilocale </b>'}]}}}
+INITIAL_STATE = {'search': {'list': [{'id': 7, 'url': '/affitto/7/', 'title': 'Attico è bello'}]}}
+
+
+def _casa_page(data) -> str:
+    payload = json.dumps(data).replace('"', '\\"').replace('/', '\\/')
+    return (
+        '<html><head><script>var x = 1 > 0;</script></head><body>'
+        '<script>window.dataLayer = [];</script>'
+        f'<script>window.__INITIAL_STATE__ = JSON.parse("{payload}");</script>'
+        '</body></html>'
+    )
+
+
+class TestNextData:
+    """Тесты __NEXT_DATA__"""
+
+    def test_fast_path_matches_soup(self):
+        """Быстрый путь дает тот же результат, что и BeautifulSoup"""
+        html = (
+            '<html><script>self.__NEXT_DATA__ = undefined</script>'
+            f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(NEXT_DATA)}</script></html>'
+        )
+        assert json_extract.extract_next_data(html) == NEXT_DATA
+        assert json.loads(json_extract._next_data_soup(html)) == NEXT_DATA
+
+    def test_missing(self):
+        """Нет скрипта - None"""
+        assert json_extract.extract_next_data('<html><body>nothing</body></html>') is None
+
+
+class TestInitialState:
+    """Тесты window.__INITIAL_STATE__ (Casa.it)"""
+
+    def test_fast_path_matches_soup(self):
+        """Быстрый путь дает тот же результат, что и старый разбор через дерево"""
+        html = _casa_page(INITIAL_STATE)
+        raw = json_extract._initial_state_fast(html)
+        assert raw == json_extract._initial_state_soup(html)
+        assert json_extract.extract_initial_state(html) == INITIAL_STATE
+
+    def test_marker_outside_script_falls_back(self):
+        """Маркер в тексте страницы, а не в скрипте, игнорируется"""
+        html = '<p>window.__INITIAL_STATE__</p>' + _casa_page(INITIAL_STATE)
+        assert json_extract.extract_initial_state(html) == INITIAL_STATE
@@ -0,0 +1,189 @@
+"""
+Тесты обратного подбора объявлений к фильтрам
+"""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.crud.crud_listing import listing as crud_listing
+from src.db.models import Filter, Listing, SentNotification
+from src.services.listing_matcher import (
+    FilterIndex,
+    RangeBuckets,
+    SharedFilterSearch,
+    filter_search_params,
+    filter_signature,
+    matches_search_params,
+)
+
+CITIES = ['roma', 'milano', 'Torino', None, '']
+
+TABLES = [Listing, SentNotification]
+
+
+def random_filters(rng: random.Random, count: int):
+    filters = []
+    for filter_id in range(1, count + 1):
+        min_price = rng.choice([None, 0, 500, 800, 1200])
+        filters.append(Filter(
+            id=filter_id,
+            city=rng.choice(CITIES),
+            min_price=min_price,
+            max_price=rng.choice([None, 900, 1500, 3000, 20000]),
+            min_rooms=rng.choice([None, 1, 2, 3]),
+            max_rooms=rng.choice([None, 2, 4, 12]),
+            min_area=rng.choice([None, 30, 60]),
+            max_area=rng.choice([None, 80, 120, 800]),
+            property_type=rng.choice([None, 'apartment', 'room']),
+            furnished=rng.choice([None, True, False]),
+            pets_allowed=rng.choice([None, True]),
+        ))
+    return filters
+
+
+def random_listing(rng: random.Random):
+    return {
+        'city': rng.choice(['Roma', 'Milano', 'Torino Centro', 'Napoli', None]),
+        'price': rng.choice([None, 0, 450, 899.5, 1500, 2500, 15000]),
+        'rooms': rng.choice([None, 1, 2, 3, 5, 15]),
+        'area': rng.choice([None, 25, 60, 95.5, 600]),
+        'property_type': rng.choice([None, 'apartment', 'room', 'house']),
+        'furnished': rng.choice([None, True, False]),
+        'pets_allowed': rng.choice([None, True, False]),
+    }
+
+
+class TestFilterIndex:
+    """Индекс дает те же совпадения, что и проверка каждого фильтра"""
+
+    def test_matches_brute_force(self):
+        rng = random.Random(7)
+        filters = random_filters(rng, 300)
+        index = FilterIndex(filters)
+
+        for _ in range(300):
+            listing = random_listing(rng)
+            expected = [f for f in filters if matches_search_params(filter_search_params(f), listing)]
+            assert index.match_listing(listing) == expected
+
+        # Проверяется лишь часть фильтров
+        assert index.stats['candidates'] < 300 * len(filters) / 2
+
+    def test_groups_listings_by_filter(self):
+        filters = [
+            Filter(id=1, city='roma', max_price=1000),
+            Filter(id=2, city='milano'),
+        ]
+        listings = [
+            {'city': 'Roma', 'price': 900},
+            {'city': 'Roma', 'price': 1100},
+            {'city': 'Milano', 'price': 2000},
+        ]
+        grouped = FilterIndex(filters).group_by_filter(listings)
+        assert grouped == {1: [listings[0]], 2: [listings[2]]}
+
+    def test_range_buckets_open_bounds(self):
+        buckets = RangeBuckets(width=100, max_value=1000)
+        buckets.add(1, None, 500)
+        buckets.add(2, 700, None)
+        buckets.add(3, None, None)
+
+        assert buckets.candidates(450) == {1, 3}
+        assert buckets.candidates(50000) == {2, 3}
+        # Без значения - только фильтры без границ
+        assert buckets.candidates(None) == {3}
+
+    def test_null_fields_fail_set_bounds(self):
+        """Объявление без цены, комнат или города не проходит заданные границы"""
+        filters = [
+            Filter(id=1, city='roma', min_price=0),
+            Filter(id=2, max_rooms=3),
+            Filter(id=3, city='roma'),
+            Filter(id=4, furnished=True, pets_allowed=True),
+        ]
+        index = FilterIndex(filters)
+        ids = lambda listing: [f.id for f in index.match_listing(listing)]
+
+        assert ids({'city': 'Roma', 'price': None, 'rooms': None}) == [3, 4]
+        assert ids({'city': 'Roma', 'price': 0, 'rooms': 0}) == [1, 2, 3, 4]
+        assert ids({'city': None, 'price': 900, 'rooms': 2}) == [2, 4]
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    started = datetime(2026, 1, 1)
+    session.add_all([
+        Listing(
+            id=n, external_id=str(n), source='casa_it', url=f'u{n}', title='t',
+            city='Roma' if n % 3 else 'Milano', price=600 + 100 * (n % 8), rooms=1 + n % 3,
+            scraped_at=started + timedelta(minutes=n),
+        )
+        for n in range(1, 41)
+    ])
+    # Пользователю 1 отправлена почти вся Roma - запаса общего списка не хватит
+    session.add_all([
+        SentNotification(user_id=1, filter_id=1, listing_id=n) for n in range(1, 41) if n % 3 and n > 6
+    ])
+    session.add(SentNotification(user_id=2, filter_id=2, listing_id=40))
+    session.commit()
+    yield session
+    session.close()
+
+
+class TestSharedFilterSearch:
+    """Одинаковые фильтры ищутся один раз, результат - как у поиска для каждого"""
+
+    def test_signature_is_canonical(self):
+        assert filter_signature({'city': 'Roma', 'max_price': 1200}) == filter_signature(
+            {'max_price': 1200, 'city': 'roma', 'property_type': ''}
+        )
+        assert filter_signature({'city': 'Roma'}) != filter_signature({'city': 'Roma', 'min_price': 0})
+
+    def test_matches_per_user_search(self, db):
+        shared = SharedFilterSearch(pool_factor=2)
+        requests = [
+            (user_id, params)
+            for params in ({'city': 'Roma'}, {'city': 'roma'}, {'city': 'Roma', 'max_price': 1000})
+            for user_id in (1, 2, 3)
+        ]
+        for user_id, params in requests:
+            expected = crud_listing.search(db, limit=5, exclude_sent_to_user=user_id, **params)
+            found = shared.search(db, user_id=user_id, limit=5, search_params=params)
+            assert [listing.id for listing in found] == [listing.id for listing in expected]
+
+        report = shared.report()
+        assert report['filters'] == 9 and report['queries'] == 2
+        # Пользователю 1 запаса не хватило - отдельный поиск
+        assert report['fallbacks'] >= 1
+
+
+class TestIndexMatchesSearch:
+    """Подбор по индексу и crud_listing.search выбирают одни и те же объявления"""
+
+    def test_null_price_and_rooms(self, session_factory):
+        db = session_factory()
+        rng = random.Random(11)
+        db.add_all([
+            Listing(
+                id=n, external_id=str(n), source='casa_it', url=f'u{n}', title='t',
+                city=rng.choice(['Roma', 'Milano', 'Torino Centro', '']),
+                price=rng.choice([None, 0, 450, 1500, 2500]),
+                rooms=rng.choice([None, 0, 1, 2, 5]),
+                area=rng.choice([None, 25, 60, 600]),
+                property_type=rng.choice([None, 'apartment', 'room']),
+                furnished=rng.choice([None, True, False]),
+            )
+            for n in range(1, 121)
+        ])
+        db.commit()
+
+        filters = random_filters(random.Random(5), 120)
+        grouped = FilterIndex(filters).group_by_filter(crud_listing.get_id_range(db, after_id=0, up_to_id=120))
+
+        for filter_obj in filters:
+            expected = crud_listing.search(db, limit=1000, **filter_search_params(filter_obj))
+            found = grouped.get(filter_obj.id, [])
+            assert sorted(listing.id for listing in found) == sorted(listing.id for listing in expected)
+        db.close()
@@ -0,0 +1,87 @@
+"""
+Тесты кеша отрисованных сообщений
+"""
+import pytest
+
+from src.services.email_service import EmailService
+from src.services.message_cache import RenderedMessageCache, message_cache
+from src.services.whatsapp_service import WhatsAppService
+
+LISTING = {
+    'id': 7, 'title': 'Bilocale Trastevere', 'price': 1200, 'rooms': 2, 'area': 55,
+    'address': 'Via della Lungara', 'city': 'Roma', 'url': 'https://www.casa.it/immobili/7/',
+    'source': 'casa_it', 'furnished': True,
+}
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    message_cache.clear()
+    yield
+    message_cache.clear()
+
+
+class CountingRender:
+    def __init__(self, text: str):
+        self.text = text
+        self.calls = 0
+
+    def __call__(self) -> str:
+        self.calls += 1
+        return self.text
+
+
+class TestRenderedMessageCache:
+    """Тело рисуется один раз на (объявление, канал, версия шаблона, локаль)"""
+
+    def test_key_parts(self):
+        cache = RenderedMessageCache()
+        render = CountingRender('body')
+        for _ in range(3):
+            assert cache.get_or_render(1, 'telegram', render) == 'body'
+        cache.get_or_render(1, 'whatsapp', render)
+        cache.get_or_render(1, 'telegram', render, template_version=2)
+        cache.get_or_render(1, 'telegram', render, locale='it')
+
+        assert render.calls == 4
+        assert cache.stats == {'hits': 2, 'misses': 4}
+
+    def test_without_id_or_size_not_cached(self):
+        render = CountingRender('body')
+        RenderedMessageCache().get_or_render(None, 'telegram', render)
+        disabled = RenderedMessageCache(max_entries=0)
+        disabled.get_or_render(1, 'telegram', render)
+        disabled.get_or_render(1, 'telegram', render)
+        assert render.calls == 3 and len(disabled) == 0
+
+    def test_evicts_least_recent(self):
+        cache = RenderedMessageCache(max_entries=2)
+        for listing_id in (1, 2, 1, 3):
+            cache.get_or_render(listing_id, 'telegram', CountingRender(str(listing_id)))
+        render = CountingRender('2')
+        cache.get_or_render(2, 'telegram', render)
+        assert render.calls == 1 and len(cache) == 2
+
+
+class TestChannelsShareBodies:
+    """Подпись фильтра добавляется вокруг общего тела"""
+
+    def test_whatsapp(self):
+        service = WhatsAppService()
+        first = service.format_single_listing_message(LISTING, 'Roma 2 комнаты')
+        second = service.format_single_listing_message(LISTING, 'Центр')
+
+        body = service.format_listing_body(LISTING)
+        assert first == f"{body}\n\n📍 _Фильтр: Roma 2 комнаты_\n📱 *ITA_RENT_BOT*"
+        assert second.startswith(body) and second.endswith("📍 _Фильтр: Центр_\n📱 *ITA_RENT_BOT*")
+        assert message_cache.stats == {'hits': 1, 'misses': 1}
+
+    def test_email_cards(self):
+        service = EmailService()
+        first = service._format_listings_html([LISTING], 'Roma')
+        second = service._format_listings_html([LISTING], 'Milano')
+
+        card = service._format_listing_card_html(LISTING)
+        assert card in first and card in second
+        assert '"Roma"' in first and '"Milano"' in second
+        assert message_cache.stats == {'hits': 1, 'misses': 1}
@@ -0,0 +1,81 @@
+"""
+Тесты прохода диспетчера уведомлений: пользователи параллельно, каждый в своей сессии
+"""
+import asyncio
+import importlib
+
+import pytest
+
+from src.core.config import settings
+from src.db import database
+from src.db.models import Filter, Listing, Notification, SentNotification, User
+
+TABLES = [User, Filter, Listing, Notification, SentNotification]
+
+
+@pytest.fixture
+def session_factory(session_factory, monkeypatch):
+    # Сервис при создании проверяет таблицы - в тестовой БД, а не в рабочей
+    monkeypatch.setattr(database, 'engine', session_factory.kw['bind'])
+    db = session_factory()
+    for user_id in (1, 2, 3):
+        db.add(User(
+            id=user_id, email=f'u{user_id}@example.com', hashed_password='x',
+            telegram_chat_id=str(100 + user_id), email_notifications_enabled=False,
+        ))
+        db.add(Filter(id=user_id, user_id=user_id, name='Roma', city='Roma'))
+    db.add_all([
+        Listing(id=n, external_id=str(n), source='casa_it', url=f'u{n}', title='t', city='Roma', price=1000)
+        for n in range(1, 4)
+    ])
+    db.commit()
+    db.close()
+    return session_factory
+
+
+@pytest.fixture
+def service(session_factory, monkeypatch):
+    # Модуль сервиса поднимает Telegram бота, которому нужен токен
+    monkeypatch.setattr(settings, 'TELEGRAM_BOT_TOKEN', settings.TELEGRAM_BOT_TOKEN or '123:test')
+    module = importlib.import_module('src.services.notification_service')
+    service = module.NotificationService(session_factory=session_factory)
+    service.db = session_factory()
+
+    async def send_telegram(user, filter_obj, listings):
+        return True
+
+    monkeypatch.setattr(service, 'send_telegram_listings', send_telegram)
+    yield service, module
+    service.db.close()
+
+
+class TestDispatchSessions:
+    """Ошибка записи одного пользователя не мешает остальным"""
+
+    def test_failed_record_does_not_break_others(self, service, session_factory, monkeypatch):
+        service, module = service
+        record_sent = module.crud_sent_notification.record_sent
+
+        def failing_record_sent(db, *, user_id, **kwargs):
+            if user_id == 2:
+                raise RuntimeError("insert failed")
+            return record_sent(db, user_id=user_id, **kwargs)
+
+        monkeypatch.setattr(module.crud_sent_notification, 'record_sent', failing_record_sent)
+        monkeypatch.setattr(settings, 'NOTIFICATION_OUTBOX_ENABLED', False)
+        monkeypatch.setattr(settings, 'DEBUG_NOTIFICATIONS', False)
+
+        stats = asyncio.run(service.process_all_notifications())
+
+        db = session_factory()
+        sent = {(row.user_id, row.listing_id) for row in db.query(SentNotification).all()}
+        assert sent == {(user_id, n) for user_id in (1, 3) for n in range(1, 4)}
+        filters = {f.id: f for f in db.query(Filter).all()}
+        assert filters[1].last_notification_sent is not None
+        assert filters[3].last_notification_sent is not None
+        # Транзакция пользователя 2 откатилась целиком
+        assert filters[2].last_notification_sent is None
+        assert filters[2].last_seen_listing_id is None
+        assert db.query(Notification).count() == 2
+        assert stats['notifications_sent'] == 2 and stats['users_processed'] == 3
+        db.close()
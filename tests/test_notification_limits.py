@@ -0,0 +1,59 @@
+"""
+Тесты лимитов каналов уведомлений
+"""
+import asyncio
+import time
+
+from src.core.rate_limit import KeyedTokenBuckets
+from src.services.notification_limits import NotificationRateLimits, run_bounded
+
+
+class TestKeyedTokenBuckets:
+    """Тесты корзин по получателям"""
+
+    def test_separate_bucket_per_key(self):
+        buckets = KeyedTokenBuckets(rate=1.0, capacity=1)
+        assert buckets.get('a').try_acquire()
+        assert not buckets.get('a').try_acquire()
+        assert buckets.get('b').try_acquire()
+
+    def test_evicts_idle_buckets(self):
+        buckets = KeyedTokenBuckets(rate=1.0, capacity=1, max_keys=2)
+        buckets.get('a')
+        buckets.get('b').try_acquire()
+        buckets.get('c')
+        # Полная корзина 'a' вытеснена, использованная 'b' сохранена
+        assert len(buckets) == 2 and not buckets.get('b').try_acquire()
+
+
+class TestNotificationRateLimits:
+    """Параллельная рассылка соблюдает лимит получателя и канала"""
+
+    def test_recipient_interval_under_concurrency(self):
+        limits = NotificationRateLimits(telegram_rate=1000, telegram_chat_rate=20)
+        sent = {}
+
+        async def send_user(user_id: str) -> None:
+            for _ in range(3):
+                await limits.acquire('telegram', user_id)
+                sent.setdefault(user_id, []).append(time.monotonic())
+
+        started = time.monotonic()
+        asyncio.run(run_bounded([str(n) for n in range(10)], send_user, concurrency=10))
+
+        # Пользователи параллельно: 3 сообщения каждому при 20/с в чат - около 0.1 с, а не 1.5
+        assert time.monotonic() - started < 0.5
+        gaps = [later - earlier for moments in sent.values() for earlier, later in zip(moments, moments[1:])]
+        assert min(gaps) >= 0.045
+        assert limits.stats['telegram']['messages'] == 30
+
+    def test_channel_rate(self):
+        limits = NotificationRateLimits(email_rate=50)
+
+        async def send_all() -> None:
+            for _ in range(6):
+                await limits.acquire('email')
+
+        started = time.monotonic()
+        asyncio.run(send_all())
+        assert time.monotonic() - started >= 0.09  # Первое сразу, остальные 5 - по 20 мс
@@ -0,0 +1,148 @@
+"""
+Тесты outbox уведомлений и воркера доставки
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from src.crud.crud_notification import notification as crud_notification
+from src.db.models import Filter, Listing, Notification, User
+from src.services.notification_outbox import NotificationOutbox
+
+TABLES = [User, Filter, Listing, Notification]
+
+
+@pytest.fixture
+def session_factory(session_factory):
+    db = session_factory()
+    db.add(User(id=1, email='u@example.com', hashed_password='x', telegram_chat_id='100'))
+    db.add(Filter(id=1, user_id=1, name='Roma'))
+    db.add_all([
+        Listing(id=n, external_id=str(n), source='casa_it', url=f'u{n}', title='t', city='Roma', price=1000)
+        for n in range(1, 4)
+    ])
+    db.commit()
+    db.close()
+    return session_factory
+
+
+class StubSender:
+    """Канал-заглушка: первые fail_times вызовов - ошибка"""
+
+    def __init__(self, fail_times: int = 0):
+        self.fail_times = fail_times
+        self.calls = []
+
+    async def __call__(self, user, filter_obj, listings):
+        self.calls.append([listing.id for listing in listings])
+        if len(self.calls) <= self.fail_times:
+            raise ConnectionError("channel down")
+        return True
+
+
+def make_outbox(session_factory, **senders):
+    return NotificationOutbox(
+        batch_size=10, lease_seconds=60, max_attempts=3, retry_delay_seconds=30,
+        senders=senders, session_factory=session_factory,
+    )
+
+
+def make_due(db):
+    """Отложенные повторы - к доставке сейчас"""
+    db.query(Notification).update({'available_at': datetime.now(timezone.utc) - timedelta(seconds=1)})
+    db.commit()
+
+
+class TestOutboxClaims:
+    """Тесты очереди сообщений"""
+
+    def test_enqueue_needs_commit(self, session_factory):
+        """Строки outbox фиксируются только вместе с транзакцией подбора"""
+        db = session_factory()
+        crud_notification.enqueue(db, user_id=1, filter_id=1, listing_ids=[1, 2], channels=['telegram', 'email'])
+        db.rollback()
+        assert crud_notification.claim(db, lease_seconds=60) == []
+
+        crud_notification.enqueue(db, user_id=1, filter_id=1, listing_ids=[1, 2], channels=['telegram', 'email'])
+        db.commit()
+        assert crud_notification.get_status_counts(db)['email']['pending'] == 1
+
+    def test_workers_do_not_share_rows(self, session_factory):
+        db = session_factory()
+        crud_notification.enqueue(db, user_id=1, filter_id=1, listing_ids=[1], channels=['telegram', 'email'])
+        db.commit()
+
+        first = crud_notification.claim(session_factory(), lease_seconds=60, limit=1)
+        second = crud_notification.claim(session_factory(), lease_seconds=60, limit=5)
+        third = crud_notification.claim(session_factory(), lease_seconds=60, limit=5)
+
+        assert len(first) == 1 and len(second) == 1 and third == []
+        assert first[0].id != second[0].id
+        assert second[0].status == 'sending' and second[0].attempts == 1
+
+    def test_stats_rows_are_not_claimed(self, session_factory):
+        """Записи статистики без канала (прямая отправка) в очередь не попадают"""
+        db = session_factory()
+        db.add(Notification(user_id=1, filter_id=1, listing_id=1, status='pending', attempts=0, max_attempts=3))
+        db.commit()
+        assert crud_notification.claim(db, lease_seconds=60) == []
+
+
+class TestOutboxDelivery:
+    """Тесты доставки с повторами"""
+
+    def test_delivers_and_counts(self, session_factory):
+        telegram = StubSender()
+        outbox = make_outbox(session_factory, telegram=telegram)
+        db = session_factory()
+        outbox.enqueue(db, user_id=1, filter_id=1, listing_ids=[3, 1], channels=['telegram'])
+        db.commit()
+
+        total = asyncio.run(outbox.drain(db))
+
+        assert total['sent'] == 1 and total['batches'] == 1
+        assert telegram.calls == [[3, 1]]
+        assert outbox.snapshot(db)['counts'] == {'pending': 0, 'sending': 0, 'sent': 1, 'failed': 0}
+
+    def test_failure_retries_with_backoff(self, session_factory):
+        telegram = StubSender(fail_times=1)
+        outbox = make_outbox(session_factory, telegram=telegram)
+        db = session_factory()
+        outbox.enqueue(db, user_id=1, filter_id=1, listing_ids=[1], channels=['telegram'])
+        db.commit()
+
+        first = asyncio.run(outbox.drain(db))
+        row = db.query(Notification).one()
+        assert first['retried'] == 1
+        assert row.status == 'pending' and 'channel down' in row.error_message
+
+        # Повтор отложен: сразу не берется
+        assert asyncio.run(outbox.drain(db))['claimed'] == 0
+
+        make_due(db)
+        assert asyncio.run(outbox.drain(db))['sent'] == 1
+        assert len(telegram.calls) == 2
+
+    def test_exhausted_attempts_fail(self, session_factory):
+        outbox = make_outbox(session_factory, telegram=StubSender(fail_times=10))
+        db = session_factory()
+        outbox.enqueue(db, user_id=1, filter_id=1, listing_ids=[1], channels=['telegram'])
+        db.commit()
+
+        for _ in range(3):
+            asyncio.run(outbox.drain(db))
+            make_due(db)
+
+        db.expire_all()
+        row = db.query(Notification).one()
+        assert row.status == 'failed' and row.attempts == 3
+        assert outbox.stats['retried'] == 2 and outbox.stats['failed'] == 1
+
+    def test_missing_listings_fail_without_retry(self, session_factory):
+        outbox = make_outbox(session_factory, telegram=StubSender())
+        db = session_factory()
+        outbox.enqueue(db, user_id=1, filter_id=1, listing_ids=[99], channels=['telegram'])
+        db.commit()
+
+        assert asyncio.run(outbox.drain(db))['failed'] == 1
+        assert db.query(Notification).one().status == 'failed'
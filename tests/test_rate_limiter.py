@@ -0,0 +1,87 @@
+"""
+Тесты для общего лимитера ScraperAPI
+"""
+import asyncio
+
+from src.core.rate_limit import TokenBucket
+from src.parsers.rate_limiter import ScraperAPILimiter
+
+
+class TestTokenBucket:
+    """Тесты token bucket"""
+
+    def test_burst_then_empty(self):
+        """Всплеск ограничен емкостью"""
+        bucket = TokenBucket(rate=1.0, capacity=2)
+        assert bucket.try_acquire()
+        assert bucket.try_acquire()
+        assert not bucket.try_acquire()
+        assert bucket.time_until_available() > 0
+
+    def test_unlimited(self):
+        """rate <= 0 - без ограничения"""
+        bucket = TokenBucket(rate=0)
+        assert all(bucket.try_acquire() for _ in range(100))
+
+
+class TestScraperAPILimiter:
+    """Тесты AIMD и весов источников"""
+
+    def test_backoff_on_429_and_ramp_up(self):
+        """429 уменьшает лимит, успешные ответы постепенно его возвращают"""
+        limiter = ScraperAPILimiter(max_concurrent=8, initial_concurrent=8, requests_per_second=0)
+
+        async def run():
+            async with limiter.slot('casa_it') as slot:
+                slot.report(status=429)
+            assert limiter.limit == 4.0
+            for _ in range(20):
+                async with limiter.slot('casa_it') as slot:
+                    slot.report(status=200)
+
+        asyncio.run(run())
+        assert 4.0 < limiter.limit <= 8.0
+        stats = limiter.snapshot()['sources']['casa_it']
+        assert stats['throttled'] == 1
+        assert stats['success'] == 20
+
+    def test_concurrency_never_exceeds_limit(self):
+        """Одновременно выполняется не больше limit запросов"""
+        limiter = ScraperAPILimiter(max_concurrent=3, initial_concurrent=3, requests_per_second=0)
+        peak = 0
+
+        async def request(source):
+            nonlocal peak
+            async with limiter.slot(source) as slot:
+                peak = max(peak, limiter.in_flight)
+                await asyncio.sleep(0.01)
+                slot.report(status=200)
+
+        async def run():
+            await asyncio.gather(*(request(s) for s in ['subito', 'casa_it'] * 10))
+
+        asyncio.run(run())
+        assert peak <= 3
+        assert limiter.in_flight == 0
+
+    def test_weights_share_slots(self):
+        """Источник с большим весом получает больше слотов при конкуренции"""
+        limiter = ScraperAPILimiter(
+            max_concurrent=1, initial_concurrent=1, requests_per_second=0,
+            weights={'subito': 2.0, 'casa_it': 1.0},
+        )
+        order = []
+
+        async def request(source):
+            async with limiter.slot(source) as slot:
+                order.append(source)
+                await asyncio.sleep(0)
+                slot.report(status=200)
+
+        async def run():
+            await asyncio.gather(*(request('subito') for _ in range(10)), *(request('casa_it') for _ in range(10)))
+
+        asyncio.run(run())
+        first_nine = order[:9]
+        assert first_nine.count('subito') == 6
+        assert first_nine.count('casa_it') == 3
@@ -0,0 +1,118 @@
+"""
+Тесты адаптивных интервалов обхода
+"""
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from src.crud.crud_scraping_session import scraping_session as crud_scraping_session
+from src.services.recrawl_scheduler import RecrawlScheduler
+
+NOW = datetime(2026, 1, 1, 12, 0)
+
+
+def _task(source, city='roma', credits=10):
+    return {'source': source, 'city': city, 'max_pages': 1, 'estimated_credits': credits}
+
+
+class TestRateEstimate:
+    """Тесты оценки темпа новых объявлений"""
+
+    def test_rate_from_history(self, monkeypatch):
+        """Новые объявления первого обхода не учитываются: интервал до него неизвестен"""
+        start = datetime.utcnow() - timedelta(hours=6)
+        sessions = [
+            SimpleNamespace(source='subito', status='completed', filters_used={'city': 'roma'}, new_listings_added=new,
+                            started_at=(start + timedelta(hours=hours)).replace(tzinfo=timezone.utc))
+            for hours, new in ((0, 500), (2, 10), (6, 30))
+        ]
+        monkeypatch.setattr(crud_scraping_session, 'get_finished_since', lambda db, since: sessions)
+
+        rates = RecrawlScheduler().estimate_rates(db=None)
+        assert rates[('subito', 'roma')]['rate_per_hour'] == 40 / 6
+        assert rates[('subito', 'roma')]['last_crawl_at'].tzinfo is None
+
+    def test_single_crawl_has_no_rate(self, monkeypatch):
+        sessions = [SimpleNamespace(source='casa_it', status='completed', filters_used={'city': 'roma'},
+                                    new_listings_added=25, started_at=datetime.utcnow())]
+        monkeypatch.setattr(crud_scraping_session, 'get_finished_since', lambda db, since: sessions)
+        assert RecrawlScheduler().estimate_rates(db=None)[('casa_it', 'roma')]['rate_per_hour'] is None
+
+    def test_failed_only_pair_backs_off(self, monkeypatch):
+        """Пара только с неудачными обходами не обходится на каждом такте"""
+        now = datetime.utcnow()
+        sessions = [
+            SimpleNamespace(source='idealista', status='failed', filters_used={'city': 'roma'},
+                            new_listings_added=0, started_at=now - timedelta(minutes=minutes))
+            for minutes in (50, 20)
+        ]
+        monkeypatch.setattr(crud_scraping_session, 'get_finished_since', lambda db, since: sessions)
+        scheduler = RecrawlScheduler(default_interval_hours=6, max_interval_hours=20)
+
+        rates = scheduler.estimate_rates(db=None)
+        info = rates[('idealista', 'roma')]
+        assert info['rate_per_hour'] is None and info['failures'] == 2
+        assert info['last_crawl_at'] == sessions[-1].started_at
+
+        pair = scheduler.compute_schedule([_task('idealista')], rates, now=now)['pairs'][0]
+        # 6 ч × 2² = 24 ч, но не дольше max_interval
+        assert pair['interval_minutes'] == 20 * 60
+        assert pair['next_crawl_at'] == sessions[-1].started_at + timedelta(hours=20)
+        assert scheduler.due_tasks(None, [_task('idealista')]) == []
+
+    def test_success_resets_failures(self, monkeypatch):
+        start = datetime.utcnow() - timedelta(hours=4)
+        sessions = [
+            SimpleNamespace(source='subito', status=status, filters_used={'city': 'roma'},
+                            new_listings_added=new, started_at=start + timedelta(hours=hours))
+            for hours, status, new in ((0, 'completed', 50), (1, 'failed', 0), (2, 'completed', 8), (3, 'failed', 0))
+        ]
+        monkeypatch.setattr(crud_scraping_session, 'get_finished_since', lambda db, since: sessions)
+
+        info = RecrawlScheduler().estimate_rates(db=None)[('subito', 'roma')]
+        assert info['rate_per_hour'] == 4 and info['failures'] == 1
+        assert info['last_crawl_at'] == sessions[-1].started_at
+
+
+class TestSchedule:
+    """Тесты распределения частоты обхода"""
+
+    def test_budget_goes_to_fast_pairs(self):
+        """Пара с большим темпом на кредит обходится чаще, бюджет не превышается"""
+        scheduler = RecrawlScheduler(budget_credits_per_hour=10, max_interval_hours=24)
+        rates = {
+            ('subito', 'roma'): {'rate_per_hour': 20.0, 'last_crawl_at': NOW - timedelta(hours=2)},
+            ('casa_it', 'roma'): {'rate_per_hour': 1.0, 'last_crawl_at': NOW - timedelta(hours=1)},
+        }
+        schedule = scheduler.compute_schedule([_task('subito'), _task('casa_it')], rates, now=NOW)
+        pairs = {pair['source']: pair for pair in schedule['pairs']}
+
+        assert pairs['subito']['interval_minutes'] < pairs['casa_it']['interval_minutes']
+        assert pairs['casa_it']['interval_minutes'] == 24 * 60
+        assert schedule['credits_per_hour'] <= 10
+        assert pairs['subito']['next_crawl_at'] <= NOW
+
+    def test_target_reached_without_overspending(self):
+        """При достаточном бюджете частота растет только до цели свежести"""
+        scheduler = RecrawlScheduler(freshness_target=0.5, budget_credits_per_hour=1000)
+        rates = {('subito', 'roma'): {'rate_per_hour': 10.0, 'last_crawl_at': NOW}}
+        schedule = scheduler.compute_schedule([_task('subito')], rates, now=NOW)
+
+        assert schedule['expected_freshness'] == 0.5
+        assert schedule['pairs'][0]['interval_minutes'] == 120
+
+    def test_unknown_pairs_use_default_interval(self):
+        """Пары без истории обходятся по умолчанию и сразу"""
+        scheduler = RecrawlScheduler(default_interval_hours=6)
+        schedule = scheduler.compute_schedule([_task('idealista', 'milano')], {}, now=NOW)
+        pair = schedule['pairs'][0]
+        assert pair['interval_minutes'] == 360 and pair['next_crawl_at'] == NOW
+
+    def test_failure_doubles_interval(self):
+        scheduler = RecrawlScheduler(freshness_target=0.5, budget_credits_per_hour=1000, max_interval_hours=24)
+        rates = {('subito', 'roma'): {'rate_per_hour': 10.0, 'last_crawl_at': NOW, 'failures': 1}}
+        pair = scheduler.compute_schedule([_task('subito')], rates, now=NOW)['pairs'][0]
+        healthy = scheduler.compute_schedule(
+            [_task('subito')], {('subito', 'roma'): {**rates[('subito', 'roma')], 'failures': 0}}, now=NOW
+        )['pairs'][0]
+        assert healthy['interval_minutes'] == 120 and pair['interval_minutes'] == 240
+        assert pair['next_crawl_at'] == NOW + timedelta(hours=4)